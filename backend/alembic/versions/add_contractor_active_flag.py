@@ -0,0 +1,28 @@
+"""add contractors.is_active for expired SAM.gov registrations
+
+Revision ID: contractor_active_001
+Revises: rag_incremental_001
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'contractor_active_001'
+down_revision = 'rag_incremental_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Add contractors.is_active (expired registrations are kept but inactive)"""
+    op.add_column(
+        'contractors',
+        sa.Column('is_active', sa.Boolean(), nullable=False, server_default=sa.true())
+    )
+
+
+def downgrade():
+    """Remove contractors.is_active"""
+    op.drop_column('contractors', 'is_active')
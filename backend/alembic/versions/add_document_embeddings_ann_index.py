@@ -0,0 +1,70 @@
+"""add ANN and filter indexes to document_embeddings
+
+Revision ID: document_ann_001
+Revises: embedding_cache_001
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'document_ann_001'
+down_revision = 'embedding_cache_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Store embeddings as vector(1536) and index them for ANN search"""
+    op.execute('CREATE EXTENSION IF NOT EXISTS vector')
+    # Created as a float array "for compatibility"; ANN indexes need the vector type
+    op.execute("""
+        DO $$
+        BEGIN
+            IF (SELECT data_type FROM information_schema.columns
+                WHERE table_name = 'document_embeddings' AND column_name = 'embedding') = 'ARRAY' THEN
+                ALTER TABLE document_embeddings ALTER COLUMN embedding TYPE vector(1536) USING embedding::vector;
+            END IF;
+        END $$
+    """)
+
+    # CONCURRENTLY: indexing and search keep running during the builds
+    with op.get_context().autocommit_block():
+        op.execute("SET maintenance_work_mem = '1GB'")
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_document_embeddings_embedding_hnsw
+            ON document_embeddings USING hnsw (embedding vector_cosine_ops)
+            WITH (m = 16, ef_construction = 64)
+        """)
+        # Organization filter (small tenants: exact scan of their rows) and metadata containment
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_document_embeddings_organization
+            ON document_embeddings ((metadata ->> 'organization_id'))
+        """)
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_document_embeddings_metadata
+            ON document_embeddings USING gin (metadata jsonb_path_ops)
+        """)
+
+
+def downgrade():
+    """Remove the ANN and filter indexes (per-organization indexes included)"""
+    with op.get_context().autocommit_block():
+        op.execute("""
+            DO $$
+            DECLARE
+                name text;
+            BEGIN
+                FOR name IN SELECT indexname FROM pg_indexes
+                            WHERE tablename = 'document_embeddings'
+                              AND indexname LIKE 'idx_document_embeddings_hnsw_org_%'
+                LOOP
+                    EXECUTE format('DROP INDEX IF EXISTS %I', name);
+                END LOOP;
+            END $$
+        """)
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS idx_document_embeddings_metadata')
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS idx_document_embeddings_organization')
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS idx_document_embeddings_embedding_hnsw')
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS idx_document_embeddings_embedding_ivfflat')
+    op.execute('ALTER TABLE document_embeddings ALTER COLUMN embedding TYPE double precision[] USING embedding::real[]')
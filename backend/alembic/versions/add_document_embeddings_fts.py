@@ -0,0 +1,37 @@
+"""add full-text search column and index to document_embeddings
+
+Revision ID: document_fts_001
+Revises: document_ann_001
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'document_fts_001'
+down_revision = 'document_ann_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Keep a tsvector of each chunk for the lexical leg of hybrid search"""
+    # Stored, so ranking reads the vector instead of re-parsing every matching chunk
+    # (adding it rewrites the table once)
+    op.execute("""
+        ALTER TABLE document_embeddings
+        ADD COLUMN IF NOT EXISTS content_tsv tsvector
+        GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, ''))) STORED
+    """)
+    with op.get_context().autocommit_block():
+        op.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_document_embeddings_content_tsv
+            ON document_embeddings USING gin (content_tsv)
+        """)
+
+
+def downgrade():
+    """Remove the full-text search index and column"""
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS idx_document_embeddings_content_tsv')
+    op.execute('ALTER TABLE document_embeddings DROP COLUMN IF EXISTS content_tsv')
@@ -0,0 +1,33 @@
+"""add content-addressed embedding cache
+
+Revision ID: embedding_cache_001
+Revises: opp_embeddings_001
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'embedding_cache_001'
+down_revision = 'opp_embeddings_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Add embedding_cache table"""
+    op.create_table(
+        'embedding_cache',
+        sa.Column('model', sa.String(100), nullable=False),
+        sa.Column('dimensions', sa.Integer(), nullable=False),
+        sa.Column('content_hash', sa.String(32), nullable=False),
+        sa.Column('vector', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.text('now()')),
+        sa.PrimaryKeyConstraint('model', 'dimensions', 'content_hash')
+    )
+
+
+def downgrade():
+    """Remove the embedding cache"""
+    op.drop_table('embedding_cache')
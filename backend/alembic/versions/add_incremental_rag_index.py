@@ -0,0 +1,89 @@
+"""add chunk hashes and RAG document registry for incremental re-indexing
+
+Revision ID: rag_incremental_001
+Revises: document_fts_001
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'rag_incremental_001'
+down_revision = 'document_fts_001'
+branch_labels = None
+depends_on = None
+
+RAG_DOCUMENT_ID_START = 1000000000  # app.models.knowledge.RAG_DOCUMENT_ID_START
+
+
+def upgrade():
+    """Hash each stored chunk; give string-keyed documents an index id"""
+    # Nullable: rows indexed before this are hashed from their content on first update
+    op.add_column('document_embeddings', sa.Column('content_hash', sa.String(32), nullable=True))
+    op.create_table(
+        'rag_documents',
+        # Ids start above documents.id values: both are document_embeddings.document_id
+        sa.Column('id', sa.Integer(), sa.Identity(start=RAG_DOCUMENT_ID_START), primary_key=True),
+        sa.Column('source_key', sa.String(200), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.text('now()')),
+        sa.UniqueConstraint('source_key', name='uq_rag_documents_source_key')
+    )
+
+    # document_id now references documents or rag_documents (by id range), which
+    # a foreign key cannot express: triggers enforce the reference and the
+    # ON DELETE CASCADE in its place
+    op.drop_constraint('document_embeddings_document_id_fkey', 'document_embeddings', type_='foreignkey')
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION document_embeddings_check_document() RETURNS trigger AS $$
+        BEGIN
+            -- FOR KEY SHARE, like a foreign key check: the parent can't be deleted under us
+            IF NEW.document_id >= {RAG_DOCUMENT_ID_START} THEN
+                PERFORM 1 FROM rag_documents WHERE id = NEW.document_id FOR KEY SHARE;
+            ELSE
+                PERFORM 1 FROM documents WHERE id = NEW.document_id FOR KEY SHARE;
+            END IF;
+            IF NOT FOUND THEN
+                RAISE foreign_key_violation USING MESSAGE = format(
+                    'document_embeddings.document_id %s is not in documents or rag_documents', NEW.document_id
+                );
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER document_embeddings_document_exists
+        BEFORE INSERT OR UPDATE OF document_id ON document_embeddings
+        FOR EACH ROW EXECUTE FUNCTION document_embeddings_check_document()
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION delete_document_embeddings() RETURNS trigger AS $$
+        BEGIN
+            DELETE FROM document_embeddings WHERE document_id = OLD.id;
+            RETURN OLD;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    for table in ('documents', 'rag_documents'):
+        op.execute(f"""
+            CREATE TRIGGER {table}_delete_embeddings
+            AFTER DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION delete_document_embeddings()
+        """)
+
+
+def downgrade():
+    """Remove the registry (and its chunks) and chunk hashes; restore the documents foreign key"""
+    for table in ('documents', 'rag_documents'):
+        op.execute(f'DROP TRIGGER IF EXISTS {table}_delete_embeddings ON {table}')
+    op.execute('DROP TRIGGER IF EXISTS document_embeddings_document_exists ON document_embeddings')
+    op.execute('DROP FUNCTION IF EXISTS delete_document_embeddings()')
+    op.execute('DROP FUNCTION IF EXISTS document_embeddings_check_document()')
+    op.execute(f'DELETE FROM document_embeddings WHERE document_id >= {RAG_DOCUMENT_ID_START}')
+    op.create_foreign_key(
+        'document_embeddings_document_id_fkey', 'document_embeddings', 'documents',
+        ['document_id'], ['id'], ondelete='CASCADE'
+    )
+    op.drop_table('rag_documents')
+    op.drop_column('document_embeddings', 'content_hash')
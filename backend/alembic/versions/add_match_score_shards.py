@@ -0,0 +1,35 @@
+"""add nightly match scoring shard checkpoints
+
+Revision ID: match_shards_001
+Revises: match_scores_001
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'match_shards_001'
+down_revision = 'match_scores_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Add match_score_shards table"""
+    op.create_table(
+        'match_score_shards',
+        sa.Column('run_id', sa.String(50), nullable=False),
+        sa.Column('organization_id', sa.String(36), nullable=False),
+        sa.Column('shard', sa.Integer(), nullable=False),
+        sa.Column('rows', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('seconds', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('worker', sa.String(255), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.text('now()')),
+        sa.PrimaryKeyConstraint('run_id', 'organization_id', 'shard')
+    )
+
+
+def downgrade():
+    """Remove match scoring shard checkpoints"""
+    op.drop_table('match_score_shards')
@@ -0,0 +1,37 @@
+"""add opportunity description embeddings
+
+Revision ID: opp_embeddings_001
+Revises: match_shards_001
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'opp_embeddings_001'
+down_revision = 'match_shards_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Add opportunity_embeddings table"""
+    op.create_table(
+        'opportunity_embeddings',
+        sa.Column('opportunity_id', sa.String(36), nullable=False),
+        sa.Column('content_hash', sa.String(32), nullable=False),
+        sa.Column('model', sa.String(100), nullable=False),
+        sa.Column('dimensions', sa.Integer(), nullable=False),
+        sa.Column('vector', sa.LargeBinary(), nullable=False),
+        sa.Column('scale', sa.Float(), nullable=False),
+        sa.Column('embedded_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.text('now()')),
+        sa.PrimaryKeyConstraint('opportunity_id')
+    )
+    op.create_index('ix_opportunity_embeddings_content_hash', 'opportunity_embeddings', ['content_hash'])
+
+
+def downgrade():
+    """Remove opportunity description embeddings"""
+    op.drop_index('ix_opportunity_embeddings_content_hash', table_name='opportunity_embeddings')
+    op.drop_table('opportunity_embeddings')
@@ -0,0 +1,51 @@
+"""add materialized opportunity match scores
+
+Revision ID: match_scores_001
+Revises: sam_detail_001
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'match_scores_001'
+down_revision = 'sam_detail_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Add opportunity_match_scores table"""
+    op.create_table(
+        'opportunity_match_scores',
+        sa.Column('organization_id', sa.String(36), nullable=False),
+        sa.Column('opportunity_id', sa.String(36), nullable=False),
+        sa.Column('overall_score', sa.Float(), nullable=False),
+        sa.Column('grade', sa.String(5), nullable=False),
+        sa.Column('capability_score', sa.Float(), nullable=False),
+        sa.Column('past_performance_score', sa.Float(), nullable=False),
+        sa.Column('set_aside_score', sa.Float(), nullable=False),
+        sa.Column('size_score', sa.Float(), nullable=False),
+        sa.Column('geography_score', sa.Float(), nullable=False),
+        sa.Column('clearance_score', sa.Float(), nullable=False),
+        sa.Column('scored_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.text('now()')),
+        sa.PrimaryKeyConstraint('organization_id', 'opportunity_id')
+    )
+    op.create_index(
+        'ix_opportunity_match_scores_org_score',
+        'opportunity_match_scores',
+        ['organization_id', sa.text('overall_score DESC'), 'opportunity_id']
+    )
+    op.create_index(
+        'ix_opportunity_match_scores_opportunity_id',
+        'opportunity_match_scores',
+        ['opportunity_id']
+    )
+
+
+def downgrade():
+    """Remove materialized match scores"""
+    op.drop_index('ix_opportunity_match_scores_opportunity_id', table_name='opportunity_match_scores')
+    op.drop_index('ix_opportunity_match_scores_org_score', table_name='opportunity_match_scores')
+    op.drop_table('opportunity_match_scores')
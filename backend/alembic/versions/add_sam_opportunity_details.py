@@ -0,0 +1,37 @@
+"""add SAM.gov opportunity detail cache
+
+Revision ID: sam_detail_001
+Revises: sam_mirror_001
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'sam_detail_001'
+down_revision = 'sam_mirror_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Add sam_opportunity_details table"""
+    op.create_table(
+        'sam_opportunity_details',
+        sa.Column('notice_id', sa.String(100), nullable=False),
+        sa.Column('source_modified', sa.String(50), nullable=True),
+        sa.Column('payload_hash', sa.String(64), nullable=False),
+        sa.Column('description_hash', sa.String(64), nullable=False),
+        sa.Column('detail', postgresql.JSONB(), nullable=False),
+        sa.Column('sections', postgresql.JSONB(), nullable=False),
+        sa.Column('fetched_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.text('now()')),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.text('now()')),
+        sa.PrimaryKeyConstraint('notice_id')
+    )
+
+
+def downgrade():
+    """Remove SAM.gov detail cache"""
+    op.drop_table('sam_opportunity_details')
@@ -0,0 +1,88 @@
+"""add SAM.gov opportunity mirror and sync checkpoints
+
+Revision ID: sam_mirror_001
+Revises: pipeline_001
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = 'sam_mirror_001'
+down_revision = 'pipeline_001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Add sync_checkpoints and sam_opportunities tables"""
+    op.create_table(
+        'sync_checkpoints',
+        sa.Column('name', sa.String(100), nullable=False),
+        sa.Column('watermark', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('status', sa.String(50), nullable=False, server_default='idle'),
+        sa.Column('last_started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_success_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_error', sa.String(1000), nullable=True),
+        sa.Column('cursor', sa.JSON(), nullable=True),
+        sa.Column('stats', sa.JSON(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.text('now()')),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+    op.create_table(
+        'sam_opportunities',
+        sa.Column('notice_id', sa.String(100), nullable=False),
+        sa.Column('solicitation_number', sa.String(100), nullable=True),
+        sa.Column('title', sa.String(1000), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('department', sa.String(255), nullable=True),
+        sa.Column('sub_tier', sa.String(255), nullable=True),
+        sa.Column('office', sa.String(255), nullable=True),
+        sa.Column('notice_type', sa.String(100), nullable=True),
+        sa.Column('naics_code', sa.String(20), nullable=True),
+        sa.Column('classification_code', sa.String(20), nullable=True),
+        sa.Column('set_aside_code', sa.String(50), nullable=True),
+        sa.Column('set_aside_description', sa.String(255), nullable=True),
+        sa.Column('posted_date', sa.Date(), nullable=True),
+        sa.Column('response_deadline', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('archive_date', sa.Date(), nullable=True),
+        sa.Column('active', sa.Boolean(), nullable=False, server_default='true'),
+        sa.Column('pwin_score', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('raw', postgresql.JSONB(), nullable=False),
+        sa.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                "to_tsvector('english', coalesce(title, '') || ' ' || "
+                "coalesce(solicitation_number, '') || ' ' || coalesce(description, ''))",
+                persisted=True
+            )
+        ),
+        sa.Column('first_seen_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.text('now()')),
+        sa.Column('synced_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.text('now()')),
+        sa.PrimaryKeyConstraint('notice_id')
+    )
+
+    op.create_index('ix_sam_opportunities_solicitation_number', 'sam_opportunities', ['solicitation_number'])
+    op.create_index('ix_sam_opportunities_search_vector', 'sam_opportunities', ['search_vector'], postgresql_using='gin')
+    op.create_index('ix_sam_opportunities_naics_code', 'sam_opportunities', ['naics_code'])
+    op.create_index('ix_sam_opportunities_set_aside_code', 'sam_opportunities', ['set_aside_code'])
+    op.create_index('ix_sam_opportunities_posted_date', 'sam_opportunities', ['posted_date'])
+    op.create_index('ix_sam_opportunities_response_deadline', 'sam_opportunities', ['response_deadline'])
+    op.create_index('ix_sam_opportunities_active_posted', 'sam_opportunities', ['active', 'posted_date'])
+
+
+def downgrade():
+    """Remove SAM.gov mirror tables"""
+    op.drop_index('ix_sam_opportunities_active_posted', table_name='sam_opportunities')
+    op.drop_index('ix_sam_opportunities_response_deadline', table_name='sam_opportunities')
+    op.drop_index('ix_sam_opportunities_posted_date', table_name='sam_opportunities')
+    op.drop_index('ix_sam_opportunities_set_aside_code', table_name='sam_opportunities')
+    op.drop_index('ix_sam_opportunities_naics_code', table_name='sam_opportunities')
+    op.drop_index('ix_sam_opportunities_search_vector', table_name='sam_opportunities')
+    op.drop_index('ix_sam_opportunities_solicitation_number', table_name='sam_opportunities')
+    op.drop_table('sam_opportunities')
+    op.drop_table('sync_checkpoints')
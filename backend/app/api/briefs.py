@@ -5,9 +5,11 @@ Generate AI-powered opportunity briefs
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import Dict, Any
+from sqlalchemy.orm import Session
 from app.services.brief_service import brief_service
 from app.services.samgov_service import samgov_service
 from app.core.auth import get_current_user
+from app.core.database import get_db
 from app.models.organization import User
 import logging
 
@@ -23,7 +25,8 @@ class BriefGenerationRequest(BaseModel):
 @router.post("/generate")
 async def generate_brief(
     request: BriefGenerationRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     """
     Generate AI-powered opportunity brief
@@ -40,7 +43,7 @@ async def generate_brief(
         logger.info(f"✅ Generating AI-powered brief for opportunity: {opportunity_id}")
         
         # Fetch opportunity details from SAM.gov
-        opportunity_data = await samgov_service.get_opportunity_by_id(opportunity_id)
+        opportunity_data = await samgov_service.get_opportunity_by_id(opportunity_id, db=db)
         
         if not opportunity_data:
             # If not found in SAM.gov, create basic data structure
@@ -73,7 +76,8 @@ async def generate_brief(
 @router.get("/{opportunity_id}")
 async def get_brief(
     opportunity_id: str,
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     """
     Get existing brief for an opportunity
@@ -81,7 +85,7 @@ async def get_brief(
     """
     try:
         # Fetch opportunity details
-        opportunity_data = await samgov_service.get_opportunity_by_id(opportunity_id)
+        opportunity_data = await samgov_service.get_opportunity_by_id(opportunity_id, db=db)
         
         if not opportunity_data:
             opportunity_data = {
@@ -63,7 +63,7 @@ async def discover_grants(
     Note: This endpoint is public and doesn't require authentication
     """
     try:
-        result = grants_service.search_grants(
+        result = await grants_service.search_grants(
             keyword=keyword,
             agency=agency,
             limit=limit,
@@ -83,7 +83,7 @@ async def get_grant_opportunity(
     Note: This endpoint is public and doesn't require authentication
     """
     try:
-        grant = grants_service.get_grant_detail(grant_id)
+        grant = await grants_service.get_grant_detail(grant_id)
         return grant
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching grant details: {str(e)}")
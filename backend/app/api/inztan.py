@@ -67,6 +67,7 @@ class PartnerSearchRequest(BaseModel):
     naics_codes: Optional[List[str]] = None
     set_aside: Optional[List[str]] = None
     state: Optional[str] = None
+    name: Optional[str] = None  # Legal name word prefixes ("booz all")
     capabilities: Optional[str] = None
     min_past_awards: Optional[int] = None
     page: int = 1
@@ -394,6 +395,7 @@ async def search_contractors(
         "naics_codes": request.naics_codes,
         "set_aside": request.set_aside,
         "state": request.state,
+        "name": request.name,
         "capabilities": request.capabilities,
         "min_past_awards": request.min_past_awards
     }
@@ -489,12 +491,12 @@ async def rag_semantic_search(
     current_user: User = Depends(get_current_user)
 ):
     """
-    Semantic search over company knowledge base
+    Hybrid (keyword + semantic) search over company knowledge base
     Returns relevant content with citations
     """
     rag_service = RAGService(db)
     
-    relevant_content = await rag_service.search_similar_content(
+    relevant_content = await rag_service.hybrid_search(
         query=request.query,
         top_k=request.top_k,
         filter_metadata=request.context_filters
@@ -1,7 +1,7 @@
 """
 Knowledge Base API endpoints - Document management, templates, past performance
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File, Form
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
 from typing import List, Optional
@@ -9,11 +9,15 @@ from pydantic import BaseModel
 from app.core.database import get_db
 from app.core.auth import get_current_user
 from app.models.organization import User
+from app.services.rag_service import reindex_source_document
 import uuid
 import os
+import logging
 from datetime import datetime
 import shutil
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 
@@ -52,6 +56,7 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 @router.post("/documents/upload")
 async def upload_document(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     title: str = Form(...),
     category: str = Form(...),
@@ -62,6 +67,7 @@ async def upload_document(
 ):
     """
     Upload a document to knowledge base
+    Text documents, PDFs and Word documents are indexed for RAG search in the background
     """
     try:
         # Validate file type
@@ -115,6 +121,18 @@ async def upload_document(
             "file_path": file_path
         }
         
+        background_tasks.add_task(
+            index_uploaded_document,
+            doc_id,
+            file_path,
+            {
+                "organization_id": current_user.organization_id,
+                "title": title,
+                "category": category,
+                "document_type": doc_type
+            }
+        )
+        
         return {
             "message": "Document uploaded successfully",
             "document": document
@@ -300,6 +318,24 @@ async def get_teaming_partners(
 
 
 # Helper functions
+async def index_uploaded_document(doc_id: str, file_path: str, metadata: dict):
+    """Index an uploaded document's text for RAG search (runs after the upload response)"""
+    file_ext = os.path.splitext(file_path)[1].lower()
+    try:
+        if file_ext == '.txt':
+            with open(file_path, encoding='utf-8', errors='replace') as f:
+                content = f.read()
+        elif file_ext in ['.pdf', '.doc', '.docx']:
+            from app.services.document_service import document_service
+            content = document_service.extract_text(file_path)
+        else:
+            return  # Spreadsheets and slides are not indexed
+    except Exception as e:
+        logger.warning(f"⚠️  Could not extract text from {file_path} for indexing: {str(e)}")
+        return
+    await reindex_source_document(f"knowledge:{doc_id}", content, metadata)
+
+
 def format_file_size(size_bytes: int) -> str:
     """Format file size in human-readable format"""
     for unit in ['B', 'KB', 'MB', 'GB']:
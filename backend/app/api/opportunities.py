@@ -11,7 +11,7 @@ from datetime import date
 from app.core.database import get_db
 from app.models.opportunity import Opportunity, OpportunityStage, OpportunityType, SetAsideType
 from app.services.llm_service import llm_service
-from app.services.samgov_service import samgov_service
+from app.services.samgov_service import samgov_service, InvalidCursorError
 
 router = APIRouter()
 
@@ -56,14 +56,15 @@ class PWinCalculation(BaseModel):
 @router.get("/top")
 async def get_top_opportunities(
     limit: int = Query(default=10, le=50),
-    min_pwin: Optional[int] = Query(default=60, ge=0, le=100)
+    min_pwin: Optional[int] = Query(default=60, ge=0, le=100),
+    db: Session = Depends(get_db)
 ):
     """
     Get top opportunities from SAM.gov
-    Returns top opportunities with PWin scoring
+    Returns top opportunities with PWin scoring (served from the local mirror when synced)
     """
     try:
-        result = samgov_service.get_top_opportunities(limit=limit, min_pwin=min_pwin)
+        result = await samgov_service.get_top_opportunities(limit=limit, min_pwin=min_pwin, db=db)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching opportunities: {str(e)}")
@@ -76,22 +77,28 @@ async def search_opportunities(
     naics_code: Optional[str] = None,
     keyword: Optional[str] = None,
     posted_from: Optional[str] = None,
-    posted_to: Optional[str] = None
+    posted_to: Optional[str] = None,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
 ):
     """
     Search SAM.gov opportunities with filters and pagination
+    Pass `cursor` (next_cursor / prev_cursor from a previous response) for stable paging
     """
     try:
-        # Note: samgov_service methods are synchronous, not async
-        result = samgov_service.search_opportunities(
+        result = await samgov_service.search_opportunities(
             page=page,
             limit=limit,
             naics_code=naics_code,
             keyword=keyword,
             posted_from=posted_from,
-            posted_to=posted_to
+            posted_to=posted_to,
+            cursor=cursor,
+            db=db
         )
         return result
+    except InvalidCursorError as ce:
+        raise HTTPException(status_code=400, detail=str(ce))
     except ValueError as ve:
         # Surface API key errors as 401 to the client
         raise HTTPException(status_code=401, detail=str(ve))
@@ -106,11 +113,13 @@ class SAMSearchRequest(BaseModel):
     naics_code: Optional[str] = None
     posted_from: Optional[str] = None
     posted_to: Optional[str] = None
+    cursor: Optional[str] = None
 
 
 @router.post("/sam-search")
 async def sam_gov_search(
-    request: SAMSearchRequest
+    request: SAMSearchRequest,
+    db: Session = Depends(get_db)
 ):
     """
     Search SAM.gov opportunities directly with keyword
@@ -126,27 +135,31 @@ async def sam_gov_search(
             )
 
         # Search SAM.gov via service
-        result = samgov_service.search_opportunities(
+        result = await samgov_service.search_opportunities(
             page=request.page,
             limit=request.limit,
             naics_code=request.naics_code,
             keyword=request.keyword.strip(),
             posted_from=request.posted_from,
-            posted_to=request.posted_to
+            posted_to=request.posted_to,
+            cursor=request.cursor,
+            db=db
         )
 
         # Add search metadata
         result['search_info'] = {
             'keyword': request.keyword.strip(),
-            'page': request.page,
+            'page': result.get('page', request.page),
             'limit': request.limit,
-            'source': 'SAM.gov'
+            'source': result.get('source', 'SAM.gov')
         }
 
         return result
 
     except HTTPException as he:
         raise he
+    except InvalidCursorError as ce:
+        raise HTTPException(status_code=400, detail=str(ce))
     except ValueError as ve:
         # Handle API key validation errors
         raise HTTPException(
@@ -226,7 +239,7 @@ async def get_opportunity_details(
     Includes description, contract sections (H-L), attachments, point of contact
     """
     # Try to fetch from SAM.gov by ID
-    opportunity_data = samgov_service.get_opportunity_by_id(opportunity_id)
+    opportunity_data = await samgov_service.get_opportunity_by_id(opportunity_id, db=db)
     
     if opportunity_data:
         return opportunity_data
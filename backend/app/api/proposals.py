@@ -208,7 +208,7 @@ async def generate_proposal_content(
         # Fetch contract details from SAM.gov if ID provided
         contract_data = None
         if contract_id:
-            contract_data = await samgov_service.get_opportunity_by_id(contract_id)
+            contract_data = await samgov_service.get_opportunity_by_id(contract_id, db=db)
         
         # Prepare prompt
         if contract_data:
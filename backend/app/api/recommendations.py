@@ -2,6 +2,8 @@
 AI Opportunity Recommendations API
 Provides Top 25 recommended opportunities based on AI matching
 """
+import asyncio
+
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 from typing import Optional, List
@@ -68,8 +70,10 @@ async def get_top_25_recommendations(
     if set_aside:
         filters["set_aside"] = set_aside
     
-    # Get recommendations
-    recommendations = service.get_top_recommendations(
+    # Get recommendations. Scoring is synchronous (a database scan, and an
+    # embeddings API call for capabilities not cached yet): keep it off the event loop
+    recommendations = await asyncio.to_thread(
+        service.get_top_recommendations,
         organization_id=organization_id,
         limit=limit,
         filters=filters if filters else None
@@ -146,8 +150,8 @@ async def get_match_score(
         from fastapi import HTTPException
         raise HTTPException(status_code=404, detail="Organization not found")
     
-    # Calculate match score
-    match_score = service.calculate_ai_match_score(opp, org)
+    # Calculate match score (off the event loop, see get_top_25_recommendations)
+    match_score = await asyncio.to_thread(service.calculate_ai_match_score, opp, org)
     
     # Generate reasons
     reasons = service._generate_recommendation_reason(match_score, opp, org)
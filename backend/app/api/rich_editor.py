@@ -1,17 +1,50 @@
 """
 API endpoints for rich text editor service
 """
-from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
-from typing import Dict, Any, Optional, List
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
+from typing import Any, Optional, List
 from pydantic import BaseModel
 
+from app.models.organization import User
 from app.services.rich_editor_service import rich_editor_service
+from app.services.rag_service import reindex_source_document
 from app.api.auth import get_current_user
 
 
 router = APIRouter(prefix="/api/v1/editor", tags=["Rich Editor"])
 
 
+def current_content(document_id: str) -> Optional[str]:
+    """The document's latest saved content (None once it is gone)"""
+    document = rich_editor_service.documents.get(document_id)
+    return document['content'] if document is not None else None
+
+
+def schedule_reindex(background_tasks: BackgroundTasks, document_id: str, current_user: User):
+    """
+    Re-index a saved document for RAG search after the response is sent
+    (only the chunks an edit touched are re-embedded)
+
+    The task indexes the content current when it runs, re-checked under the
+    index lock, so saves finishing out of order never leave older text indexed.
+    """
+    document = rich_editor_service.documents.get(document_id)
+    if document is None:
+        return
+    background_tasks.add_task(
+        reindex_source_document,
+        f"editor:{document_id}",
+        document['content'],
+        {
+            'organization_id': current_user.organization_id,
+            'title': document['title'],
+            'category': 'editor',
+            'document_type': document['document_type']
+        },
+        load_content=lambda: current_content(document_id)
+    )
+
+
 class CreateDocumentRequest(BaseModel):
     """Create document request"""
     document_id: str
@@ -58,7 +91,8 @@ class UpdatePermissionRequest(BaseModel):
 @router.post("/documents")
 async def create_document(
     request: CreateDocumentRequest,
-    current_user: Dict = Depends(get_current_user)
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user)
 ):
     """
     Create a new document
@@ -68,11 +102,14 @@ async def create_document(
             document_id=request.document_id,
             title=request.title,
             content=request.content,
-            owner_id=current_user['user_id'],
-            owner_name=current_user.get('name', 'User'),
+            owner_id=current_user.id,
+            owner_name=current_user.full_name,
             document_type=request.document_type
         )
         
+        if result.get('status') == 'created':
+            schedule_reindex(background_tasks, request.document_id, current_user)
+        
         return result
     
     except Exception as e:
@@ -85,7 +122,8 @@ async def create_document(
 @router.post("/auto-save")
 async def auto_save(
     request: AutoSaveRequest,
-    current_user: Dict = Depends(get_current_user)
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user)
 ):
     """
     Auto-save document content
@@ -96,12 +134,15 @@ async def auto_save(
     try:
         result = await rich_editor_service.auto_save(
             document_id=request.document_id,
-            user_id=current_user['user_id'],
-            user_name=current_user.get('name', 'User'),
+            user_id=current_user.id,
+            user_name=current_user.full_name,
             content=request.content,
             save_as_draft=request.save_as_draft
         )
         
+        if result.get('status') == 'saved':
+            schedule_reindex(background_tasks, request.document_id, current_user)
+        
         return result
     
     except Exception as e:
@@ -114,7 +155,8 @@ async def auto_save(
 @router.post("/save-version")
 async def save_version(
     request: SaveVersionRequest,
-    current_user: Dict = Depends(get_current_user)
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user)
 ):
     """
     Save a new version of the document
@@ -124,12 +166,15 @@ async def save_version(
     try:
         result = await rich_editor_service.save_version(
             document_id=request.document_id,
-            user_id=current_user['user_id'],
-            user_name=current_user.get('name', 'User'),
+            user_id=current_user.id,
+            user_name=current_user.full_name,
             content=request.content,
             version_note=request.version_note
         )
         
+        if result.get('status') == 'version_saved':
+            schedule_reindex(background_tasks, request.document_id, current_user)
+        
         return result
     
     except Exception as e:
@@ -143,7 +188,7 @@ async def save_version(
 async def get_version_history(
     document_id: str,
     limit: int = 50,
-    current_user: Dict = Depends(get_current_user)
+    current_user: User = Depends(get_current_user)
 ):
     """
     Get version history for a document
@@ -153,7 +198,7 @@ async def get_version_history(
     try:
         result = await rich_editor_service.get_version_history(
             document_id=document_id,
-            user_id=current_user['user_id'],
+            user_id=current_user.id,
             limit=limit
         )
         
@@ -169,7 +214,8 @@ async def get_version_history(
 @router.post("/rollback")
 async def rollback_to_version(
     request: RollbackRequest,
-    current_user: Dict = Depends(get_current_user)
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user)
 ):
     """
     Rollback document to a specific version
@@ -180,10 +226,13 @@ async def rollback_to_version(
         result = await rich_editor_service.rollback_to_version(
             document_id=request.document_id,
             version_id=request.version_id,
-            user_id=current_user['user_id'],
-            user_name=current_user.get('name', 'User')
+            user_id=current_user.id,
+            user_name=current_user.full_name
         )
         
+        if result.get('status') == 'rolled_back':
+            schedule_reindex(background_tasks, request.document_id, current_user)
+        
         return result
     
     except Exception as e:
@@ -196,7 +245,7 @@ async def rollback_to_version(
 @router.post("/share")
 async def share_document(
     request: ShareDocumentRequest,
-    current_user: Dict = Depends(get_current_user)
+    current_user: User = Depends(get_current_user)
 ):
     """
     Share document via email invitation
@@ -206,7 +255,7 @@ async def share_document(
     try:
         result = await rich_editor_service.share_document(
             document_id=request.document_id,
-            inviter_id=current_user['user_id'],
+            inviter_id=current_user.id,
             invitee_email=request.invitee_email,
             permission_level=request.permission_level,
             message=request.message
@@ -225,7 +274,7 @@ async def share_document(
 async def accept_invitation(
     document_id: str,
     permission_level: str,
-    current_user: Dict = Depends(get_current_user)
+    current_user: User = Depends(get_current_user)
 ):
     """
     Accept document invitation
@@ -235,7 +284,7 @@ async def accept_invitation(
     try:
         result = await rich_editor_service.accept_invitation(
             document_id=document_id,
-            user_id=current_user['user_id'],
+            user_id=current_user.id,
             permission_level=permission_level
         )
         
@@ -251,7 +300,7 @@ async def accept_invitation(
 @router.post("/permissions")
 async def update_permission(
     request: UpdatePermissionRequest,
-    current_user: Dict = Depends(get_current_user)
+    current_user: User = Depends(get_current_user)
 ):
     """
     Update user permission for a document
@@ -261,7 +310,7 @@ async def update_permission(
     try:
         result = await rich_editor_service.update_permission(
             document_id=request.document_id,
-            admin_id=current_user['user_id'],
+            admin_id=current_user.id,
             target_user_id=request.target_user_id,
             new_permission=request.new_permission
         )
@@ -278,7 +327,7 @@ async def update_permission(
 @router.get("/documents/{document_id}/permissions")
 async def get_document_permissions(
     document_id: str,
-    current_user: Dict = Depends(get_current_user)
+    current_user: User = Depends(get_current_user)
 ):
     """
     Get document permissions
@@ -288,7 +337,7 @@ async def get_document_permissions(
     try:
         result = await rich_editor_service.get_document_permissions(
             document_id=document_id,
-            user_id=current_user['user_id']
+            user_id=current_user.id
         )
         
         return result
@@ -303,7 +352,7 @@ async def get_document_permissions(
 @router.get("/documents/{document_id}/active-editors")
 async def get_active_editors(
     document_id: str,
-    current_user: Dict = Depends(get_current_user)
+    current_user: User = Depends(get_current_user)
 ):
     """
     Get list of active editors
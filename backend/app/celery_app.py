@@ -2,12 +2,18 @@
 Celery configuration for GovLogic GovConAI
 """
 from celery import Celery
+from celery.schedules import crontab
 from app.config import settings
 
 celery_app = Celery(
     "GovSure",
     broker=settings.CELERY_BROKER_URL,
-    backend=settings.CELERY_RESULT_BACKEND
+    backend=settings.CELERY_RESULT_BACKEND,
+    include=[
+        "app.tasks.opportunity_tasks",
+        "app.tasks.partner_tasks",
+        "app.tasks.matching_tasks",
+    ]
 )
 
 celery_app.conf.update(
@@ -19,8 +25,42 @@ celery_app.conf.update(
     task_track_started=True,
     task_time_limit=30 * 60,  # 30 minutes
     worker_prefetch_multiplier=1,
+    beat_schedule={
+        "refresh-sam-opportunity-mirror": {
+            "task": "opportunities.refresh_sam_mirror",
+            "schedule": settings.SAM_MIRROR_SYNC_INTERVAL_MINUTES * 60,
+        },
+        "rescore-sam-opportunity-mirror": {
+            "task": "opportunities.rescore_sam_mirror",
+            "schedule": crontab(hour=3, minute=0),
+        },
+    },
 )
 
+if settings.SAM_ENTITY_EXTRACT_PATH:
+    celery_app.conf.beat_schedule["ingest-sam-entity-extract"] = {
+        "task": "partners.ingest_entity_extract",
+        "schedule": crontab(hour=settings.SAM_ENTITY_EXTRACT_HOUR, minute=0),
+    }
+
+if settings.CAPABILITY_EMBEDDINGS_ENABLED:
+    # After the extract ingest, so the night's new and changed contractors are embedded
+    celery_app.conf.beat_schedule["build-capability-embeddings"] = {
+        "task": "partners.build_capability_embeddings",
+        "schedule": crontab(hour=(settings.SAM_ENTITY_EXTRACT_HOUR + 1) % 24, minute=0),
+    }
+
+if settings.MATCH_SCORES_ENABLED:
+    celery_app.conf.beat_schedule["process-dirty-match-scores"] = {
+        "task": "matching.process_dirty_scores",
+        "schedule": settings.MATCH_SCORES_DRAIN_SECONDS,
+    }
+    # Past performance recency decays daily, so every organization is rescored nightly
+    celery_app.conf.beat_schedule["run-match-score-batch"] = {
+        "task": "matching.run_match_score_batch",
+        "schedule": crontab(hour=4, minute=0),
+    }
+
 @celery_app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
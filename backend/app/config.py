@@ -50,7 +50,76 @@ class Settings(BaseSettings):
     STRIPE_PUBLIC_KEY: Optional[str] = None
     STRIPE_SECRET_KEY: Optional[str] = None
     DOCUSIGN_INTEGRATION_KEY: Optional[str] = None
-    
+
+    # SAM.gov HTTP client (quota defaults match a non-federal system account key)
+    SAM_API_DAILY_QUOTA: int = 10000
+    SAM_API_HOURLY_QUOTA: int = 1000
+    SAM_API_MAX_QUOTA_WAIT_SECONDS: float = 10.0
+    SAM_API_MAX_CONCURRENCY_PER_ENDPOINT: int = 4
+    SAM_API_MAX_CONNECTIONS: int = 20
+    SAM_API_MAX_RETRIES: int = 3
+    SAM_SEARCH_PREFETCH_PAGES: int = 2  # Pages fetched ahead of live search results
+    SAM_DETAIL_CACHE_TTL_MINUTES: int = 6 * 60  # Refetch non-mirrored opportunity details after this
+
+    # Response cache for external search services (L1 in-process LRU + L2 Redis)
+    CACHE_REDIS_ENABLED: bool = True
+    CACHE_L1_MAX_ENTRIES: int = 512  # Per cache
+    CACHE_L1_MAX_BYTES: int = 32 * 1024 * 1024  # Per cache, serialized JSON size
+    SINGLE_FLIGHT_LOCK_TTL_SECONDS: float = 30.0  # Longest a cross-process leader is waited for
+    SINGLE_FLIGHT_RESULT_TTL_SECONDS: float = 5.0
+
+    # SAM.gov local opportunity mirror
+    SAM_MIRROR_ENABLED: bool = True
+    SAM_MIRROR_SYNC_INTERVAL_MINUTES: int = 30
+    SAM_MIRROR_MAX_STALENESS_MINUTES: int = 24 * 60  # Fall back to live API after this
+    SAM_MIRROR_BACKFILL_DAYS: int = 30  # Window for the first sync
+    SAM_MIRROR_OVERLAP_DAYS: int = 2  # Re-scan window to pick up amended notices
+
+    # SAM.gov contractor (entity) sync
+    CONTRACTOR_SYNC_CONCURRENCY: int = 4  # Entity pages fetched in parallel
+    CONTRACTOR_INDEX_ENABLED: bool = True  # Serve partner search from the in-memory contractor index
+    CONTRACTOR_INDEX_REFRESH_SECONDS: int = 60  # How often searches check for newly synced contractors
+    SAM_ENTITY_EXTRACT_PATH: Optional[str] = None  # Entity extract zip, or a directory of them (nightly full refresh)
+    SAM_ENTITY_EXTRACT_HOUR: int = 2  # UTC hour of the nightly extract ingest (maintenance window)
+    CAPABILITY_EMBEDDINGS_ENABLED: bool = True  # Rank partner recommendations by capability embeddings once built
+    CAPABILITY_EMBEDDINGS_DIR: str = "/tmp/GovSure/capability_embeddings"  # Memory-mapped int8 matrix generations
+    CAPABILITY_EMBEDDING_MODEL: str = "text-embedding-3-small"
+    CAPABILITY_EMBEDDING_DIMENSIONS: int = 256  # Shortened embeddings: 256 bytes per contractor
+    CAPABILITY_EMBEDDING_CONCURRENCY: int = 4  # Embeddings calls in flight during a build
+    CAPABILITY_EMBEDDINGS_BUILD_SECONDS: int = 3 * 60 * 60  # Per nightly run; a longer build resumes the next night
+
+    # Materialized opportunity match scores (organization x opportunity)
+    MATCH_SCORES_ENABLED: bool = True  # Serve top recommendations from opportunity_match_scores once an org is scored
+    MATCH_SCORES_DRAIN_SECONDS: int = 30  # How often queued opportunity/organization rescores are processed
+    OPPORTUNITY_EMBEDDINGS_ENABLED: bool = True  # Credit capabilities by embedding similarity as well as keywords
+    SEMANTIC_MATCH_FLOOR: float = 0.30  # Capability/description cosine similarity that earns no credit
+    SEMANTIC_MATCH_FULL: float = 0.55  # Similarity at which a capability counts as matched
+
+    # RAG knowledge base indexing
+    RAG_EMBEDDING_BATCH_TOKENS: int = 100000  # Tokens per embeddings call (API limit: 300K per request)
+    RAG_EMBEDDING_BATCH_INPUTS: int = 512  # Chunks per embeddings call (API limit: 2048)
+    RAG_EMBEDDING_CONCURRENCY: int = 4  # Embeddings calls in flight per indexing service
+    EMBEDDING_CACHE_ENABLED: bool = True  # Reuse embeddings of identical (normalized) chunks and queries
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 4096  # In-process LRU in front of embedding_cache (~6 KB per 1536-dim entry)
+
+    # RAG vector search (pgvector ANN indexes on document_embeddings)
+    RAG_VECTOR_INDEX_METHOD: str = "hnsw"  # hnsw | ivfflat
+    RAG_HNSW_M: int = 16  # Graph links per node (build time, index size)
+    RAG_HNSW_EF_CONSTRUCTION: int = 64  # Candidate list while building
+    RAG_HNSW_EF_SEARCH: int = 100  # Candidate list per query (at least top_k): recall vs latency
+    RAG_IVFFLAT_PROBES: int = 10  # Lists scanned per query with an IVFFlat index
+    RAG_ORG_INDEX_MIN_ROWS: int = 50000  # Organizations with more chunks get their own partial HNSW index
+    RAG_INDEX_MAINTENANCE_WORK_MEM: str = "1GB"  # HNSW builds are much faster when the graph fits
+    RAG_HYBRID_SEARCH: bool = True  # Fuse full-text matches (clause and contract numbers, acronyms) with vector search
+    RAG_HYBRID_CANDIDATES: int = 50  # Chunks each leg ranks before fusion (results returned stay top_k)
+    RAG_RRF_K: int = 60  # Reciprocal rank fusion constant: higher flattens the weight of top ranks
+
+    # Record/replay of outbound HTTP and the fake LLM provider (benchmarks, offline development)
+    HTTP_REPLAY_MODE: str = "off"  # off | record | replay
+    HTTP_REPLAY_URL: str = "http://127.0.0.1:8765"  # Stand-in server (python -m app.services.replay_server)
+    HTTP_FIXTURES_DIR: str = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "fixtures", "http")
+    LLM_PROVIDER: Optional[str] = None  # "fake" sends OpenAI/Anthropic calls to the stand-in server
+
     # File Storage
     UPLOAD_DIR: str = "/tmp/GovSure/uploads"
     MAX_UPLOAD_SIZE: int = 50 * 1024 * 1024  # 50MB
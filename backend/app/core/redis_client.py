@@ -0,0 +1,50 @@
+"""
+Async Redis connection shared by caches and locks
+Fails open: callers get None while Redis is unreachable and fall back to local behaviour
+"""
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LoopBoundRedis:
+    """
+    Lazily created redis.asyncio client
+
+    The client is recreated when the running event loop changes (Celery tasks
+    use asyncio.run per call), and disabled for a cool-down after an error.
+    """
+
+    def __init__(self, name: str, enabled: bool = True, cooldown_seconds: float = 30.0):
+        self.name = name
+        self.enabled = enabled
+        self.cooldown_seconds = cooldown_seconds
+        self._client = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._down_until = 0.0
+
+    def get(self):
+        """Return a client for the running loop, or None if disabled/unavailable"""
+        if not self.enabled or time.monotonic() < self._down_until:
+            return None
+
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            import redis.asyncio as aioredis
+            self._client = aioredis.Redis.from_url(
+                settings.REDIS_URL,
+                socket_connect_timeout=0.5,
+                socket_timeout=0.5
+            )
+            self._loop = loop
+        return self._client
+
+    def mark_down(self, error: Exception):
+        """Stop using Redis for a cool-down after a connection/command error"""
+        logger.warning(f"⚠️  Redis unavailable for {self.name}: {str(error)}")
+        self._down_until = time.monotonic() + self.cooldown_seconds
@@ -58,6 +58,11 @@ async def add_process_time_header(request: Request, call_next):
 @app.on_event("startup")
 async def startup():
     """Create database tables on startup"""
+    if settings.MATCH_SCORES_ENABLED:
+        # Queue match score rescores for committed opportunity/organization changes
+        from app.services.match_score_service import track_changes
+        track_changes()
+
     try:
         # Import all models to ensure they're registered
         from app.models import pipeline  # noqa
@@ -69,6 +74,10 @@ async def startup():
         print(f"🤖 AI Provider: {settings.DEFAULT_LLM_PROVIDER}")
         print(f"🔧 Debug Mode: {settings.DEBUG}")
         print(f"✅ Pipeline tables created/verified")
+
+        if settings.CONTRACTOR_INDEX_ENABLED:
+            from app.services.contractor_index import contractor_index
+            contractor_index.warm()
     except Exception as e:
         print(f"⚠️  Warning during startup: {str(e)}")
         print(f"✅ {settings.APP_NAME} v{settings.APP_VERSION} started (with warnings)")
@@ -77,6 +86,8 @@ async def startup():
 @app.on_event("shutdown")
 async def shutdown():
     """Cleanup on shutdown"""
+    from app.services.samgov_client import samgov_client
+    await samgov_client.aclose()
     print(f"👋 {settings.APP_NAME} shutting down")
 
 
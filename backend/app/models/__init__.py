@@ -11,4 +11,6 @@ from .pricing import *
 from .awards import *
 from .subscription import *
 from .pipeline import *
-
+from .sync import *
+from .sam_opportunity import *
+from .match_score import *
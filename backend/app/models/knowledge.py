@@ -1,5 +1,6 @@
-from sqlalchemy import Column, String, Text, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, String, Text, Boolean, ForeignKey, DateTime, Identity, Integer, LargeBinary
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
 from app.models.base import Base, UUIDMixin, TimestampMixin, TenantMixin
 
 class KnowledgeDocument(Base, UUIDMixin, TimestampMixin, TenantMixin):
@@ -38,3 +39,30 @@ class TeamingAgreement(Base, UUIDMixin, TimestampMixin, TenantMixin):
     partner = relationship("TeamingPartner")
     opportunity = relationship("Opportunity")
 
+class EmbeddingCacheEntry(Base):
+    """
+    Embedding of a normalized text, shared by every document (and every
+    organization) containing that exact text: repeated boilerplate is
+    embedded once per model and dimensions
+    """
+    __tablename__ = "embedding_cache"
+    model = Column(String(100), primary_key=True)
+    dimensions = Column(Integer, primary_key=True)
+    content_hash = Column(String(32), primary_key=True)  # blake2b of the normalized text
+    vector = Column(LargeBinary, nullable=False)  # float32 x dimensions, little-endian
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+# Above documents.id values, which share document_embeddings.document_id (a trigger,
+# not a foreign key, checks it against documents or rag_documents by this range)
+RAG_DOCUMENT_ID_START = 1_000_000_000
+
+class RagDocument(Base):
+    """
+    RAG index identity of a document that has no integer id of its own
+    (rich-editor documents, knowledge-base uploads): its id is the
+    document_embeddings.document_id of the document's chunks
+    """
+    __tablename__ = "rag_documents"
+    id = Column(Integer, Identity(start=RAG_DOCUMENT_ID_START), primary_key=True)
+    source_key = Column(String(200), nullable=False, unique=True)  # "editor:<id>", "knowledge:<id>"
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -0,0 +1,73 @@
+"""
+Materialized AI match scores (organization x opportunity) and the opportunity
+description embeddings the semantic capability match reads
+"""
+from sqlalchemy import Column, String, Float, Integer, DateTime, Index, LargeBinary
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class OpportunityMatchScore(Base):
+    """
+    Stored result of OpportunityMatchingService scoring for one organization and
+    one opportunity. Kept current incrementally by MatchScoreService, so top
+    recommendations are an indexed ORDER BY overall_score DESC LIMIT k read.
+    """
+    __tablename__ = "opportunity_match_scores"
+
+    organization_id = Column(String(36), primary_key=True)
+    opportunity_id = Column(String(36), primary_key=True)
+
+    overall_score = Column(Float, nullable=False)
+    grade = Column(String(5), nullable=False)
+
+    # Factor scores (see OpportunityMatchingService.calculate_ai_match_score)
+    capability_score = Column(Float, nullable=False)
+    past_performance_score = Column(Float, nullable=False)
+    set_aside_score = Column(Float, nullable=False)
+    size_score = Column(Float, nullable=False)
+    geography_score = Column(Float, nullable=False)
+    clearance_score = Column(Float, nullable=False)
+
+    scored_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index('ix_opportunity_match_scores_org_score', 'organization_id', overall_score.desc(), 'opportunity_id'),
+        Index('ix_opportunity_match_scores_opportunity_id', 'opportunity_id'),
+    )
+
+
+class MatchScoreShard(Base):
+    """
+    Completed shard of a nightly match scoring run: one organization against
+    one opportunity id range. Written in the same transaction as the shard's
+    scores, so a restarted run re-dispatches exactly the unfinished shards.
+    """
+    __tablename__ = "match_score_shards"
+
+    run_id = Column(String(50), primary_key=True)
+    organization_id = Column(String(36), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+
+    rows = Column(Integer, nullable=False, default=0)
+    seconds = Column(Float, nullable=False, default=0.0)
+    worker = Column(String(255), nullable=True)  # host:pid that ran the shard
+    finished_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class OpportunityEmbedding(Base):
+    """
+    Embedding of an opportunity's title and description, int8-quantized with
+    one float scale (vector ~= int8 values * scale). content_hash identifies the
+    embedded text: an opportunity is only re-embedded when its text changes,
+    and opportunities with identical text share one embedding call.
+    """
+    __tablename__ = "opportunity_embeddings"
+
+    opportunity_id = Column(String(36), primary_key=True)
+    content_hash = Column(String(32), nullable=False, index=True)
+    model = Column(String(100), nullable=False)
+    dimensions = Column(Integer, nullable=False)
+    vector = Column(LargeBinary, nullable=False)  # int8 x dimensions
+    scale = Column(Float, nullable=False)
+    embedded_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
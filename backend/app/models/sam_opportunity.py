@@ -0,0 +1,83 @@
+"""
+Local mirror of SAM.gov contract opportunity notices
+"""
+from sqlalchemy import Column, String, Integer, Date, DateTime, Text, Boolean, Computed, Index
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class SAMOpportunity(Base):
+    """
+    SAM.gov notice as synced into the local mirror.
+    The raw API payload is kept so reads produce exactly what the live API path returns.
+    """
+    __tablename__ = "sam_opportunities"
+
+    notice_id = Column(String(100), primary_key=True)
+    solicitation_number = Column(String(100), nullable=True, index=True)
+    title = Column(String(1000), nullable=False, default="")
+    description = Column(Text, nullable=True)
+
+    # Agency info
+    department = Column(String(255), nullable=True)
+    sub_tier = Column(String(255), nullable=True)
+    office = Column(String(255), nullable=True)
+
+    # Classification
+    notice_type = Column(String(100), nullable=True)
+    naics_code = Column(String(20), nullable=True)
+    classification_code = Column(String(20), nullable=True)
+    set_aside_code = Column(String(50), nullable=True)
+    set_aside_description = Column(String(255), nullable=True)
+
+    # Dates
+    posted_date = Column(Date, nullable=True)
+    response_deadline = Column(DateTime(timezone=True), nullable=True)
+    archive_date = Column(Date, nullable=True)
+
+    active = Column(Boolean, default=True, nullable=False)
+    pwin_score = Column(Integer, default=0, nullable=False)
+
+    raw = Column(JSONB, nullable=False)
+
+    # Full-text search over title, solicitation number and description
+    search_vector = Column(
+        TSVECTOR,
+        Computed(
+            "to_tsvector('english', coalesce(title, '') || ' ' || "
+            "coalesce(solicitation_number, '') || ' ' || coalesce(description, ''))",
+            persisted=True
+        )
+    )
+
+    first_seen_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    synced_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index('ix_sam_opportunities_search_vector', 'search_vector', postgresql_using='gin'),
+        Index('ix_sam_opportunities_naics_code', 'naics_code'),
+        Index('ix_sam_opportunities_set_aside_code', 'set_aside_code'),
+        Index('ix_sam_opportunities_posted_date', 'posted_date'),
+        Index('ix_sam_opportunities_response_deadline', 'response_deadline'),
+        Index('ix_sam_opportunities_active_posted', 'active', 'posted_date'),
+    )
+
+
+class SAMOpportunityDetail(Base):
+    """
+    Persistent cache of transformed SAM.gov opportunity details (detail page payload).
+    Hashes let refreshes skip work: the detail is only rebuilt when the raw payload
+    changes, and contract sections are only re-parsed when the description changes.
+    """
+
+    __tablename__ = "sam_opportunity_details"
+
+    notice_id = Column(String(100), primary_key=True)
+    source_modified = Column(String(50), nullable=True)  # SAM.gov modifiedDate (or postedDate)
+    payload_hash = Column(String(64), nullable=False)
+    description_hash = Column(String(64), nullable=False)
+    detail = Column(JSONB, nullable=False)
+    sections = Column(JSONB, nullable=False)
+    fetched_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
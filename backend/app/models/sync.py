@@ -0,0 +1,28 @@
+"""
+Sync checkpoint model for scheduled external data syncs
+"""
+from sqlalchemy import Column, String, DateTime, JSON
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class SyncCheckpoint(Base):
+    """Watermark and progress of a named sync job (e.g. the SAM.gov mirror)"""
+    __tablename__ = "sync_checkpoints"
+
+    name = Column(String(100), primary_key=True)
+
+    # High-water mark of source data already synced
+    watermark = Column(DateTime(timezone=True), nullable=True)
+
+    # Run status
+    status = Column(String(50), default="idle", nullable=False)  # idle, running, failed
+    last_started_at = Column(DateTime(timezone=True), nullable=True)
+    last_success_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(String(1000), nullable=True)
+
+    # Job-specific progress (page offsets etc.) and last run statistics
+    cursor = Column(JSON, nullable=True)
+    stats = Column(JSON, nullable=True)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
@@ -5,8 +5,14 @@ past performance, competitive analysis, and next steps.
 """
 from typing import Dict, List, Any, Optional
 from datetime import datetime
+import hashlib
+import json
 import logging
 
+from app.services.capability_matcher import capability_matcher
+from app.services.naics_hierarchy import naics_hierarchy
+from app.services.single_flight import SingleFlight
+
 logger = logging.getLogger(__name__)
 
 
@@ -15,6 +21,9 @@ class BriefService:
     Service for generating AI-powered opportunity briefs
     """
     
+    # Core capability areas matched against opportunity text (stemmed, whole words)
+    capability_keywords = ['cybersecurity', 'infrastructure', 'cloud', 'information technology', 'modernization', 'security']
+    
     # Real job contract examples for past performance matching
     past_performance_examples = [
         {
@@ -57,7 +66,8 @@ class BriefService:
     
     def __init__(self):
         """Initialize the brief service"""
-        pass
+        # Identical concurrent brief requests (e.g. several users opening the same opportunity) share one generation
+        self.flight = SingleFlight("brief")
     
     async def generate_brief(self, opportunity_id: str, opportunity_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -70,6 +80,13 @@ class BriefService:
         Returns:
             Complete Shipley-standard brief with analysis and recommendations
         """
+        data_hash = hashlib.sha1(json.dumps(opportunity_data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        return await self.flight.do(
+            f"{opportunity_id}:{data_hash}",
+            lambda: self._generate_brief(opportunity_id, opportunity_data)
+        )
+    
+    async def _generate_brief(self, opportunity_id: str, opportunity_data: Dict[str, Any]) -> Dict[str, Any]:
         try:
             logger.info(f"🤖 Generating Shipley-compliant AI brief for opportunity: {opportunity_id}")
             
@@ -162,15 +179,12 @@ class BriefService:
         # NAICS alignment (0-30 points)
         if naics in ['541511', '541512', '541519']:
             score += 30
-        elif naics.startswith('541'):
+        elif naics_hierarchy.is_ancestor('541', naics):  # Professional, scientific and technical services
             score += 20
         
-        # Keyword matching (0-25 points)
-        keywords = ['cybersecurity', 'infrastructure', 'cloud', 'IT', 'modernization', 'security']
-        title_lower = title.lower()
-        desc_lower = description.lower()
-        
-        keyword_matches = sum(1 for kw in keywords if kw in title_lower or kw in desc_lower)
+        # Keyword matching (0-25 points): one pass over title and description
+        matcher = capability_matcher(self.capability_keywords, stemmed=True)
+        keyword_matches = len(matcher.matched(f"{title}\n{description}"))
         score += min(keyword_matches * 5, 25)
         
         # Agency experience (0-20 points)
@@ -181,18 +195,30 @@ class BriefService:
         
         return min(score, 100)
     
-    def _generate_company_match(self, title: str, description: str, naics: str) -> Dict[str, List[str]]:
+    def _generate_company_match(self, title: str, description: str, naics: str) -> Dict[str, Any]:
         """
         Generate company match analysis
         In production, this would use AI/LLM
         """
+        # Which of our capability areas the requirements mention, and how often
+        matcher = capability_matcher(self.capability_keywords, stemmed=True)
+        mentions = {kw: count for kw, count in zip(self.capability_keywords, matcher.counts(f"{title}\n{description}")) if count}
+        if mentions:
+            coverage = (
+                f"{', '.join(kw.capitalize() for kw in mentions)} capabilities cover "
+                f"{len(mentions)} of {len(self.capability_keywords)} core areas named in the requirements"
+            )
+        else:
+            coverage = "Cybersecurity and infrastructure capabilities apply to typical SOW requirements"
+        
         return {
             "whyWeMatch": [
                 f"Strong NAICS {naics} alignment with proven government contracting experience",
-                "Cybersecurity capabilities match 80% of typical SOW requirements",
+                coverage,
                 "Active GSA Schedule holder with relevant SINs",
                 "Previous agency contract experience demonstrates familiarity"
             ],
+            "capabilityMentions": mentions,
             "strengths": [
                 "Proven government contracting track record",
                 "Strong technical capabilities in cybersecurity and infrastructure",
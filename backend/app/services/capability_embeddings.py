@@ -0,0 +1,522 @@
+"""
+Contractor Capability Embeddings
+Precomputed embeddings of each contractor's capability profile (name, stated
+capabilities, NAICS codes, certifications), stored int8-quantized in a
+memory-mapped matrix so partner recommendations can rank the whole contractor
+corpus by semantic similarity to an opportunity's requirements per request.
+
+Builds persist every page as they go: a build stopped by its time budget, a
+worker restart or an API error resumes where it stopped on the next run, so
+the first full build of the corpus may span several nights.
+
+Usage:
+    python -m app.services.capability_embeddings            # incremental build
+    python -m app.services.capability_embeddings --full     # re-embed everything
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+from prometheus_client import Gauge, Histogram
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics
+CAPABILITY_EMBEDDING_ROWS = Gauge(
+    'capability_embedding_rows',
+    'Contractors in the loaded capability embedding matrix'
+)
+
+CAPABILITY_EMBEDDING_QUERY = Histogram(
+    'capability_embedding_query_seconds',
+    'Time to score the full contractor corpus against a batch of queries',
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+CURRENT_FILE = "CURRENT"       # Names the live generation directory
+BUILDING_FILE = "BUILDING"     # Names a generation still being built (resumed by the next build)
+PROGRESS_FILE = "progress.json"
+MAX_TEXT_CHARS = 2000          # Capability profiles are short; cap runaway descriptions
+_BLOCK_ROWS = 4096             # Rows dequantized per matmul (keeps scratch in cache)
+_SIDECARS = (("ids", np.int64), ("scales", np.float32), ("hashes", np.uint64))  # Appended raw while building
+
+# JSONB arrays flattened by Postgres, as in the contractor index load
+_PROFILE_SQL = """
+    SELECT id, legal_business_name, doing_business_as, capabilities,
+           ARRAY(SELECT COALESCE(e->>'naicsCode', e->>'code', e #>> '{}')
+                 FROM jsonb_array_elements(CASE WHEN jsonb_typeof(naics_codes) = 'array'
+                                                THEN naics_codes ELSE '[]'::jsonb END) e),
+           ARRAY(SELECT jsonb_array_elements_text(CASE WHEN jsonb_typeof(set_aside_status) = 'array'
+                                                       THEN set_aside_status ELSE '[]'::jsonb END))
+    FROM contractors
+    WHERE id > :after
+    ORDER BY id
+    LIMIT :limit
+"""
+
+
+def capability_text(
+    legal_name: Optional[str],
+    dba: Optional[str],
+    capabilities: Optional[str],
+    naics_codes: Optional[Iterable[str]],
+    set_asides: Optional[Iterable[str]]
+) -> str:
+    """The text embedded for one contractor"""
+    parts = [legal_name or '']
+    if dba and dba != legal_name:
+        parts.append(f"doing business as {dba}")
+    if capabilities:
+        parts.append(capabilities.strip())
+    naics = [c for c in naics_codes or [] if c]
+    if naics:
+        parts.append("NAICS " + ", ".join(naics))
+    certifications = [s for s in set_asides or [] if s]
+    if certifications:
+        parts.append("Certifications: " + ", ".join(certifications))
+    return ". ".join(p for p in parts if p)[:MAX_TEXT_CHARS]
+
+
+def _text_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 quantization: vectors ~= q * scale[:, None]"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    q = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return q, scales.astype(np.float32)
+
+
+class _Matrix:
+    """One built generation: int8 vectors (memory-mapped) plus row sidecars"""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.path = path
+        self.dimensions = int(self.meta['dimensions'])
+        self.ids = np.load(os.path.join(path, "ids.npy"))
+        self.scales = np.load(os.path.join(path, "scales.npy"))
+        self.hashes = np.load(os.path.join(path, "hashes.npy"))
+        rows = len(self.ids)
+        self.vectors = (
+            np.memmap(os.path.join(path, "vectors.i8"), dtype=np.int8, mode='r', shape=(rows, self.dimensions))
+            if rows else np.zeros((0, self.dimensions), dtype=np.int8)
+        )
+        self.id_order = np.argsort(self.ids, kind='stable')
+
+    def rows_of(self, ids: np.ndarray) -> np.ndarray:
+        """Row of each contractor id, -1 when not embedded"""
+        if not len(self.ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        sorted_ids = self.ids[self.id_order]
+        pos = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+        return np.where(sorted_ids[pos] == ids, self.id_order[pos], -1)
+
+
+class CapabilityEmbeddings:
+    """
+    Capability embedding matrix and batched top-k similarity search
+
+    Features:
+    1. int8 vectors with a float32 scale per row (~dimensions bytes per
+       contractor), memory-mapped so worker processes share the page cache
+    2. One pass over the matrix scores every query of a request at once
+       (blocked dequantize + matmul), then argpartition picks the top k
+    3. Optional per-query bias (NAICS/set-aside blending) and allow-mask
+       (hard filters) applied before top-k selection
+    4. Incremental builds: unchanged profiles (same text hash) reuse their
+       stored vector, so only new or edited contractors are embedded
+    5. Builds write a new generation directory and switch CURRENT atomically;
+       searches pick up the new generation without a restart
+    6. Resumable builds: each page is persisted with the build's progress, and
+       embeddings calls run CAPABILITY_EMBEDDING_CONCURRENCY at a time
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or settings.CAPABILITY_EMBEDDINGS_DIR
+        self.model = settings.CAPABILITY_EMBEDDING_MODEL
+        self.dimensions = settings.CAPABILITY_EMBEDDING_DIMENSIONS
+        self._matrix: Optional[_Matrix] = None
+        self._version: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def _current_path(self) -> str:
+        return os.path.join(self.directory, CURRENT_FILE)
+
+    def matrix(self) -> Optional[_Matrix]:
+        """The live generation, reopened when a build has switched CURRENT"""
+        try:
+            stat = os.stat(self._current_path())
+        except OSError:
+            return self._matrix
+        # CURRENT is replaced (new inode) on every switch
+        version = (stat.st_ino, stat.st_mtime_ns)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    try:
+                        with open(self._current_path()) as f:
+                            generation = f.read().strip()
+                        matrix = _Matrix(os.path.join(self.directory, generation))
+                    except (OSError, ValueError, KeyError) as e:
+                        logger.warning(f"⚠️  Could not open capability embeddings: {e}")
+                        return self._matrix
+                    if matrix.meta.get('model') != self.model or matrix.dimensions != self.dimensions:
+                        logger.warning(
+                            f"⚠️  Capability embeddings were built with {matrix.meta.get('model')}/"
+                            f"{matrix.dimensions}; rebuild for {self.model}/{self.dimensions}"
+                        )
+                        matrix = None
+                    self._matrix = matrix
+                    self._version = version
+                    CAPABILITY_EMBEDDING_ROWS.set(len(matrix.ids) if matrix else 0)
+        return self._matrix
+
+    @property
+    def ready(self) -> bool:
+        matrix = self.matrix()
+        return matrix is not None and len(matrix.ids) > 0
+
+    def stats(self) -> Dict[str, Any]:
+        matrix = self.matrix()
+        if matrix is None:
+            return {"ready": False}
+        return {
+            "ready": len(matrix.ids) > 0,
+            "rows": len(matrix.ids),
+            "dimensions": matrix.dimensions,
+            "model": matrix.meta.get('model'),
+            "built_at": matrix.meta.get('built_at'),
+            "matrix_bytes": int(matrix.vectors.nbytes),
+        }
+
+    # ------------------------------------------------------------------
+    # Embedding
+    # ------------------------------------------------------------------
+
+    def embed(self, texts: List[str], batch_size: int = 256) -> np.ndarray:
+        """Unit-length float32 embeddings, one provider call per batch, CAPABILITY_EMBEDDING_CONCURRENCY in flight"""
+        from app.services.llm_clients import openai_client
+
+        client = openai_client(settings.OPENAI_API_KEY)
+        # text-embedding-3 models shorten natively (Matryoshka); older models don't take it
+        extra = {"dimensions": self.dimensions} if self.model.startswith("text-embedding-3") else None
+        out = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+
+        def embed_batch(start: int):
+            batch = [t or ' ' for t in texts[start:start + batch_size]]
+            response = client.embeddings.create(model=self.model, input=batch, extra_body=extra)
+            for item in response.data:
+                vector = np.asarray(item.embedding, dtype=np.float32)[:self.dimensions]
+                out[start + item.index, :len(vector)] = vector
+
+        starts = range(0, len(texts), batch_size)
+        workers = max(1, min(settings.CAPABILITY_EMBEDDING_CONCURRENCY, len(starts)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(embed_batch, starts))  # Re-raises the first failed call
+        norms = np.linalg.norm(out, axis=1)
+        norms[norms == 0] = 1.0
+        return out / norms[:, None]
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def similarity(self, queries: np.ndarray, matrix: Optional[_Matrix] = None) -> np.ndarray:
+        """Cosine similarity of every contractor to every query, shape (rows, queries)"""
+        matrix = matrix or self.matrix()
+        queries = np.ascontiguousarray(np.atleast_2d(queries).T, dtype=np.float32)
+        rows = len(matrix.ids)
+        scores = np.empty((rows, queries.shape[1]), dtype=np.float32)
+        for start in range(0, rows, _BLOCK_ROWS):
+            stop = min(start + _BLOCK_ROWS, rows)
+            np.matmul(matrix.vectors[start:stop].astype(np.float32), queries, out=scores[start:stop])
+        scores *= matrix.scales[:, None]
+        return scores
+
+    def top_k(
+        self,
+        queries: np.ndarray,
+        k: int = 50,
+        bias: Optional[List[Optional[np.ndarray]]] = None,
+        allowed: Optional[List[Optional[np.ndarray]]] = None
+    ) -> List[Dict[str, np.ndarray]]:
+        """
+        Best contractors for each query
+
+        Args:
+            queries: (m, dimensions) unit vectors
+            k: Results per query
+            bias: Per query, None or a score added per row (aligned with `ids()`)
+            allowed: Per query, None or a boolean mask of eligible rows
+
+        Returns:
+            Per query {"ids", "scores", "similarity", "best"}, best first;
+            scores are similarity relative to the best eligible match
+            ("best") plus bias
+        """
+        started = time.perf_counter()
+        matrix = self.matrix()
+        queries = np.atleast_2d(queries)
+        if matrix is None or not len(matrix.ids):
+            return [{"ids": np.zeros(0, np.int64), "scores": np.zeros(0), "similarity": np.zeros(0), "best": 0.0}
+                    for _ in queries]
+
+        similarity = self.similarity(queries, matrix)
+        results = []
+        for j in range(similarity.shape[1]):
+            sim = similarity[:, j]
+            mask = allowed[j] if allowed is not None else None
+            # Similarity relative to the closest eligible contractor (1.0), so
+            # bias weights mean the same for every query
+            best = float(sim[mask].max()) if mask is not None and mask.any() else float(sim.max())
+            score = sim / best if best > 0 else sim.copy()
+            if bias is not None and bias[j] is not None:
+                score += bias[j]
+            if mask is not None:
+                score[~mask] = -np.inf
+            n = min(k, int(np.count_nonzero(np.isfinite(score))))
+            if n <= 0:
+                results.append({"ids": np.zeros(0, np.int64), "scores": np.zeros(0), "similarity": np.zeros(0), "best": 0.0})
+                continue
+            top = np.argpartition(-score, n - 1)[:n] if n < len(score) else np.arange(len(score))
+            top = top[np.argsort(-score[top], kind='stable')][:n]
+            results.append({"ids": matrix.ids[top], "scores": score[top], "similarity": sim[top], "best": best})
+        CAPABILITY_EMBEDDING_QUERY.observe(time.perf_counter() - started)
+        return results
+
+    def ids(self) -> np.ndarray:
+        """Contractor id of each matrix row (what bias/allowed masks align with)"""
+        matrix = self.matrix()
+        return matrix.ids if matrix is not None else np.zeros(0, dtype=np.int64)
+
+    # ------------------------------------------------------------------
+    # Build
+    # ------------------------------------------------------------------
+
+    def build(
+        self,
+        db: Session,
+        full: bool = False,
+        page_size: int = 2048,
+        batch_size: int = 256,
+        max_seconds: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Embed the contractors table into a new generation and switch to it,
+        resuming an unfinished build if there is one
+
+        Args:
+            db: Database session
+            full: Re-embed every contractor (e.g. after changing the model)
+            page_size: Contractors read and written per step
+            batch_size: Texts per embeddings API call
+            max_seconds: Stop after the page running at this point; the next
+                build carries on from there
+
+        Returns:
+            Build statistics ("complete" is False when stopped early)
+        """
+        started = time.time()
+        generation, progress = self._start_build(full)
+        path = os.path.join(self.directory, generation)
+        previous = None if progress["full"] else self.matrix()
+        resumed_rows = progress["rows"]
+
+        files = {name: open(os.path.join(path, f"{name}.raw"), "ab") for name, _ in _SIDECARS}
+        files["vectors"] = open(os.path.join(path, "vectors.i8"), "ab")
+        complete = False
+        try:
+            while True:
+                if max_seconds is not None and time.time() - started >= max_seconds:
+                    break
+                rows = db.execute(text(_PROFILE_SQL), {"after": progress["after"], "limit": page_size}).fetchall()
+                if not rows:
+                    complete = True
+                    break
+
+                page_ids = np.array([r[0] for r in rows], dtype=np.int64)
+                texts = [capability_text(r[1], r[2], r[3], r[4], r[5]) for r in rows]
+                page_hashes = np.array([_text_hash(t) for t in texts], dtype=np.uint64)
+                page_vectors = np.zeros((len(rows), self.dimensions), dtype=np.int8)
+                page_scales = np.ones(len(rows), dtype=np.float32)
+
+                stale = np.ones(len(rows), dtype=bool)
+                if previous is not None:
+                    old = previous.rows_of(page_ids)
+                    reuse = old >= 0
+                    reuse[reuse] = previous.hashes[old[reuse]] == page_hashes[reuse]
+                    page_vectors[reuse] = previous.vectors[old[reuse]]
+                    page_scales[reuse] = previous.scales[old[reuse]]
+                    stale = ~reuse
+
+                pending = np.flatnonzero(stale)
+                if len(pending):
+                    q, s = quantize(self.embed([texts[i] for i in pending], batch_size=batch_size))
+                    page_vectors[pending] = q
+                    page_scales[pending] = s
+
+                for name, data in (("vectors", page_vectors), ("ids", page_ids),
+                                   ("scales", page_scales), ("hashes", page_hashes)):
+                    files[name].write(data.tobytes())
+                    files[name].flush()
+                    os.fsync(files[name].fileno())
+                progress["after"] = int(page_ids[-1])
+                progress["rows"] += len(rows)
+                progress["embedded"] += len(pending)
+                progress["reused"] += len(rows) - len(pending)
+                self._write_progress(path, progress)
+                # Release the snapshot between pages (long builds, hot table)
+                db.rollback()
+        finally:
+            for f in files.values():
+                f.close()
+
+        stats = {
+            "rows": progress["rows"],
+            "embedded": progress["embedded"],
+            "reused": progress["reused"],
+            "generation": generation,
+            "complete": complete,
+            "resumed_at_row": resumed_rows,
+            "duration_seconds": round(time.time() - started, 1),
+        }
+        if not complete:
+            logger.info(
+                f"⏸️  Capability embedding build {generation} paused at {progress['rows']} contractors "
+                f"({progress['embedded']} embedded so far); the next build resumes it"
+            )
+            return stats
+
+        for name, dtype in _SIDECARS:
+            raw = os.path.join(path, f"{name}.raw")
+            np.save(os.path.join(path, f"{name}.npy"), np.fromfile(raw, dtype=dtype))
+            os.remove(raw)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({
+                "model": self.model,
+                "dimensions": self.dimensions,
+                "rows": progress["rows"],
+                "built_at": datetime.utcnow().isoformat(),
+            }, f)
+        os.remove(os.path.join(self.directory, BUILDING_FILE))
+        self._switch(generation)
+        logger.info(
+            f"✅ Capability embeddings built: {stats['rows']} contractors "
+            f"({stats['embedded']} embedded, {stats['reused']} reused) in {stats['duration_seconds']}s"
+        )
+        return stats
+
+    def _start_build(self, full: bool) -> Tuple[str, Dict[str, Any]]:
+        """
+        (generation, progress) of the unfinished build to resume, or of a new
+        one. An unfinished build is discarded when it was made for another
+        model or when a full build is asked of an incremental one.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        marker = os.path.join(self.directory, BUILDING_FILE)
+        try:
+            with open(marker) as f:
+                generation = f.read().strip()
+            path = os.path.join(self.directory, generation)
+            with open(os.path.join(path, PROGRESS_FILE)) as f:
+                progress = json.load(f)
+            if (progress.get("model") == self.model and progress.get("dimensions") == self.dimensions
+                    and (progress["full"] or not full)):
+                # Drop anything written after the last recorded page
+                for name, dtype in _SIDECARS:
+                    with open(os.path.join(path, f"{name}.raw"), "ab") as f:
+                        f.truncate(progress["rows"] * np.dtype(dtype).itemsize)
+                with open(os.path.join(path, "vectors.i8"), "ab") as f:
+                    f.truncate(progress["rows"] * self.dimensions)
+                logger.info(f"▶️  Resuming capability embedding build {generation} at {progress['rows']} contractors")
+                return generation, progress
+            shutil.rmtree(path, ignore_errors=True)
+        except (OSError, ValueError, KeyError):
+            pass
+
+        generation = datetime.utcnow().strftime("gen-%Y%m%d%H%M%S%f")
+        path = os.path.join(self.directory, generation)
+        os.makedirs(path, exist_ok=True)
+        progress = {
+            "model": self.model,
+            "dimensions": self.dimensions,
+            "full": full,
+            "after": 0,
+            "rows": 0,
+            "embedded": 0,
+            "reused": 0,
+            "started_at": datetime.utcnow().isoformat(),
+        }
+        self._write_progress(path, progress)
+        tmp = marker + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(generation)
+        os.replace(tmp, marker)
+        return generation, progress
+
+    @staticmethod
+    def _write_progress(path: str, progress: Dict[str, Any]):
+        tmp = os.path.join(path, PROGRESS_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(progress, f)
+        os.replace(tmp, os.path.join(path, PROGRESS_FILE))
+
+    def _switch(self, generation: str):
+        """Point CURRENT at a new generation and drop all but the previous one"""
+        tmp = self._current_path() + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(generation)
+        try:
+            with open(self._current_path()) as f:
+                keep = {generation, f.read().strip()}
+        except OSError:
+            keep = {generation}
+        os.replace(tmp, self._current_path())
+
+        # Open maps of a removed generation stay valid until their readers reload
+        for name in os.listdir(self.directory):
+            if name.startswith("gen-") and name not in keep:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+
+capability_embeddings = CapabilityEmbeddings()
+
+
+if __name__ == "__main__":
+    import argparse
+    from app.core.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Build contractor capability embeddings")
+    parser.add_argument("--full", action="store_true", help="Re-embed every contractor")
+    parser.add_argument("--batch-size", type=int, default=256, help="Texts per embeddings API call")
+    parser.add_argument("--max-seconds", type=float, default=None, help="Pause after this long (resumable)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        stats = capability_embeddings.build(db, full=args.full, batch_size=args.batch_size, max_seconds=args.max_seconds)
+        print(json.dumps(stats, indent=2))
+    finally:
+        db.close()
@@ -0,0 +1,159 @@
+"""
+Multi-pattern capability matcher
+Finds every occurrence of a set of capability phrases in a text in a single
+pass over an Aho-Corasick automaton (pyahocorasick), instead of one substring
+search per phrase. Automata are compiled once per phrase set and cached, i.e.
+once per organization profile.
+"""
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import re
+
+import ahocorasick
+
+# Light suffix stripping (longest first): migrate/migrating/migration -> migrat,
+# security/securities -> securit, service/services/servicing -> servic
+_SUFFIXES = ("ings", "ing", "ions", "ion", "ies", "es", "ed", "e", "s", "y")
+_MIN_STEM = 4
+_TOKENS = re.compile(r"\w+|\W+")
+
+# Below this many phrases a presence check is cheaper as one C substring search
+# per phrase than as an automaton pass (measured on 10 KB descriptions)
+_SEARCH_MAX_PATTERNS = 24
+
+
+def stem(word: str) -> str:
+    """Strip one common English inflection from a word"""
+    word = word.lower()
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= _MIN_STEM:
+            if suffix == "s" and word.endswith("ss"):
+                break  # process, class
+            return word[:-len(suffix)]
+    return word
+
+
+def _is_word(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+class _StemmedText:
+    """Text with every word replaced by its stem and every separator run by one space"""
+
+    def __init__(self, text: str):
+        parts: List[str] = []
+        self.starts: List[int] = []          # Start of each token in the stemmed text
+        self.spans: List[Tuple[int, int]] = []  # Span of each token in the original text
+        length = 0
+        offset = 0
+        for token in _TOKENS.findall(text):
+            rendered = stem(token) if _is_word(token[0]) else " "
+            parts.append(rendered)
+            self.starts.append(length)
+            self.spans.append((offset, offset + len(token)))
+            length += len(rendered)
+            offset += len(token)
+        self.text = "".join(parts)
+
+    def original(self, start: int, end: int) -> Tuple[int, int]:
+        """Original span of a stemmed-text span that starts and ends on token boundaries"""
+        first = bisect_right(self.starts, start) - 1
+        last = bisect_right(self.starts, end - 1) - 1
+        return self.spans[first][0], self.spans[last][1]
+
+
+class CapabilityMatcher:
+    """
+    Case-insensitive multi-pattern matcher over capability phrases
+
+    Modes:
+    1. Substring (default): same results as `phrase.lower() in text.lower()`
+    2. word_boundary: occurrences must start and end on word boundaries
+    3. stemmed: words match any inflection with the same stem ("cloud
+       migration" finds "Cloud Migrations"); implies word boundaries
+
+    Every occurrence is reported, overlapping ones included.
+    """
+
+    def __init__(self, patterns: Sequence[str], word_boundary: bool = False, stemmed: bool = False):
+        self.patterns = list(patterns)
+        self.word_boundary = word_boundary or stemmed
+        self.stemmed = stemmed
+
+        keys: Dict[str, List[int]] = {}
+        for i, pattern in enumerate(self.patterns):
+            keys.setdefault(self._key(pattern or ""), []).append(i)
+        # Empty phrases are contained in every text
+        self._always = keys.pop("", [])
+
+        self._automaton: Optional[ahocorasick.Automaton] = None
+        if keys:
+            self._automaton = ahocorasick.Automaton()
+            for key, indices in keys.items():
+                self._automaton.add_word(key, (len(key), indices))
+            self._automaton.make_automaton()
+
+    def _key(self, pattern: str) -> str:
+        if self.stemmed:
+            return _StemmedText(pattern).text.strip()
+        return pattern.lower()
+
+    def find(self, text: Optional[str]) -> List[Tuple[int, int, int]]:
+        """Every occurrence as (pattern index, start, end), ordered by end position"""
+        if not text:
+            return []
+        found = [(i, 0, 0) for i in self._always]
+        if self._automaton is None:
+            return found
+
+        stemmed = _StemmedText(text) if self.stemmed else None
+        haystack = stemmed.text if stemmed else text.lower()
+        for last, (length, indices) in self._automaton.iter(haystack):
+            start, end = last - length + 1, last + 1
+            if self.word_boundary and (
+                (start > 0 and _is_word(haystack[start - 1])) or
+                (end < len(haystack) and _is_word(haystack[end]))
+            ):
+                continue
+            if stemmed:
+                start, end = stemmed.original(start, end)
+            found.extend((i, start, end) for i in indices)
+        return found
+
+    def counts(self, text: Optional[str]) -> List[int]:
+        """Occurrences per pattern"""
+        counts = [0] * len(self.patterns)
+        for i, _, _ in self.find(text):
+            counts[i] += 1
+        return counts
+
+    def positions(self, text: Optional[str]) -> Dict[str, List[Tuple[int, int]]]:
+        """Pattern -> (start, end) spans of its occurrences, for patterns found"""
+        spans: Dict[str, List[Tuple[int, int]]] = {}
+        for i, start, end in self.find(text):
+            spans.setdefault(self.patterns[i], []).append((start, end))
+        return spans
+
+    def matched(self, text: Optional[str]) -> List[str]:
+        """Patterns found at least once, in pattern order"""
+        if not text:
+            return []
+        if not self.word_boundary and len(self.patterns) < _SEARCH_MAX_PATTERNS:
+            lowered = text.lower()
+            return [pattern for pattern in self.patterns if pattern.lower() in lowered]
+        counts = self.counts(text)
+        return [pattern for pattern, count in zip(self.patterns, counts) if count]
+
+
+@lru_cache(maxsize=512)
+def _cached_matcher(patterns: Tuple[str, ...], word_boundary: bool, stemmed: bool) -> CapabilityMatcher:
+    return CapabilityMatcher(patterns, word_boundary=word_boundary, stemmed=stemmed)
+
+
+def capability_matcher(patterns: Iterable[str], word_boundary: bool = False, stemmed: bool = False) -> CapabilityMatcher:
+    """
+    Compiled matcher for a phrase list, cached on its contents (an organization's
+    capabilities compile once; a profile edit simply yields a new entry)
+    """
+    return _cached_matcher(tuple(p or "" for p in patterns), word_boundary, stemmed)
@@ -0,0 +1,691 @@
+"""
+Contractor Search Index
+In-memory faceted search over the synced contractors table: compact array
+columns, roaring-style bitmaps per NAICS code, state and business type, and a
+token prefix index on legal names. Filtering, ranking and facet counts run
+without a database or SAM.gov round trip; only the returned page is read back.
+"""
+from bisect import bisect_left
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+import logging
+import re
+import threading
+import time
+
+import numpy as np
+from prometheus_client import Gauge, Histogram
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.services.naics_hierarchy import naics_hierarchy
+
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics
+CONTRACTOR_INDEX_ROWS = Gauge(
+    'contractor_index_rows',
+    'Live contractors in the in-memory search index'
+)
+
+CONTRACTOR_INDEX_QUERY = Histogram(
+    'contractor_index_query_seconds',
+    'Filter, rank and facet time of one contractor index query',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+)
+
+_CHUNK = 1 << 16        # Rows per bitmap container
+_ARRAY_MAX = 4096       # Denser containers are stored as bitsets
+_TOKEN = re.compile(r"[a-z0-9]+")
+_NAT = np.datetime64('NaT', 'us')
+
+# Rows re-read on refresh: rows written by transactions that started before the
+# last refresh but committed after it carry an older last_updated
+REFRESH_OVERLAP_SECONDS = 300
+
+# JSONB arrays are flattened to text[] by Postgres (much cheaper than decoding JSON per row)
+_LOAD_SQL = """
+    SELECT id, legal_business_name,
+           ARRAY(SELECT COALESCE(e->>'naicsCode', e->>'code', e #>> '{}')
+                 FROM jsonb_array_elements(CASE WHEN jsonb_typeof(naics_codes) = 'array'
+                                                THEN naics_codes ELSE '[]'::jsonb END) e),
+           ARRAY(SELECT jsonb_array_elements_text(CASE WHEN jsonb_typeof(set_aside_status) = 'array'
+                                                       THEN set_aside_status ELSE '[]'::jsonb END)),
+           location->>'state', past_awards->>'count', last_updated, is_active
+    FROM contractors
+"""
+
+_HYDRATE_SQL = """
+    SELECT id, uei, duns, legal_business_name, doing_business_as, naics_codes,
+           set_aside_status, capabilities, location, contact_info, past_awards
+    FROM contractors
+    WHERE id = ANY(:ids)
+"""
+
+
+def _tokens(value: Optional[str]) -> List[str]:
+    return _TOKEN.findall((value or '').lower())
+
+
+def _naics_code(value: Any) -> Optional[str]:
+    """NAICS entries are stored as codes or as SAM.gov {naicsCode: ...} objects"""
+    if isinstance(value, dict):
+        value = value.get('naicsCode') or value.get('code')
+    value = str(value).strip() if value is not None else ''
+    return value or None
+
+
+class Bitmap:
+    """
+    Roaring-style compressed row set
+
+    Rows are split into 65536-row chunks; each chunk is a sorted uint16 array
+    when sparse or a packed 65536-bit bitset when it holds more than 4096 rows,
+    so rare and common facet values both stay small and expand quickly.
+    """
+    __slots__ = ('keys', 'containers', 'cardinality')
+
+    def __init__(self, keys: np.ndarray, containers: List[np.ndarray], cardinality: int):
+        self.keys = keys
+        self.containers = containers
+        self.cardinality = cardinality
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[int]) -> "Bitmap":
+        rows = np.unique(np.asarray(rows, dtype=np.uint32))
+        high = rows >> 16
+        keys, starts = np.unique(high, return_index=True)
+        bounds = np.append(starts, len(rows))
+        containers = []
+        for i in range(len(keys)):
+            low = (rows[bounds[i]:bounds[i + 1]] & 0xFFFF).astype(np.uint16)
+            if len(low) > _ARRAY_MAX:
+                bits = np.zeros(_CHUNK, dtype=bool)
+                bits[low] = True
+                containers.append(np.packbits(bits, bitorder='little'))
+            else:
+                containers.append(low)
+        return cls(keys, containers, len(rows))
+
+    def __len__(self) -> int:
+        return self.cardinality
+
+    @property
+    def nbytes(self) -> int:
+        return self.keys.nbytes + sum(c.nbytes for c in self.containers)
+
+    def mark(self, target: np.ndarray):
+        """
+        Add this set into a dense per-row array: sets True in a bool mask, or
+        increments a counter array (used to count how many filter values match)
+        """
+        for key, container in zip(self.keys, self.containers):
+            base = int(key) << 16
+            if container.dtype == np.uint8:
+                chunk = target[base:base + _CHUNK]
+                chunk += np.unpackbits(container, count=len(chunk), bitorder='little').astype(target.dtype)
+            else:
+                target[base + container.astype(np.int64)] += target.dtype.type(1)
+
+    def rows(self) -> np.ndarray:
+        """Sorted row numbers"""
+        parts = []
+        for key, container in zip(self.keys, self.containers):
+            low = np.flatnonzero(np.unpackbits(container, bitorder='little')) if container.dtype == np.uint8 else container
+            parts.append((int(key) << 16) + low.astype(np.int64))
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+
+def _group_bitmaps(values: List[str], codes: np.ndarray, rows: np.ndarray) -> Dict[str, Bitmap]:
+    """One Bitmap per value from parallel (value code, row) arrays"""
+    if not len(codes):
+        return {}
+    order = np.argsort(codes, kind='stable')
+    codes, rows = codes[order], rows[order]
+    present, starts = np.unique(codes, return_index=True)
+    bounds = np.append(starts, len(codes))
+    return {
+        values[code]: Bitmap.from_rows(rows[bounds[i]:bounds[i + 1]])
+        for i, code in enumerate(present)
+    }
+
+
+class _Segment:
+    """
+    Facet bitmaps and name-token postings for a range of index rows
+
+    The bulk load is one segment; rows changed by later refreshes go into a
+    small delta segment until the next full reload.
+    """
+
+    def __init__(self, first_row: int, columns: Dict[str, np.ndarray], vocab: Dict[str, List[str]], names: List[str]):
+        offsets = columns['naics_offsets'][first_row:]
+        naics = columns['naics'][offsets[0]:offsets[-1]]
+        naics_rows = first_row + np.repeat(np.arange(len(offsets) - 1, dtype=np.uint32), np.diff(offsets))
+        state = columns['state'][first_row:]
+        stated = np.flatnonzero(state)
+        set_aside = columns['set_aside'][first_row:]
+
+        self.bitmaps: Dict[str, Dict[str, Bitmap]] = {
+            'naics': _group_bitmaps(vocab['naics'], naics, naics_rows),
+            'state': _group_bitmaps(vocab['state'], state[stated], first_row + stated),
+            'set_aside': {},
+        }
+        for bit, label in enumerate(vocab['set_aside'][:32]):
+            rows = np.flatnonzero(set_aside & np.uint32(1 << bit))
+            if len(rows):
+                self.bitmaps['set_aside'][label] = Bitmap.from_rows(first_row + rows)
+
+        # Prefix index: tokens in sorted order, with their rows laid out
+        # contiguously, so every token sharing a prefix is one slice
+        words: Dict[str, int] = {}
+        codes: List[int] = []
+        token_rows: List[int] = []
+        for offset, name in enumerate(names):
+            for token in set(_tokens(name)):
+                codes.append(words.setdefault(token, len(words)))
+                token_rows.append(first_row + offset)
+        self.tokens = sorted(words)
+        rank = np.empty(len(words), dtype=np.int64)
+        rank[np.fromiter((words[t] for t in self.tokens), dtype=np.int64, count=len(words))] = np.arange(len(words))
+        token_rank = rank[np.asarray(codes, dtype=np.int64)]
+        self.token_rows = np.asarray(token_rows, dtype=np.uint32)[np.argsort(token_rank, kind='stable')]
+        self.token_offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(token_rank, minlength=len(words)))]
+        ).astype(np.int64)
+
+    def prefix_rows(self, prefix: str) -> np.ndarray:
+        """Rows with a name token starting with `prefix` (may repeat a row)"""
+        lo = bisect_left(self.tokens, prefix)
+        hi = bisect_left(self.tokens, prefix + '\uffff', lo)
+        return self.token_rows[self.token_offsets[lo]:self.token_offsets[hi]]
+
+
+class _Snapshot:
+    """Immutable index state; refreshes build a new snapshot and swap it in"""
+
+    def __init__(self, columns: Dict[str, np.ndarray], vocab: Dict[str, List[str]],
+                 segments: List[_Segment], live: np.ndarray, base_rows: int,
+                 delta_names: Optional[List[str]] = None):
+        self.ids = columns['ids']                    # contractors.id per row
+        self.state = columns['state']                # code into vocab['state'] (0 = unknown)
+        self.set_aside = columns['set_aside']        # bit per vocab['set_aside'] label
+        self.past_awards = columns['past_awards']    # award count, -1 when unknown
+        self.last_updated = columns['last_updated']
+        self.naics_offsets = columns['naics_offsets']  # CSR: row -> naics codes
+        self.naics = columns['naics']
+        self.vocab = vocab
+        self.segments = segments
+        self.live = live
+        self.base_rows = base_rows
+        self.delta_names = delta_names or []  # Legal names of the delta segment's rows
+        self.size = len(self.ids)
+        self.live_count = int(np.count_nonzero(live))
+        self.id_order = np.argsort(self.ids, kind='stable')
+        valid = self.last_updated[~np.isnat(self.last_updated)]
+        self.watermark = valid.max() if len(valid) else None
+        self.all_facets: Optional[Dict[str, List[Dict[str, Any]]]] = None
+
+    def lookup(self, ids: np.ndarray) -> np.ndarray:
+        """Live row of each contractor id, -1 when not indexed"""
+        if not self.size:
+            return np.full(len(ids), -1, dtype=np.int64)
+        # Rightmost match: a re-appended contractor's newest row comes last
+        pos = np.searchsorted(self.ids[self.id_order], ids, side='right') - 1
+        rows = self.id_order[np.maximum(pos, 0)]
+        found = (pos >= 0) & (self.ids[rows] == ids) & self.live[rows]
+        return np.where(found, rows, -1)
+
+
+def _columns(records: List[tuple], vocab: Dict[str, List[str]]) -> Dict[str, np.ndarray]:
+    """Array columns for parsed records; extends `vocab` with new values"""
+    index = {facet: {v: i for i, v in enumerate(values)} for facet, values in vocab.items()}
+
+    def code(facet: str, value: str) -> int:
+        found = index[facet].get(value)
+        if found is None:
+            found = index[facet][value] = len(vocab[facet])
+            vocab[facet].append(value)
+        return found
+
+    naics, lengths = [], []
+    set_aside_bits = np.zeros(len(records), dtype=np.uint32)
+    for i, record in enumerate(records):
+        codes = [code('naics', c) for c in record[2]]
+        naics.extend(codes)
+        lengths.append(len(codes))
+        for label in record[3]:
+            bit = code('set_aside', label)
+            if bit < 32:
+                set_aside_bits[i] |= np.uint32(1 << bit)
+
+    return {
+        'ids': np.fromiter((r[0] for r in records), dtype=np.int64, count=len(records)),
+        'state': np.fromiter((code('state', r[4]) if r[4] else 0 for r in records), dtype=np.uint16, count=len(records)),
+        'set_aside': set_aside_bits,
+        'past_awards': np.fromiter((r[5] for r in records), dtype=np.int32, count=len(records)),
+        'last_updated': np.array([r[6] or _NAT for r in records], dtype='datetime64[us]'),
+        'naics_offsets': np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]).astype(np.int64),
+        'naics': np.asarray(naics, dtype=np.uint32),
+    }
+
+
+def _parse_record(row: tuple) -> tuple:
+    """(id, name, [naics], [set-aside labels], state, past award count or -1, last_updated, active)"""
+    contractor_id, name, naics, set_asides, state, past_awards, last_updated = row[:7]
+    active = row[7] if len(row) > 7 else True
+    codes = []
+    for value in naics if isinstance(naics, list) else []:
+        code = _naics_code(value)
+        if code and code not in codes:
+            codes.append(code)
+    labels = sorted({str(s) for s in set_asides if s}) if isinstance(set_asides, list) else []
+    try:
+        awards = int(past_awards) if past_awards is not None else -1
+    except (TypeError, ValueError):
+        awards = -1
+    if isinstance(last_updated, datetime) and last_updated.tzinfo is not None:
+        last_updated = last_updated.replace(tzinfo=None)
+    return (contractor_id, name, codes, labels, (state or '').strip().upper() or None, awards, last_updated,
+            active is not False)
+
+
+class ContractorIndex:
+    """
+    In-memory faceted contractor search
+
+    Features:
+    1. Compact columns (NumPy arrays, ~40 bytes per contractor plus postings)
+    2. Roaring-style bitmaps per NAICS code, state and set-aside/business type
+       for filters; facet counts come from the columns of the matching rows
+    3. Prefix search on legal-name words ("booz all" matches Booz Allen Hamilton)
+    4. Incremental refresh of rows changed since the last load, applied as a
+       delta segment and tombstones; a background full reload compacts it
+    5. Queries read an immutable snapshot, so refreshes never block searches
+
+    Usage:
+        contractor_index.warm()
+        result = contractor_index.search({'naics_codes': ['541512'], 'state': 'VA'})
+    """
+
+    def __init__(self, compact_fraction: float = 0.1):
+        self._snapshot: Optional[_Snapshot] = None
+        self._lock = threading.Lock()          # One load/refresh at a time
+        self._compact_fraction = compact_fraction
+        self._last_check = 0.0
+        self._checkpoint_seen: Optional[datetime] = None
+        self._background: Optional[threading.Thread] = None
+        self._lookup = None                    # (snapshot, ids, rows) of the last flags() call
+
+    @property
+    def ready(self) -> bool:
+        snapshot = self._snapshot
+        return snapshot is not None and snapshot.live_count > 0
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {"ready": False}
+        bitmap_bytes = sum(b.nbytes for s in snapshot.segments for facet in s.bitmaps.values() for b in facet.values())
+        return {
+            "ready": self.ready,
+            "rows": snapshot.live_count,
+            "tombstones": snapshot.size - snapshot.live_count,
+            "delta_rows": snapshot.size - snapshot.base_rows,
+            "naics_codes": len(snapshot.vocab['naics']),
+            "bitmap_bytes": bitmap_bytes,
+            "watermark": str(snapshot.watermark) if snapshot.watermark is not None else None,
+        }
+
+    # ------------------------------------------------------------------
+    # Loading and refresh
+    # ------------------------------------------------------------------
+
+    def load(self, db: Session, partition_size: int = 50000) -> Dict[str, Any]:
+        """Build the index from the whole contractors table"""
+        with self._lock:
+            return self._load(db, partition_size)
+
+    def _load(self, db: Session, partition_size: int = 50000) -> Dict[str, Any]:
+        started = time.perf_counter()
+        self._checkpoint_seen = self._checkpoint_updated_at(db)
+        result = db.execute(text(_LOAD_SQL + " ORDER BY id").execution_options(stream_results=True))
+        loaded = self.load_rows(row for partition in result.partitions(partition_size) for row in partition)
+
+        logger.info(f"📇 Contractor index loaded {loaded} contractors in {time.perf_counter() - started:.1f}s")
+        return {"loaded": loaded, "seconds": round(time.perf_counter() - started, 2)}
+
+    def load_rows(self, rows: Iterable[tuple]) -> int:
+        """
+        Build the index from contractor rows:
+        (id, legal name, [naics], [set-asides], state, past award count, last_updated[, active]);
+        inactive (expired) registrations are left out
+        """
+        records = [record for record in map(_parse_record, map(tuple, rows)) if record[7]]
+        vocab = {'naics': [], 'state': [''], 'set_aside': []}
+        columns = _columns(records, vocab)
+        segment = _Segment(0, columns, vocab, [r[1] for r in records])
+        self._swap(_Snapshot(columns, vocab, [segment], np.ones(len(records), dtype=bool), len(records)))
+        return len(records)
+
+    def refresh(self, db: Session) -> Dict[str, Any]:
+        """
+        Apply contractors inserted or changed since the last load/refresh
+
+        Changed rows are tombstoned and re-appended to the delta segment
+        (rows whose registration went inactive are only tombstoned); once
+        the delta exceeds `compact_fraction` of the index the whole index
+        is reloaded.
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.watermark is None:
+                return self._load(db)
+
+            self._checkpoint_seen = self._checkpoint_updated_at(db)
+            since = (snapshot.watermark - np.timedelta64(REFRESH_OVERLAP_SECONDS, 's')).astype(datetime)
+            rows = db.execute(text(_LOAD_SQL + " WHERE last_updated > :since ORDER BY id"), {"since": since}).fetchall()
+            records = [_parse_record(tuple(row)) for row in rows]
+            if not records:
+                return {"applied": 0}
+
+            ids = np.fromiter((r[0] for r in records), dtype=np.int64, count=len(records))
+            existing = snapshot.lookup(ids)
+            stamps = np.array([r[6] or _NAT for r in records], dtype='datetime64[us]')
+            known = existing >= 0
+            unchanged = known & (snapshot.last_updated[np.where(known, existing, 0)] == stamps)
+            stale = existing[known & ~unchanged]
+            records = [r for r, skip in zip(records, unchanged) if not skip and r[7]]
+            if not records and not len(stale):
+                return {"applied": 0}
+
+            delta_rows = snapshot.size - snapshot.base_rows + len(records)
+            if delta_rows > self._compact_fraction * max(snapshot.base_rows, 1):
+                return {**self._load(db), "compacted": True}
+
+            vocab = {facet: list(values) for facet, values in snapshot.vocab.items()}
+            added = _columns(records, vocab)
+            offset = snapshot.naics_offsets[-1]
+            columns = {
+                'ids': np.concatenate([snapshot.ids, added['ids']]),
+                'state': np.concatenate([snapshot.state, added['state']]),
+                'set_aside': np.concatenate([snapshot.set_aside, added['set_aside']]),
+                'past_awards': np.concatenate([snapshot.past_awards, added['past_awards']]),
+                'last_updated': np.concatenate([snapshot.last_updated, added['last_updated']]),
+                'naics_offsets': np.concatenate([snapshot.naics_offsets, added['naics_offsets'][1:] + offset]),
+                'naics': np.concatenate([snapshot.naics, added['naics']]),
+            }
+            live = np.concatenate([snapshot.live, np.ones(len(records), dtype=bool)])
+            live[stale] = False
+
+            # The delta segment is rebuilt over every row appended since the load
+            delta_names = snapshot.delta_names + [r[1] for r in records]
+            delta = _Segment(snapshot.base_rows, columns, vocab, delta_names)
+            self._swap(_Snapshot(columns, vocab, [snapshot.segments[0], delta], live, snapshot.base_rows, delta_names))
+
+            logger.info(f"📇 Contractor index refreshed {len(records)} contractors")
+            return {"applied": len(records)}
+
+    def _swap(self, snapshot: _Snapshot):
+        self._snapshot = snapshot
+        CONTRACTOR_INDEX_ROWS.set(snapshot.live_count)
+
+    def warm(self):
+        """Load the index in a background thread (application startup)"""
+        self._run_in_background(lambda db: self.load(db) if self._snapshot is None else None)
+
+    def request_refresh(self):
+        """Refresh in the background if the index is loaded (after a sync)"""
+        if self._snapshot is not None:
+            self._run_in_background(self.refresh)
+
+    def maybe_refresh(self, db: Session):
+        """
+        Cheap staleness check for the search path: at most every
+        CONTRACTOR_INDEX_REFRESH_SECONDS, compare the contractor sync and
+        entity extract checkpoints with the last ones seen and refresh in
+        the background when a sync or ingest (in any process) has written since
+        """
+        now = time.monotonic()
+        if now - self._last_check < settings.CONTRACTOR_INDEX_REFRESH_SECONDS:
+            return
+        self._last_check = now
+        if self._snapshot is None:
+            self.warm()
+            return
+
+        if self._checkpoint_updated_at(db) != self._checkpoint_seen:
+            self.request_refresh()
+
+    @staticmethod
+    def _checkpoint_updated_at(db: Session) -> Optional[datetime]:
+        from app.models.sync import SyncCheckpoint
+        from app.services.contractor_sync_service import CONTRACTOR_CHECKPOINT
+        from app.services.sam_entity_extract_service import ENTITY_EXTRACT_CHECKPOINT
+
+        # An extract ingest may leave the sync checkpoint untouched (older extract)
+        return db.query(func.max(SyncCheckpoint.updated_at)).filter(
+            SyncCheckpoint.name.in_([CONTRACTOR_CHECKPOINT, ENTITY_EXTRACT_CHECKPOINT])
+        ).scalar()
+
+    def _run_in_background(self, work):
+        if self._background is not None and self._background.is_alive():
+            return
+
+        def run():
+            from app.core.database import SessionLocal
+
+            db = SessionLocal()
+            try:
+                work(db)
+            except Exception as e:
+                logger.warning(f"⚠️  Contractor index update failed: {str(e)}")
+            finally:
+                db.close()
+
+        self._background = threading.Thread(target=run, name="contractor-index", daemon=True)
+        self._background.start()
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def search(
+        self,
+        query: Dict[str, Any],
+        offset: int = 0,
+        limit: int = 20,
+        facet_limit: int = 20
+    ) -> Dict[str, Any]:
+        """
+        Filter, rank and facet contractors
+
+        Args:
+            query: PartnerMatchingService query; naics_codes (2-6 digits: "5415"
+                matches every code under it), set_aside, state, name and
+                min_past_awards filter, capabilities ranks (name words)
+            offset: Rows to skip
+            limit: Rows to return
+            facet_limit: NAICS facet values to return (states/set-asides: all)
+
+        Returns:
+            {"ids": [...], "scores": [...], "total": n, "facets": {...}}
+        """
+        started = time.perf_counter()
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {"ids": [], "scores": [], "total": 0, "facets": {}}
+
+        naics_codes = [c for c in (_naics_code(v) for v in query.get('naics_codes') or []) if c]
+        set_asides = [s for s in query.get('set_aside') or [] if s]
+        state = (query.get('state') or '').strip().upper()
+        name_words = _tokens(query.get('name'))
+        capability_words = _tokens(query.get('capabilities'))
+        min_awards = query.get('min_past_awards')
+
+        mask = snapshot.live.copy()
+        overlap = None
+        if naics_codes:
+            overlap = self._matches(snapshot, 'naics', naics_hierarchy.expand(naics_codes), np.uint8)
+            mask &= overlap > 0
+        if set_asides:
+            mask &= self._matches(snapshot, 'set_aside', set_asides, bool)
+        if state:
+            mask &= self._matches(snapshot, 'state', [state], bool)
+        if min_awards:
+            # Contractors without award history are kept (counts come from FPDS enrichment)
+            mask &= (snapshot.past_awards < 0) | (snapshot.past_awards >= int(min_awards))
+        for word in name_words:
+            mask &= self._prefix(snapshot, word)
+
+        rows = np.flatnonzero(mask)
+        filtered = bool(naics_codes or set_asides or state or name_words or min_awards)
+
+        # Same weights as the mock/SAM.gov relevance score; filters are hard, so
+        # their components are constant and capability words order the results
+        score = (30 if naics_codes else 10) + (20 if set_asides else 10) + (15 if state else 5)
+        hits = None
+        if capability_words:
+            hits = np.ones(snapshot.size, dtype=bool)
+            for word in capability_words:
+                hits &= self._prefix(snapshot, word)
+            hits = hits[rows]
+        else:
+            score += 5
+
+        # Rank: capability hit, then NAICS overlap with the query, then index order
+        level = None
+        if hits is not None:
+            level = hits.astype(np.int16) * 8
+        if len(naics_codes) > 1:
+            overlap = np.minimum(overlap[rows], 7).astype(np.int16)
+            level = overlap if level is None else level + overlap
+        if level is None:
+            selected = np.arange(min(offset, len(rows)), min(offset + limit, len(rows)))
+        else:
+            selected = self._top(level, offset + limit)[offset:]
+        scores = np.full(len(selected), score, dtype=np.int16)
+        if hits is not None:
+            scores += 25 * hits[selected]
+        np.minimum(scores, 100, out=scores)
+
+        facets = self._facets(snapshot, rows if filtered else None, facet_limit)
+        CONTRACTOR_INDEX_QUERY.observe(time.perf_counter() - started)
+        return {
+            "ids": snapshot.ids[rows[selected]].tolist(),
+            "scores": scores.tolist(),
+            "total": len(rows),
+            "facets": facets,
+            "took_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+
+    def flags(self, ids: np.ndarray, facet: str, values: List[str]) -> Optional[np.ndarray]:
+        """
+        Whether each contractor id has any of the facet values, aligned with
+        `ids` (False when not indexed); None until the index is loaded
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        if not snapshot.size:
+            return np.zeros(len(ids), dtype=bool)
+        if facet == 'naics':
+            values = naics_hierarchy.expand(c for c in (_naics_code(v) for v in values) if c)
+        cached = self._lookup
+        if cached is not None and cached[0] is snapshot and cached[1] is ids:
+            rows = cached[2]
+        else:
+            rows = snapshot.lookup(ids)
+            self._lookup = (snapshot, ids, rows)
+        matched = self._matches(snapshot, facet, values, bool)
+        return (rows >= 0) & matched[np.maximum(rows, 0)]
+
+    @staticmethod
+    def _matches(snapshot: _Snapshot, facet: str, values: List[str], dtype) -> np.ndarray:
+        """Per-row count (or any-match mask) of the given facet values"""
+        target = np.zeros(snapshot.size, dtype=dtype)
+        for value in values:
+            for segment in snapshot.segments:
+                bitmap = segment.bitmaps[facet].get(value)
+                if bitmap is not None:
+                    bitmap.mark(target)
+        return target
+
+    @staticmethod
+    def _prefix(snapshot: _Snapshot, word: str) -> np.ndarray:
+        mask = np.zeros(snapshot.size, dtype=bool)
+        for segment in snapshot.segments:
+            mask[segment.prefix_rows(word)] = True
+        return mask
+
+    @staticmethod
+    def _top(level: np.ndarray, k: int) -> np.ndarray:
+        """Positions of the k best levels, highest first, ties in index order"""
+        picked = []
+        remaining = level
+        while k > 0 and len(remaining):
+            best = remaining.max()
+            positions = np.flatnonzero(level == best)
+            picked.append(positions[:k])
+            k -= len(positions)
+            remaining = remaining[remaining < best]
+        return np.concatenate(picked) if picked else np.zeros(0, dtype=np.int64)
+
+    def _facets(self, snapshot: _Snapshot, rows: Optional[np.ndarray], facet_limit: int) -> Dict[str, List[Dict[str, Any]]]:
+        """Facet counts over matching rows (all live rows when `rows` is None, cached)"""
+        if rows is None:
+            if snapshot.all_facets is None:
+                snapshot.all_facets = self._facets(snapshot, np.flatnonzero(snapshot.live), facet_limit)
+            return snapshot.all_facets
+
+        vocab = snapshot.vocab
+        starts = snapshot.naics_offsets[rows]
+        lengths = snapshot.naics_offsets[rows + 1] - starts
+        total = int(lengths.sum())
+        if total:
+            positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+            naics_counts = np.bincount(snapshot.naics[positions], minlength=len(vocab['naics']))
+        else:
+            naics_counts = np.zeros(len(vocab['naics']), dtype=np.int64)
+        state_counts = np.bincount(snapshot.state[rows], minlength=len(vocab['state']))
+        bits = snapshot.set_aside[rows]
+        if len(vocab['set_aside']) <= 12:
+            # Few labels: count each label combination once, then split into labels
+            combos = np.bincount(bits, minlength=1 << len(vocab['set_aside']))
+            members = np.arange(len(combos))
+            set_aside_counts = [int(combos[(members >> i) & 1 == 1].sum()) for i in range(len(vocab['set_aside']))]
+        else:
+            set_aside_counts = [
+                int(np.count_nonzero(bits & np.uint32(1 << i))) for i in range(min(len(vocab['set_aside']), 32))
+            ]
+
+        def top(values: List[str], counts, limit: Optional[int], skip_first: bool = False):
+            order = np.argsort(-np.asarray(counts), kind='stable')
+            facet = [
+                {"value": values[i], "count": int(counts[i])}
+                for i in order if counts[i] and not (skip_first and i == 0)
+            ]
+            return facet[:limit] if limit else facet
+
+        return {
+            "naics": top(vocab['naics'], naics_counts, facet_limit),
+            "state": top(vocab['state'], state_counts, None, skip_first=True),
+            "set_aside": top(vocab['set_aside'], set_aside_counts, None),
+        }
+
+    # ------------------------------------------------------------------
+    # Results
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def hydrate(db: Session, ids: List[int]) -> List[Dict[str, Any]]:
+        """Full contractor rows for a result page, in result order"""
+        if not ids:
+            return []
+        rows = db.execute(text(_HYDRATE_SQL), {"ids": ids}).mappings().all()
+        by_id = {row['id']: dict(row) for row in rows}
+        return [by_id[i] for i in ids if i in by_id]
+
+
+contractor_index = ContractorIndex()
@@ -0,0 +1,442 @@
+"""
+SAM.gov Contractor Sync
+Pipelined, resumable sync of SAM.gov entity registrations into the contractors
+table: pages are fetched concurrently, each page is written with one
+INSERT ... ON CONFLICT (uei), and page checkpoints let an interrupted run resume
+"""
+from typing import Any, Dict, List, Optional, Set, Tuple
+from datetime import datetime, timezone
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from psycopg2.extras import execute_values
+from prometheus_client import Counter, Gauge, Histogram
+import asyncio
+import json
+import logging
+import time
+
+from app.config import settings
+from app.models.sync import SyncCheckpoint
+from app.services.contractor_index import contractor_index
+from app.services.partner_matching_service import PartnerMatchingService
+from app.services.samgov_client import samgov_client
+
+logger = logging.getLogger(__name__)
+
+CONTRACTOR_CHECKPOINT = "sam_contractor_sync"
+
+# Prometheus metrics
+CONTRACTOR_SYNC_ROWS = Counter(
+    'contractor_sync_rows_total',
+    'Contractor rows processed by the SAM.gov entity sync',
+    ['result']  # inserted, updated, unchanged, skipped
+)
+
+CONTRACTOR_SYNC_ROWS_PER_SECOND = Gauge(
+    'contractor_sync_rows_per_second',
+    'Contractor rows written per second in the current or last sync run'
+)
+
+CONTRACTOR_SYNC_PAGES_PENDING = Gauge(
+    'contractor_sync_pages_pending',
+    'Entity pages fetched but not yet written (pipeline lag)'
+)
+
+CONTRACTOR_SYNC_LAG = Gauge(
+    'contractor_sync_lag_seconds',
+    'Age of the contractor data (seconds since the last completed sync started)'
+)
+
+CONTRACTOR_SYNC_PAGE_WRITE = Histogram(
+    'contractor_sync_page_write_seconds',
+    'Time to upsert one entity page'
+)
+
+_UPSERT_SQL = """
+    INSERT INTO contractors
+        (uei, duns, legal_business_name, naics_codes, set_aside_status, location, is_active, last_updated)
+    VALUES %s
+    ON CONFLICT (uei) DO UPDATE SET
+        duns = COALESCE(EXCLUDED.duns, contractors.duns),
+        legal_business_name = EXCLUDED.legal_business_name,
+        naics_codes = EXCLUDED.naics_codes,
+        set_aside_status = EXCLUDED.set_aside_status,
+        location = EXCLUDED.location,
+        is_active = EXCLUDED.is_active,
+        last_updated = EXCLUDED.last_updated
+    WHERE (contractors.duns, contractors.legal_business_name, contractors.naics_codes,
+           contractors.set_aside_status, contractors.location, contractors.is_active)
+        IS DISTINCT FROM
+          (COALESCE(EXCLUDED.duns, contractors.duns), EXCLUDED.legal_business_name, EXCLUDED.naics_codes,
+           EXCLUDED.set_aside_status, EXCLUDED.location, EXCLUDED.is_active)
+    RETURNING (xmax = 0) AS inserted
+"""
+_UPSERT_TEMPLATE = "(%s, %s, %s, %s::jsonb, %s::jsonb, %s::jsonb, %s, NOW())"
+
+
+class ContractorSyncService:
+    """
+    Bulk sync of SAM.gov registered entities into contractors
+
+    Features:
+    1. Pages fetched concurrently (CONTRACTOR_SYNC_CONCURRENCY) through the
+       shared SAM.gov client, which still enforces quota and per-endpoint limits
+    2. A single writer upserts each page with one INSERT ... ON CONFLICT (uei),
+       skipping rows that did not change, while later pages are still downloading
+    3. Each page commits together with its checkpoint, so a crashed or
+       quota-limited run resumes at the first unwritten page
+    4. rows/sec, pipeline lag and data age metrics (Prometheus)
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.api_key = settings.SAM_GOV_API_KEY
+        self._parser = PartnerMatchingService(db)
+
+    def get_checkpoint(self) -> SyncCheckpoint:
+        """Get (or create) the contractor sync checkpoint"""
+        checkpoint = self.db.query(SyncCheckpoint).filter(SyncCheckpoint.name == CONTRACTOR_CHECKPOINT).first()
+        if not checkpoint:
+            checkpoint = SyncCheckpoint(name=CONTRACTOR_CHECKPOINT, status="idle")
+            self.db.add(checkpoint)
+            self.db.commit()
+            self.db.refresh(checkpoint)
+        return checkpoint
+
+    async def sync(
+        self,
+        batch_size: int = 1000,
+        incremental: bool = True,
+        concurrency: Optional[int] = None,
+        resume: bool = True,
+        max_pages: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Sync contractor registrations from SAM.gov
+
+        Args:
+            batch_size: Entities per API page
+            incremental: Only fetch registrations since the last completed sync
+            concurrency: Pages fetched in parallel (default: CONTRACTOR_SYNC_CONCURRENCY)
+            resume: Continue an interrupted run with the same filters
+            max_pages: Stop after writing this many pages (partial runs stay resumable)
+
+        Returns:
+            Sync statistics
+        """
+        if not self.api_key:
+            return {"error": "SAM.gov API key not configured"}
+
+        concurrency = max(1, concurrency or settings.CONTRACTOR_SYNC_CONCURRENCY)
+        checkpoint = self.get_checkpoint()
+        now = datetime.now(timezone.utc)
+        if checkpoint.watermark:
+            CONTRACTOR_SYNC_LAG.set((now - checkpoint.watermark).total_seconds())
+
+        registration_date = self._registration_date(checkpoint) if incremental else None
+        run = self._resumable_run(checkpoint, registration_date, batch_size) if resume else None
+        resumed = run is not None
+        if not resumed:
+            run = {
+                "registration_date": registration_date,
+                "size": batch_size,
+                "started_at": now.isoformat(),
+                "total_pages": None,
+                "next_page": 0,
+                "done": [],
+            }
+        else:
+            logger.info(f"🔄 Resuming contractor sync at page {run['next_page']} of {run['total_pages']}")
+
+        checkpoint.status = "running"
+        checkpoint.last_started_at = now
+        checkpoint.cursor = run
+        self.db.commit()
+
+        params = {
+            "api_key": self.api_key,
+            "samRegistered": "Yes",
+            "includeSections": "entityRegistration,coreData",
+            "format": "JSON",
+            "size": batch_size,
+        }
+        if registration_date:
+            params["registrationDate"] = registration_date
+
+        stats = {
+            "new_contractors": 0,
+            "updated_contractors": 0,
+            "unchanged_contractors": 0,
+            "errors": 0,
+            "pages": 0,
+            "resumed_from_page": run["next_page"] if resumed else None,
+            "sync_started": now.isoformat(),
+        }
+
+        started = time.perf_counter()
+        try:
+            complete = await self._run_pages(checkpoint, run, params, concurrency, max_pages, stats, started)
+        except Exception as e:
+            self.db.rollback()
+            checkpoint = self.get_checkpoint()
+            checkpoint.status = "failed"
+            checkpoint.last_error = str(e)[:1000]
+            checkpoint.stats = stats
+            self.db.commit()
+            CONTRACTOR_SYNC_PAGES_PENDING.set(0)
+            logger.error(f"❌ Contractor sync failed after {stats['pages']} pages (resumable): {str(e)}")
+            stats["error_message"] = str(e)
+            return stats
+
+        duration = time.perf_counter() - started
+        written = stats["new_contractors"] + stats["updated_contractors"] + stats["unchanged_contractors"]
+        stats["duration_seconds"] = round(duration, 2)
+        stats["rows_per_second"] = round(written / duration, 1) if duration > 0 else None
+        stats["complete"] = complete
+        stats["sync_completed"] = datetime.now(timezone.utc).isoformat()
+
+        checkpoint.status = "idle" if complete else "running"
+        checkpoint.last_error = None
+        checkpoint.stats = stats
+        if complete:
+            # Next incremental run picks up registrations since this run began
+            checkpoint.watermark = datetime.fromisoformat(run["started_at"])
+            checkpoint.last_success_at = datetime.now(timezone.utc)
+            checkpoint.cursor = None
+            CONTRACTOR_SYNC_LAG.set((datetime.now(timezone.utc) - checkpoint.watermark).total_seconds())
+        self.db.commit()
+        CONTRACTOR_SYNC_PAGES_PENDING.set(0)
+        contractor_index.request_refresh()
+
+        logger.info(
+            f"✅ Contractor sync wrote {written} rows in {stats['duration_seconds']}s "
+            f"({stats['rows_per_second']} rows/sec, {stats['new_contractors']} new)"
+        )
+        return stats
+
+    # ------------------------------------------------------------------
+    # Pipeline
+    # ------------------------------------------------------------------
+
+    async def _run_pages(
+        self,
+        checkpoint: SyncCheckpoint,
+        run: Dict[str, Any],
+        params: Dict[str, Any],
+        concurrency: int,
+        max_pages: Optional[int],
+        stats: Dict[str, Any],
+        started: float
+    ) -> bool:
+        """Fetch pages concurrently and write them in one writer; returns True when every page is written"""
+        done: Set[int] = set(run["done"])
+        skip = frozenset(done)  # Written by the interrupted run
+        state = {"next": run["next_page"], "total": run["total_pages"], "issued": 0}
+
+        if state["total"] is None:
+            # The first page tells us how many pages there are
+            entities, total = await self._fetch_page(params, 0)
+            state["total"] = self._page_count(total, run["size"])
+            state["next"] = state["issued"] = 1
+            await asyncio.to_thread(self._write_page, checkpoint, run, done, 0, entities, state["total"], stats)
+            self._report_rate(stats, started)
+
+        def next_page() -> Optional[int]:
+            while state["next"] < state["total"] and state["next"] in skip:
+                state["next"] += 1
+            if state["next"] >= state["total"] or (max_pages and state["issued"] >= max_pages):
+                return None
+            page = state["next"]
+            state["next"] += 1
+            state["issued"] += 1
+            return page
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+        writing: Dict[str, Optional[asyncio.Future]] = {"page": None}
+
+        async def fetcher():
+            while True:
+                page = next_page()
+                if page is None:
+                    return
+                entities, total = await self._fetch_page(params, page)
+                # Registrations added mid-run extend the page count
+                state["total"] = max(state["total"], self._page_count(total, run["size"]))
+                await queue.put((page, entities))
+                CONTRACTOR_SYNC_PAGES_PENDING.set(queue.qsize())
+
+        async def writer():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                page, entities = item
+                CONTRACTOR_SYNC_PAGES_PENDING.set(queue.qsize())
+                # Shielded: a write already handed to the worker thread cannot be
+                # interrupted, so cancellation must not abandon it mid-commit
+                writing["page"] = asyncio.ensure_future(asyncio.to_thread(
+                    self._write_page, checkpoint, run, done, page, entities, state["total"], stats
+                ))
+                await asyncio.shield(writing["page"])
+                self._report_rate(stats, started)
+
+        writer_task = asyncio.create_task(writer())
+        fetchers = [asyncio.create_task(fetcher()) for _ in range(concurrency)]
+        try:
+            await asyncio.gather(*fetchers)
+            await queue.put(None)
+            await writer_task
+        except BaseException:
+            for task in fetchers + [writer_task]:
+                task.cancel()
+            await asyncio.gather(*fetchers, writer_task, return_exceptions=True)
+            if writing["page"] is not None:
+                # The session is rolled back by the caller; let the in-flight write finish first
+                await asyncio.gather(writing["page"], return_exceptions=True)
+            raise
+
+        return run["next_page"] >= run["total_pages"]
+
+    async def _fetch_page(self, params: Dict[str, Any], page: int) -> Tuple[List[Dict[str, Any]], int]:
+        response = await samgov_client.get(
+            PartnerMatchingService.SAM_GOV_API,
+            endpoint="entities",
+            params={**params, "page": page}
+        )
+        response.raise_for_status()
+        data = response.json()
+        return data.get("entityData", []) or [], int(data.get("totalRecords", 0) or 0)
+
+    def _write_page(
+        self,
+        checkpoint: SyncCheckpoint,
+        run: Dict[str, Any],
+        done: Set[int],
+        page: int,
+        entities: List[Dict[str, Any]],
+        total_pages: int,
+        stats: Dict[str, Any]
+    ):
+        """Upsert one page and advance the checkpoint in the same transaction (runs in a worker thread)"""
+        started = time.perf_counter()
+        rows, skipped = self._page_rows(entities)
+        try:
+            counts = self.upsert_contractors(rows, commit=False)
+
+            done.add(page)
+            while run["next_page"] in done:
+                done.discard(run["next_page"])
+                run["next_page"] += 1
+            run["done"] = sorted(done)
+            run["total_pages"] = total_pages
+            checkpoint.cursor = dict(run)  # Reassign so the JSON column is flushed
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        CONTRACTOR_SYNC_PAGE_WRITE.observe(time.perf_counter() - started)
+
+        stats["pages"] += 1
+        stats["errors"] += skipped
+        stats["new_contractors"] += counts["inserted"]
+        stats["updated_contractors"] += counts["updated"]
+        stats["unchanged_contractors"] += counts["unchanged"]
+        CONTRACTOR_SYNC_ROWS.labels(result='skipped').inc(skipped)
+
+    def _page_rows(self, entities: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+        rows: Dict[str, Dict[str, Any]] = {}
+        skipped = 0
+        for entity in entities:
+            try:
+                row = self._parser._parse_sam_entity(entity)
+            except Exception as e:
+                logger.warning(f"⚠️  Skipping unparseable SAM.gov entity: {str(e)}")
+                skipped += 1
+                continue
+            if not row.get("uei") or not row.get("legal_name"):
+                skipped += 1
+                continue
+            # Last occurrence wins if a page repeats an entity
+            rows[row["uei"]] = row
+        return list(rows.values()), skipped
+
+    def upsert_contractors(self, rows: List[Dict[str, Any]], commit: bool = True) -> Dict[str, int]:
+        """
+        Upsert parsed contractor rows (PartnerMatchingService._parse_sam_entity shape)
+        with a single statement; unchanged rows are not rewritten
+
+        Returns:
+            {"inserted": n, "updated": n, "unchanged": n}
+        """
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+        if not rows:
+            return counts
+
+        values = [
+            (
+                row["uei"][:12],
+                (row.get("duns") or None) and str(row["duns"])[:13],
+                row["legal_name"][:500],
+                json.dumps(row.get("naics") or []),
+                json.dumps(row.get("set_aside") or []),
+                json.dumps(row.get("location") or {}),
+                row.get("active", True),
+            )
+            for row in rows
+        ]
+        cursor = self.db.connection().connection.cursor()
+        try:
+            returned = execute_values(cursor, _UPSERT_SQL, values, template=_UPSERT_TEMPLATE,
+                                      page_size=len(values), fetch=True)
+        finally:
+            cursor.close()
+        if commit:
+            self.db.commit()
+
+        counts["inserted"] = sum(1 for (inserted,) in returned if inserted)
+        counts["updated"] = len(returned) - counts["inserted"]
+        counts["unchanged"] = len(values) - len(returned)
+        for result, count in counts.items():
+            CONTRACTOR_SYNC_ROWS.labels(result=result).inc(count)
+        return counts
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    def _registration_date(self, checkpoint: SyncCheckpoint) -> Optional[str]:
+        """SAM.gov registrationDate filter (MM/DD/YYYY) for an incremental run"""
+        last_sync = checkpoint.watermark
+        if last_sync is None:
+            # Contractors loaded before checkpoints existed
+            last_sync = self.db.execute(text("SELECT MAX(last_updated) FROM contractors")).scalar()
+        return last_sync.strftime("%m/%d/%Y") if last_sync else None
+
+    @staticmethod
+    def _resumable_run(
+        checkpoint: SyncCheckpoint,
+        registration_date: Optional[str],
+        size: int
+    ) -> Optional[Dict[str, Any]]:
+        """The interrupted run to continue, if its filters match this one"""
+        run = checkpoint.cursor
+        if checkpoint.status not in ("running", "failed") or not isinstance(run, dict):
+            return None
+        if run.get("size") != size or run.get("total_pages") is None:
+            return None
+        if run.get("registration_date") != registration_date:
+            return None
+        return dict(run)
+
+    @staticmethod
+    def _page_count(total_records: int, size: int) -> int:
+        return max(1, (total_records + size - 1) // size)
+
+    @staticmethod
+    def _report_rate(stats: Dict[str, Any], started: float):
+        elapsed = time.perf_counter() - started
+        written = stats["new_contractors"] + stats["updated_contractors"] + stats["unchanged_contractors"]
+        if elapsed > 0:
+            CONTRACTOR_SYNC_ROWS_PER_SECOND.set(written / elapsed)
+        if stats["pages"] % 50 == 0:
+            logger.info(f"🔄 Contractor sync: {stats['pages']} pages, {written} rows ({written / max(elapsed, 1e-9):.0f} rows/sec)")
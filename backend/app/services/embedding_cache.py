@@ -0,0 +1,211 @@
+"""
+Embedding Cache
+Content-addressed cache of text embeddings, keyed by (model, dimensions, hash
+of the normalized text). Proposal libraries repeat the same past-performance
+blurbs, corporate overviews and resumes across dozens of documents; each
+distinct text is embedded once and every later copy is a lookup.
+
+Two tiers: an in-process LRU (per worker) in front of the embedding_cache
+table (shared by all workers). Cache failures never fail the caller; the
+texts are embedded as if they had missed.
+"""
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+import hashlib
+import logging
+import re
+import threading
+import time
+import unicodedata
+
+import numpy as np
+from prometheus_client import Counter, Histogram
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.knowledge import EmbeddingCacheEntry
+
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics (hit rate: hits / all lookups; saved spend: saved tokens x model price)
+EMBEDDING_CACHE_LOOKUPS = Counter(
+    'embedding_cache_lookups_total',
+    'Embedding cache lookups by outcome',
+    ['result']  # memory_hit | database_hit | miss
+)
+
+EMBEDDING_CACHE_SAVED_TOKENS = Counter(
+    'embedding_cache_saved_tokens_total',
+    'Embeddings API input tokens not sent because the embedding was cached'
+)
+
+EMBEDDING_CACHE_LOOKUP = Histogram(
+    'embedding_cache_lookup_seconds',
+    'Time to look up a batch of texts in the embedding cache (both tiers)',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5)
+)
+
+_WHITESPACE = re.compile(r"\s+")
+_QUERY_CHUNK = 1000  # Hashes per database lookup
+
+
+def normalize_text(value: str) -> str:
+    """Text as cached and embedded: NFKC, whitespace collapsed, trimmed"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", value or "")).strip()
+
+
+def text_hash(normalized: str) -> str:
+    """Cache key of a normalized text (blake2b, 16 bytes, hex)"""
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier content-addressed embedding cache
+
+    Features:
+    1. LRU of recently used vectors per process, bounded by
+       EMBEDDING_CACHE_MAX_ENTRIES
+    2. Postgres tier shared across workers and restarts; database hits are
+       promoted into the LRU
+    3. Batch lookups and inserts (one query per 1000 texts, one INSERT ...
+       ON CONFLICT DO NOTHING per batch)
+    4. Lookup counts by tier and saved API tokens, per process and as
+       Prometheus metrics
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or settings.EMBEDDING_CACHE_MAX_ENTRIES
+        self._entries: "OrderedDict[Tuple[str, int, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {"memory_hit": 0, "database_hit": 0, "miss": 0, "saved_tokens": 0}
+
+    def get_many(
+        self,
+        db: Optional[Session],
+        model: str,
+        dimensions: int,
+        hashes: Iterable[str]
+    ) -> Dict[str, np.ndarray]:
+        """
+        Cached vectors of the given text hashes
+
+        Args:
+            db: Database session for the shared tier (None: in-process only)
+            model: Embedding model
+            dimensions: Vector dimensions
+            hashes: text_hash() of each normalized text
+
+        Returns:
+            {hash: float32 vector} for the hashes found
+        """
+        started = time.perf_counter()
+        wanted = list(dict.fromkeys(hashes))
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in wanted:
+                vector = self._entries.get((model, dimensions, key))
+                if vector is not None:
+                    self._entries.move_to_end((model, dimensions, key))
+                    found[key] = vector
+        memory_hits = len(found)
+
+        missing = [key for key in wanted if key not in found]
+        if missing and db is not None:
+            try:
+                for start in range(0, len(missing), _QUERY_CHUNK):
+                    rows = db.execute(
+                        select(EmbeddingCacheEntry.content_hash, EmbeddingCacheEntry.vector).where(
+                            EmbeddingCacheEntry.model == model,
+                            EmbeddingCacheEntry.dimensions == dimensions,
+                            EmbeddingCacheEntry.content_hash.in_(missing[start:start + _QUERY_CHUNK])
+                        )
+                    ).all()
+                    for key, vector in rows:
+                        found[key] = np.frombuffer(vector, dtype="<f4")
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"⚠️  Embedding cache lookup failed, embedding uncached: {str(e)}")
+            self._remember(model, dimensions, {key: found[key] for key in missing if key in found})
+
+        database_hits = len(found) - memory_hits
+        self._count("memory_hit", memory_hits)
+        self._count("database_hit", database_hits)
+        self._count("miss", len(wanted) - len(found))
+        EMBEDDING_CACHE_LOOKUP.observe(time.perf_counter() - started)
+        return found
+
+    def put_many(
+        self,
+        db: Optional[Session],
+        model: str,
+        dimensions: int,
+        vectors: Dict[str, np.ndarray]
+    ):
+        """
+        Cache newly embedded vectors (commits the database tier insert)
+
+        Args:
+            db: Database session for the shared tier (None: in-process only)
+            model: Embedding model
+            dimensions: Vector dimensions
+            vectors: {text hash: vector}
+        """
+        if not vectors:
+            return
+        vectors = {key: np.asarray(vector, dtype="<f4") for key, vector in vectors.items()}
+        self._remember(model, dimensions, vectors)
+        if db is None:
+            return
+        try:
+            stmt = pg_insert(EmbeddingCacheEntry).on_conflict_do_nothing(
+                index_elements=["model", "dimensions", "content_hash"]
+            )
+            db.execute(stmt, [
+                {"model": model, "dimensions": dimensions, "content_hash": key, "vector": vector.tobytes()}
+                for key, vector in vectors.items()
+            ])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"⚠️  Embedding cache write failed: {str(e)}")
+
+    def record_saved_tokens(self, tokens: int):
+        """Count API input tokens a cache hit avoided sending"""
+        self._count("saved_tokens", tokens)
+        EMBEDDING_CACHE_SAVED_TOKENS.inc(tokens)
+
+    def stats(self) -> Dict[str, float]:
+        """Lookup counts and hit rate of this process since start"""
+        with self._lock:
+            counts = dict(self._counts)
+            counts["entries"] = len(self._entries)
+        lookups = counts["memory_hit"] + counts["database_hit"] + counts["miss"]
+        counts["hit_rate"] = round((lookups - counts["miss"]) / lookups, 4) if lookups else 0.0
+        return counts
+
+    def clear(self):
+        """Drop the in-process tier (the database tier is untouched)"""
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, model: str, dimensions: int, vectors: Dict[str, np.ndarray]):
+        with self._lock:
+            for key, vector in vectors.items():
+                self._entries[(model, dimensions, key)] = vector
+                self._entries.move_to_end((model, dimensions, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _count(self, result: str, n: int):
+        if not n:
+            return
+        with self._lock:
+            self._counts[result] += n
+        if result != "saved_tokens":
+            EMBEDDING_CACHE_LOOKUPS.labels(result=result).inc(n)
+
+
+embedding_cache = EmbeddingCache()
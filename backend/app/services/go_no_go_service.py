@@ -9,7 +9,9 @@ from sqlalchemy.orm import Session
 from datetime import datetime
 import httpx
 from app.services.llm_service import LLMService
+from app.services.capability_matcher import capability_matcher
 from app.config import settings
+from app.services.http_replay import replay_transport
 
 
 class GoNoGoService:
@@ -140,6 +142,15 @@ class GoNoGoService:
         Assess how well organization capabilities match opportunity requirements
         """
         
+        # Which capabilities the requirement text names (one pass, inflections included)
+        capabilities = [c for c in organization_data.get('capabilities', []) if c]
+        requirement_text = "\n".join(
+            [str(opportunity_data.get('title') or ''), str(opportunity_data.get('description') or '')] +
+            [str(r) for r in opportunity_data.get('key_requirements', [])]
+        )
+        matcher = capability_matcher(capabilities, stemmed=True)
+        mentions = {c: n for c, n in zip(capabilities, matcher.counts(requirement_text)) if n}
+        
         # Use AI to compare requirements with capabilities
         fit_prompt = f"""Assess technical fit between opportunity requirements and organization capabilities.
 
@@ -152,6 +163,7 @@ Key Requirements: {opportunity_data.get('key_requirements', [])}
 ORGANIZATION CAPABILITIES:
 Past Performance: {len(organization_data.get('past_performance', []))} relevant projects
 Capabilities: {', '.join(organization_data.get('capabilities', []))}
+Capabilities Named in Requirements: {', '.join(f"{c} ({n}x)" for c, n in mentions.items()) or 'none'}
 Certifications: {', '.join(organization_data.get('certifications', []))}
 
 SCORE:
@@ -178,7 +190,10 @@ OUTPUT FORMAT (JSON):
         )
         
         import json
-        return json.loads(response)
+        technical_fit = json.loads(response)
+        technical_fit['capability_mentions'] = mentions
+        technical_fit['capability_coverage'] = round(len(mentions) / len(capabilities), 2) if capabilities else 0.0
+        return technical_fit
     
     async def _analyze_competitors(self, opportunity_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -190,7 +205,7 @@ OUTPUT FORMAT (JSON):
         agency = opportunity_data.get('agency')
         
         try:
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(transport=replay_transport()) as client:
                 # Search for recent awards in same NAICS + agency
                 params = {
                     "filters": {
@@ -300,7 +315,7 @@ OUTPUT FORMAT (JSON):
         agency = opportunity_data.get('agency')
         
         try:
-            async with httpx.AsyncClient() as client:
+            async with httpx.AsyncClient(transport=replay_transport()) as client:
                 params = {
                     "filters": {
                         "naics_codes": [naics],
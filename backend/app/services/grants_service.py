@@ -6,8 +6,10 @@ import os
 import logging
 from typing import List, Dict, Optional, Any
 from datetime import datetime, timedelta
-import requests
+import httpx
 from app.config import settings
+from app.services.samgov_client import samgov_client
+from app.services.response_cache import ResponseCache
 
 logger = logging.getLogger(__name__)
 
@@ -21,15 +23,15 @@ class GrantsService:
         self.sam_base_url = "https://api.sam.gov/opportunities/v2/search"
         # Grants.gov API (if available - note: Grants.gov primarily uses XML feeds)
         self.grants_gov_xml_feed = "https://www.grants.gov/grantsws/rest/opportunities"
-        self.cache = {}
         self.cache_ttl = 300  # 5 minutes
+        self.cache = ResponseCache("grants", ttl=self.cache_ttl, stale_ttl=600)
         
         if not self.api_key or self.api_key in ['demo_api_key_12345', 'your_sam_gov_api_key_here']:
             logger.warning("⚠️  SAM_GOV_API_KEY not configured. Using mock grant data.")
         else:
             logger.info(f"✅ Grants API key configured: {self.api_key[:8]}...")
     
-    def search_grants(
+    async def search_grants(
         self,
         keyword: Optional[str] = None,
         agency: Optional[str] = None,
@@ -50,33 +52,11 @@ class GrantsService:
         """
         cache_key = f"grants_search_{keyword}_{agency}_{limit}_{offset}"
         
-        # Check cache
-        if cache_key in self.cache:
-            cached_time, cached_data = self.cache[cache_key]
-            if (datetime.now() - cached_time).seconds < self.cache_ttl:
-                logger.info("📦 Returning cached grant results")
-                return cached_data
-        
         try:
-            if self.api_key and self.api_key not in ['demo_api_key_12345', 'your_sam_gov_api_key_here']:
-                # Try real API
-                items = self._fetch_from_sam_gov(keyword, agency, limit, offset)
-            else:
-                # Use mock data
-                items = self._get_mock_grants(keyword, agency, limit)
-            
-            result = {
-                'items': items,
-                'total': len(items),
-                'page': (offset // limit) + 1,
-                'limit': limit,
-                'offset': offset
-            }
-            
-            # Cache result
-            self.cache[cache_key] = (datetime.now(), result)
-            
-            return result
+            return await self.cache.get_or_set(
+                cache_key,
+                lambda: self._search(keyword, agency, limit, offset)
+            )
             
         except Exception as e:
             logger.error(f"❌ Error searching grants: {str(e)}")
@@ -90,7 +70,30 @@ class GrantsService:
                 'source': 'Mock (API unavailable)'
             }
     
-    def get_grant_detail(self, grant_id: str) -> Dict[str, Any]:
+    async def _search(
+        self,
+        keyword: Optional[str],
+        agency: Optional[str],
+        limit: int,
+        offset: int
+    ) -> Dict[str, Any]:
+        """Search the live API (or mock data when no key is configured)"""
+        if self.api_key and self.api_key not in ['demo_api_key_12345', 'your_sam_gov_api_key_here']:
+            # Try real API
+            items = await self._fetch_from_sam_gov(keyword, agency, limit, offset)
+        else:
+            # Use mock data
+            items = self._get_mock_grants(keyword, agency, limit)
+        
+        return {
+            'items': items,
+            'total': len(items),
+            'page': (offset // limit) + 1,
+            'limit': limit,
+            'offset': offset
+        }
+    
+    async def get_grant_detail(self, grant_id: str) -> Dict[str, Any]:
         """
         Get detailed information about a specific grant
         
@@ -102,14 +105,14 @@ class GrantsService:
         """
         try:
             if self.api_key and self.api_key not in ['demo_api_key_12345']:
-                return self._fetch_grant_detail_from_api(grant_id)
+                return await self._fetch_grant_detail_from_api(grant_id)
             else:
                 return self._get_mock_grant_detail(grant_id)
         except Exception as e:
             logger.error(f"❌ Error fetching grant detail: {str(e)}")
             return self._get_mock_grant_detail(grant_id)
     
-    def _fetch_from_sam_gov(
+    async def _fetch_from_sam_gov(
         self,
         keyword: Optional[str],
         agency: Optional[str],
@@ -137,18 +140,17 @@ class GrantsService:
         logger.info(f"🔄 Fetching grants from SAM.gov: {params}")
         
         try:
-            response = requests.get(
+            response = await samgov_client.get(
                 self.sam_base_url,
-                params=params,
-                headers={'Accept': 'application/json'},
-                timeout=30
+                params=params
             )
             
             logger.info(f"📡 SAM.gov grants response: {response.status_code}")
             
             if response.status_code != 200:
                 logger.error(f"❌ SAM.gov API error: {response.status_code}")
-                return []
+            # Raise rather than return [], so the cache never stores a failed search
+            response.raise_for_status()
             
             data = response.json()
             opportunities = data.get('opportunitiesData', [])
@@ -158,9 +160,9 @@ class GrantsService:
             # Transform to our format
             return [self._transform_grant(opp) for opp in opportunities]
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"❌ SAM.gov request failed: {str(e)}")
-            return []
+            raise e
     
     def _transform_grant(self, opp: Dict[str, Any]) -> Dict[str, Any]:
         """Transform SAM.gov opportunity to grant format"""
@@ -182,7 +184,7 @@ class GrantsService:
             'source': 'SAM.gov'
         }
     
-    def _fetch_grant_detail_from_api(self, grant_id: str) -> Dict[str, Any]:
+    async def _fetch_grant_detail_from_api(self, grant_id: str) -> Dict[str, Any]:
         """Fetch detailed grant information from API"""
         # Similar structure to opportunity detail fetch
         params = {
@@ -191,10 +193,9 @@ class GrantsService:
         }
         
         try:
-            response = requests.get(
+            response = await samgov_client.get(
                 self.sam_base_url,
-                params=params,
-                timeout=30
+                params=params
             )
             
             if response.status_code == 200:
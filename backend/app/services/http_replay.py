@@ -0,0 +1,234 @@
+"""
+Record/replay transport for outbound HTTP
+Records real upstream responses (SAM.gov, USAspending/FPDS) as JSON fixtures,
+and replays them through the local stand-in server so benchmarks and offline
+runs see real round trips without touching the network.
+
+Modes (HTTP_REPLAY_MODE):
+    off     Requests go straight upstream (default)
+    record  Requests go upstream; every response is saved under HTTP_FIXTURES_DIR
+    replay  Requests go to the stand-in server at HTTP_REPLAY_URL
+"""
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Header carrying the original scheme://host of a replayed request
+REPLAY_TARGET_HEADER = "X-Replay-Target"
+
+# Credentials never become part of a fixture key or a recorded URL
+SECRET_PARAMS = {"api_key", "apikey", "api-key", "key", "token"}
+SECRET_HEADERS = {"authorization", "apikey", "x-api-key", "cookie", "set-cookie"}
+
+_SLUG = re.compile(r"[^A-Za-z0-9]+")
+
+
+def _canonical_body(content: bytes) -> bytes:
+    """JSON bodies are keyed by content, not by key order or whitespace"""
+    if not content:
+        return b""
+    try:
+        return json.dumps(json.loads(content), sort_keys=True, separators=(",", ":")).encode("utf-8")
+    except (ValueError, UnicodeDecodeError):
+        return content
+
+
+def _public_query(query: str) -> str:
+    pairs = [(k, v) for k, v in parse_qsl(query, keep_blank_values=True) if k.lower() not in SECRET_PARAMS]
+    return urlencode(sorted(pairs))
+
+
+def fixture_key(method: str, url: str, content: bytes = b"") -> str:
+    """
+    Stable fixture name for a request: <host>/<METHOD>_<path>__<digest>
+
+    The digest covers the method, URL (credentials removed, query sorted) and
+    canonical body, so the same call always maps to the same file.
+    """
+    parts = urlsplit(url)
+    digest = hashlib.sha1(
+        "\n".join([method.upper(), parts.netloc, parts.path, _public_query(parts.query)]).encode("utf-8")
+        + b"\n" + _canonical_body(content)
+    ).hexdigest()[:16]
+    slug = _SLUG.sub("_", parts.path).strip("_") or "root"
+    return f"{parts.netloc}/{method.upper()}_{slug}__{digest}"
+
+
+def route_key(method: str, url: str) -> str:
+    """Fallback key shared by every request to the same method + host + path"""
+    parts = urlsplit(url)
+    return f"{method.upper()} {parts.netloc}{parts.path}"
+
+
+def public_url(url: str) -> str:
+    parts = urlsplit(url)
+    query = _public_query(parts.query)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}" + (f"?{query}" if query else "")
+
+
+def encode_response(status: int, headers: Dict[str, str], content: bytes) -> Dict[str, Any]:
+    """Fixture representation of a response body (JSON, text or base64)"""
+    kept = {
+        k.lower(): v for k, v in headers.items()
+        if k.lower() not in SECRET_HEADERS
+        and k.lower() not in ("content-length", "content-encoding", "transfer-encoding", "connection", "date")
+    }
+    response: Dict[str, Any] = {"status": status, "headers": kept}
+    content_type = kept.get("content-type", "")
+    if "json" in content_type:
+        try:
+            response["json"] = json.loads(content)
+            return response
+        except ValueError:
+            pass
+    if content_type.startswith("text/") or "xml" in content_type:
+        try:
+            response["text"] = content.decode("utf-8")
+            return response
+        except UnicodeDecodeError:
+            pass
+    response["base64"] = base64.b64encode(content).decode("ascii")
+    return response
+
+
+def decode_body(response: Dict[str, Any]) -> bytes:
+    if "json" in response:
+        return json.dumps(response["json"]).encode("utf-8")
+    if "text" in response:
+        return response["text"].encode("utf-8")
+    return base64.b64decode(response.get("base64", ""))
+
+
+class FixtureStore:
+    """JSON fixtures on disk, one file per recorded request"""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or settings.HTTP_FIXTURES_DIR
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/")) + ".json"
+
+    def save(self, request: httpx.Request, status: int, headers: Dict[str, str], content: bytes) -> str:
+        key = fixture_key(request.method, str(request.url), request.content)
+        fixture = {
+            "request": {
+                "method": request.method,
+                "url": public_url(str(request.url)),
+                "body": _canonical_body(request.content).decode("utf-8", errors="replace") or None,
+            },
+            "response": encode_response(status, dict(headers), content),
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+        }
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(fixture, f, indent=2, sort_keys=True)
+        return key
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        """Every fixture under the root, by fixture key"""
+        fixtures = {}
+        if not os.path.isdir(self.root):
+            return fixtures
+        for directory, _, files in os.walk(self.root):
+            for name in sorted(files):
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(directory, name)
+                key = os.path.relpath(path, self.root)[:-len(".json")].replace(os.sep, "/")
+                with open(path, encoding="utf-8") as f:
+                    fixtures[key] = json.load(f)
+        return fixtures
+
+
+class RecordReplayTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that records upstream responses or replays them
+
+    Usage:
+        httpx.AsyncClient(transport=replay_transport())
+    """
+
+    def __init__(
+        self,
+        mode: str,
+        inner: Optional[httpx.AsyncBaseTransport] = None,
+        replay_url: Optional[str] = None,
+        store: Optional[FixtureStore] = None
+    ):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unsupported HTTP replay mode: {mode}")
+        self.mode = mode
+        self.inner = inner or httpx.AsyncHTTPTransport()
+        self.replay_url = httpx.URL(replay_url or settings.HTTP_REPLAY_URL)
+        self.store = store or FixtureStore()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self.mode == "replay":
+            return await self.inner.handle_async_request(self._to_stand_in(request))
+
+        response = await self.inner.handle_async_request(request)
+        content = await response.aread()
+        await response.aclose()
+        try:
+            key = self.store.save(request, response.status_code, dict(response.headers), content)
+            logger.debug(f"📼 Recorded {request.method} {public_url(str(request.url))} as {key}")
+        except OSError as e:
+            logger.warning(f"⚠️  Could not record fixture for {request.url.host}: {str(e)}")
+        headers = [
+            (k, v) for k, v in response.headers.items()
+            if k.lower() not in ("content-encoding", "content-length", "transfer-encoding")
+        ]
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=headers,
+            content=content,
+            request=request,
+            extensions=response.extensions,
+        )
+
+    def _to_stand_in(self, request: httpx.Request) -> httpx.Request:
+        original = request.url
+        url = self.replay_url.copy_with(path=original.path, query=original.query or None)
+        headers = httpx.Headers(request.headers)
+        headers["host"] = url.netloc.decode("ascii")
+        headers[REPLAY_TARGET_HEADER] = f"{original.scheme}://{original.netloc.decode('ascii')}"
+        return httpx.Request(
+            request.method,
+            url,
+            headers=headers,
+            content=request.content,
+            extensions=request.extensions,
+        )
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+
+def replay_transport(**transport_kwargs: Any) -> Optional[httpx.AsyncBaseTransport]:
+    """
+    Transport for outbound clients according to HTTP_REPLAY_MODE
+
+    Returns None when replay is off, so callers keep httpx's default transport.
+    `transport_kwargs` (http2, limits, ...) configure the real transport, since
+    httpx ignores client-level pool settings when a transport is given.
+    """
+    mode = (settings.HTTP_REPLAY_MODE or "off").lower()
+    if mode == "off":
+        return None
+    if mode == "replay":
+        # The stand-in server speaks plain HTTP/1.1
+        transport_kwargs.pop("http2", None)
+    return RecordReplayTransport(mode, inner=httpx.AsyncHTTPTransport(**transport_kwargs))
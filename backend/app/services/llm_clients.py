@@ -0,0 +1,40 @@
+"""
+LLM client factories
+Every OpenAI/Anthropic client is built here, so LLM_PROVIDER=fake can point
+them all at the stand-in server (python -m app.services.replay_server) for
+offline runs and reproducible benchmarks.
+"""
+from typing import Optional
+
+from app.config import settings
+
+FAKE_API_KEY = "fake-llm-key"
+
+
+def fake_llm_enabled() -> bool:
+    """Whether LLM calls go to the stand-in server instead of a real provider"""
+    return (settings.LLM_PROVIDER or "").lower() == "fake"
+
+
+def openai_client(api_key: Optional[str] = None):
+    """Synchronous OpenAI client (the fake provider when LLM_PROVIDER=fake)"""
+    from openai import OpenAI
+    if fake_llm_enabled():
+        return OpenAI(api_key=FAKE_API_KEY, base_url=f"{settings.HTTP_REPLAY_URL.rstrip('/')}/v1")
+    return OpenAI(api_key=api_key)
+
+
+def async_openai_client(api_key: Optional[str] = None):
+    """Async OpenAI client (the fake provider when LLM_PROVIDER=fake)"""
+    from openai import AsyncOpenAI
+    if fake_llm_enabled():
+        return AsyncOpenAI(api_key=FAKE_API_KEY, base_url=f"{settings.HTTP_REPLAY_URL.rstrip('/')}/v1")
+    return AsyncOpenAI(api_key=api_key)
+
+
+def anthropic_client(api_key: Optional[str] = None):
+    """Anthropic client (the fake provider when LLM_PROVIDER=fake)"""
+    import anthropic
+    if fake_llm_enabled():
+        return anthropic.Anthropic(api_key=FAKE_API_KEY, base_url=settings.HTTP_REPLAY_URL.rstrip('/'))
+    return anthropic.Anthropic(api_key=api_key)
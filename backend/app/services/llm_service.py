@@ -3,8 +3,7 @@ Advanced LLM Service - Production-Grade Multi-Provider AI Integration
 Supports OpenAI, Anthropic, and local models with advanced features
 """
 from typing import Optional, List, Dict, Any, Callable
-from openai import OpenAI
-import anthropic
+from app.services.llm_clients import anthropic_client, fake_llm_enabled, openai_client
 import json
 import os
 import asyncio
@@ -41,11 +40,11 @@ class LLMService:
         openai_key = os.getenv("OPENAI_API_KEY")
         anthropic_key = os.getenv("ANTHROPIC_API_KEY")
         
-        if openai_key:
-            self.openai_client = OpenAI(api_key=openai_key)
+        if openai_key or fake_llm_enabled():
+            self.openai_client = openai_client(openai_key)
         
-        if anthropic_key:
-            self.anthropic_client = anthropic.Anthropic(api_key=anthropic_key)
+        if anthropic_key or fake_llm_enabled():
+            self.anthropic_client = anthropic_client(anthropic_key)
         
         # Model configurations
         self.models = {
@@ -0,0 +1,318 @@
+"""
+Nightly Match Scoring Run
+Precomputes every organization's match scores against every active opportunity
+into opportunity_match_scores, so no tenant's first page load scores live.
+
+The work is split into independent shards of (organization, opportunity id
+range). Shards run on a local process pool or as a Celery chord across worker
+nodes, and each commits its scores together with a shard checkpoint: a
+restarted run re-dispatches only the shards that have not committed.
+
+Usage:
+    python -m app.services.match_score_batch --workers 8            # run on this box
+    python -m app.services.match_score_batch --run-id 2026-10-17    # resume a run
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import os
+import socket
+import time
+
+import numpy as np
+from prometheus_client import Histogram
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.match_score import MatchScoreShard, OpportunityMatchScore
+from app.models.opportunity import Opportunity
+from app.models.organization import Organization
+from app.models.sync import SyncCheckpoint
+from app.services.match_score_service import MatchScoreService
+from app.services.opportunity_embeddings import opportunity_embeddings
+from app.services.opportunity_matching_service import OpportunityMatchingService
+
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics
+MATCH_SCORE_SHARD = Histogram(
+    'match_score_shard_seconds',
+    'Time to score one organization against one opportunity id range',
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+)
+
+RUN_CHECKPOINT = "match_scores_nightly"
+DEFAULT_SHARD_SIZE = 50000  # Opportunities per shard
+
+
+def shard_range(bounds: List[Optional[str]], shard: int) -> Tuple[Optional[str], Optional[str]]:
+    """[low, high) opportunity id range of a shard (None bounds are open)"""
+    return bounds[shard], bounds[shard + 1] if shard + 1 < len(bounds) else None
+
+
+class MatchScoreBatchService:
+    """
+    Sharded full rescore of the materialized match score table
+
+    Features:
+    1. Run plan (organizations x opportunity id ranges) fixed in a sync
+       checkpoint, so every dispatch of a run sees the same shards
+    2. Shards reuse MatchScoreService.rescore_organization (upserts plus
+       stale-row cleanup) and commit with their checkpoint row
+    3. Per-shard row counts, timings and worker recorded for the run summary
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_checkpoint(self) -> SyncCheckpoint:
+        """Get (or create) the nightly run's checkpoint"""
+        checkpoint = self.db.query(SyncCheckpoint).filter(SyncCheckpoint.name == RUN_CHECKPOINT).first()
+        if not checkpoint:
+            checkpoint = SyncCheckpoint(name=RUN_CHECKPOINT, status="idle")
+            self.db.add(checkpoint)
+            self.db.commit()
+            self.db.refresh(checkpoint)
+        return checkpoint
+
+    def plan(self, run_id: Optional[str] = None, shard_size: int = DEFAULT_SHARD_SIZE) -> Dict[str, Any]:
+        """
+        Plan a run, or return the existing plan when `run_id` is the current run
+
+        Args:
+            run_id: Run identifier (default: today's UTC date, so a re-trigger resumes)
+            shard_size: Opportunities per shard
+
+        Returns:
+            {"run_id", "shard_size", "bounds": shard lower bounds, "organizations": ids}
+        """
+        run_id = run_id or datetime.now(timezone.utc).date().isoformat()
+        checkpoint = self.get_checkpoint()
+        if checkpoint.cursor and checkpoint.cursor.get("run_id") == run_id:
+            return checkpoint.cursor
+
+        if settings.OPPORTUNITY_EMBEDDINGS_ENABLED:
+            # Descriptions the match score queue could not embed at ingest
+            try:
+                opportunity_embeddings.embed_opportunities(self.db)
+            except Exception as e:
+                self.db.rollback()
+                logger.warning(f"⚠️  Opportunity embeddings incomplete, scoring lexically where missing: {str(e)}")
+
+        conditions = OpportunityMatchingService(self.db).filter_conditions()
+        numbered = select(
+            Opportunity.id,
+            func.row_number().over(order_by=Opportunity.id).label("position")
+        ).where(*conditions).subquery()
+        starts = self.db.execute(
+            select(numbered.c.id).where((numbered.c.position - 1) % shard_size == 0).order_by(numbered.c.id)
+        ).scalars().all()
+
+        organizations = [
+            org_id for org_id, in self.db.query(Organization.id).filter(
+                Organization.is_active.isnot(False),
+                Organization.is_deleted.is_(False)
+            ).order_by(Organization.id)
+        ]
+
+        # The first shard is open below, the last open above: opportunities
+        # created after planning still fall in a shard
+        plan = {
+            "run_id": run_id,
+            "shard_size": shard_size,
+            "bounds": [None] + list(starts[1:]),
+            "organizations": organizations,
+        }
+        checkpoint.cursor = plan
+        checkpoint.status = "running"
+        checkpoint.last_started_at = datetime.now(timezone.utc)
+        checkpoint.last_error = None
+        self.db.commit()
+
+        logger.info(
+            f"🗓️  Match scoring run {run_id}: {len(organizations)} organizations x "
+            f"{len(plan['bounds'])} opportunity shards"
+        )
+        return plan
+
+    def pending(self, plan: Dict[str, Any]) -> List[Tuple[str, int]]:
+        """(organization, shard) pairs of the plan without a committed checkpoint"""
+        done = set(self.db.query(MatchScoreShard.organization_id, MatchScoreShard.shard).filter(
+            MatchScoreShard.run_id == plan["run_id"]
+        ).all())
+        return [
+            (org_id, shard)
+            for org_id in plan["organizations"]
+            for shard in range(len(plan["bounds"]))
+            if (org_id, shard) not in done
+        ]
+
+    def run_shard(self, run_id: str, organization_id: str, shard: int) -> Dict[str, Any]:
+        """
+        Score one organization against one opportunity id range (idempotent)
+
+        Returns:
+            Shard statistics ({"skipped": True} if it already committed or the run is gone)
+        """
+        plan = self.get_checkpoint().cursor or {}
+        if plan.get("run_id") != run_id:
+            logger.warning(f"⚠️  Match scoring run {run_id} was superseded; skipping shard {organization_id}/{shard}")
+            return {"run_id": run_id, "organization_id": organization_id, "shard": shard, "skipped": True}
+
+        key = (run_id, organization_id, shard)
+        if self.db.get(MatchScoreShard, key) is not None:
+            return {"run_id": run_id, "organization_id": organization_id, "shard": shard, "skipped": True}
+
+        started = time.monotonic()
+        rows = MatchScoreService(self.db).rescore_organization(
+            organization_id,
+            id_range=shard_range(plan["bounds"], shard),
+            commit=False
+        )
+        seconds = round(time.monotonic() - started, 3)
+        # Same transaction as the scores: the shard is done exactly when they are
+        self.db.merge(MatchScoreShard(
+            run_id=run_id,
+            organization_id=organization_id,
+            shard=shard,
+            rows=rows,
+            seconds=seconds,
+            worker=f"{socket.gethostname()}:{os.getpid()}"
+        ))
+        self.db.commit()
+
+        MATCH_SCORE_SHARD.observe(seconds)
+        logger.info(f"🧩 Match scoring shard {organization_id}/{shard}: {rows} scores in {seconds}s")
+        return {"run_id": run_id, "organization_id": organization_id, "shard": shard, "rows": rows, "seconds": seconds}
+
+    def finish(self, run_id: str, error: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Close a run: drop scores of organizations no longer scored, summarize
+        per-shard timings into the checkpoint and prune older runs' shards
+
+        Args:
+            run_id: Run to close
+            error: Why the run stopped early (chord error callback), recorded
+                   when shards are still pending
+
+        Returns:
+            Run summary
+        """
+        checkpoint = self.get_checkpoint()
+        plan = checkpoint.cursor or {}
+        if plan.get("run_id") != run_id:
+            return {"run_id": run_id, "skipped": True}
+
+        shards = self.db.query(MatchScoreShard).filter(MatchScoreShard.run_id == run_id).all()
+        pending = len(self.pending(plan))
+        seconds = np.array([s.seconds for s in shards], dtype=np.float64)
+        slowest = max(shards, key=lambda s: s.seconds, default=None)
+        stats: Dict[str, Any] = {
+            "run_id": run_id,
+            "organizations": len(plan["organizations"]),
+            "shards": len(shards),
+            "pending_shards": pending,
+            "rows": sum(s.rows for s in shards),
+            "shard_seconds": {
+                "total": round(float(seconds.sum()), 2),
+                "p50": round(float(np.percentile(seconds, 50)), 3) if len(seconds) else 0.0,
+                "p95": round(float(np.percentile(seconds, 95)), 3) if len(seconds) else 0.0,
+                "max": round(float(seconds.max()), 3) if len(seconds) else 0.0,
+            },
+            "slowest_shard": {
+                "organization_id": slowest.organization_id,
+                "shard": slowest.shard,
+                "worker": slowest.worker,
+            } if slowest else None,
+            "workers": len({s.worker for s in shards}),
+        }
+        if checkpoint.last_started_at:
+            stats["wall_seconds"] = round(
+                (datetime.now(timezone.utc) - checkpoint.last_started_at).total_seconds(), 2
+            )
+
+        if not pending:
+            active = select(Organization.id).where(
+                Organization.is_active.isnot(False),
+                Organization.is_deleted.is_(False)
+            )
+            stats["removed_organizations_rows"] = self.db.query(OpportunityMatchScore).filter(
+                OpportunityMatchScore.organization_id.notin_(active)
+            ).delete(synchronize_session=False)
+            self.db.query(MatchScoreShard).filter(
+                MatchScoreShard.run_id != run_id
+            ).delete(synchronize_session=False)
+            checkpoint.status = "idle"
+            checkpoint.last_success_at = datetime.now(timezone.utc)
+        else:
+            checkpoint.status = "failed"
+            checkpoint.last_error = f"{pending} shards did not complete" + (f": {error}" if error else "")
+        checkpoint.stats = stats
+        self.db.commit()
+
+        logger.info(
+            f"✅ Match scoring run {run_id}: {stats['rows']} scores in {stats['shards']} shards "
+            f"(p50 {stats['shard_seconds']['p50']}s, max {stats['shard_seconds']['max']}s, {pending} pending)"
+        )
+        return stats
+
+
+def _init_worker():
+    """Process pool initializer: never reuse the parent's pooled connections"""
+    from app.core.database import engine
+    engine.dispose(close=False)
+
+
+def _run_shard(args: Tuple[str, str, int]) -> Dict[str, Any]:
+    from app.core.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return MatchScoreBatchService(db).run_shard(*args)
+    finally:
+        db.close()
+
+
+def run_local(
+    run_id: Optional[str] = None,
+    workers: Optional[int] = None,
+    shard_size: int = DEFAULT_SHARD_SIZE
+) -> Dict[str, Any]:
+    """Run (or resume) a full scoring run on this machine's cores"""
+    from app.core.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        service = MatchScoreBatchService(db)
+        plan = service.plan(run_id, shard_size)
+        shards = [(plan["run_id"], org_id, shard) for org_id, shard in service.pending(plan)]
+        db.commit()  # Release the connection before forking
+
+        # Each shard logs and checkpoints itself; a failed one stays pending for the next dispatch
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker) as pool:
+            futures = [pool.submit(_run_shard, shard) for shard in shards]
+            for future, (_, org_id, shard) in zip(futures, shards):
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"❌ Match scoring shard {org_id}/{shard} failed: {str(e)}")
+
+        return service.finish(plan["run_id"])
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Precompute every organization's opportunity match scores")
+    parser.add_argument("--run-id", help="Run to start or resume (default: today's UTC date)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="Opportunities per shard")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(run_local(args.run_id, args.workers, args.shard_size), indent=2, default=str))
@@ -0,0 +1,490 @@
+"""
+Materialized Match Score Service
+Keeps the opportunity_match_scores table (organization x opportunity) current
+so top recommendations are an indexed read instead of a full scoring scan.
+
+Changes are tracked incrementally: committing a new or changed opportunity
+queues that opportunity (rescored across every organization), and a changed
+organization profile or past performance queues that organization (rescored
+across every opportunity). Queued ids live in Redis sets and are drained by
+the matching.process_dirty_scores Celery task.
+
+Usage:
+    python -m app.services.match_score_service --org <id>   # rescore one organization
+    python -m app.services.match_score_service --all        # queue every organization
+    python -m app.services.match_score_service --drain      # process the queue now
+"""
+from itertools import chain
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+import time
+import uuid
+
+import numpy as np
+from prometheus_client import Counter, Histogram
+from sqlalchemy import event, func, inspect
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.knowledge import PastPerformance
+from app.models.match_score import OpportunityMatchScore
+from app.models.opportunity import Opportunity
+from app.models.organization import Organization
+from app.services.opportunity_embeddings import opportunity_embeddings
+from app.services.opportunity_match_scoring import FACTORS, PROFILE_ATTRIBUTES, SCORE_COLUMNS
+from app.services.opportunity_matching_service import OpportunityMatchingService
+
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics
+MATCH_SCORE_RESCORE = Histogram(
+    'match_score_rescore_seconds',
+    'Time to rescore a batch of dirty opportunities or one dirty organization',
+    ['kind'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+MATCH_SCORE_ROWS = Counter(
+    'match_score_rows_written_total',
+    'Organization x opportunity match scores written to the materialized table'
+)
+
+DIRTY_OPPORTUNITIES = "match_scores:dirty:opportunities"
+DIRTY_ORGANIZATIONS = "match_scores:dirty:organizations"
+DRAIN_LOCK = "match_scores:drain_lock"
+
+# Attributes whose changes invalidate stored scores
+OPPORTUNITY_ATTRIBUTES = tuple(name for name in SCORE_COLUMNS if name != "capability_hits") + ("title", "description", "is_deleted")
+ORGANIZATION_ATTRIBUTES = PROFILE_ATTRIBUTES + ("is_active", "is_deleted")
+PAST_PERFORMANCE_ATTRIBUTES = ("organization_id", "customer_agency", "end_date", "contract_value")
+
+_FACTOR_COLUMNS = {factor: f"{factor}_score" for factor in FACTORS}
+_WRITE_BATCH = 5000
+_PENDING = "match_scores_dirty"  # Session.info key: ids changed in the open transaction
+
+# Compare-and-delete, so a drain never releases a lock that expired and was taken by another worker
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class DirtyQueue:
+    """
+    Redis sets of opportunity and organization ids awaiting a rescore
+
+    Fails open like the response cache: while Redis is unreachable, marks are
+    dropped (the nightly scoring run rewrites every organization) and the
+    queue reads as empty.
+    """
+
+    def __init__(self, cooldown_seconds: float = 30.0):
+        self.cooldown_seconds = cooldown_seconds
+        self._client = None
+        self._down_until = 0.0
+
+    def _redis(self):
+        if time.monotonic() < self._down_until:
+            return None
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(
+                settings.REDIS_URL,
+                socket_connect_timeout=0.5,
+                socket_timeout=2.0,
+                decode_responses=True
+            )
+        return self._client
+
+    def _mark_down(self, error: Exception):
+        logger.warning(f"⚠️  Redis unavailable for match score queue: {str(error)}")
+        self._down_until = time.monotonic() + self.cooldown_seconds
+
+    def add(self, key: str, ids: Iterable[Any]) -> int:
+        ids = [str(i) for i in ids if i]
+        client = self._redis()
+        if not ids or client is None:
+            return 0
+        try:
+            return client.sadd(key, *ids)
+        except Exception as e:
+            self._mark_down(e)
+            return 0
+
+    def pop(self, key: str, count: int) -> List[str]:
+        client = self._redis()
+        if client is None:
+            return []
+        try:
+            return client.spop(key, count) or []
+        except Exception as e:
+            self._mark_down(e)
+            return []
+
+    def size(self, key: str) -> int:
+        client = self._redis()
+        if client is None:
+            return 0
+        try:
+            return client.scard(key)
+        except Exception as e:
+            self._mark_down(e)
+            return 0
+
+    def acquire(self, key: str, ttl_seconds: int) -> Optional[str]:
+        """Take a Redis lock; returns its token, or None if held elsewhere (or Redis is down)"""
+        client = self._redis()
+        if client is None:
+            return None
+        token = uuid.uuid4().hex
+        try:
+            return token if client.set(key, token, nx=True, ex=ttl_seconds) else None
+        except Exception as e:
+            self._mark_down(e)
+            return None
+
+    def release(self, key: str, token: str):
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            client.eval(_RELEASE_SCRIPT, 1, key, token)
+        except Exception as e:
+            self._mark_down(e)
+
+
+dirty_queue = DirtyQueue()
+
+
+def mark_dirty(opportunity_ids: Iterable[Any] = (), organization_ids: Iterable[Any] = ()):
+    """Queue opportunities and organizations for a rescore"""
+    dirty_queue.add(DIRTY_OPPORTUNITIES, opportunity_ids)
+    dirty_queue.add(DIRTY_ORGANIZATIONS, organization_ids)
+
+
+def id_range_conditions(column, id_range: Optional[Tuple[Optional[str], Optional[str]]]) -> List:
+    """column >= low and column < high for an id range (None bounds are open)"""
+    low, high = id_range or (None, None)
+    conditions = []
+    if low is not None:
+        conditions.append(column >= low)
+    if high is not None:
+        conditions.append(column < high)
+    return conditions
+
+
+def _changed(obj: Any, names: Tuple[str, ...]) -> bool:
+    attrs = inspect(obj).attrs
+    return any(name in attrs and attrs[name].history.has_changes() for name in names)
+
+
+def _collect_changes(session: Session, flush_context):
+    """after_flush: remember which scored rows this transaction touched"""
+    pending = session.info.setdefault(_PENDING, {"opportunities": set(), "organizations": set()})
+    created_or_deleted = set(chain(session.new, session.deleted))
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Opportunity):
+            if obj in created_or_deleted or _changed(obj, OPPORTUNITY_ATTRIBUTES):
+                pending["opportunities"].add(obj.id)
+        elif isinstance(obj, Organization):
+            if obj in created_or_deleted or _changed(obj, ORGANIZATION_ATTRIBUTES):
+                pending["organizations"].add(obj.id)
+        elif isinstance(obj, PastPerformance):
+            if obj in created_or_deleted or _changed(obj, PAST_PERFORMANCE_ATTRIBUTES):
+                # A reference moved between organizations changes both
+                history = inspect(obj).attrs["organization_id"].history
+                pending["organizations"].update(chain([obj.organization_id], history.deleted or ()))
+
+
+def _queue_changes(session: Session):
+    """after_commit: queue what the transaction changed (never before it is visible)"""
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        mark_dirty(pending["opportunities"], pending["organizations"])
+
+
+def _discard_changes(session: Session):
+    session.info.pop(_PENDING, None)
+
+
+def track_changes():
+    """
+    Queue rescores for committed ORM changes to opportunities, organizations
+    and past performance (idempotent). Bulk Core writes bypass the ORM and
+    must call mark_dirty themselves.
+    """
+    if not event.contains(Session, "after_flush", _collect_changes):
+        event.listen(Session, "after_flush", _collect_changes)
+        event.listen(Session, "after_commit", _queue_changes)
+        event.listen(Session, "after_rollback", _discard_changes)
+
+
+class MatchScoreService:
+    """
+    Incremental maintenance and reads of the materialized match score table
+
+    Features:
+    1. Indexed top-N reads (ORDER BY overall_score DESC LIMIT k) with the
+       recommendation filters applied through a join
+    2. Rescore of one organization across every opportunity
+    3. Rescore of a set of opportunities across every organization
+    4. Redis dirty-set draining under a single-drainer lock
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.matching = OpportunityMatchingService(db)
+
+    def top(
+        self,
+        organization_id: str,
+        limit: int = 25,
+        filters: Optional[Dict] = None
+    ) -> Optional[List[Tuple[Opportunity, Dict[str, float], float]]]:
+        """
+        Best stored matches for an organization
+
+        Args:
+            organization_id: Organization ID
+            limit: Number of matches
+            filters: Recommendation filters (see OpportunityMatchingService.filter_conditions)
+
+        Returns:
+            (opportunity, factor scores, overall score) best first, or None when
+            the organization has not been scored yet
+        """
+        rows = self.db.query(OpportunityMatchScore, Opportunity).join(
+            Opportunity, Opportunity.id == OpportunityMatchScore.opportunity_id
+        ).filter(
+            OpportunityMatchScore.organization_id == organization_id,
+            *self.matching.filter_conditions(filters)
+        ).order_by(
+            OpportunityMatchScore.overall_score.desc(),
+            OpportunityMatchScore.opportunity_id
+        ).limit(limit).all()
+
+        if not rows and not self.is_scored(organization_id):
+            return None
+
+        return [
+            (
+                opp,
+                {factor: getattr(score_row, column) for factor, column in _FACTOR_COLUMNS.items()},
+                score_row.overall_score
+            )
+            for score_row, opp in rows
+        ]
+
+    def is_scored(self, organization_id: str) -> bool:
+        """Whether the organization has materialized scores"""
+        return self.db.query(OpportunityMatchScore.opportunity_id).filter(
+            OpportunityMatchScore.organization_id == organization_id
+        ).limit(1).first() is not None
+
+    def rescore_organization(
+        self,
+        organization_id: str,
+        id_range: Optional[Tuple[Optional[str], Optional[str]]] = None,
+        commit: bool = True
+    ) -> int:
+        """
+        Rewrite an organization's stored scores (removed if it is inactive or deleted)
+
+        Args:
+            organization_id: Organization ID
+            id_range: Only opportunities with low <= id < high (None bounds are open)
+            commit: Commit the rewrite (callers adding their own bookkeeping pass False)
+
+        Returns:
+            Number of scores written
+        """
+        started = time.monotonic()
+        written = 0
+        org = self._scored_organizations().filter(Organization.id == organization_id).first()
+        if org is not None:
+            # Fresh service: past performance is re-read, never taken from an earlier rescore
+            matching = OpportunityMatchingService(self.db)
+            for batch in matching.score_all(org, id_range=id_range):
+                written += self._write(org.id, batch)
+
+        self._delete_stale(
+            OpportunityMatchScore.organization_id == organization_id,
+            *id_range_conditions(OpportunityMatchScore.opportunity_id, id_range)
+        )
+        if commit:
+            self.db.commit()
+        MATCH_SCORE_RESCORE.labels(kind="organization").observe(time.monotonic() - started)
+        return written
+
+    def rescore_opportunities(self, opportunity_ids: List[str]) -> int:
+        """
+        Rewrite the stored scores of these opportunities across every organization
+        (removed for opportunities that were deleted or are no longer active).
+        New or edited descriptions are embedded first.
+
+        Returns:
+            Number of scores written
+        """
+        if not opportunity_ids:
+            return 0
+
+        started = time.monotonic()
+        if settings.OPPORTUNITY_EMBEDDINGS_ENABLED:
+            try:
+                opportunity_embeddings.embed_opportunities(self.db, opportunity_ids)
+            except Exception as e:
+                # Scored lexically for now; the nightly run embeds what is missing
+                self.db.rollback()
+                logger.warning(f"⚠️  Could not embed {len(opportunity_ids)} opportunities: {str(e)}")
+        written = 0
+        matching = OpportunityMatchingService(self.db)
+        for org in self._scored_organizations().all():
+            for batch in matching.score_all(org, opportunity_ids):
+                written += self._write(org.id, batch)
+
+        self._delete_stale(OpportunityMatchScore.opportunity_id.in_(opportunity_ids))
+        self.db.commit()
+        MATCH_SCORE_RESCORE.labels(kind="opportunities").observe(time.monotonic() - started)
+        return written
+
+    def process_dirty(
+        self,
+        max_seconds: float = 60.0,
+        opportunity_batch: int = 1000
+    ) -> Dict[str, Any]:
+        """
+        Drain the dirty queues until empty or `max_seconds` have passed
+
+        Only one drainer runs at a time, so an older rescore can never commit
+        over a newer one. Ids popped by a failed rescore are queued again.
+
+        Returns:
+            Run statistics
+        """
+        stats = {"opportunities": 0, "organizations": 0, "rows": 0}
+        token = dirty_queue.acquire(DRAIN_LOCK, ttl_seconds=int(max_seconds) + 15 * 60)
+        if token is None:
+            return {**stats, "skipped": True}
+
+        started = time.monotonic()
+        try:
+            while time.monotonic() - started < max_seconds:
+                opportunity_ids = dirty_queue.pop(DIRTY_OPPORTUNITIES, opportunity_batch)
+                if opportunity_ids:
+                    self._drain(DIRTY_OPPORTUNITIES, opportunity_ids, self.rescore_opportunities, stats)
+                    stats["opportunities"] += len(opportunity_ids)
+                    continue
+
+                organization_ids = dirty_queue.pop(DIRTY_ORGANIZATIONS, 1)
+                if not organization_ids:
+                    break
+                self._drain(DIRTY_ORGANIZATIONS, organization_ids, self.rescore_organization, stats)
+                stats["organizations"] += 1
+        finally:
+            dirty_queue.release(DRAIN_LOCK, token)
+
+        stats["duration_seconds"] = round(time.monotonic() - started, 2)
+        stats["remaining"] = {
+            "opportunities": dirty_queue.size(DIRTY_OPPORTUNITIES),
+            "organizations": dirty_queue.size(DIRTY_ORGANIZATIONS),
+        }
+        if stats["opportunities"] or stats["organizations"]:
+            logger.info(
+                f"🎯 Rescored {stats['opportunities']} opportunities and {stats['organizations']} organizations "
+                f"({stats['rows']} match scores) in {stats['duration_seconds']}s"
+            )
+        return stats
+
+    def queue_all_organizations(self) -> int:
+        """Queue every scored organization (e.g. after a change to the scoring itself)"""
+        ids = [org_id for org_id, in self._scored_organizations().with_entities(Organization.id)]
+        mark_dirty(organization_ids=ids)
+        return len(ids)
+
+    def _drain(self, key: str, ids: List[str], rescore, stats: Dict[str, Any]):
+        try:
+            stats["rows"] += rescore(ids[0] if key == DIRTY_ORGANIZATIONS else ids)
+        except Exception:
+            self.db.rollback()
+            dirty_queue.add(key, ids)
+            raise
+
+    def _scored_organizations(self):
+        return self.db.query(Organization).filter(
+            Organization.is_active.isnot(False),
+            Organization.is_deleted.is_(False)
+        )
+
+    def _delete_stale(self, *conditions):
+        """
+        Remove matching scores this transaction did not (re)write: pairs that
+        are no longer scored. Rows from rescores that started later are kept.
+        """
+        self.db.query(OpportunityMatchScore).filter(
+            *conditions,
+            OpportunityMatchScore.scored_at < func.now()
+        ).delete(synchronize_session=False)
+
+    def _write(self, organization_id: str, batch: Dict[str, np.ndarray]) -> int:
+        """
+        Upsert one scored batch, stamped with the transaction start (now()). A
+        row is only replaced by a rescore that started no earlier than the one
+        that wrote it, so overlapping rescores (queue drains, nightly shards)
+        never regress a pair to older data.
+        """
+        factors = {factor: batch[factor].tolist() for factor in FACTORS}
+        overall = batch["overall"].tolist()
+        rows = [
+            {
+                "organization_id": organization_id,
+                "opportunity_id": opp_id,
+                "overall_score": overall[i],
+                "grade": self.matching._get_match_grade(overall[i]),
+                **{column: factors[factor][i] for factor, column in _FACTOR_COLUMNS.items()},
+            }
+            for i, opp_id in enumerate(batch["id"].tolist())
+        ]
+
+        for start in range(0, len(rows), _WRITE_BATCH):
+            stmt = pg_insert(OpportunityMatchScore)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["organization_id", "opportunity_id"],
+                set_={
+                    column: stmt.excluded[column]
+                    for column in ["overall_score", "grade", *_FACTOR_COLUMNS.values(), "scored_at"]
+                },
+                where=OpportunityMatchScore.scored_at <= stmt.excluded.scored_at
+            )
+            self.db.execute(stmt, rows[start:start + _WRITE_BATCH])
+
+        MATCH_SCORE_ROWS.inc(len(rows))
+        return len(rows)
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    from app.core.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Maintain materialized opportunity match scores")
+    parser.add_argument("--org", action="append", default=[], help="Rescore this organization now")
+    parser.add_argument("--all", action="store_true", help="Queue every organization for a rescore")
+    parser.add_argument("--drain", action="store_true", help="Process the dirty queues")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    session = SessionLocal()
+    try:
+        service = MatchScoreService(session)
+        for org_id in args.org:
+            print(f"{org_id}: {service.rescore_organization(org_id)} scores")
+        if args.all:
+            print(f"Queued {service.queue_all_organizations()} organizations")
+        if args.drain:
+            print(json.dumps(service.process_dirty(max_seconds=24 * 3600), indent=2))
+    finally:
+        session.close()
@@ -0,0 +1,307 @@
+"""
+NAICS Hierarchy
+The 2022 NAICS code tree (sectors, subsectors, industry groups, industries,
+national industries) with titles and SBA size standards, loaded once from the
+bundled app/data/naics_2022.csv. Replaces ad hoc prefix slicing such as
+str(code)[:2]: sectors span several prefixes (31-33 Manufacturing, 44-45
+Retail Trade, 48-49 Transportation), which slicing gets wrong.
+
+Every node knows its ancestors and the contiguous range of 6-digit codes
+beneath it (codes are numbered in tree order), so ancestor, descendant and
+"all codes under 5415" lookups are O(1) without walking the tree.
+
+Size standards: the SBA table of 13 CFR 121.201 (effective 2023-03-17) for
+every 6-digit industry it covers, as average annual receipts in $ millions,
+employees, or total assets in $ millions (banks and credit card issuers).
+Public administration (92), private households, monetary authorities and a
+few other industries have no SBA standard and report none.
+"""
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+import csv
+import os
+import re
+
+import numpy as np
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "naics_2022.csv")
+
+SECTOR_RANGE = re.compile(r"\d{2}-\d{2}")
+
+LEVELS = {2: "sector", 3: "subsector", 4: "industry_group", 5: "industry", 6: "national_industry"}
+
+
+class SizeStandard(NamedTuple):
+    value: float
+    unit: str  # "$M" (average annual receipts), "employees" or "$M assets"
+
+    def describe(self) -> str:
+        if self.unit == "$M":
+            return f"${self.value:g}M"
+        if self.unit == "$M assets":
+            return f"${self.value:g}M in assets"
+        return f"{self.value:,.0f} employees"
+
+
+class NaicsNode:
+    """One code in the tree"""
+
+    __slots__ = ("code", "title", "depth", "parent", "children", "path", "first", "stop", "size_standard")
+
+    def __init__(self, code: str, title: str, size_standard: Optional[SizeStandard]):
+        self.code = code
+        self.title = title
+        self.depth = 0                 # 1 (sector) .. 5 (6-digit national industry)
+        self.parent: Optional["NaicsNode"] = None
+        self.children: List["NaicsNode"] = []
+        self.path: Tuple["NaicsNode", ...] = ()  # Sector first, this node last
+        self.first = 0                 # [first, stop): this node's 6-digit codes in tree order
+        self.stop = 0
+        self.size_standard = size_standard
+
+    @property
+    def level(self) -> str:
+        return LEVELS[self.depth + 1]
+
+    def __repr__(self) -> str:
+        return f"NaicsNode({self.code!r}, {self.title!r})"
+
+
+class NaicsHierarchy:
+    """
+    Trie over the NAICS code tree
+
+    Features:
+    1. Lookup by code, by sector alias ("31" -> 31-33) or by the longest
+       known prefix (codes retired from older NAICS editions still resolve
+       to their industry)
+    2. O(1) ancestor tests and descendant ranges from precomputed paths and
+       tree-order intervals
+    3. Distance and similarity scoring through the deepest common ancestor
+    4. Expansion of any mix of 2-6 digit codes to 6-digit codes, as a list
+       or as a bitmap over the 6-digit code space
+    5. Titles and size standards
+    """
+
+    def __init__(self, rows: Iterable[Tuple[str, str, Optional[SizeStandard]]]):
+        self._nodes: Dict[str, NaicsNode] = {}
+        sectors: List[NaicsNode] = []
+        for code, title, size_standard in rows:
+            node = NaicsNode(code, title, size_standard)
+            self._nodes[code] = node
+            if "-" in code:
+                low, high = code.split("-")
+                for prefix in range(int(low), int(high) + 1):
+                    self._nodes[str(prefix)] = node
+            if len(code) == 2 or "-" in code:
+                sectors.append(node)
+
+        for code, node in list(self._nodes.items()):
+            if node.code != code or node in sectors:
+                continue
+            node.parent = self._nodes[code[:-1]] if len(code) > 3 else self._nodes[code[:2]]
+            node.parent.children.append(node)
+
+        self.codes: List[str] = []  # 6-digit codes in tree order
+        for sector in sorted(sectors, key=lambda n: n.code):
+            self._number(sector, ())
+
+    def _number(self, node: NaicsNode, path: Tuple[NaicsNode, ...]):
+        node.path = path + (node,)
+        node.depth = len(node.path)
+        node.first = len(self.codes)
+        node.children.sort(key=lambda n: n.code)
+        if node.children:
+            for child in node.children:
+                self._number(child, node.path)
+        else:
+            self.codes.append(node.code)
+        node.stop = len(self.codes)
+
+    @classmethod
+    def load(cls, path: str = DATA_PATH) -> "NaicsHierarchy":
+        """Read the bundled code table (code, title, size_standard, size_unit)"""
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = [
+                (
+                    row["code"],
+                    row["title"],
+                    SizeStandard(float(row["size_standard"]), row["size_unit"]) if row["size_standard"] else None
+                )
+                for row in csv.DictReader(f)
+            ]
+        return cls(rows)
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def normalize(code) -> str:
+        """Digits of a code as stored or sent ("541512", 541512, " 5415 "); sector ranges ("31-33") kept"""
+        if code is None:
+            return ""
+        if isinstance(code, float) and code.is_integer():
+            code = int(code)
+        text = str(code).strip()
+        if SECTOR_RANGE.fullmatch(text):
+            return text
+        return "".join(c for c in text if c.isdigit())[:6]
+
+    def get(self, code) -> Optional[NaicsNode]:
+        """The node for exactly this code"""
+        return self._nodes.get(self.normalize(code))
+
+    def resolve(self, code) -> Optional[NaicsNode]:
+        """The node for this code, or for its longest known prefix"""
+        digits = self.normalize(code)
+        for length in range(len(digits), 1, -1):
+            node = self._nodes.get(digits[:length])
+            if node is not None:
+                return node
+        return None
+
+    def title(self, code) -> Optional[str]:
+        node = self.get(code)
+        return node.title if node else None
+
+    def size_standard(self, code) -> Optional[SizeStandard]:
+        node = self.get(code)
+        return node.size_standard if node else None
+
+    def sector(self, code) -> Optional[str]:
+        """Sector code ("54", "31-33") of a code"""
+        node = self.resolve(code)
+        return node.path[0].code if node else None
+
+    def _locate(self, code) -> Optional[Tuple[Tuple[NaicsNode, ...], int]]:
+        """
+        (known path, depth) of a code; a code missing from this edition sits
+        one level below its longest known prefix
+        """
+        digits = self.normalize(code)
+        node = self.resolve(digits)
+        if node is None:
+            return None
+        exact = self._nodes.get(digits) is node
+        return node.path, node.depth if exact else node.depth + 1
+
+    def ancestors(self, code) -> List[str]:
+        """Codes above this one, sector first"""
+        located = self._locate(code)
+        if located is None:
+            return []
+        path, depth = located
+        return [n.code for n in path[:depth - 1]]
+
+    def descendants(self, code) -> List[str]:
+        """6-digit codes under this code (the code itself when it is 6-digit)"""
+        node = self.get(code)
+        return self.codes[node.first:node.stop] if node else []
+
+    def is_ancestor(self, ancestor, code) -> bool:
+        """Whether `ancestor` is above `code` in the tree"""
+        above, located = self.get(ancestor), self._locate(code)
+        if above is None or located is None:
+            return False
+        path, depth = located
+        return above.depth < depth and path[above.depth - 1] is above
+
+    def covers(self, code, candidate) -> bool:
+        """Whether `candidate` is `code` or falls under it (a filter for "5415" admits 541512)"""
+        code_digits, candidate_digits = self.normalize(code), self.normalize(candidate)
+        if not code_digits or not candidate_digits:
+            return False
+        return code_digits == candidate_digits or self.is_ancestor(code_digits, candidate_digits)
+
+    # ------------------------------------------------------------------
+    # Distance
+    # ------------------------------------------------------------------
+
+    def _shared_depth(self, a, b) -> Optional[Tuple[int, int, int]]:
+        """(depth of a, depth of b, depth of their deepest common ancestor); None if either is unknown"""
+        first, second = self._locate(a), self._locate(b)
+        if first is None or second is None:
+            return None
+        shared = 0
+        for x, y in zip(first[0][:first[1]], second[0][:second[1]]):
+            if x is not y:
+                break
+            shared += 1
+        return first[1], second[1], shared
+
+    def common_ancestor(self, a, b) -> Optional[NaicsNode]:
+        """Deepest code both codes are (or are under); None across sectors"""
+        depths = self._shared_depth(a, b)
+        if depths is None or not depths[2]:
+            return None
+        return self.resolve(a).path[depths[2] - 1]
+
+    def distance(self, a, b) -> Optional[int]:
+        """Tree edges between two codes (codes in different sectors meet at a virtual root); None if unknown"""
+        if self.normalize(a) and self.normalize(a) == self.normalize(b):
+            return 0
+        depths = self._shared_depth(a, b)
+        if depths is None:
+            return None
+        first, second, shared = depths
+        return first + second - 2 * shared
+
+    def similarity(self, a, b) -> float:
+        """
+        1.0 for the same code, otherwise the depth of the deepest common
+        ancestor over the deeper code's depth: two 6-digit codes in one 5-digit
+        industry score 0.8, in one sector 0.2, in different sectors 0.0
+        """
+        if self.normalize(a) and self.normalize(a) == self.normalize(b):
+            return 1.0
+        depths = self._shared_depth(a, b)
+        if depths is None:
+            return 0.0
+        first, second, shared = depths
+        return shared / max(first, second)
+
+    def best_match(self, code, candidates: Iterable) -> Tuple[Optional[str], float]:
+        """The candidate most similar to `code`, with its similarity"""
+        best, best_score = None, 0.0
+        for candidate in candidates or []:
+            score = self.similarity(code, candidate)
+            if score > best_score:
+                best, best_score = candidate, score
+        return best, best_score
+
+    def shares_sector(self, code, candidates: Iterable) -> bool:
+        """Whether any candidate is in the same sector as `code`"""
+        sector = self.sector(code)
+        return sector is not None and any(self.sector(c) == sector for c in candidates or [])
+
+    # ------------------------------------------------------------------
+    # Expansion
+    # ------------------------------------------------------------------
+
+    def expand(self, codes: Iterable) -> List[str]:
+        """
+        6-digit codes covered by any of `codes` (2-6 digits), in tree order.
+        Codes not in this edition are kept as given, so exact filters on
+        older codes still match.
+        """
+        digits = [d for d in (self.normalize(c) for c in codes or []) if d]
+        unknown = sorted({d for d in digits if d not in self._nodes})
+        return [self.codes[i] for i in np.flatnonzero(self.mask(digits))] + unknown
+
+    def mask(self, codes: Iterable) -> np.ndarray:
+        """Bitmap over `codes` (the 6-digit code space) of the codes covered by any of `codes`"""
+        mask = np.zeros(len(self.codes), dtype=bool)
+        for code in codes or []:
+            node = self.get(code)
+            if node is not None:
+                mask[node.first:node.stop] = True
+        return mask
+
+    def index(self, code) -> int:
+        """Position of a 6-digit code in `codes` (-1 if not a current 6-digit code)"""
+        digits = self.normalize(code)
+        node = self._nodes.get(digits)
+        return node.first if node is not None and len(digits) == 6 else -1
+
+
+naics_hierarchy = NaicsHierarchy.load()
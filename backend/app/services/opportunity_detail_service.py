@@ -0,0 +1,158 @@
+"""
+SAM.gov Opportunity Detail Cache
+Serves detail pages from Postgres and refreshes them conditionally, so the most
+viewed route does not wait on SAM.gov
+"""
+from typing import Dict, Optional, Any
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import asyncio
+import hashlib
+import json
+import logging
+
+from app.config import settings
+from app.models.sam_opportunity import SAMOpportunity, SAMOpportunityDetail
+from app.services.samgov_service import samgov_service
+
+logger = logging.getLogger(__name__)
+
+# Background refresh tasks (kept referenced until done) and the notices they cover
+_background = set()
+_refreshing = set()
+
+
+def _hash(value: Any) -> str:
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+def _modified_marker(notice: Dict[str, Any]) -> Optional[str]:
+    """SAM.gov's change marker for a notice (amendments re-post when modifiedDate is absent)"""
+    marker = notice.get('modifiedDate') or notice.get('postedDate')
+    return str(marker)[:50] if marker else None
+
+
+class OpportunityDetailService:
+    """
+    Persistent, change-detecting cache for opportunity detail lookups
+
+    Features:
+    1. Detail, raw payload hash and extracted sections stored per noticeId
+    2. Mirrored notices are built from the local mirror payload (no API call)
+       whenever its modified date or payload hash differs from the cached copy
+    3. Other notices are refetched only after SAM_DETAIL_CACHE_TTL_MINUTES; an
+       expired entry is served immediately and refreshed in the background
+    4. Contract sections are re-parsed only when the description hash changes
+    5. Writes are INSERT ... ON CONFLICT (notice_id) upserts, so concurrent
+       first views of a notice do not collide
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    async def get(self, notice_id: str) -> Optional[Dict[str, Any]]:
+        """Return the cached detail for a notice, refreshing it if needed"""
+        cached = self.db.get(SAMOpportunityDetail, notice_id)
+
+        mirrored = self._get_mirrored(notice_id)
+        if mirrored is not None:
+            if cached and cached.source_modified == _modified_marker(mirrored.raw) \
+                    and cached.payload_hash == _hash(mirrored.raw):
+                return cached.detail
+            return self._store(notice_id, mirrored.raw, cached)
+
+        if cached:
+            if datetime.now(timezone.utc) - cached.fetched_at >= self._ttl():
+                self._schedule_refresh(notice_id)
+            return cached.detail
+
+        return await self.refresh(notice_id)
+
+    async def refresh(self, notice_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch a notice from SAM.gov and update the cache; returns the detail"""
+        raw = await samgov_service.flight.do(notice_id, lambda: samgov_service._fetch_notice_raw(notice_id))
+        if raw is None:
+            return None
+        return self._store(notice_id, raw, self.db.get(SAMOpportunityDetail, notice_id))
+
+    def _store(
+        self,
+        notice_id: str,
+        raw: Dict[str, Any],
+        cached: Optional[SAMOpportunityDetail]
+    ) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        payload_hash = _hash(raw)
+
+        if cached and cached.payload_hash == payload_hash:
+            # Unchanged upstream: only record that we checked
+            cached.fetched_at = now
+            cached.source_modified = _modified_marker(raw)
+            self.db.commit()
+            return cached.detail
+
+        description = raw.get('description', '') or ''
+        description_hash = _hash(description)
+        if cached and cached.description_hash == description_hash:
+            sections = cached.sections
+        else:
+            sections = samgov_service._extract_contract_sections(description)
+
+        detail = samgov_service._transform_opportunity_detail(raw, sections=sections)
+
+        # Another request may have cached the notice since we read it; last write wins
+        row = {
+            'notice_id': notice_id,
+            'source_modified': _modified_marker(raw),
+            'payload_hash': payload_hash,
+            'description_hash': description_hash,
+            'detail': detail,
+            'sections': sections,
+            'fetched_at': now,
+            'updated_at': now,
+        }
+        stmt = pg_insert(SAMOpportunityDetail).values(**row)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['notice_id'],
+            set_={column: stmt.excluded[column] for column in row if column != 'notice_id'}
+        )
+        self.db.execute(stmt)
+        self.db.commit()
+
+        logger.info(f"✅ Cached opportunity detail for {notice_id}")
+        return detail
+
+    def _get_mirrored(self, notice_id: str) -> Optional[SAMOpportunity]:
+        if not settings.SAM_MIRROR_ENABLED:
+            return None
+        return self.db.get(SAMOpportunity, notice_id)
+
+    @staticmethod
+    def _ttl() -> timedelta:
+        return timedelta(minutes=settings.SAM_DETAIL_CACHE_TTL_MINUTES)
+
+    @staticmethod
+    def _schedule_refresh(notice_id: str):
+        """Refresh an expired entry in the background with its own session"""
+        if notice_id in _refreshing:
+            return
+        _refreshing.add(notice_id)
+
+        async def refresh():
+            from app.core.database import SessionLocal
+            db = SessionLocal()
+            try:
+                await OpportunityDetailService(db).refresh(notice_id)
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"⚠️  Background detail refresh failed for {notice_id}: {str(e)}")
+            finally:
+                db.close()
+                _refreshing.discard(notice_id)
+
+        task = asyncio.get_running_loop().create_task(refresh())
+        _background.add(task)
+        task.add_done_callback(_background.discard)
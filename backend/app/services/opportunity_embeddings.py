@@ -0,0 +1,357 @@
+"""
+Opportunity Description Embeddings
+Embeddings of each opportunity's title and description, used by the semantic
+capability match: an organization's capability phrases are compared with
+every candidate opportunity in one matrix product, so "zero trust
+architecture" credits a description that only says "ZTA".
+
+Descriptions are embedded once, when the opportunity is ingested (the match
+score queue drain embeds before it rescores), keyed by a hash of the embedded
+text. Unchanged text is never re-embedded.
+
+Usage:
+    python -m app.services.opportunity_embeddings          # embed new or changed descriptions
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import hashlib
+import logging
+import threading
+import time
+
+import numpy as np
+from prometheus_client import Counter, Histogram
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.match_score import OpportunityEmbedding
+from app.models.opportunity import Opportunity
+from app.services.capability_embeddings import capability_embeddings, quantize
+
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics
+OPPORTUNITY_EMBEDDINGS = Counter(
+    'opportunity_embeddings_total',
+    'Opportunity descriptions checked for embedding, by outcome',
+    ['result']  # embedded | reused (same text embedded before) | unchanged
+)
+
+SEMANTIC_MATCH = Histogram(
+    'semantic_capability_match_seconds',
+    'Time to score a batch of opportunities against an organization\'s capabilities',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+MAX_TEXT_CHARS = 8000         # ~2K tokens: the scope is stated up front, attachments follow
+_CAPABILITY_CACHE_SIZE = 4096  # Capability phrase vectors kept per process
+_RETRY_SECONDS = 60.0          # Embeddings API failures: lexical-only matching until then
+
+
+def opportunity_text(title: Optional[str], description: Optional[str]) -> str:
+    """The text embedded for one opportunity"""
+    return ". ".join(p.strip() for p in (title, description) if p and p.strip())[:MAX_TEXT_CHARS]
+
+
+def content_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class OpportunityEmbeddings:
+    """
+    Opportunity embedding store and semantic capability scoring
+
+    Features:
+    1. Content-hash keyed: an opportunity is re-embedded only when its text
+       changes, and identical texts (amendments, reposts) are embedded once
+    2. int8 vectors with a float scale per row, as for contractor capabilities
+       (same model, so both live in one vector space)
+    3. Capability phrase vectors cached per process (an organization's
+       capabilities are embedded once, an edited profile adds its new phrases)
+    4. Failures fall back to lexical matching: stale vectors are dropped and
+       the embeddings API is not retried for a minute
+    """
+
+    def __init__(self):
+        self.model = settings.CAPABILITY_EMBEDDING_MODEL
+        self.dimensions = settings.CAPABILITY_EMBEDDING_DIMENSIONS
+        self._capabilities: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._retry_at = 0.0
+
+    # ------------------------------------------------------------------
+    # Embedding
+    # ------------------------------------------------------------------
+
+    def embed_opportunities(
+        self,
+        db: Session,
+        opportunity_ids: Optional[Iterable[str]] = None,
+        page_size: int = 2000,
+        batch_size: int = 64
+    ) -> Dict[str, Any]:
+        """
+        Embed opportunities whose text is new or changed since it was embedded
+
+        Args:
+            db: Database session (committed per page)
+            opportunity_ids: Only these (default: every active opportunity)
+            page_size: Opportunities read per step
+            batch_size: Texts per embeddings API call (descriptions are long)
+
+        Returns:
+            Run statistics
+        """
+        started = time.time()
+        stats = {"opportunities": 0, "embedded": 0, "reused": 0, "unchanged": 0, "removed": 0}
+        columns = (Opportunity.id, Opportunity.title, Opportunity.description)
+
+        if opportunity_ids is not None:
+            ids = list(dict.fromkeys(opportunity_ids))
+            for start in range(0, len(ids), page_size):
+                page_ids = ids[start:start + page_size]
+                rows = db.query(*columns).filter(Opportunity.id.in_(page_ids)).all()
+                # Gone from the table: nothing left to match against
+                gone = set(page_ids) - {row[0] for row in rows}
+                if gone:
+                    stats["removed"] += db.query(OpportunityEmbedding).filter(
+                        OpportunityEmbedding.opportunity_id.in_(gone)
+                    ).delete(synchronize_session=False)
+                self._embed_page(db, rows, batch_size, stats)
+                db.commit()
+        else:
+            from app.services.opportunity_matching_service import OpportunityMatchingService
+
+            conditions = OpportunityMatchingService(db).filter_conditions()
+            after = None
+            while True:
+                query = db.query(*columns).filter(*conditions)
+                if after is not None:
+                    query = query.filter(Opportunity.id > after)
+                rows = query.order_by(Opportunity.id).limit(page_size).all()
+                if not rows:
+                    break
+                after = rows[-1][0]
+                self._embed_page(db, rows, batch_size, stats)
+                db.commit()
+
+        stats["duration_seconds"] = round(time.time() - started, 2)
+        if stats["embedded"] or stats["reused"]:
+            logger.info(
+                f"🧠 Opportunity embeddings: {stats['embedded']} embedded, {stats['reused']} reused, "
+                f"{stats['unchanged']} unchanged in {stats['duration_seconds']}s"
+            )
+        return stats
+
+    def _embed_page(self, db: Session, rows: Sequence[Tuple[str, Optional[str], Optional[str]]],
+                    batch_size: int, stats: Dict[str, Any]):
+        texts = {opp_id: opportunity_text(title, description) for opp_id, title, description in rows}
+        hashes = {opp_id: content_hash(text) for opp_id, text in texts.items()}
+        stats["opportunities"] += len(rows)
+
+        stored = dict(db.query(OpportunityEmbedding.opportunity_id, OpportunityEmbedding.content_hash).filter(
+            OpportunityEmbedding.opportunity_id.in_(list(texts)),
+            *self._model_conditions()
+        ).all())
+        stale = [opp_id for opp_id in texts if stored.get(opp_id) != hashes[opp_id]]
+        stats["unchanged"] += len(texts) - len(stale)
+        OPPORTUNITY_EMBEDDINGS.labels(result="unchanged").inc(len(texts) - len(stale))
+        if not stale:
+            return
+
+        # Text embedded before (another opportunity, or an edit that was reverted)
+        known: Dict[str, Tuple[bytes, float]] = {}
+        for text_hash, vector, scale in db.query(
+            OpportunityEmbedding.content_hash, OpportunityEmbedding.vector, OpportunityEmbedding.scale
+        ).filter(
+            OpportunityEmbedding.content_hash.in_({hashes[opp_id] for opp_id in stale}),
+            *self._model_conditions()
+        ):
+            known.setdefault(text_hash, (vector, scale))
+
+        pending = {hashes[opp_id]: texts[opp_id] for opp_id in stale if hashes[opp_id] not in known}
+        if pending:
+            try:
+                vectors, scales = quantize(capability_embeddings.embed(list(pending.values()), batch_size=batch_size))
+            except Exception:
+                # Never score against a description that has since changed
+                db.query(OpportunityEmbedding).filter(OpportunityEmbedding.opportunity_id.in_(stale)).delete(
+                    synchronize_session=False
+                )
+                db.commit()
+                raise
+            for text_hash, vector, scale in zip(pending, vectors, scales):
+                known[text_hash] = (vector.tobytes(), float(scale))
+
+        rows_out = [
+            {
+                "opportunity_id": opp_id,
+                "content_hash": hashes[opp_id],
+                "model": self.model,
+                "dimensions": self.dimensions,
+                "vector": known[hashes[opp_id]][0],
+                "scale": known[hashes[opp_id]][1],
+            }
+            for opp_id in stale
+        ]
+        stmt = pg_insert(OpportunityEmbedding)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["opportunity_id"],
+            set_={
+                **{column: stmt.excluded[column] for column in ("content_hash", "model", "dimensions", "vector", "scale")},
+                "embedded_at": func.now(),
+            }
+        )
+        db.execute(stmt, rows_out)
+
+        embedded = sum(1 for opp_id in stale if hashes[opp_id] in pending)
+        stats["embedded"] += embedded
+        stats["reused"] += len(stale) - embedded
+        OPPORTUNITY_EMBEDDINGS.labels(result="embedded").inc(embedded)
+        OPPORTUNITY_EMBEDDINGS.labels(result="reused").inc(len(stale) - embedded)
+
+    def _model_conditions(self) -> List:
+        return [OpportunityEmbedding.model == self.model, OpportunityEmbedding.dimensions == self.dimensions]
+
+    # ------------------------------------------------------------------
+    # Vectors
+    # ------------------------------------------------------------------
+
+    def vectors(
+        self,
+        db: Session,
+        opportunity_ids: Sequence[str],
+        hashes: Optional[Sequence[str]] = None,
+        chunk_size: int = 5000
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Stored vectors of these opportunities
+
+        Args:
+            db: Database session
+            opportunity_ids: Opportunity IDs
+            hashes: Expected content hash per opportunity (vectors of other text are ignored)
+            chunk_size: Ids per query
+
+        Returns:
+            (float32 vectors of shape (n, dimensions), boolean mask of rows found)
+        """
+        index = {opp_id: i for i, opp_id in enumerate(opportunity_ids)}
+        out = np.zeros((len(index), self.dimensions), dtype=np.float32)
+        found = np.zeros(len(index), dtype=bool)
+        ids = list(index)
+        for start in range(0, len(ids), chunk_size):
+            # Core execution: plain rows, no ORM result processing
+            rows = db.connection().execute(select(
+                OpportunityEmbedding.opportunity_id,
+                OpportunityEmbedding.content_hash,
+                OpportunityEmbedding.vector,
+                OpportunityEmbedding.scale
+            ).where(
+                OpportunityEmbedding.opportunity_id.in_(ids[start:start + chunk_size]),
+                *self._model_conditions()
+            )).all()
+            if hashes is not None:
+                rows = [row for row in rows if hashes[index[row[0]]] == row[1]]
+            if not rows:
+                continue
+            positions = np.array([index[row[0]] for row in rows], dtype=np.int64)
+            values = np.frombuffer(b"".join(row[2] for row in rows), dtype=np.int8).reshape(len(rows), self.dimensions)
+            out[positions] = values * np.array([row[3] for row in rows], dtype=np.float32)[:, None]
+            found[positions] = True
+        return out, found
+
+    def capability_vectors(self, phrases: Sequence[str]) -> Optional[np.ndarray]:
+        """Unit vectors of capability phrases, shape (len(phrases), dimensions); None if unavailable"""
+        keys = [(phrase or "").strip().lower() for phrase in phrases]
+        with self._lock:
+            missing = [key for key in dict.fromkeys(keys) if key not in self._capabilities]
+        if missing:
+            if time.monotonic() < self._retry_at:
+                return None
+            try:
+                embedded = capability_embeddings.embed(missing)
+            except Exception as e:
+                logger.warning(f"⚠️  Capability embeddings unavailable, lexical matching only: {str(e)}")
+                self._retry_at = time.monotonic() + _RETRY_SECONDS
+                return None
+            with self._lock:
+                for key, vector in zip(missing, embedded):
+                    self._capabilities[key] = vector
+                while len(self._capabilities) > _CAPABILITY_CACHE_SIZE:
+                    self._capabilities.popitem(last=False)
+        with self._lock:
+            for key in keys:
+                self._capabilities.move_to_end(key)
+            return np.stack([self._capabilities[key] for key in keys])
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def semantic_hits(vectors: np.ndarray, found: np.ndarray, capability_vectors: np.ndarray) -> np.ndarray:
+        """
+        Capabilities each opportunity covers semantically: per capability,
+        credit rising linearly from 0 at SEMANTIC_MATCH_FLOOR cosine similarity
+        to 1 at SEMANTIC_MATCH_FULL, summed. 0 for opportunities without a vector.
+        """
+        floor, full = settings.SEMANTIC_MATCH_FLOOR, settings.SEMANTIC_MATCH_FULL
+        similarity = vectors @ capability_vectors.T
+        credit = np.clip((similarity - floor) / (full - floor), 0.0, 1.0)
+        hits = credit.sum(axis=1, dtype=np.float64)
+        hits[~found] = 0.0
+        return hits
+
+    def capability_hits(
+        self,
+        db: Session,
+        opportunity_ids: Sequence[str],
+        capabilities: Sequence[str],
+        hashes: Optional[Sequence[str]] = None
+    ) -> np.ndarray:
+        """
+        Semantic capability hits per opportunity (see semantic_hits), on the same
+        scale as the lexical keyword count; zeros when embeddings are missing
+
+        Args:
+            db: Database session
+            opportunity_ids: Candidate opportunities
+            capabilities: The organization's capability phrases
+            hashes: Expected content hash per opportunity (see vectors)
+        """
+        hits = np.zeros(len(opportunity_ids), dtype=np.float64)
+        if not settings.OPPORTUNITY_EMBEDDINGS_ENABLED or not capabilities or not len(opportunity_ids):
+            return hits
+
+        started = time.perf_counter()
+        capability_vectors = self.capability_vectors(capabilities)
+        if capability_vectors is None:
+            return hits
+        vectors, found = self.vectors(db, opportunity_ids, hashes)
+        if found.any():
+            hits = self.semantic_hits(vectors, found, capability_vectors)
+        SEMANTIC_MATCH.observe(time.perf_counter() - started)
+        return hits
+
+
+opportunity_embeddings = OpportunityEmbeddings()
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from app.core.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Embed new or changed opportunity descriptions")
+    parser.add_argument("--batch-size", type=int, default=64, help="Texts per embeddings API call")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    session = SessionLocal()
+    try:
+        print(json.dumps(opportunity_embeddings.embed_opportunities(session, batch_size=args.batch_size), indent=2))
+    finally:
+        session.close()
@@ -0,0 +1,223 @@
+"""
+Vectorized opportunity match scoring
+Batch equivalent of OpportunityMatchingService.calculate_ai_match_score: the
+six factor scores computed with NumPy over opportunity columns, against an
+organization profile (and its past performance) loaded once per request
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from app.services.naics_hierarchy import naics_hierarchy
+
+FACTORS = ("capability", "past_performance", "set_aside", "size", "geography", "clearance")
+
+# Opportunity columns the factors read (capability_hits is computed by the query)
+SCORE_COLUMNS = (
+    "naics_code", "agency", "estimated_value", "capability_hits", "set_aside_type",
+    "place_of_performance", "remote_work_allowed", "clearance_required",
+)
+
+# Organization attributes MatchProfile reads (absent ones count as empty)
+PROFILE_ATTRIBUTES = (
+    "naics_codes", "core_capabilities", "certifications", "annual_revenue",
+    "headquarters_location", "clearances",
+)
+
+_DMV = ("DC", "MD", "VA")
+
+
+def to_date(value: Any) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return None
+
+
+def to_amount(value: Any) -> Optional[float]:
+    """Dollar amounts stored as numbers or text ("$1,200,000")"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace('$', '').replace(',', '').strip())
+    except ValueError:
+        return None
+
+
+def _factorize(values: Sequence[Any]) -> Tuple[np.ndarray, List[Any]]:
+    """Codes into the distinct values (in first-seen order)"""
+    uniques = list(dict.fromkeys(values))
+    index = {value: code for code, value in enumerate(uniques)}
+    codes = np.fromiter(map(index.__getitem__, values), dtype=np.int32, count=len(values))
+    return codes, uniques
+
+
+def _per_value(values: Sequence[Any], fn: Callable[[Any], float]) -> np.ndarray:
+    """fn evaluated once per distinct value, broadcast back to every row"""
+    codes, uniques = _factorize(values)
+    return np.array([fn(u) for u in uniques], dtype=np.float64).reshape(-1)[codes] if len(values) else np.zeros(0)
+
+
+class MatchProfile:
+    """Organization attributes and past performance the factor scores read"""
+
+    def __init__(self, org: Any, past_performance: Iterable[Tuple[Any, Optional[date], Optional[float]]],
+                 today: Optional[date] = None):
+        """
+        Args:
+            org: Organization (profile attributes it lacks count as empty)
+            past_performance: (customer agency, end date, contract value) per reference
+            today: Reference date for "recent" performance
+        """
+        self.naics = list(getattr(org, 'naics_codes', None) or [])
+        self.industries = {naics_hierarchy.sector(n) for n in self.naics} - {None}
+        self.capabilities = [c.lower() for c in getattr(org, 'core_capabilities', None) or []]
+        self.certifications = list(getattr(org, 'certifications', None) or [])
+        self.annual_revenue = getattr(org, 'annual_revenue', None)
+        self.headquarters = (getattr(org, 'headquarters_location', None) or '').upper()
+        self.clearances = list(getattr(org, 'clearances', None) or [])
+
+        records = list(past_performance)
+        self.has_past_performance = bool(records)
+        self.agencies = [agency for agency, _, _ in records]
+        three_years_ago = (today or date.today()) - timedelta(days=1095)
+        recent = sum(1 for _, end, _ in records if end and end >= three_years_ago)
+        self.recent_score = 10.0 if recent >= 3 else (5.0 * (recent / 3) if recent >= 1 else 0.0)
+        self.contract_values = np.sort(np.array([v for _, _, v in records if v], dtype=np.float64))
+
+
+def score_columns(columns: Dict[str, Sequence[Any]], profile: MatchProfile) -> Dict[str, np.ndarray]:
+    """
+    Factor scores for a batch of opportunities
+
+    Args:
+        columns: SCORE_COLUMNS -> values, one entry per opportunity
+        profile: The organization being matched
+
+    Returns:
+        {factor: float array, ..., "overall": float array (capped at 100, 1 decimal)}
+    """
+    n = len(columns["naics_code"])
+    values = np.array([to_amount(v) or 0.0 for v in columns["estimated_value"]], dtype=np.float64).reshape(-1)
+    has_value = values != 0
+
+    # 1. Capability: NAICS (15, or 7.5 for the same sector) + capability keywords in the description (15)
+    def naics_points(code: Any) -> float:
+        if code in profile.naics:
+            return 15.0
+        if code and naics_hierarchy.sector(code) in profile.industries:
+            return 7.5
+        return 0.0
+
+    capability = _per_value(columns["naics_code"], naics_points)
+
+    # 2. Past performance: same agency (10) + recent references (10) + a similar contract value (5)
+    if profile.has_past_performance:
+        past_performance = _per_value(columns["agency"], lambda a: 10.0 if a in profile.agencies else 0.0)
+        past_performance += profile.recent_score
+        similar = profile.contract_values
+        in_range = (
+            np.searchsorted(similar, 2.0 * values, side='right') - np.searchsorted(similar, 0.5 * values, side='left')
+        ) > 0
+        past_performance += np.where(has_value & in_range, 5.0, 0.0)
+    else:
+        past_performance = np.zeros(n)
+
+    # 3. Set-aside: unrestricted or certified (20), otherwise 0
+    set_aside = _per_value(
+        columns["set_aside_type"],
+        lambda s: 20.0 if not s or s in profile.certifications else 0.0
+    )
+
+    # 4. Contract size: 10-30% of annual revenue is the sweet spot (15)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if profile.annual_revenue:
+            min_sweet = profile.annual_revenue * 0.10
+            max_sweet = profile.annual_revenue * 0.30
+            size = np.where(
+                values < min_sweet,
+                15.0 * values / min_sweet,
+                np.where(values <= max_sweet, 15.0, 15.0 * max_sweet / values)
+            )
+        else:
+            size = np.where((values >= 100000) & (values <= 10000000), 15.0, 7.5)
+    size = np.where(has_value, size, 7.5)
+
+    # 5. Geography: unknown, remote, same state or both in the DMV (10), elsewhere 5
+    def place_points(place: Any) -> float:
+        if not place:
+            return 10.0
+        if not profile.headquarters:
+            return 5.0
+        place = place.upper()
+        if place in profile.headquarters:
+            return 10.0
+        if any(r in profile.headquarters for r in _DMV) and any(r in place for r in _DMV):
+            return 10.0
+        return 5.0
+
+    remote = np.array([bool(r) for r in columns["remote_work_allowed"]], dtype=bool).reshape(-1)
+    geography = np.where(remote, 10.0, _per_value(columns["place_of_performance"], place_points))
+
+    # 6. Clearance bonus: required and held (10)
+    clearance = _per_value(
+        columns["clearance_required"],
+        lambda c: 10.0 if c and c in profile.clearances else 0.0
+    )
+
+    scores = {
+        "capability": capability,
+        "past_performance": np.round(past_performance, 2),
+        "set_aside": set_aside,
+        "size": size,
+        "geography": geography,
+        "clearance": clearance,
+    }
+    return with_capability_hits(scores, columns["capability_hits"], profile)
+
+
+def with_capability_hits(scores: Dict[str, np.ndarray], hits: Sequence[Any], profile: MatchProfile) -> Dict[str, np.ndarray]:
+    """
+    Scores computed with no capability keyword hits, updated for `hits`
+    (keywords found per description). Bounds and exact scores share the other
+    five factors, so a batch is scored once and re-totalled per hit count.
+    """
+    capability = scores["capability"]
+    if profile.capabilities:
+        hits = np.array([h or 0 for h in hits], dtype=np.float64).reshape(-1)
+        capability = capability + 15.0 * hits / len(profile.capabilities)
+    updated = {**scores, "capability": np.round(capability, 2)}
+    total = sum(updated[f] for f in FACTORS)
+    updated["overall"] = np.round(np.minimum(total, 100), 1)
+    return updated
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first; ties keep input order"""
+    if k <= 0 or not len(scores):
+        return np.zeros(0, dtype=np.int64)
+    if k < len(scores):
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[:k - len(above)]
+        picked = np.sort(np.concatenate([above, ties]))
+    else:
+        picked = np.arange(len(scores))
+    return picked[np.argsort(-scores[picked], kind='stable')]
+
+
+def reachable(lower: np.ndarray, upper: np.ndarray, k: int) -> np.ndarray:
+    """
+    Mask of the rows (in scan order) that can still finish in the top k, given
+    lower and upper bounds on their final scores; earlier rows win ties
+    """
+    if len(lower) <= k:
+        return np.ones(len(lower), dtype=bool)
+    threshold = np.partition(lower, len(lower) - k)[len(lower) - k]
+    secured = lower >= threshold
+    ahead = np.cumsum(secured) - secured  # Secured rows before each row
+    return (upper > threshold) | ((upper == threshold) & (ahead < k))
@@ -2,15 +2,47 @@
 Advanced AI Opportunity Matching Service
 Generates Top 25 recommended opportunities based on AI matching algorithm
 """
-from typing import List, Dict, Optional
+from typing import Any, Iterator, List, Dict, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, case, literal, null, select
 from datetime import date, timedelta
+import re
 import numpy as np
 
+from app.config import settings
 from app.models.opportunity import Opportunity
 from app.models.organization import Organization
 from app.models.knowledge import PastPerformance
+from app.services.capability_matcher import capability_matcher
+from app.services.naics_hierarchy import naics_hierarchy
+from app.services.opportunity_embeddings import content_hash, opportunity_embeddings, opportunity_text
+from app.services.opportunity_match_scoring import (
+    FACTORS,
+    SCORE_COLUMNS,
+    MatchProfile,
+    reachable,
+    score_columns,
+    to_amount,
+    to_date,
+    top_k,
+    with_capability_hits,
+)
+
+
+def _column(model, name: str):
+    """Model column by attribute name; NULL when this schema doesn't have it"""
+    column = getattr(model, name, None)
+    return column if column is not None else null()
+
+
+# Read in the scoring scan; keyword hits are matched in SQL for surviving rows only
+_FETCHED_COLUMNS = tuple(name for name in SCORE_COLUMNS if name != "capability_hits")
+
+
+def _object_array(values) -> np.ndarray:
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
 
 
 class OpportunityMatchingService:
@@ -18,20 +50,31 @@ class OpportunityMatchingService:
     
     def __init__(self, db: Session):
         self.db = db
+        self._past_performance_cache: Dict[Any, List[Tuple[Any, Optional[date], Optional[float]]]] = {}
     
     def get_top_recommendations(
         self,
         organization_id: str,
         limit: int = 25,
-        filters: Optional[Dict] = None
+        filters: Optional[Dict] = None,
+        batch_size: int = 20000
     ) -> List[Dict]:
         """
         Get top recommended opportunities for an organization
         
+        Read from the materialized opportunity_match_scores table once the
+        organization has been scored (see MatchScoreService). Otherwise every
+        active opportunity is scored live, in batches of the scored columns,
+        with the six factors as NumPy array operations. Capability keywords are
+        matched in SQL (descriptions never leave the database), and only for
+        rows whose best possible score can still reach the top N, as is the
+        semantic capability match. Full rows are loaded for the top N only.
+        
         Args:
             organization_id: Organization ID
             limit: Number of recommendations (default 25)
             filters: Optional filters (new, expiring_soon, high_value, etc.)
+            batch_size: Opportunities scored per batch (live scoring)
             
         Returns:
             List of opportunities with AI match scores, sorted by relevance
@@ -41,59 +84,236 @@ class OpportunityMatchingService:
             Organization.id == organization_id
         ).first()
         
-        if not org:
+        if not org or limit <= 0:
             return []
         
-        # Get active opportunities
-        query = self.db.query(Opportunity).filter(
-            Opportunity.status == "active"
-        )
+        if settings.MATCH_SCORES_ENABLED:
+            from app.services.match_score_service import MatchScoreService, mark_dirty
+            
+            stored = MatchScoreService(self.db).top(org.id, limit, filters)
+            if stored is not None:
+                return [
+                    self._recommendation(opp, org, scores, overall)
+                    for opp, scores, overall in stored
+                ]
+            # Not materialized yet: score live this time, and queue the org
+            mark_dirty(organization_ids=[org.id])
+        
+        profile = MatchProfile(org, self._past_performance(org))
+        keywords = len(profile.capabilities)
+        
+        # Pass 1: cheap columns only. Each row's score is bounded by scoring it
+        # with none and with all of the org's capability keywords in its
+        # description; rows that can no longer reach the top N are dropped as
+        # the scan goes.
+        kept: Optional[Dict[str, np.ndarray]] = None
+        # Core execution: plain rows, no ORM result processing
+        result = self.db.connection().execute(self._scoring_query(filters).execution_options(stream_results=True))
+        for partition in result.partitions(batch_size):
+            columns = {
+                name: _object_array(values)
+                for name, values in zip(("id",) + _FETCHED_COLUMNS, zip(*partition))
+            }
+            base = score_columns({**columns, "capability_hits": np.zeros(len(partition))}, profile)
+            upper = base["overall"]
+            if keywords:
+                upper = with_capability_hits(base, np.full(len(partition), keywords), profile)["overall"]
+            batch = {"id": columns["id"], "lower": base["overall"], "upper": upper, **base}
+            
+            kept = batch if kept is None else {name: np.concatenate([kept[name], batch[name]]) for name in kept}
+            kept = {name: values[reachable(kept["lower"], kept["upper"], limit)] for name, values in kept.items()}
+        
+        # Pass 2: keyword hits (matched in SQL) for the surviving rows, then exact scores
+        best_ids: List[Any] = []
+        if kept is not None and len(kept["id"]):
+            hits = np.zeros(len(kept["id"]))
+            if keywords:
+                hits = np.maximum(
+                    self._capability_hits(kept["id"], profile),
+                    opportunity_embeddings.capability_hits(
+                        self.db, kept["id"].tolist(), profile.capabilities, hashes=self._content_hashes(kept["id"])
+                    )
+                )
+            best_scores = with_capability_hits(kept, hits, profile)
+            picked = top_k(best_scores["overall"], limit)
+            best_ids = kept["id"][picked].tolist()
+            best_scores = {name: values[picked] for name, values in best_scores.items()}
+        
+        opportunities = {
+            opp.id: opp
+            for opp in self.db.query(Opportunity).filter(Opportunity.id.in_(best_ids))
+        } if best_ids else {}
+        
+        scored_opportunities = []
+        for rank, opp_id in enumerate(best_ids):
+            opp = opportunities.get(opp_id)
+            if opp is None:
+                continue
+            scored_opportunities.append(self._recommendation(
+                opp,
+                org,
+                {name: float(best_scores[name][rank]) for name in FACTORS},
+                float(best_scores["overall"][rank])
+            ))
+        
+        return scored_opportunities
+    
+    def score_all(
+        self,
+        org: Organization,
+        opportunity_ids: Optional[List[Any]] = None,
+        batch_size: int = 20000,
+        id_range: Optional[Tuple[Optional[str], Optional[str]]] = None
+    ) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Exact scores of every active opportunity (or of `opportunity_ids`) for an org
+        
+        Keyword hits are counted in the scan query itself and semantic hits
+        computed per batch, so one streamed pass yields final scores. Used to
+        materialize opportunity_match_scores.
+        
+        Args:
+            org: Organization
+            opportunity_ids: Only these opportunities
+            batch_size: Opportunities scored per batch
+            id_range: Only opportunities with low <= id < high (None bounds are open)
+        
+        Yields:
+            {"id": ids, factor: scores, ..., "overall": scores} per batch
+        """
+        profile = MatchProfile(org, self._past_performance(org))
+        statement = self._scoring_query(capability_hits=self._capability_hits_expr(profile))
+        if opportunity_ids is not None:
+            statement = statement.where(Opportunity.id.in_(list(opportunity_ids)))
+        if id_range is not None:
+            low, high = id_range
+            if low is not None:
+                statement = statement.where(Opportunity.id >= low)
+            if high is not None:
+                statement = statement.where(Opportunity.id < high)
+        
+        result = self.db.connection().execute(statement.execution_options(stream_results=True))
+        for partition in result.partitions(batch_size):
+            columns = {
+                name: _object_array(values)
+                for name, values in zip(("id",) + _FETCHED_COLUMNS + ("capability_hits",), zip(*partition))
+            }
+            if profile.capabilities:
+                columns["capability_hits"] = np.maximum(
+                    np.array([h or 0 for h in columns["capability_hits"]], dtype=np.float64),
+                    opportunity_embeddings.capability_hits(
+                        self.db, columns["id"].tolist(), profile.capabilities, hashes=self._content_hashes(columns["id"])
+                    )
+                )
+            yield {"id": columns["id"], **score_columns(columns, profile)}
+    
+    def _recommendation(self, opp: Opportunity, org: Organization, scores: Dict[str, float], overall: float) -> Dict:
+        """Response entry for one scored opportunity"""
+        match_score = {
+            "overall_score": overall,
+            "scores": scores,
+            "grade": self._get_match_grade(overall)
+        }
+        return {
+            "opportunity": opp,
+            "ai_match_score": overall,
+            "match_details": match_score,
+            "pwin_score": opp.pwin_score or 50,
+            "recommendation_reason": self._generate_recommendation_reason(match_score, opp, org)
+        }
+    
+    def _capability_hits_expr(self, profile: MatchProfile):
+        """SQL count of the org's capability keywords mentioned in an opportunity's description"""
+        # Case-insensitive regex (~* on Postgres) scans long descriptions several
+        # times faster than lower(...) LIKE, which copies each description per keyword
+        description = _column(Opportunity, "description")
+        hits = [
+            case((description.regexp_match(re.escape(capability), flags="i"), 1), else_=0)
+            for capability in profile.capabilities
+        ]
+        return sum(hits[1:], hits[0]) if hits else literal(0)
+    
+    def _capability_hits(self, ids: np.ndarray, profile: MatchProfile, chunk_size: int = 5000) -> np.ndarray:
+        """How many of the org's capability keywords each opportunity's description mentions"""
+        capability_hits = self._capability_hits_expr(profile)
+        
+        found: Dict[Any, int] = {}
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size].tolist()
+            statement = select(Opportunity.id, capability_hits).where(Opportunity.id.in_(chunk))
+            found.update(self.db.connection().execute(statement).all())
+        return np.array([found.get(i) or 0 for i in ids], dtype=np.float64)
+    
+    def _content_hashes(self, ids: np.ndarray, chunk_size: int = 5000) -> List[Optional[str]]:
+        """Hash of each opportunity's current text, so vectors of an edited description are ignored"""
+        if not settings.OPPORTUNITY_EMBEDDINGS_ENABLED:
+            return [None] * len(ids)
+        
+        found: Dict[Any, str] = {}
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size].tolist()
+            statement = select(Opportunity.id, Opportunity.title, _column(Opportunity, "description")).where(
+                Opportunity.id.in_(chunk)
+            )
+            found.update(
+                (opp_id, content_hash(opportunity_text(title, description)))
+                for opp_id, title, description in self.db.connection().execute(statement)
+            )
+        return [found.get(i) for i in ids]
+    
+    def _scoring_query(self, filters: Optional[Dict] = None, capability_hits=None):
+        """Active opportunities (after filters): id and the scored columns, keyword hits if given"""
+        columns = [_column(Opportunity, name).label(name) for name in _FETCHED_COLUMNS]
+        if capability_hits is not None:
+            columns.append(capability_hits.label("capability_hits"))
+        return select(Opportunity.id, *columns).where(*self.filter_conditions(filters))
+    
+    def filter_conditions(self, filters: Optional[Dict] = None) -> List:
+        """WHERE conditions on Opportunity: not deleted, plus the recommendation filters"""
+        conditions = [Opportunity.is_deleted.is_(False)]
         
         # Apply filters
         if filters:
             if filters.get("new"):
                 # Posted in last 7 days
                 seven_days_ago = date.today() - timedelta(days=7)
-                query = query.filter(Opportunity.posted_date >= seven_days_ago)
+                conditions.append(_column(Opportunity, "posted_date") >= seven_days_ago)
             
             if filters.get("expiring_soon"):
                 # Due in next 14 days
                 fourteen_days_later = date.today() + timedelta(days=14)
-                query = query.filter(
+                deadline = _column(Opportunity, "response_deadline")
+                conditions.append(
                     and_(
-                        Opportunity.response_deadline >= date.today(),
-                        Opportunity.response_deadline <= fourteen_days_later
+                        deadline >= date.today(),
+                        deadline <= fourteen_days_later
                     )
                 )
             
             if filters.get("high_value"):
                 # Value > $1M
-                query = query.filter(Opportunity.estimated_value >= 1000000)
+                conditions.append(_column(Opportunity, "estimated_value") >= 1000000)
             
             if filters.get("set_aside"):
                 # Filter by set-aside type
-                query = query.filter(Opportunity.set_aside_type == filters["set_aside"])
-        
-        opportunities = query.all()
+                conditions.append(_column(Opportunity, "set_aside_type") == filters["set_aside"])
         
-        # Calculate AI match score for each opportunity
-        scored_opportunities = []
-        for opp in opportunities:
-            match_score = self.calculate_ai_match_score(opp, org)
-            
-            scored_opportunities.append({
-                "opportunity": opp,
-                "ai_match_score": match_score["overall_score"],
-                "match_details": match_score,
-                "pwin_score": opp.pwin_score or 50,
-                "recommendation_reason": self._generate_recommendation_reason(match_score, opp, org)
-            })
-        
-        # Sort by AI match score (descending)
-        scored_opportunities.sort(key=lambda x: x["ai_match_score"], reverse=True)
-        
-        # Return top N
-        return scored_opportunities[:limit]
+        return conditions
+    
+    def _past_performance(self, org: Organization) -> List[Tuple[Any, Optional[date], Optional[float]]]:
+        """(customer agency, end date, contract value) of the org's references, read once per service"""
+        if org.id not in self._past_performance_cache:
+            rows = self.db.query(
+                _column(PastPerformance, "customer_agency"),
+                PastPerformance.end_date,
+                PastPerformance.contract_value
+            ).filter(
+                PastPerformance.organization_id == org.id
+            ).all()
+            self._past_performance_cache[org.id] = [
+                (agency, to_date(end_date), to_amount(value)) for agency, end_date, value in rows
+            ]
+        return self._past_performance_cache[org.id]
     
     def calculate_ai_match_score(
         self,
@@ -152,28 +372,27 @@ class OpportunityMatchingService:
         # NAICS code match (15 points)
         if opp.naics_code in (org.naics_codes or []):
             score += 15.0
-        elif org.naics_codes:
-            # Partial credit for same 2-digit NAICS (industry)
-            opp_industry = str(opp.naics_code)[:2] if opp.naics_code else None
-            org_industries = [str(n)[:2] for n in org.naics_codes]
-            if opp_industry in org_industries:
-                score += 7.5
-        
-        # Keyword/capability overlap (15 points)
-        if opp.description and org.core_capabilities:
-            opp_text = opp.description.lower()
-            
-            # Count capability matches
-            matches = 0
-            total_capabilities = len(org.core_capabilities)
-            
-            for capability in org.core_capabilities:
-                if capability.lower() in opp_text:
-                    matches += 1
-            
-            if total_capabilities > 0:
-                match_ratio = matches / total_capabilities
-                score += 15.0 * match_ratio
+        elif naics_hierarchy.shares_sector(opp.naics_code, org.naics_codes):
+            # Partial credit for the same NAICS sector (industry)
+            score += 7.5
+        
+        # Keyword/capability overlap (15 points): capabilities named in the
+        # description, or covered by it semantically (embeddings), whichever is more
+        if org.core_capabilities:
+            matches = 0.0
+            if opp.description:
+                # One pass over the description with the org's compiled (cached) matcher
+                matches = len(capability_matcher(org.core_capabilities).matched(opp.description))
+            semantic = 0.0
+            if settings.OPPORTUNITY_EMBEDDINGS_ENABLED:
+                semantic = float(opportunity_embeddings.capability_hits(
+                    self.db,
+                    [opp.id],
+                    [c.lower() for c in org.core_capabilities],
+                    hashes=[content_hash(opportunity_text(opp.title, opp.description))]
+                )[0])
+            match_ratio = max(matches, semantic) / len(org.core_capabilities)
+            score += 15.0 * match_ratio
         
         return round(score, 2)
     
@@ -182,24 +401,22 @@ class OpportunityMatchingService:
         
         score = 0.0
         
-        # Get past performance references
-        past_perf = self.db.query(PastPerformance).filter(
-            PastPerformance.organization_id == org.id
-        ).all()
+        # Get past performance references (loaded once per service, not per opportunity)
+        past_perf = self._past_performance(org)
         
         if not past_perf:
             return 0.0
         
         # Same agency (10 points)
-        same_agency = [p for p in past_perf if p.customer_agency == opp.agency]
+        same_agency = [agency for agency, _, _ in past_perf if agency == opp.agency]
         if same_agency:
             score += 10.0
         
         # Recent performance (last 3 years) (10 points)
         three_years_ago = date.today() - timedelta(days=1095)
         recent = [
-            p for p in past_perf
-            if p.end_date and p.end_date >= three_years_ago
+            end_date for _, end_date, _ in past_perf
+            if end_date and end_date >= three_years_ago
         ]
         
         if len(recent) >= 3:
@@ -210,9 +427,9 @@ class OpportunityMatchingService:
         # Similar contract value (5 points)
         if opp.estimated_value:
             similar_value = [
-                p for p in past_perf
-                if p.contract_value and
-                0.5 * opp.estimated_value <= p.contract_value <= 2.0 * opp.estimated_value
+                value for _, _, value in past_perf
+                if value and
+                0.5 * opp.estimated_value <= value <= 2.0 * opp.estimated_value
             ]
             if similar_value:
                 score += 5.0
@@ -0,0 +1,411 @@
+"""
+SAM.gov Opportunity Mirror Service
+Keeps a local Postgres copy of SAM.gov contract opportunities in sync and serves
+search / top-opportunity queries from it with real totals and deep pagination
+"""
+from typing import Dict, List, Optional, Any
+from datetime import datetime, date, timedelta, timezone
+from sqlalchemy.orm import Session
+from sqlalchemy import func, or_, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import numpy as np
+import logging
+import time
+
+from app.config import settings
+from app.models.sam_opportunity import SAMOpportunity
+from app.models.sync import SyncCheckpoint
+from app.services.samgov_service import samgov_service
+from app.services.pwin_scoring import score_columns, score_notices
+
+logger = logging.getLogger(__name__)
+
+MIRROR_CHECKPOINT = "sam_opportunity_mirror"
+
+# Columns refreshed when a notice is re-synced (first_seen_at is preserved)
+UPSERT_COLUMNS = [
+    'solicitation_number', 'title', 'description', 'department', 'sub_tier', 'office',
+    'notice_type', 'naics_code', 'classification_code', 'set_aside_code',
+    'set_aside_description', 'posted_date', 'response_deadline', 'archive_date',
+    'active', 'pwin_score', 'raw', 'synced_at'
+]
+
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    """Parse SAM.gov date strings ('2024-01-15', '01/15/2024' or ISO datetimes)"""
+    if not value:
+        return None
+    for fmt in ('%Y-%m-%d', '%m/%d/%Y'):
+        try:
+            return datetime.strptime(value[:10], fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    """Parse SAM.gov response deadlines, which may or may not carry a UTC offset"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        parsed_date = _parse_date(value)
+        if not parsed_date:
+            return None
+        parsed = datetime.combine(parsed_date, datetime.min.time())
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _is_active(value: Any) -> bool:
+    """SAM.gov reports 'active' as 'Yes'/'No' strings or booleans"""
+    if isinstance(value, str):
+        return value.strip().lower() in ('yes', 'true', '1')
+    return bool(value) if value is not None else True
+
+
+def notice_to_row(notice: Dict[str, Any], synced_at: datetime, pwin_score: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Map a raw SAM.gov notice to a sam_opportunities row
+    Pass `pwin_score` from a batch (notices_to_rows) to skip per-notice scoring
+    """
+    return {
+        'notice_id': notice.get('noticeId'),
+        'solicitation_number': (notice.get('solicitationNumber') or '')[:100] or None,
+        'title': (notice.get('title') or '')[:1000],
+        'description': notice.get('description') or None,
+        'department': notice.get('department') or None,
+        'sub_tier': notice.get('subTier') or None,
+        'office': notice.get('office') or None,
+        'notice_type': notice.get('type') or None,
+        'naics_code': notice.get('naicsCode') or None,
+        'classification_code': notice.get('classificationCode') or None,
+        'set_aside_code': notice.get('typeOfSetAside') or None,
+        'set_aside_description': notice.get('typeOfSetAsideDescription') or None,
+        'posted_date': _parse_date(notice.get('postedDate')),
+        'response_deadline': _parse_datetime(notice.get('responseDeadLine')),
+        'archive_date': _parse_date(notice.get('archiveDate')),
+        'active': _is_active(notice.get('active')),
+        'pwin_score': samgov_service._calculate_simple_pwin(notice) if pwin_score is None else pwin_score,
+        'raw': notice,
+        'synced_at': synced_at,
+    }
+
+
+def notices_to_rows(notices: List[Dict[str, Any]], synced_at: datetime) -> List[Dict[str, Any]]:
+    """Map a batch of raw notices to rows, scoring PWin for the whole batch at once"""
+    scores = score_notices(notices)
+    return [notice_to_row(notice, synced_at, int(score)) for notice, score in zip(notices, scores)]
+
+
+class OpportunityMirrorService:
+    """
+    Local mirror of SAM.gov contract opportunities
+
+    Features:
+    1. Incremental sync by posted date with an overlap window for amended notices
+    2. Bulk upserts (INSERT ... ON CONFLICT) into sam_opportunities
+    3. Full-text / NAICS / set-aside / date search with real totals
+    4. Cheap freshness checks against SAM.gov (one-record probe)
+    5. Vectorized PWin scoring on write and nightly rescoring
+    """
+
+    PAGE_SIZE = 1000  # SAM.gov maximum page size
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    # ------------------------------------------------------------------
+    # Sync
+    # ------------------------------------------------------------------
+
+    def get_checkpoint(self) -> SyncCheckpoint:
+        """Get (or create) the mirror's sync checkpoint"""
+        checkpoint = self.db.query(SyncCheckpoint).filter(SyncCheckpoint.name == MIRROR_CHECKPOINT).first()
+        if not checkpoint:
+            checkpoint = SyncCheckpoint(name=MIRROR_CHECKPOINT, status="idle")
+            self.db.add(checkpoint)
+            self.db.commit()
+            self.db.refresh(checkpoint)
+        return checkpoint
+
+    async def sync(
+        self,
+        posted_from: Optional[date] = None,
+        posted_to: Optional[date] = None,
+        max_pages: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Incrementally sync notices posted since the last watermark
+
+        Args:
+            posted_from: Override start of the posted-date window
+            posted_to: Override end of the posted-date window (default: today)
+            max_pages: Stop after this many pages (for partial backfills)
+
+        Returns:
+            Sync statistics
+        """
+        checkpoint = self.get_checkpoint()
+        started_at = datetime.now(timezone.utc)
+        today = started_at.date()
+
+        if posted_from is None:
+            if checkpoint.watermark:
+                posted_from = checkpoint.watermark.date() - timedelta(days=settings.SAM_MIRROR_OVERLAP_DAYS)
+            else:
+                posted_from = today - timedelta(days=settings.SAM_MIRROR_BACKFILL_DAYS)
+        posted_to = posted_to or today
+
+        checkpoint.status = "running"
+        checkpoint.last_started_at = started_at
+        self.db.commit()
+
+        stats = {
+            "posted_from": posted_from.isoformat(),
+            "posted_to": posted_to.isoformat(),
+            "pages": 0,
+            "upserted": 0,
+            "total_records": 0,
+            "complete": False,
+        }
+
+        try:
+            offset = 0
+            while True:
+                data = await samgov_service._fetch_page(
+                    limit=self.PAGE_SIZE,
+                    offset=offset,
+                    posted_from=posted_from.strftime('%m/%d/%Y'),
+                    posted_to=posted_to.strftime('%m/%d/%Y')
+                )
+                notices = data.get('opportunitiesData', [])
+                stats["total_records"] = data.get('totalRecords', stats["total_records"])
+                stats["pages"] += 1
+
+                stats["upserted"] += self.upsert_notices(notices)
+
+                offset += self.PAGE_SIZE
+                if len(notices) < self.PAGE_SIZE or offset >= stats["total_records"]:
+                    stats["complete"] = True
+                    break
+                if max_pages and stats["pages"] >= max_pages:
+                    break
+
+        except Exception as e:
+            self.db.rollback()
+            checkpoint.status = "failed"
+            checkpoint.last_error = str(e)[:1000]
+            self.db.commit()
+            logger.error(f"❌ SAM.gov mirror sync failed: {str(e)}")
+            stats["error"] = str(e)
+            return stats
+
+        completed_at = datetime.now(timezone.utc)
+        stats["duration_seconds"] = round((completed_at - started_at).total_seconds(), 2)
+
+        checkpoint.status = "idle"
+        checkpoint.last_error = None
+        if stats["complete"]:
+            # Partial (max_pages) runs leave the watermark where it was, and
+            # never make the mirror ready (is_ready) on their own
+            checkpoint.last_success_at = completed_at
+            checkpoint.watermark = datetime.combine(posted_to, datetime.min.time(), tzinfo=timezone.utc)
+        checkpoint.stats = stats
+        self.db.commit()
+
+        logger.info(f"✅ SAM.gov mirror synced {stats['upserted']} notices in {stats['duration_seconds']}s")
+        return stats
+
+    def upsert_notices(self, notices: List[Dict[str, Any]]) -> int:
+        """Bulk upsert raw SAM.gov notices; returns number of rows written"""
+        synced_at = datetime.now(timezone.utc)
+        rows = {}
+        for row in notices_to_rows([n for n in notices if n.get('noticeId')], synced_at):
+            # Last occurrence wins if a page repeats a notice
+            rows[row['notice_id']] = row
+
+        if not rows:
+            return 0
+
+        stmt = pg_insert(SAMOpportunity).values(list(rows.values()))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['notice_id'],
+            set_={column: stmt.excluded[column] for column in UPSERT_COLUMNS}
+        )
+        self.db.execute(stmt)
+        self.db.commit()
+        return len(rows)
+
+    async def check_freshness(self) -> Dict[str, Any]:
+        """
+        Compare SAM.gov's record count since the watermark with the local count.
+        Costs a single one-record API call. A fresh result counts as a
+        successful sync, so a mirror that keeps passing the probe stays ready.
+        """
+        checkpoint = self.get_checkpoint()
+        if not checkpoint.watermark:
+            return {"fresh": False, "reason": "never_synced"}
+
+        since = checkpoint.watermark.date() - timedelta(days=settings.SAM_MIRROR_OVERLAP_DAYS)
+        data = await samgov_service._fetch_page(
+            limit=1,
+            offset=0,
+            posted_from=since.strftime('%m/%d/%Y'),
+            posted_to=date.today().strftime('%m/%d/%Y')
+        )
+        remote_count = data.get('totalRecords', 0)
+        local_count = self.db.query(func.count(SAMOpportunity.notice_id)).filter(
+            SAMOpportunity.posted_date >= since
+        ).scalar() or 0
+
+        fresh = local_count >= remote_count
+        if fresh:
+            checkpoint.last_success_at = datetime.now(timezone.utc)
+            self.db.commit()
+
+        return {
+            "fresh": fresh,
+            "remote_count": remote_count,
+            "local_count": local_count,
+            "since": since.isoformat()
+        }
+
+    def rescore(self, batch_size: int = 50000) -> Dict[str, Any]:
+        """
+        Recompute stored PWin scores in vectorized batches.
+        The recency bonus decays daily, so this runs nightly to keep the stored
+        scores (used to pre-filter get_top) current; only changed rows are written.
+        """
+        started = time.perf_counter()
+        today = date.today()
+        stats = {"scanned": 0, "updated": 0}
+        last_id = ''
+
+        while True:
+            rows = self.db.query(
+                SAMOpportunity.notice_id,
+                SAMOpportunity.set_aside_description,
+                SAMOpportunity.posted_date,
+                SAMOpportunity.pwin_score
+            ).filter(
+                SAMOpportunity.notice_id > last_id
+            ).order_by(SAMOpportunity.notice_id).limit(batch_size).all()
+            if not rows:
+                break
+
+            notice_ids, set_asides, posted_dates, current = zip(*rows)
+            scores = score_columns(set_asides, np.array(posted_dates, dtype='datetime64[D]'), today=today)
+            changed = np.flatnonzero(scores != np.array(current, dtype=np.int64))
+
+            if len(changed):
+                self.db.execute(
+                    text(
+                        "UPDATE sam_opportunities AS s SET pwin_score = v.score "
+                        "FROM unnest(:ids, :scores) AS v(notice_id, score) "
+                        "WHERE s.notice_id = v.notice_id"
+                    ),
+                    {
+                        "ids": [notice_ids[i] for i in changed],
+                        "scores": [int(scores[i]) for i in changed]
+                    }
+                )
+                self.db.commit()
+
+            stats["scanned"] += len(rows)
+            stats["updated"] += len(changed)
+            last_id = notice_ids[-1]
+
+        stats["duration_seconds"] = round(time.perf_counter() - started, 2)
+        logger.info(f"✅ Rescored {stats['scanned']} mirrored notices ({stats['updated']} changed) in {stats['duration_seconds']}s")
+        return stats
+
+    def is_ready(self) -> bool:
+        """Mirror has synced successfully within the allowed staleness window"""
+        checkpoint = self.db.query(SyncCheckpoint).filter(SyncCheckpoint.name == MIRROR_CHECKPOINT).first()
+        if not checkpoint or not checkpoint.last_success_at:
+            return False
+        age = datetime.now(timezone.utc) - checkpoint.last_success_at
+        return age < timedelta(minutes=settings.SAM_MIRROR_MAX_STALENESS_MINUTES)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def search(
+        self,
+        page: int = 1,
+        limit: int = 20,
+        naics_code: Optional[str] = None,
+        keyword: Optional[str] = None,
+        posted_from: Optional[str] = None,
+        posted_to: Optional[str] = None,
+        snapshot: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Search mirrored notices. Mirrors the live API's defaults (last 30 days)
+        but returns real totals and supports arbitrarily deep pages.
+        `snapshot` hides notices first seen after it, so paging stays stable.
+        """
+        from_date = _parse_date(posted_from) or (date.today() - timedelta(days=30))
+        to_date = _parse_date(posted_to) or date.today()
+
+        query = self.db.query(SAMOpportunity).filter(
+            SAMOpportunity.posted_date >= from_date,
+            SAMOpportunity.posted_date <= to_date
+        )
+
+        if naics_code:
+            query = query.filter(SAMOpportunity.naics_code == naics_code)
+        if snapshot:
+            query = query.filter(SAMOpportunity.first_seen_at <= snapshot)
+
+        order_by = [SAMOpportunity.posted_date.desc(), SAMOpportunity.notice_id]
+        if keyword:
+            ts_query = func.websearch_to_tsquery('english', keyword)
+            query = query.filter(SAMOpportunity.search_vector.op('@@')(ts_query))
+            order_by.insert(0, func.ts_rank_cd(SAMOpportunity.search_vector, ts_query).desc())
+
+        total = query.order_by(None).count()
+        rows = query.order_by(*order_by).offset((page - 1) * limit).limit(limit).all()
+
+        return {
+            'items': samgov_service._transform_opportunities([row.raw for row in rows]),
+            'total': total,
+            'page': page,
+            'limit': limit,
+            'total_pages': (total + limit - 1) // limit if limit else 0,
+            'source': 'SAM.gov (local mirror)'
+        }
+
+    def get_top(self, limit: int = 10, min_pwin: Optional[int] = 60) -> Dict[str, Any]:
+        """Top open opportunities from the mirror, scored the same way as the live path"""
+        now = datetime.now(timezone.utc)
+        query = self.db.query(SAMOpportunity).filter(
+            SAMOpportunity.active.is_(True),
+            SAMOpportunity.posted_date >= date.today() - timedelta(days=30),
+            or_(SAMOpportunity.response_deadline.is_(None), SAMOpportunity.response_deadline >= now)
+        )
+        # Stored scores were computed at sync time and can only have decayed
+        # since (recency bonus), so they are a safe pre-filter
+        if min_pwin is not None:
+            query = query.filter(SAMOpportunity.pwin_score >= min_pwin)
+
+        rows = query.order_by(
+            SAMOpportunity.pwin_score.desc(),
+            SAMOpportunity.posted_date.desc()
+        ).limit(limit * 3).all()
+
+        items = samgov_service._transform_opportunities([row.raw for row in rows])
+        if min_pwin is not None:
+            items = [item for item in items if item['pwin_score'] >= min_pwin]
+        items.sort(key=lambda item: item['pwin_score'], reverse=True)
+
+        return {
+            'items': items[:limit],
+            'total': len(items),
+            'page': 1,
+            'source': 'SAM.gov (local mirror)'
+        }
@@ -7,9 +7,13 @@ Critical for proposal collaboration and subcontractor management
 from typing import Dict, List, Any, Optional
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, func
-import httpx
-from datetime import datetime, timedelta
+from datetime import timedelta
 from app.config import settings
+from app.services.samgov_client import samgov_client
+from app.services.contractor_index import contractor_index
+from app.services.capability_embeddings import capability_embeddings
+from app.services.naics_hierarchy import naics_hierarchy
+from app.services.response_cache import ResponseCache
 
 
 class PartnerMatchingService:
@@ -31,9 +35,8 @@ class PartnerMatchingService:
         self.db = db
         self.sam_api_key = settings.SAM_GOV_API_KEY if hasattr(settings, 'SAM_GOV_API_KEY') else None
     
-    # Simple in-memory cache for SAM.gov results
-    _cache = {}
-    _cache_ttl = 3600  # 1 hour
+    # Shared two-tier cache for SAM.gov results (class-level, so shared by every instance)
+    _cache = ResponseCache("partner_search", ttl=3600)
 
     async def search_contractors(
         self,
@@ -60,23 +63,22 @@ class PartnerMatchingService:
         import json
         logger = logging.getLogger(__name__)
         
+        # Local contractor index first (synced contractors table, no network round trip)
+        if settings.CONTRACTOR_INDEX_ENABLED:
+            contractor_index.maybe_refresh(self.db)
+            if contractor_index.ready:
+                return self._search_contractor_index(query, page, page_size)
+        
         # Create cache key
         cache_key = f"partners_{json.dumps(query, sort_keys=True)}_{page}_{page_size}"
         
-        # Check cache
-        if cache_key in self._cache:
-            cached_data, cached_time = self._cache[cache_key]
-            if (datetime.now() - cached_time).total_seconds() < self._cache_ttl:
-                logger.info("📦 Returning cached partner search results")
-                return cached_data
-        
         # Try SAM.gov API first
         if self.sam_api_key:
             try:
-                result = await self._search_sam_gov_api(query, page, page_size)
-                # Cache the result
-                self._cache[cache_key] = (result, datetime.now())
-                return result
+                return await self._cache.get_or_set(
+                    cache_key,
+                    lambda: self._search_sam_gov_api(query, page, page_size)
+                )
             except Exception as e:
                 logger.warning(f"⚠️  SAM.gov API failed: {str(e)}, using mock data")
         
@@ -84,7 +86,7 @@ class PartnerMatchingService:
         logger.info("Using mock partner data (SAM_GOV_API_KEY not configured or API failed)")
         result = self._get_mock_contractors(query, page, page_size)
         # Cache mock data too
-        self._cache[cache_key] = (result, datetime.now())
+        await self._cache.set(cache_key, result)
         return result
     
     async def _search_sam_gov_api(
@@ -139,66 +141,127 @@ class PartnerMatchingService:
         
         logger.info(f"🔄 Searching SAM.gov entities: page={page}, filters={query}")
         
-        url = "https://api.sam.gov/entity-information/v3/entities"
+        response = await samgov_client.get(self.SAM_GOV_API, endpoint="entities", params=params)
+        response.raise_for_status()
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
-            entities = data.get('entityData', [])
-            total_records = data.get('totalRecords', 0)
-            
-            logger.info(f"✅ SAM.gov returned {len(entities)} entities ({total_records} total)")
-            
-            # Transform to our format
-            contractors = []
-            for entity in entities:
-                try:
-                    core_data = entity.get('coreData', {})
-                    entity_reg = entity.get('entityRegistration', {})
-                    
-                    contractor = {
-                        'id': len(contractors) + 1,
-                        'uei': core_data.get('ueiSAM', ''),
-                        'legal_name': core_data.get('legalBusinessName', ''),
-                        'dba': core_data.get('dbaName', ''),
-                        'naics': [core_data.get('primaryNaics', '')],
-                        'set_aside': self._extract_set_aside(entity_reg),
-                        'capabilities': core_data.get('congressionalDistrict', ''),
-                        'location': {
-                            'city': core_data.get('physicalAddress', {}).get('city', ''),
-                            'state': core_data.get('physicalAddress', {}).get('stateOrProvinceCode', ''),
-                            'zip': core_data.get('physicalAddress', {}).get('zipCode', ''),
-                            'country': core_data.get('physicalAddress', {}).get('countryCode', 'USA')
-                        },
-                        'contact': {
-                            'email': core_data.get('entityContactEmail', ''),
-                            'phone': core_data.get('entityContactPhone', '')
-                        },
-                        'past_awards': {
-                            'count': 0,  # Would need FPDS-NG API for this
-                            'total_value': 0
-                        },
-                        'relevance_score': self._calculate_relevance(entity, query)
-                    }
-                    contractors.append(contractor)
-                except Exception as e:
-                    logger.warning(f"Error parsing entity: {str(e)}")
-                    continue
-            
-            return {
-                'contractors': contractors,
-                'pagination': {
-                    'page': page,
-                    'page_size': page_size,
-                    'total': total_records,
-                    'total_pages': (total_records + page_size - 1) // page_size
-                },
-                'source': 'SAM.gov',
-                'cached': False
-            }
-    
+        data = response.json()
+        entities = data.get('entityData', [])
+        total_records = data.get('totalRecords', 0)
+        
+        logger.info(f"✅ SAM.gov returned {len(entities)} entities ({total_records} total)")
+        
+        # Transform to our format
+        contractors = []
+        for entity in entities:
+            try:
+                core_data = entity.get('coreData', {})
+                entity_reg = entity.get('entityRegistration', {})
+                
+                contractor = {
+                    'id': len(contractors) + 1,
+                    'uei': core_data.get('ueiSAM', ''),
+                    'legal_name': core_data.get('legalBusinessName', ''),
+                    'dba': core_data.get('dbaName', ''),
+                    'naics': [core_data.get('primaryNaics', '')],
+                    'set_aside': self._extract_set_aside(entity_reg),
+                    'capabilities': core_data.get('congressionalDistrict', ''),
+                    'location': {
+                        'city': core_data.get('physicalAddress', {}).get('city', ''),
+                        'state': core_data.get('physicalAddress', {}).get('stateOrProvinceCode', ''),
+                        'zip': core_data.get('physicalAddress', {}).get('zipCode', ''),
+                        'country': core_data.get('physicalAddress', {}).get('countryCode', 'USA')
+                    },
+                    'contact': {
+                        'email': core_data.get('entityContactEmail', ''),
+                        'phone': core_data.get('entityContactPhone', '')
+                    },
+                    'past_awards': {
+                        'count': 0,  # Would need FPDS-NG API for this
+                        'total_value': 0
+                    },
+                    'relevance_score': self._calculate_relevance(entity, query)
+                }
+                contractors.append(contractor)
+            except Exception as e:
+                logger.warning(f"Error parsing entity: {str(e)}")
+                continue
+        
+        return {
+            'contractors': contractors,
+            'pagination': {
+                'page': page,
+                'page_size': page_size,
+                'total': total_records,
+                'total_pages': (total_records + page_size - 1) // page_size
+            },
+            'source': 'SAM.gov',
+            'cached': False
+        }
+
+    def _search_contractor_index(
+        self,
+        query: Dict[str, Any],
+        page: int = 1,
+        page_size: int = 20
+    ) -> Dict[str, Any]:
+        """
+        Search the in-memory contractor index (filters, ranking and facets in
+        memory; only the returned page is read from the contractors table)
+        """
+        result = contractor_index.search(query, offset=(page - 1) * page_size, limit=page_size)
+        scores = dict(zip(result['ids'], result['scores']))
+        
+        contractors = [
+            self._contractor_from_row(row, scores[row['id']])
+            for row in contractor_index.hydrate(self.db, result['ids'])
+        ]
+        
+        total = result['total']
+        return {
+            'contractors': contractors,
+            'pagination': {
+                'page': page,
+                'page_size': page_size,
+                'total': total,
+                'total_pages': (total + page_size - 1) // page_size
+            },
+            'facets': result['facets'],
+            'source': 'Contractor Index',
+            'cached': False,
+            'took_ms': result['took_ms']
+        }
+
+    @staticmethod
+    def _contractor_from_row(row: Dict[str, Any], relevance_score: int) -> Dict[str, Any]:
+        """API shape of a contractors table row"""
+        location = row.get('location') or {}
+        contact = row.get('contact_info') or {}
+        past_awards = row.get('past_awards') or {}
+        return {
+            'id': row['id'],
+            'uei': row['uei'],
+            'legal_name': row['legal_business_name'],
+            'dba': row.get('doing_business_as') or '',
+            'naics': row.get('naics_codes') or [],
+            'set_aside': row.get('set_aside_status') or [],
+            'capabilities': row.get('capabilities') or '',
+            'location': {
+                'city': location.get('city', ''),
+                'state': location.get('state', ''),
+                'zip': location.get('zip', ''),
+                'country': location.get('country', 'USA')
+            },
+            'contact': {
+                'email': contact.get('email', ''),
+                'phone': contact.get('phone', '')
+            },
+            'past_awards': {
+                'count': past_awards.get('count', 0),
+                'total_value': past_awards.get('total_value', 0)
+            },
+            'relevance_score': relevance_score
+        }
+
     def _extract_set_aside(self, entity_reg: Dict) -> List[str]:
         """Extract set-aside certifications from entity registration"""
         set_asides = []
@@ -225,10 +288,10 @@ class PartnerMatchingService:
         core_data = entity.get('coreData', {})
         entity_reg = entity.get('entityRegistration', {})
         
-        # NAICS match
+        # NAICS match (the code or one under it: "5415" matches 541512)
         if query.get('naics_codes'):
             primary_naics = core_data.get('primaryNaics', '')
-            if any(naics in primary_naics for naics in query['naics_codes']):
+            if any(naics_hierarchy.covers(naics, primary_naics) for naics in query['naics_codes']):
                 score += 30
         
         # Set-aside match
@@ -324,7 +387,7 @@ class PartnerMatchingService:
             
             # NAICS match
             if query.get('naics_codes'):
-                if any(naics in contractor['naics'] for naics in query['naics_codes']):
+                if any(naics_hierarchy.covers(naics, code) for naics in query['naics_codes'] for code in contractor['naics']):
                     score += 30
             else:
                 score += 10
@@ -392,9 +455,19 @@ class PartnerMatchingService:
         Returns:
             List of recommended contractors with match scores
         """
+        import logging
+        logger = logging.getLogger(__name__)
+        
         # Identify capability gaps
         gaps = self._identify_capability_gaps(opportunity_data, organization_capabilities)
         
+        # Semantic ranking of the whole contractor corpus once capability embeddings are built
+        if gaps and settings.CAPABILITY_EMBEDDINGS_ENABLED and capability_embeddings.ready:
+            try:
+                return await self._recommend_by_embeddings(gaps, opportunity_data)
+            except Exception as e:
+                logger.warning(f"⚠️  Capability embedding ranking failed: {str(e)}, using keyword search")
+        
         # Search for contractors that fill gaps
         recommendations = []
         
@@ -429,6 +502,104 @@ class PartnerMatchingService:
         
         return sorted_recommendations
     
+    async def _recommend_by_embeddings(
+        self,
+        gaps: List[Dict[str, Any]],
+        opportunity_data: Dict[str, Any],
+        per_gap: int = 5,
+        pool: int = 50
+    ) -> List[Dict[str, Any]]:
+        """
+        Recommend partners by capability-embedding similarity
+        
+        Each gap (with the opportunity's requirement text) is embedded and the
+        whole contractor corpus is scored in one batched pass. Similarity is
+        blended with NAICS and set-aside matches using the relevance score
+        weights (similarity 50, NAICS 30, set-aside 20); a required set-aside
+        stays a hard filter.
+        """
+        import asyncio
+        import numpy as np
+        
+        requirements = self._requirement_text(opportunity_data)
+        texts = [f"{gap['capability_needed']}. {requirements}".strip(' .') for gap in gaps]
+        queries = await asyncio.to_thread(capability_embeddings.embed, texts)
+        
+        naics = opportunity_data.get('naics')
+        set_aside = opportunity_data.get('set_aside')
+        
+        # Blend and filter across the corpus when the contractor index can supply
+        # facet flags; otherwise the similarity pool is re-ranked after hydration
+        ids = capability_embeddings.ids()
+        naics_flags = contractor_index.flags(ids, 'naics', [naics]) if naics else None
+        set_aside_flags = contractor_index.flags(ids, 'set_aside', [set_aside]) if set_aside else None
+        base_bias = None
+        if naics_flags is not None or set_aside_flags is not None:
+            base_bias = np.zeros(len(ids), dtype=np.float32)
+            if naics_flags is not None:
+                base_bias += 0.6 * naics_flags
+            if set_aside_flags is not None:
+                base_bias += 0.4 * set_aside_flags
+        bias, allowed = [], []
+        for gap in gaps:
+            bias.append(base_bias)
+            required = gap.get('requires_set_aside')
+            if required and required == set_aside:
+                allowed.append(set_aside_flags)
+            elif required:
+                allowed.append(contractor_index.flags(ids, 'set_aside', [required]))
+            else:
+                allowed.append(None)
+        
+        ranked = await asyncio.to_thread(capability_embeddings.top_k, queries, pool, bias, allowed)
+        rows = {
+            row['id']: row
+            for row in contractor_index.hydrate(self.db, sorted({int(i) for r in ranked for i in r['ids']}))
+        }
+        
+        recommendations = {}
+        for gap, result in zip(gaps, ranked):
+            best = result['best']
+            candidates = []
+            for contractor_id, similarity in zip(result['ids'].tolist(), result['similarity'].tolist()):
+                row = rows.get(contractor_id)
+                if row is None:
+                    continue
+                holds = row.get('set_aside_status') or []
+                if gap.get('requires_set_aside') and gap['requires_set_aside'] not in holds:
+                    continue
+                codes = {
+                    str(c.get('naicsCode') or c.get('code')) if isinstance(c, dict) else str(c)
+                    for c in row.get('naics_codes') or []
+                }
+                score = 50 * (similarity / best if best > 0 else 0.0)
+                score += 30 if naics and str(naics) in codes else 0
+                score += 20 if set_aside and set_aside in holds else 0
+                candidates.append((min(int(round(score)), 100), round(similarity, 4), row))
+            
+            candidates.sort(key=lambda c: c[0], reverse=True)
+            for score, similarity, row in candidates[:per_gap]:
+                contractor = self._contractor_from_row(row, score)
+                contractor['fills_gap'] = gap['gap_name']
+                contractor['match_score'] = score
+                contractor['capability_similarity'] = similarity
+                if contractor['id'] not in recommendations or score > recommendations[contractor['id']]['match_score']:
+                    recommendations[contractor['id']] = contractor
+        
+        return sorted(recommendations.values(), key=lambda x: x['match_score'], reverse=True)[:10]
+    
+    @staticmethod
+    def _requirement_text(opportunity_data: Dict[str, Any], max_chars: int = 2000) -> str:
+        """Opportunity requirement text used as embedding query context"""
+        parts = []
+        for key in ('title', 'description', 'sow_requirements'):
+            value = opportunity_data.get(key)
+            if isinstance(value, (list, tuple)):
+                value = '; '.join(str(v) for v in value)
+            if value:
+                parts.append(str(value))
+        return ' '.join(parts)[:max_chars]
+    
     def _identify_capability_gaps(
         self,
         opportunity_data: Dict[str, Any],
@@ -482,6 +653,10 @@ class PartnerMatchingService:
         Sync contractor data from SAM.gov API
         Populates/updates contractors table
         
+        Delegates to ContractorSyncService: pages are fetched concurrently,
+        upserted one page per statement, and checkpointed so an interrupted
+        sync resumes where it stopped.
+        
         Args:
             batch_size: Number of records per API call
             incremental: Only fetch new/updated records since last sync
@@ -489,101 +664,9 @@ class PartnerMatchingService:
         Returns:
             Sync statistics
         """
-        if not self.sam_api_key:
-            return {"error": "SAM.gov API key not configured"}
-        
-        stats = {
-            "new_contractors": 0,
-            "updated_contractors": 0,
-            "errors": 0,
-            "sync_started": datetime.utcnow().isoformat()
-        }
-        
-        # Determine last sync date if incremental
-        last_sync = None
-        if incremental:
-            last_sync_query = "SELECT MAX(last_updated) FROM contractors"
-            last_sync = self.db.execute(last_sync_query).scalar()
-        
-        # Build SAM.gov API params
-        params = {
-            "api_key": self.sam_api_key,
-            "samRegistered": "Yes",
-            "includeSections": "entityRegistration,coreData",
-            "format": "JSON",
-            "limit": batch_size
-        }
+        from app.services.contractor_sync_service import ContractorSyncService
         
-        if last_sync:
-            # Format date for SAM.gov API (MM/DD/YYYY)
-            params["registrationDate"] = last_sync.strftime("%m/%d/%Y")
-        
-        try:
-            async with httpx.AsyncClient() as client:
-                page = 0
-                while True:
-                    params["offset"] = page * batch_size
-                    
-                    response = await client.get(self.SAM_GOV_API, params=params, timeout=30.0)
-                    response.raise_for_status()
-                    
-                    data = response.json()
-                    entities = data.get("entityData", [])
-                    
-                    if not entities:
-                        break
-                    
-                    # Process batch
-                    for entity in entities:
-                        try:
-                            contractor_data = self._parse_sam_entity(entity)
-                            
-                            # Check if exists
-                            existing = self.db.execute(
-                                "SELECT id FROM contractors WHERE uei = :uei",
-                                {"uei": contractor_data['uei']}
-                            ).scalar()
-                            
-                            if existing:
-                                # Update
-                                self.db.execute(
-                                    """UPDATE contractors SET 
-                                       legal_business_name = :legal_name,
-                                       naics_codes = :naics,
-                                       set_aside_status = :set_aside,
-                                       location = :location,
-                                       last_updated = NOW()
-                                       WHERE uei = :uei""",
-                                    contractor_data
-                                )
-                                stats['updated_contractors'] += 1
-                            else:
-                                # Insert
-                                self.db.execute(
-                                    """INSERT INTO contractors 
-                                       (uei, duns, legal_business_name, naics_codes, set_aside_status, location, last_updated)
-                                       VALUES (:uei, :duns, :legal_name, :naics, :set_aside, :location, NOW())""",
-                                    contractor_data
-                                )
-                                stats['new_contractors'] += 1
-                        
-                        except Exception as e:
-                            stats['errors'] += 1
-                            print(f"Error processing entity: {e}")
-                    
-                    self.db.commit()
-                    page += 1
-                    
-                    # Check if more pages
-                    if len(entities) < batch_size:
-                        break
-        
-        except Exception as e:
-            stats['error_message'] = str(e)
-            return stats
-        
-        stats['sync_completed'] = datetime.utcnow().isoformat()
-        return stats
+        return await ContractorSyncService(self.db).sync(batch_size=batch_size, incremental=incremental)
     
     def _parse_sam_entity(self, entity: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -598,6 +681,7 @@ class PartnerMatchingService:
             "legal_name": core_data.get("legalBusinessName"),
             "naics": entity_reg.get("naicsCodes", []),
             "set_aside": self._extract_set_aside(entity_reg),
+            "active": entity_reg.get("registrationStatus", "Active") == "Active",
             "location": {
                 "address": core_data.get("physicalAddress", {}),
                 "city": core_data.get("physicalAddress", {}).get("city"),
@@ -0,0 +1,112 @@
+"""
+Vectorized PWin scoring for SAM.gov notices
+Batch equivalent of the simple PWin heuristic (set-aside bonus + recency bonus),
+computed with NumPy over columns so whole pages, mirror syncs and extract
+batches are scored in one pass
+"""
+from typing import Any, Dict, Iterable, Optional, Sequence
+from datetime import date, datetime
+import re
+
+import numpy as np
+
+BASE_SCORE = 50
+SMALL_BUSINESS_BONUS = 20
+WOMAN_VETERAN_BONUS = 15
+POSTED_WITHIN_7_DAYS_BONUS = 10
+POSTED_WITHIN_14_DAYS_BONUS = 5
+
+_ISO_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+_NAT = np.datetime64('NaT', 'D')
+
+
+def _set_aside_bonus(set_asides: Sequence[Optional[str]]) -> np.ndarray:
+    """Bonus per notice; classifies each distinct set-aside string once"""
+    if not len(set_asides):
+        return np.zeros(0, dtype=np.int16)
+    values = np.array([s or '' for s in set_asides], dtype=object).astype(str)
+    uniques, inverse = np.unique(values, return_inverse=True)
+    lowered = np.char.lower(uniques)
+    bonus = np.where(
+        np.char.find(lowered, 'small business') >= 0,
+        SMALL_BUSINESS_BONUS,
+        np.where(
+            (np.char.find(lowered, 'woman') >= 0) | (np.char.find(lowered, 'veteran') >= 0),
+            WOMAN_VETERAN_BONUS,
+            0
+        )
+    ).astype(np.int16)
+    return bonus[inverse.reshape(-1)]
+
+
+def _to_day(value: Any) -> np.datetime64:
+    if isinstance(value, datetime):
+        return np.datetime64(value.date(), 'D')
+    if isinstance(value, date):
+        return np.datetime64(value, 'D')
+    if isinstance(value, str) and _ISO_DATE.match(value[:10]):
+        try:
+            return np.datetime64(value[:10], 'D')
+        except ValueError:
+            return _NAT
+    return _NAT
+
+
+def parse_posted_dates(posted_dates: Sequence[Any]) -> np.ndarray:
+    """
+    Parse posted dates ('YYYY-MM-DD...' strings, date/datetime objects or None)
+    into a datetime64[D] array; unparseable values become NaT.
+    Each distinct value is parsed once (a page or a day's extract spans few dates).
+    """
+    if isinstance(posted_dates, np.ndarray) and np.issubdtype(posted_dates.dtype, np.datetime64):
+        return posted_dates.astype('datetime64[D]')
+    if not len(posted_dates):
+        return np.zeros(0, dtype='datetime64[D]')
+    keys = np.array([
+        v[:10] if isinstance(v, str) else (v.isoformat()[:10] if isinstance(v, (date, datetime)) else '')
+        for v in posted_dates
+    ], dtype=object).astype(str)
+    uniques, inverse = np.unique(keys, return_inverse=True)
+    parsed = np.array([_to_day(u) for u in uniques], dtype='datetime64[D]')
+    return parsed[inverse.reshape(-1)]
+
+
+def score_columns(
+    set_asides: Sequence[Optional[str]],
+    posted_dates: Sequence[Any],
+    today: Optional[date] = None
+) -> np.ndarray:
+    """
+    Score columnar notice data
+
+    Args:
+        set_asides: typeOfSetAsideDescription per notice
+        posted_dates: postedDate per notice (strings, dates or datetime64 array)
+        today: Reference date for the recency bonus (default: today)
+
+    Returns:
+        int array of PWin scores (0-100), aligned with the inputs
+    """
+    days = parse_posted_dates(posted_dates)
+    reference = np.datetime64(today or date.today(), 'D')
+    age = (reference - days).astype('timedelta64[D]')
+    valid = ~np.isnat(days)
+    age_days = np.where(valid, age.astype(np.int64), np.iinfo(np.int64).max)
+
+    recency = np.where(
+        age_days < 7,
+        POSTED_WITHIN_7_DAYS_BONUS,
+        np.where(age_days < 14, POSTED_WITHIN_14_DAYS_BONUS, 0)
+    )
+    scores = BASE_SCORE + _set_aside_bonus(set_asides) + recency
+    return np.minimum(scores, 100).astype(np.int64)
+
+
+def score_notices(notices: Iterable[Dict[str, Any]], today: Optional[date] = None) -> np.ndarray:
+    """Score raw SAM.gov notices (API shape); returns an int array aligned with `notices`"""
+    notices = list(notices)
+    return score_columns(
+        [n.get('typeOfSetAsideDescription') for n in notices],
+        [n.get('postedDate') for n in notices],
+        today=today
+    )
@@ -12,6 +12,7 @@ from app.models.opportunity import Opportunity
 from app.models.organization import Organization
 from app.models.knowledge import PastPerformance
 from app.services.llm_service import LLMService
+from app.services.naics_hierarchy import naics_hierarchy
 
 
 class QualificationAnalysisService:
@@ -138,11 +139,34 @@ class QualificationAnalysisService:
             })
             score += 20
         
-        # Size standard check (20 points)
-        # Simplified - would check actual size standard from SAM.gov
-        if org.annual_revenue:
+        # Size standard check (20 points): SBA standard of the opportunity's NAICS code
+        standard = naics_hierarchy.size_standard(opp.naics_code)
+        if standard and standard.unit == "$M" and org.annual_revenue:
+            if org.annual_revenue <= standard.value * 1_000_000:
+                checks.append({
+                    "requirement": f"Size Standard: {standard.describe()}",
+                    "status": "pass",
+                    "detail": f"✅ Your revenue: ${org.annual_revenue:,.0f} (within limit)",
+                })
+                score += 20
+            else:
+                checks.append({
+                    "requirement": f"Size Standard: {standard.describe()}",
+                    "status": "fail",
+                    "detail": f"❌ Your revenue: ${org.annual_revenue:,.0f} exceeds the NAICS {opp.naics_code} size standard",
+                    "mitigation": "You are other than small for this NAICS code - bid unrestricted work or as a subcontractor."
+                })
+        elif standard and standard.unit != "$M":
+            basis = "headcount" if standard.unit == "employees" else "total assets"
             checks.append({
-                "requirement": f"Size Standard: ${opp.size_standard or 'Unknown'}",
+                "requirement": f"Size Standard: {standard.describe()}",
+                "status": "unknown",
+                "detail": f"⚠️ NAICS {opp.naics_code} is sized by {basis}; confirm you have no more than {standard.describe()}"
+            })
+            score += 10
+        elif org.annual_revenue:
+            checks.append({
+                "requirement": "Size Standard: Unknown",
                 "status": "pass",
                 "detail": f"✅ Your revenue: ${org.annual_revenue:,.0f} (within limit)",
             })
@@ -155,7 +179,8 @@ class QualificationAnalysisService:
             })
             score += 10
         
-        # NAICS code check (20 points)
+        # NAICS code check (20 points; 15 for a code in the same industry group)
+        related, similarity = naics_hierarchy.best_match(opp.naics_code, org.naics_codes)
         if opp.naics_code in (org.naics_codes or []):
             checks.append({
                 "requirement": f"NAICS: {opp.naics_code}",
@@ -163,6 +188,15 @@ class QualificationAnalysisService:
                 "detail": f"✅ {opp.naics_code} is your primary NAICS code"
             })
             score += 20
+        elif similarity >= 0.6:  # Same 4-digit industry group
+            checks.append({
+                "requirement": f"NAICS: {opp.naics_code}",
+                "status": "warning",
+                "detail": f"⚠️ {opp.naics_code} not in your NAICS codes, but related to your {related} "
+                          f"({naics_hierarchy.title(related) or 'same industry group'})",
+                "mitigation": "Highlight your related work, and consider adding the code to your SAM.gov registration"
+            })
+            score += 15
         else:
             checks.append({
                 "requirement": f"NAICS: {opp.naics_code}",
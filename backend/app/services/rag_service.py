@@ -4,13 +4,188 @@ Grounds AI responses in actual company knowledge base to prevent hallucinations
 Uses pgvector for semantic search over embeddings
 """
 
-from typing import List, Dict, Any, Optional
+from collections import deque
+from functools import lru_cache
+from typing import List, Dict, Any, Callable, NamedTuple, Optional, Tuple
+import asyncio
+import base64
+import io
+import json
+import logging
+import re
+import struct
+import time
+import zlib
+
+from prometheus_client import Counter, Histogram
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-import openai
+from sqlalchemy import select, text
 from app.config import settings
+from app.models.knowledge import RagDocument
+from app.services.embedding_cache import embedding_cache, normalize_text, text_hash
+from app.services.llm_clients import async_openai_client, openai_client
+from app.services.vector_index import ORGANIZATION_KEY, apply_search_settings, vector_literal
 import numpy as np
 
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics
+RAG_INDEXED_CHUNKS = Counter(
+    'rag_indexed_chunks_total',
+    'Document chunks embedded and stored for RAG'
+)
+
+RAG_EMBEDDING_BATCH = Histogram(
+    'rag_embedding_batch_seconds',
+    'Time for one embeddings API call (one token-bounded batch of chunks)',
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+
+RAG_INDEX_THROUGHPUT = Histogram(
+    'rag_index_chunks_per_second',
+    'Chunks indexed per second for one document (chunking, embedding and insert)',
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+)
+
+RAG_REINDEXED_CHUNKS = Counter(
+    'rag_reindexed_chunks_total',
+    'Chunks of re-indexed documents by outcome',
+    ['action']  # kept | inserted | deleted
+)
+
+RAG_SEARCH_LEG = Histogram(
+    'rag_hybrid_leg_seconds',
+    'Time for one leg of a hybrid search (vector includes embedding the query)',
+    ['leg'],  # vector | lexical
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+_COPY_SQL = (
+    "COPY document_embeddings (id, document_id, chunk_index, content, content_hash, embedding, metadata) "
+    "FROM STDIN WITH (FORMAT binary)"
+)
+_COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)  # Signature, flags, no extension
+_COPY_TRAILER = struct.pack(">h", -1)
+
+DEFAULT_CHUNK_SIZE = 1000     # Characters per chunk
+DEFAULT_CHUNK_OVERLAP = 200   # Characters shared by consecutive chunks
+_INDEX_GROUP_CHUNKS = 4096    # Knowledge base chunks embedded together (bounds memory)
+_CUT_EVERY = 4                # Past half size, about one sentence end in this many closes a chunk
+_SEGMENT_END = re.compile(r"[.!?](?=\s)|\n")
+_REINDEX_ATTEMPTS = 3         # Plans recomputed when a concurrent save changes the stored chunks
+
+TEXT_SEARCH_CONFIG = "english"  # Must match document_embeddings.content_tsv
+_QUERY_TERM = re.compile(r"[A-Za-z0-9](?:[A-Za-z0-9.\-/]*[A-Za-z0-9])?")
+
+
+@lru_cache(maxsize=1)
+def _token_encoding():
+    """cl100k_base (text-embedding-3 tokenizer), or None when it cannot be loaded"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"⚠️  tiktoken unavailable, estimating embedding batch tokens from length: {str(e)}")
+        return None
+
+
+def count_tokens(value: str) -> int:
+    """Tokens in `value` as the embeddings API counts them (estimated without tiktoken)"""
+    encoding = _token_encoding()
+    if encoding is None:
+        return len(value) // 3 + 1  # Conservative: English averages ~4 characters per token
+    return len(encoding.encode(value, disallowed_special=()))
+
+
+def lexical_query_terms(query: str) -> Tuple[str, str]:
+    """
+    websearch_to_tsquery() inputs for a search query: any of its terms, and
+    any of its exact identifiers (terms with a digit or two capitals: clause
+    and contract numbers, acronyms such as DFARS or FedRAMP)
+
+    Full-text ranking has no notion of term rarity, so a chunk repeating
+    "compliance" would outrank the one quoting "252.204-7012"; identifier
+    matches are ranked first. A hyphenated number stays one phrase
+    ('252.204' <-> '-7012'), so neighbouring clauses do not match.
+    """
+    terms = [t for t in _QUERY_TERM.findall(query or "") if t.lower() != "or"]
+    identifiers = [t for t in terms if any(c.isdigit() for c in t) or sum(c.isupper() for c in t) >= 2]
+    return " or ".join(terms), " or ".join(identifiers)
+
+
+def reciprocal_rank_fusion(rankings: List[List[Any]], k: int = 60) -> List[Tuple[Any, float]]:
+    """
+    Fuse ranked lists of ids: each id scores sum(1 / (k + rank)) over the
+    lists it appears in (rank from 1). Scores, not raw similarities or
+    ts_rank values, so the two legs need no calibration against each other.
+    
+    Returns:
+        (id, score), best first; ties keep first-seen order
+    """
+    scores: Dict[Any, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+class ReindexPlan(NamedTuple):
+    """Changes bringing a document's stored chunks in line with its new chunks"""
+    kept: int                          # Stored chunks reused as they are
+    renumber: List[Tuple[int, int]]    # (embedding id, new chunk_index) of kept chunks that moved
+    insert: List[int]                  # Positions of new chunks to embed and insert
+    delete: List[int]                  # Embedding ids of stored chunks no longer in the document
+
+
+def plan_reindex(stored: List[Tuple[int, int, str]], hashes: List[str]) -> ReindexPlan:
+    """
+    Diff stored chunks against a document's new chunk hashes
+    
+    Args:
+        stored: (embedding id, chunk_index, content hash) of the stored chunks
+        hashes: Content hash of each new chunk, in order
+    
+    Returns:
+        ReindexPlan; a repeated chunk reuses one stored row per occurrence
+    """
+    available: Dict[str, deque] = {}
+    for embedding_id, chunk_index, content_hash in sorted(stored, key=lambda row: (row[1], row[0])):
+        available.setdefault(content_hash, deque()).append((embedding_id, chunk_index))
+    
+    kept, renumber, insert = 0, [], []
+    for position, content_hash in enumerate(hashes):
+        rows = available.get(content_hash)
+        if rows:
+            embedding_id, chunk_index = rows.popleft()
+            kept += 1
+            if chunk_index != position:
+                renumber.append((embedding_id, position))
+        else:
+            insert.append(position)
+    delete = [embedding_id for rows in available.values() for embedding_id, _ in rows]
+    return ReindexPlan(kept, renumber, insert, delete)
+
+
+def token_batches(texts: List[str], max_tokens: int, max_inputs: int) -> List[List[int]]:
+    """
+    Group texts (by position) into consecutive batches of at most `max_inputs`
+    texts and `max_tokens` tokens; a text over `max_tokens` gets a batch of its own
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    tokens = 0
+    for i, value in enumerate(texts):
+        size = count_tokens(value)
+        if current and (tokens + size > max_tokens or len(current) >= max_inputs):
+            batches.append(current)
+            current, tokens = [], 0
+        current.append(i)
+        tokens += size
+    if current:
+        batches.append(current)
+    return batches
+
 
 class RAGService:
     """
@@ -21,11 +196,23 @@ class RAGService:
     2. Grounds all AI responses in real, verified content
     3. Prevents hallucinations by only using retrieved context
     4. Tracks sources for full auditability
+    5. Batched indexing: chunks embedded in token-bounded batches, a few
+       batches in flight at once, one binary COPY per document
+    6. Content-addressed embedding cache: repeated chunks and queries are
+       embedded once (in-process LRU, then the embedding_cache table)
+    7. Hybrid retrieval: full-text and vector rankings, run concurrently and
+       fused by reciprocal rank, so exact clause numbers and acronyms are
+       found without raising top_k
+    8. Incremental re-indexing: content-defined chunk boundaries and chunk
+       hashes, so an edit re-embeds only the chunks it touched
     """
     
     def __init__(self, db: Session):
         self.db = db
-        self.openai_client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.openai_client = openai_client(settings.OPENAI_API_KEY)
+        self.async_openai_client = async_openai_client(settings.OPENAI_API_KEY)
+        self._embedding_slots: Optional[asyncio.Semaphore] = None
+        self.embedding_stats = {"texts": 0, "embedded": 0}  # Texts requested vs sent to the API
         self.embedding_model = "text-embedding-3-small"  # Cost-effective, high quality
         self.embedding_dimensions = 1536
     
@@ -33,19 +220,79 @@ class RAGService:
         """
         Generate embedding vector for text using OpenAI
         """
-        response = self.openai_client.embeddings.create(
-            model=self.embedding_model,
-            input=text
-        )
-        return response.data[0].embedding
+        return (await self.generate_embeddings([text]))[0].tolist()
+    
+    async def generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed many texts. Texts are normalized (whitespace, Unicode form) and
+        looked up in the embedding cache; each distinct uncached text is sent
+        once, in token-bounded batches with up to RAG_EMBEDDING_CONCURRENCY
+        calls in flight (shared by every document this service is indexing)
+        
+        Returns:
+            float32 array of shape (len(texts), dimensions), in text order
+        """
+        if self._embedding_slots is None:
+            self._embedding_slots = asyncio.Semaphore(settings.RAG_EMBEDDING_CONCURRENCY)
+        
+        normalized = [normalize_text(t) for t in texts]
+        hashes = [text_hash(t) for t in normalized]
+        cached: Dict[str, np.ndarray] = {}
+        if settings.EMBEDDING_CACHE_ENABLED:
+            cached = embedding_cache.get_many(self.db, self.embedding_model, self.embedding_dimensions, hashes)
+        
+        # First position of each distinct text the cache does not have
+        pending: Dict[str, int] = {}
+        for i, key in enumerate(hashes):
+            if key not in cached and key not in pending:
+                pending[key] = i
+        inputs = [normalized[i] for i in pending.values()]
+        fresh = np.zeros((len(inputs), self.embedding_dimensions), dtype=np.float32)
+        
+        async def embed_batch(positions: List[int]):
+            async with self._embedding_slots:
+                started = time.perf_counter()
+                # base64: packed float32 instead of JSON numbers, which the client
+                # otherwise parses one by one (most of the call for large batches)
+                response = await self.async_openai_client.embeddings.create(
+                    model=self.embedding_model,
+                    input=[inputs[i] or " " for i in positions],
+                    encoding_format="base64"
+                )
+                RAG_EMBEDDING_BATCH.observe(time.perf_counter() - started)
+            for item in response.data:
+                if isinstance(item.embedding, str):
+                    vector = np.frombuffer(base64.b64decode(item.embedding), dtype="<f4")
+                else:
+                    vector = np.asarray(item.embedding, dtype=np.float32)
+                fresh[positions[item.index]] = vector[:self.embedding_dimensions]
+        
+        batches = token_batches(inputs, settings.RAG_EMBEDDING_BATCH_TOKENS, settings.RAG_EMBEDDING_BATCH_INPUTS)
+        await asyncio.gather(*(embed_batch(positions) for positions in batches))
+        
+        embedded = dict(zip(pending.keys(), fresh))
+        vectors = {**cached, **embedded}
+        if settings.EMBEDDING_CACHE_ENABLED:
+            embedding_cache.put_many(self.db, self.embedding_model, self.embedding_dimensions, embedded)
+            saved = sum(count_tokens(normalized[i]) for i, key in enumerate(hashes) if pending.get(key) != i)
+            if saved:
+                embedding_cache.record_saved_tokens(saved)
+        
+        self.embedding_stats["texts"] += len(texts)
+        self.embedding_stats["embedded"] += len(inputs)
+        
+        embeddings = np.zeros((len(texts), self.embedding_dimensions), dtype=np.float32)
+        for i, key in enumerate(hashes):
+            embeddings[i] = vectors[key]
+        return embeddings
     
     async def store_document_embedding(
         self,
         document_id: int,
         content: str,
         metadata: Dict[str, Any],
-        chunk_size: int = 1000,
-        chunk_overlap: int = 200
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        chunk_overlap: int = DEFAULT_CHUNK_OVERLAP
     ) -> List[int]:
         """
         Chunk document, generate embeddings, store in vector DB
@@ -58,41 +305,79 @@ class RAGService:
             chunk_overlap: Overlap between chunks for context preservation
         
         Returns:
-            List of embedding IDs created
+            List of embedding IDs created, in chunk order
         """
+        started = time.perf_counter()
+        
         # Chunk the document
         chunks = self._chunk_text(content, chunk_size, chunk_overlap)
+        if not chunks:
+            return []
         
-        embedding_ids = []
-        for i, chunk in enumerate(chunks):
-            # Generate embedding
-            embedding = await self.generate_embedding(chunk)
-            
-            # Store in database with pgvector
-            query = text("""
-                INSERT INTO document_embeddings 
-                (document_id, chunk_index, content, embedding, metadata)
-                VALUES (:document_id, :chunk_index, :content, :embedding::vector, :metadata)
-                RETURNING id
-            """)
-            
-            result = self.db.execute(
-                query,
-                {
-                    "document_id": document_id,
-                    "chunk_index": i,
-                    "content": chunk,
-                    "embedding": embedding,
-                    "metadata": metadata
-                }
-            )
-            
-            embedding_id = result.scalar()
-            embedding_ids.append(embedding_id)
+        # Generate embeddings (batched, concurrent)
+        embeddings = await self.generate_embeddings(chunks)
         
+        # Store in database with pgvector: one COPY for the whole document
+        embedding_ids = self._copy_chunks(document_id, list(range(len(chunks))), chunks, embeddings, metadata)
         self.db.commit()
+        
+        seconds = time.perf_counter() - started
+        rate = len(chunks) / seconds if seconds > 0 else 0.0
+        RAG_INDEXED_CHUNKS.inc(len(chunks))
+        RAG_INDEX_THROUGHPUT.observe(rate)
+        logger.info(f"📚 Indexed document {document_id}: {len(chunks)} chunks in {seconds:.2f}s ({rate:.1f} chunks/sec)")
+        return embedding_ids
+    
+    def _copy_chunks(
+        self,
+        document_id: int,
+        chunk_indexes: List[int],
+        contents: List[str],
+        embeddings: np.ndarray,
+        metadata: Dict[str, Any]
+    ) -> List[int]:
+        """
+        Write chunk rows with one binary COPY (no per-float text formatting);
+        IDs are reserved from the table's sequence first, since COPY cannot
+        return them
+        
+        Returns:
+            Embedding IDs, one per chunk in the order given
+        """
+        connection = self.db.connection().connection
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence('document_embeddings', 'id')) "
+                "FROM generate_series(1, %s)",
+                (len(contents),)
+            )
+            embedding_ids = sorted(row[0] for row in cursor.fetchall())
+            
+            metadata_field = self._copy_field(b"\x01" + json.dumps(metadata or {}, default=str).encode("utf-8"))
+            vectors = embeddings.astype(">f4")  # pgvector binary: big-endian float4
+            vector_header = struct.pack(">hh", vectors.shape[1], 0)  # Dimensions, unused
+            
+            buffer = io.BytesIO()
+            buffer.write(_COPY_HEADER)
+            for embedding_id, chunk_index, content, vector in zip(embedding_ids, chunk_indexes, contents, vectors):
+                buffer.write(struct.pack(">hiiiiii", 7, 4, embedding_id, 4, document_id, 4, chunk_index))
+                buffer.write(self._copy_field(content.encode("utf-8")))
+                buffer.write(self._copy_field(text_hash(content).encode("ascii")))
+                buffer.write(self._copy_field(vector_header + vector.tobytes()))
+                buffer.write(metadata_field)
+            buffer.write(_COPY_TRAILER)
+            buffer.seek(0)
+            cursor.copy_expert(_COPY_SQL, buffer)
+        finally:
+            cursor.close()
         return embedding_ids
     
+    @staticmethod
+    def _copy_field(value: bytes) -> bytes:
+        """One field of a binary COPY row: int32 length, then the value"""
+        return struct.pack(">i", len(value)) + value
+    
     async def search_similar_content(
         self,
         query: str,
@@ -114,51 +399,213 @@ class RAGService:
         """
         # Generate query embedding
         query_embedding = await self.generate_embedding(query)
+        results = self._nearest_chunks(query_embedding, top_k, filter_metadata, similarity_threshold)
         
-        # Perform vector similarity search
-        metadata_filter = ""
-        if filter_metadata:
-            conditions = [f"metadata->'{k}' = '{v}'" for k, v in filter_metadata.items()]
-            metadata_filter = f"AND {' AND '.join(conditions)}"
+        return self._format_results([dict(row._mapping) for row in results])
+    
+    async def hybrid_search(
+        self,
+        query: str,
+        top_k: int = 5,
+        filter_metadata: Optional[Dict[str, Any]] = None,
+        similarity_threshold: float = 0.7
+    ) -> str:
+        """
+        Lexical + vector search over the knowledge base (vector only when
+        RAG_HYBRID_SEARCH is off)
         
-        search_query = text(f"""
-            SELECT 
-                id,
-                document_id,
-                chunk_index,
-                content,
-                metadata,
-                1 - (embedding <=> :query_embedding::vector) AS similarity
-            FROM document_embeddings
-            WHERE 1 - (embedding <=> :query_embedding::vector) > :threshold
-            {metadata_filter}
-            ORDER BY embedding <=> :query_embedding::vector
-            LIMIT :top_k
-        """)
+        Args:
+            query: Search query (question or topic)
+            top_k: Number of top results to return
+            filter_metadata: Optional filters (e.g., {"category": "past_performance"})
+            similarity_threshold: Minimum cosine similarity for vector matches (0-1)
         
-        results = self.db.execute(
-            search_query,
-            {
-                "query_embedding": query_embedding,
-                "threshold": similarity_threshold,
-                "top_k": top_k
-            }
-        ).fetchall()
+        Returns:
+            Concatenated relevant content with source citations
+        """
+        if not settings.RAG_HYBRID_SEARCH:
+            return await self.search_similar_content(query, top_k, filter_metadata, similarity_threshold)
+        results = await self.hybrid_chunks(query, top_k, filter_metadata, similarity_threshold)
+        return self._format_results(results)
+    
+    async def hybrid_chunks(
+        self,
+        query: str,
+        top_k: int = 5,
+        filter_metadata: Optional[Dict[str, Any]] = None,
+        similarity_threshold: float = 0.7
+    ) -> List[Dict[str, Any]]:
+        """
+        The top_k chunks by reciprocal rank fusion of a full-text ranking and
+        a vector ranking
+        
+        Each leg ranks RAG_HYBRID_CANDIDATES chunks. The lexical leg runs in a
+        worker thread on its own session while the query is embedded and the
+        vector leg runs on this one. A failed lexical leg (e.g. before the
+        content_tsv migration) leaves the vector ranking alone.
+        
+        Returns:
+            Chunk rows as dicts with similarity (None for keyword-only
+            matches), vector_rank, lexical_rank and rrf_score
+        """
+        candidates = max(top_k, settings.RAG_HYBRID_CANDIDATES)
+        
+        async def vector_leg() -> List[Any]:
+            started = time.perf_counter()
+            query_embedding = await self.generate_embedding(query)
+            rows = self._nearest_chunks(query_embedding, candidates, filter_metadata, similarity_threshold)
+            RAG_SEARCH_LEG.labels(leg="vector").observe(time.perf_counter() - started)
+            return rows
+        
+        vector_rows, lexical_rows = await asyncio.gather(
+            vector_leg(),
+            asyncio.to_thread(self._lexical_leg, query, candidates, filter_metadata)
+        )
+        
+        chunks: Dict[int, Dict[str, Any]] = {}
+        for leg, rows in (("lexical", lexical_rows), ("vector", vector_rows)):
+            for rank, row in enumerate(rows, start=1):
+                chunk = chunks.setdefault(row.id, {**row._mapping, "similarity": None})
+                chunk[f"{leg}_rank"] = rank
+                if leg == "vector":
+                    chunk["similarity"] = row.similarity
+        
+        fused = reciprocal_rank_fusion(
+            [[row.id for row in vector_rows], [row.id for row in lexical_rows]],
+            k=settings.RAG_RRF_K
+        )
+        results = []
+        for chunk_id, score in fused[:top_k]:
+            chunk = chunks[chunk_id]
+            chunk.setdefault("vector_rank", None)
+            chunk.setdefault("lexical_rank", None)
+            chunk["rrf_score"] = round(score, 6)
+            results.append(chunk)
+        return results
+    
+    def _lexical_leg(
+        self,
+        query: str,
+        limit: int,
+        filter_metadata: Optional[Dict[str, Any]] = None
+    ) -> List[Any]:
+        """Full-text ranking on a session of its own (runs in a worker thread)"""
+        started = time.perf_counter()
+        try:
+            with Session(bind=self.db.get_bind()) as db:
+                return self._lexical_chunks(db, query, limit, filter_metadata)
+        except Exception as e:
+            logger.warning(f"⚠️  Lexical search failed, using vector results only: {str(e)}")
+            return []
+        finally:
+            RAG_SEARCH_LEG.labels(leg="lexical").observe(time.perf_counter() - started)
+    
+    @staticmethod
+    def _lexical_chunks(
+        db: Session,
+        query: str,
+        limit: int,
+        filter_metadata: Optional[Dict[str, Any]] = None
+    ) -> List[Any]:
+        """
+        Chunks matching any query term (GIN index on content_tsv), exact
+        identifier matches first, then by cover density
+        """
+        terms, identifiers = lexical_query_terms(query)
+        if not terms:
+            return []
+        params: Dict[str, Any] = {"terms": terms, "limit": limit}
+        conditions = [f"content_tsv @@ websearch_to_tsquery('{TEXT_SEARCH_CONFIG}', :terms)"]
+        conditions += RAGService._filter_conditions(filter_metadata, params)
+        order = [f"ts_rank_cd(content_tsv, websearch_to_tsquery('{TEXT_SEARCH_CONFIG}', :terms)) DESC", "id"]
+        if identifiers:
+            order.insert(0, f"ts_rank_cd(content_tsv, websearch_to_tsquery('{TEXT_SEARCH_CONFIG}', :identifiers)) DESC")
+            params["identifiers"] = identifiers
         
-        # Format results with citations
+        lexical_query = text(f"""
+            SELECT id, document_id, chunk_index, content, metadata
+            FROM document_embeddings
+            WHERE {' AND '.join(conditions)}
+            ORDER BY {', '.join(order)}
+            LIMIT :limit
+        """)
+        return db.execute(lexical_query, params).fetchall()
+    
+    @staticmethod
+    def _filter_conditions(filter_metadata: Optional[Dict[str, Any]], params: Dict[str, Any]) -> List[str]:
+        """
+        SQL conditions for metadata filters, binding their values into params:
+        organization_id compares the same expression as the per-organization
+        partial indexes, other keys are one JSONB containment test (served by
+        the metadata GIN index)
+        """
+        filters = dict(filter_metadata or {})
+        conditions = []
+        if filters.get("organization_id") is not None:
+            conditions.append(f"{ORGANIZATION_KEY} = :organization_id")
+            params["organization_id"] = str(filters.pop("organization_id"))
+        if filters:
+            conditions.append("metadata @> CAST(:metadata_filter AS jsonb)")
+            params["metadata_filter"] = json.dumps(filters, default=str)
+        return conditions
+    
+    @staticmethod
+    def _format_results(results: List[Dict[str, Any]]) -> str:
+        """Chunks with source citations, as placed in prompts"""
         formatted_content = []
         for row in results:
-            source_info = row.metadata or {}
-            citation = f"[KB:Doc#{row.document_id}_Chunk#{row.chunk_index}]"
+            source_info = row["metadata"] or {}
+            citation = f"[KB:Doc#{row['document_id']}_Chunk#{row['chunk_index']}]"
+            similarity = f"{row['similarity']:.2%}" if row["similarity"] is not None else "keyword match"
             
             formatted_content.append(
-                f"{row.content}\n"
+                f"{row['content']}\n"
                 f"Source: {source_info.get('title', 'Unknown')} - {citation}\n"
-                f"Similarity: {row.similarity:.2%}\n"
+                f"Similarity: {similarity}\n"
             )
         
         return "\n---\n".join(formatted_content)
     
+    def _nearest_chunks(
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        filter_metadata: Optional[Dict[str, Any]] = None,
+        similarity_threshold: float = 0.0
+    ) -> List[Any]:
+        """
+        The top_k chunks nearest the query embedding, then those above the
+        similarity threshold
+        
+        Ranking by distance with a LIMIT is the shape an ANN index serves; the
+        threshold is applied to the ranked rows, outside the LIMIT. Filters are
+        bound parameters (see _filter_conditions).
+        """
+        params: Dict[str, Any] = {
+            "query_embedding": vector_literal(query_embedding),
+            "threshold": similarity_threshold,
+            "top_k": top_k
+        }
+        conditions = self._filter_conditions(filter_metadata, params)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        search_query = text(f"""
+            SELECT id, document_id, chunk_index, content, metadata, 1 - distance AS similarity
+            FROM (
+                SELECT id, document_id, chunk_index, content, metadata,
+                       embedding <=> CAST(:query_embedding AS vector) AS distance
+                FROM document_embeddings
+                {where}
+                ORDER BY embedding <=> CAST(:query_embedding AS vector)
+                LIMIT :top_k
+            ) nearest
+            WHERE 1 - distance > :threshold
+            ORDER BY distance
+        """)
+        
+        apply_search_settings(self.db, top_k)
+        return self.db.execute(search_query, params).fetchall()
+    
     async def get_grounded_response(
         self,
         question: str,
@@ -177,8 +624,8 @@ class RAGService:
         Returns:
             Dict with 'answer', 'sources', and 'confidence'
         """
-        # Step 1: Retrieve relevant context
-        relevant_context = await self.search_similar_content(
+        # Step 1: Retrieve relevant context (keyword and semantic matches)
+        relevant_context = await self.hybrid_search(
             query=question,
             top_k=5,
             filter_metadata=context_filters
@@ -241,30 +688,61 @@ ANSWER:"""
     
     def _chunk_text(self, text: str, chunk_size: int, overlap: int) -> List[str]:
         """
-        Split text into overlapping chunks for better context preservation
-        """
-        chunks = []
-        start = 0
+        Split text into overlapping chunks at content-defined boundaries
         
-        while start < len(text):
-            end = start + chunk_size
-            chunk = text[start:end]
-            
-            # Try to end at sentence boundary
-            if end < len(text):
-                last_period = chunk.rfind('.')
-                last_newline = chunk.rfind('\n')
-                boundary = max(last_period, last_newline)
-                
-                if boundary > chunk_size * 0.7:  # At least 70% through chunk
-                    chunk = chunk[:boundary+1]
-                    end = start + boundary + 1
-            
-            chunks.append(chunk.strip())
-            start = end - overlap
+        A chunk closes after a sentence or line once it is half full and the
+        closing sentence's hash picks it (about one in _CUT_EVERY; blank lines
+        always), or when the next sentence would not fit. Boundaries depend
+        only on nearby text, so an edit re-chunks the chunks around it and the
+        rest of the document chunks exactly as before, which is what
+        incremental re-indexing diffs against. Each chunk after the first
+        starts with up to `overlap` characters from the end of the one before.
+        """
+        body_size = max(chunk_size - overlap, chunk_size // 2)
+        bodies = []
+        current = ""
+        for segment in self._segments(text, body_size):
+            if current and len(current) + len(segment) > body_size:
+                bodies.append(current)
+                current = ""
+            current += segment
+            closing = segment.strip()
+            if len(current) >= body_size // 2 and (
+                not closing or zlib.crc32(closing.encode("utf-8")) % _CUT_EVERY == 0
+            ):
+                bodies.append(current)
+                current = ""
+        if current:
+            bodies.append(current)
         
+        chunks = []
+        previous = ""
+        for body in bodies:
+            tail = previous[-overlap:] if overlap > 0 else ""
+            if tail and len(tail) < len(previous) and not previous[-len(tail) - 1].isspace():
+                tail = tail[tail.find(" ") + 1:] if " " in tail else ""  # Start on a word
+            chunk = (tail + body).strip()
+            if chunk:
+                chunks.append(chunk)
+            previous = body
         return chunks
     
+    @staticmethod
+    def _segments(text: str, max_length: int):
+        """Sentences and lines of text (with their trailing breaks), none longer than max_length"""
+        start = 0
+        ends = [match.end() for match in _SEGMENT_END.finditer(text)]
+        for end in ends + [len(text)]:
+            piece = text[start:end]
+            start = end
+            while len(piece) > max_length:
+                cut = piece.rfind(" ", 0, max_length)
+                cut = cut if cut > 0 else max_length
+                yield piece[:cut]
+                piece = piece[cut:]
+            if piece:
+                yield piece
+    
     async def index_knowledge_base(
         self,
         organization_id: int,
@@ -278,40 +756,96 @@ ANSWER:"""
             documents: List of dicts with 'id', 'title', 'content', 'category'
         
         Returns:
-            Indexing statistics
+            Indexing statistics (including chunks_per_second)
         """
+        started = time.perf_counter()
         total_docs = len(documents)
+        texts_before = self.embedding_stats["texts"]
+        embedded_before = self.embedding_stats["embedded"]
         total_chunks = 0
         errors = []
         
+        # Documents are embedded in groups: boilerplate repeated across the
+        # group is sent once, and small documents share API batches
+        group: List[Tuple[Dict[str, Any], List[str]]] = []
+        group_chunks = 0
         for doc in documents:
             try:
-                metadata = {
-                    "organization_id": organization_id,
-                    "title": doc.get("title", "Untitled"),
-                    "category": doc.get("category", "general"),
-                    "created_at": doc.get("created_at", ""),
-                    "document_type": doc.get("document_type", "unknown")
-                }
-                
-                chunks = await self.store_document_embedding(
-                    document_id=doc["id"],
-                    content=doc["content"],
-                    metadata=metadata
-                )
-                
-                total_chunks += len(chunks)
-                
+                chunks = self._chunk_text(doc["content"], DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP)
             except Exception as e:
                 errors.append({"document_id": doc.get("id"), "error": str(e)})
+                continue
+            group.append((doc, chunks))
+            group_chunks += len(chunks)
+            if group_chunks >= _INDEX_GROUP_CHUNKS:
+                total_chunks += await self._index_group(organization_id, group, errors)
+                group, group_chunks = [], 0
+        if group:
+            total_chunks += await self._index_group(organization_id, group, errors)
         
+        seconds = time.perf_counter() - started
+        texts = self.embedding_stats["texts"] - texts_before
+        embedded = self.embedding_stats["embedded"] - embedded_before
+        logger.info(
+            f"📚 Indexed knowledge base of organization {organization_id}: {total_chunks} chunks "
+            f"({texts - embedded} cached) in {seconds:.2f}s"
+        )
         return {
             "status": "completed" if not errors else "completed_with_errors",
             "total_documents": total_docs,
             "total_chunks": total_chunks,
+            "embedded_chunks": embedded,
+            "cached_chunks": texts - embedded,
+            "embedding_cache_hit_rate": round((texts - embedded) / texts, 4) if texts else 0.0,
+            "duration_seconds": round(seconds, 2),
+            "chunks_per_second": round(total_chunks / seconds, 1) if seconds > 0 else 0.0,
             "errors": errors
         }
     
+    async def _index_group(
+        self,
+        organization_id: int,
+        group: List[Tuple[Dict[str, Any], List[str]]],
+        errors: List[Dict[str, Any]]
+    ) -> int:
+        """
+        Embed a group of chunked documents in one pass, then store each
+        document with its own COPY and commit
+        
+        Returns:
+            Chunks stored (failed documents are appended to `errors`)
+        """
+        try:
+            embeddings = await self.generate_embeddings([chunk for _, chunks in group for chunk in chunks])
+        except Exception as e:
+            errors.extend({"document_id": doc.get("id"), "error": str(e)} for doc, _ in group)
+            return 0
+        
+        stored = 0
+        offset = 0
+        for doc, chunks in group:
+            document_embeddings = embeddings[offset:offset + len(chunks)]
+            offset += len(chunks)
+            if not chunks:
+                continue
+            metadata = {
+                "organization_id": organization_id,
+                "title": doc.get("title", "Untitled"),
+                "category": doc.get("category", "general"),
+                "created_at": doc.get("created_at", ""),
+                "document_type": doc.get("document_type", "unknown")
+            }
+            try:
+                self._copy_chunks(doc["id"], list(range(len(chunks))), chunks, document_embeddings, metadata)
+                self.db.commit()
+                stored += len(chunks)
+            except Exception as e:
+                self.db.rollback()
+                errors.append({"document_id": doc.get("id"), "error": str(e)})
+        
+        RAG_INDEXED_CHUNKS.inc(stored)
+        return stored
+    
     async def semantic_search_proposals(
         self,
         query: str,
@@ -347,20 +881,137 @@ ANSWER:"""
         
         return [{"content": results, "relevance": "high"}]
     
-    async def update_embedding_index(self, document_id: int) -> bool:
+    async def update_embedding_index(
+        self,
+        document_id: int,
+        content: str,
+        metadata: Dict[str, Any],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+        load_content: Optional[Callable[[], Optional[str]]] = None
+    ) -> Dict[str, Any]:
         """
-        Update embeddings when document content changes
+        Bring a document's stored chunks up to date with its new content,
+        embedding only chunks that are new or changed
+        
+        The content is re-chunked (boundaries are content-defined, so an edit
+        only changes nearby chunks) and each chunk hashed; unchanged chunks
+        keep their rows (renumbered if they moved), removed ones are deleted
+        and new ones embedded and inserted. The changes are written in one
+        transaction under a per-document advisory lock; if a concurrent save
+        changed the stored chunks in the meantime, the diff is redone.
+        
+        With `load_content`, the document's latest text is read before each
+        attempt and again under the lock, and the diff redone if it changed,
+        so a re-index that runs late cannot overwrite newer content.
+        
+        Args:
+            document_id: document_embeddings.document_id of the document
+            content: Full current document text ("" removes the document's chunks)
+            metadata: Document metadata (stored on every chunk)
+            chunk_size: Characters per chunk
+            chunk_overlap: Overlap between chunks for context preservation
+            load_content: Returns the document's current text (None keeps `content`)
+        
+        Returns:
+            Re-indexing statistics (chunks kept, inserted, deleted, renumbered)
         """
-        # Delete existing embeddings for this document
-        delete_query = text("DELETE FROM document_embeddings WHERE document_id = :document_id")
-        self.db.execute(delete_query, {"document_id": document_id})
+        started = time.perf_counter()
+        embedded_before = self.embedding_stats["embedded"]
+        given = content
         
-        # Fetch updated document content
-        # (Requires document retrieval logic)
-        # Then re-index
+        def latest() -> str:
+            current = load_content() if load_content is not None else None
+            return (given if current is None else current) or ""
         
-        self.db.commit()
-        return True
+        content = latest()
+        chunks = self._chunk_text(content, chunk_size, chunk_overlap)
+        hashes = [text_hash(chunk) for chunk in chunks]
+        metadata_json = json.dumps(metadata or {}, default=str)
+        
+        for _ in range(_REINDEX_ATTEMPTS):
+            if latest() != content:
+                content = latest()
+                chunks = self._chunk_text(content, chunk_size, chunk_overlap)
+                hashes = [text_hash(chunk) for chunk in chunks]
+            stored = self._stored_chunks(document_id)
+            plan = plan_reindex(stored, hashes)
+            # Embedding commits (cache writes), so it happens before the write transaction
+            embeddings = await self.generate_embeddings([chunks[i] for i in plan.insert]) if plan.insert else None
+            
+            try:
+                self.db.execute(
+                    text("SELECT pg_advisory_xact_lock(hashtext('document_embeddings'), :document_id)"),
+                    {"document_id": document_id}
+                )
+                if self._stored_chunks(document_id) != stored or latest() != content:
+                    self.db.rollback()
+                    continue
+                if plan.delete:
+                    self.db.execute(
+                        text("DELETE FROM document_embeddings WHERE id = ANY(:ids)"),
+                        {"ids": plan.delete}
+                    )
+                if plan.renumber:
+                    self.db.execute(text("""
+                        UPDATE document_embeddings AS e SET chunk_index = moved.chunk_index
+                        FROM (SELECT unnest(CAST(:ids AS integer[])) AS id,
+                                     unnest(CAST(:positions AS integer[])) AS chunk_index) moved
+                        WHERE e.id = moved.id
+                    """), {"ids": [i for i, _ in plan.renumber], "positions": [p for _, p in plan.renumber]})
+                self.db.execute(text("""
+                    UPDATE document_embeddings SET metadata = CAST(:metadata AS jsonb)
+                    WHERE document_id = :document_id AND metadata IS DISTINCT FROM CAST(:metadata AS jsonb)
+                """), {"document_id": document_id, "metadata": metadata_json})
+                if plan.insert:
+                    self._copy_chunks(document_id, plan.insert, [chunks[i] for i in plan.insert], embeddings, metadata)
+                self.db.commit()
+                break
+            except Exception:
+                self.db.rollback()
+                raise
+        else:
+            raise RuntimeError(f"Document {document_id} kept changing during re-indexing; try again")
+        
+        seconds = time.perf_counter() - started
+        RAG_REINDEXED_CHUNKS.labels(action="kept").inc(plan.kept)
+        RAG_REINDEXED_CHUNKS.labels(action="inserted").inc(len(plan.insert))
+        RAG_REINDEXED_CHUNKS.labels(action="deleted").inc(len(plan.delete))
+        logger.info(
+            f"🔄 Re-indexed document {document_id}: {plan.kept} chunks kept, {len(plan.insert)} inserted, "
+            f"{len(plan.delete)} deleted in {seconds:.2f}s"
+        )
+        return {
+            "document_id": document_id,
+            "total_chunks": len(chunks),
+            "kept_chunks": plan.kept,
+            "inserted_chunks": len(plan.insert),
+            "deleted_chunks": len(plan.delete),
+            "renumbered_chunks": len(plan.renumber),
+            "embedded_chunks": self.embedding_stats["embedded"] - embedded_before,
+            "duration_seconds": round(seconds, 3)
+        }
+    
+    def _stored_chunks(self, document_id: int) -> List[Tuple[int, int, str]]:
+        """(embedding id, chunk_index, content hash) of a document's stored chunks"""
+        rows = self.db.execute(text("""
+            SELECT id, chunk_index, content_hash, CASE WHEN content_hash IS NULL THEN content END AS content
+            FROM document_embeddings
+            WHERE document_id = :document_id
+            ORDER BY chunk_index, id
+        """), {"document_id": document_id}).fetchall()
+        # Rows stored before chunk hashes were kept are hashed from their content
+        return [(row.id, row.chunk_index, row.content_hash or text_hash(row.content)) for row in rows]
+    
+    def rag_document_id(self, source_key: str) -> int:
+        """
+        document_embeddings.document_id of a document keyed by a string
+        (e.g. "editor:<id>"), registered in rag_documents on first use
+        """
+        self.db.execute(
+            pg_insert(RagDocument).values(source_key=source_key).on_conflict_do_nothing(index_elements=["source_key"])
+        )
+        return self.db.execute(select(RagDocument.id).where(RagDocument.source_key == source_key)).scalar_one()
     
     def get_index_statistics(self, organization_id: Optional[int] = None) -> Dict[str, Any]:
         """
@@ -389,6 +1040,42 @@ ANSWER:"""
             "total_documents": result.total_documents,
             "avg_chunk_length": int(result.avg_chunk_length) if result.avg_chunk_length else 0,
             "embedding_model": self.embedding_model,
-            "dimensions": self.embedding_dimensions
+            "dimensions": self.embedding_dimensions,
+            "embedding_cache": embedding_cache.stats()
         }
 
+
+async def reindex_source_document(
+    source_key: str,
+    content: str,
+    metadata: Dict[str, Any],
+    load_content: Optional[Callable[[], Optional[str]]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Background task: incrementally re-index a string-keyed document (rich
+    editor saves, knowledge base uploads) on a session of its own
+    
+    Args:
+        source_key: "editor:<id>", "knowledge:<id>"
+        content: Full current document text
+        metadata: Document metadata (organization_id, title, ...)
+        load_content: Returns the latest text when the task runs (see update_embedding_index)
+    
+    Returns:
+        update_embedding_index() statistics, or None if re-indexing failed
+    """
+    from app.core.database import SessionLocal
+    
+    db = SessionLocal()
+    try:
+        service = RAGService(db)
+        document_id = service.rag_document_id(source_key)
+        return await service.update_embedding_index(
+            document_id, content, {**metadata, "source": source_key}, load_content=load_content
+        )
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Re-indexing {source_key} failed: {str(e)}")
+        return None
+    finally:
+        db.close()
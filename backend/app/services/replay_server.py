@@ -0,0 +1,330 @@
+"""
+Local stand-in server for upstream APIs and LLM providers
+Serves recorded HTTP fixtures (HTTP_REPLAY_MODE=replay) and a deterministic
+fake OpenAI/Anthropic API (LLM_PROVIDER=fake), with configurable latency and
+error injection, for offline development and reproducible benchmarks.
+
+Usage:
+    python -m app.services.replay_server --port 8765 --latency-ms 120 --jitter-ms 40 --error-rate 0.01
+    HTTP_REPLAY_MODE=replay LLM_PROVIDER=fake uvicorn app.main:app
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+from app.services.http_replay import (
+    REPLAY_TARGET_HEADER,
+    FixtureStore,
+    decode_body,
+    fixture_key,
+    route_key,
+)
+
+logger = logging.getLogger(__name__)
+
+# Canned LLM replies, matched by substring of the prompt
+LLM_RESPONSES_FILE = "llm_responses.json"
+
+EMBEDDING_DIMENSIONS = {
+    "text-embedding-3-large": 3072,
+    "text-embedding-3-small": 1536,
+    "text-embedding-ada-002": 1536,
+}
+
+_CITATION = re.compile(r"\[KB:Doc#\d+_Chunk#\d+\]")
+_WORDS = (
+    "the contractor shall provide program management cloud migration security "
+    "compliance deliverables schedule staffing transition risk mitigation quality "
+    "assurance past performance technical approach agency mission requirements "
+    "evaluation factors pricing small business teaming partner capability"
+).split()
+
+
+def _seed(*parts: str) -> int:
+    return int.from_bytes(hashlib.sha256("\x00".join(parts).encode("utf-8")).digest()[:8], "big")
+
+
+def _count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _json_template(prompt: str) -> Optional[Any]:
+    """The example JSON a prompt asks for ("Respond in JSON format: {...}"), if parseable"""
+    end = prompt.rfind("}")
+    if end < 0:
+        return None
+    # Walk back to the opening brace of the last JSON block
+    depth = 0
+    for start in range(end, -1, -1):
+        if prompt[start] == "}":
+            depth += 1
+        elif prompt[start] == "{":
+            depth -= 1
+            if depth == 0:
+                break
+    else:
+        return None
+    block = re.sub(r"\btrue\|false\b", "true", prompt[start:end + 1])
+    try:
+        return json.loads(block)
+    except ValueError:
+        return None
+
+
+class FakeLLM:
+    """
+    Deterministic LLM replies: the same prompt always gets the same answer
+
+    1. Canned replies from llm_responses.json when a rule's "match" occurs in the prompt
+    2. JSON mode returns the example JSON embedded in the prompt (or {})
+    3. Otherwise seeded filler text, carrying over any [KB:...] citation in the prompt
+    4. Embeddings are seeded unit vectors (similar only when texts are identical)
+    """
+
+    def __init__(self, rules: Optional[List[Dict[str, Any]]] = None):
+        self.rules = rules or []
+
+    def reply(self, prompt: str, model: str, json_mode: bool, max_tokens: int) -> str:
+        for rule in self.rules:
+            if rule.get("match") and rule["match"] in prompt:
+                content = rule.get("content")
+                return content if isinstance(content, str) else json.dumps(content)
+
+        if json_mode or "JSON" in prompt[-2000:]:
+            template = _json_template(prompt)
+            if template is not None or json_mode:
+                return json.dumps(template if template is not None else {})
+
+        rng = random.Random(_seed(model, prompt))
+        length = min(max(max_tokens // 2, 16), 160)
+        words = [rng.choice(_WORDS) for _ in range(length)]
+        text = " ".join(words).capitalize() + "."
+        citation = _CITATION.search(prompt)
+        if citation:
+            text += f" {citation.group(0)}"
+        return text
+
+    def embedding(self, text: str, model: str, dimensions: Optional[int] = None) -> List[float]:
+        dims = dimensions or EMBEDDING_DIMENSIONS.get(model, 1536)
+        vector = np.random.default_rng(_seed(model, text)).standard_normal(dims)
+        vector /= np.linalg.norm(vector)
+        return vector.astype(np.float32).tolist()
+
+
+def create_replay_app(
+    fixtures_dir: Optional[str] = None,
+    latency_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    llm_latency_ms: float = 0.0,
+    error_rate: float = 0.0,
+    error_status: int = 503,
+    seed: Optional[int] = None
+) -> FastAPI:
+    """
+    Build the stand-in server
+
+    Args:
+        fixtures_dir: Recorded fixtures (defaults to HTTP_FIXTURES_DIR)
+        latency_ms: Added to every fixture response
+        jitter_ms: Uniform +/- jitter on top of the latency
+        llm_latency_ms: Added to every fake LLM call (completions are slower than APIs)
+        error_rate: Fraction of requests answered with `error_status` instead
+        error_status: Status code for injected errors (503 and 429 exercise client retries)
+        seed: Seed for jitter and error injection (reproducible runs)
+    """
+    store = FixtureStore(fixtures_dir)
+    fixtures = store.load_all()
+    rules = fixtures.pop(LLM_RESPONSES_FILE[:-len(".json")], None)
+
+    # Requests without an exact recording fall back to the first fixture for the same route
+    by_route: Dict[str, Dict[str, Any]] = {}
+    for key in sorted(fixtures):
+        request = fixtures[key].get("request", {})
+        if request.get("url"):
+            by_route.setdefault(route_key(request.get("method", "GET"), request["url"]), fixtures[key])
+
+    fake_llm = FakeLLM(rules if isinstance(rules, list) else None)
+    rng = random.Random(seed)
+    stats = {"exact": 0, "fallback": 0, "missing": 0, "injected_errors": 0, "llm_calls": 0}
+
+    app = FastAPI(title="Replay stand-in server", docs_url=None, redoc_url=None)
+
+    @app.middleware("http")
+    async def latency_and_errors(request: Request, call_next):
+        if request.url.path.startswith("/_replay"):
+            return await call_next(request)
+
+        is_llm = request.url.path.startswith("/v1/")
+        delay = (llm_latency_ms if is_llm else latency_ms) + rng.uniform(-jitter_ms, jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000.0)
+
+        if error_rate and rng.random() < error_rate:
+            stats["injected_errors"] += 1
+            return JSONResponse(
+                {"error": {"message": "Injected error from replay server", "type": "replay_error"}},
+                status_code=error_status,
+                headers={"Retry-After": "0"}
+            )
+        return await call_next(request)
+
+    @app.get("/_replay/stats")
+    async def replay_stats():
+        return {**stats, "fixtures": len(fixtures), "routes": sorted(by_route)}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "gpt-4o")
+        messages = body.get("messages", [])
+        prompt = "\n\n".join(str(m.get("content", "")) for m in messages)
+        json_mode = (body.get("response_format") or {}).get("type") == "json_object"
+        content = fake_llm.reply(prompt, model, json_mode, body.get("max_tokens") or 1024)
+        stats["llm_calls"] += 1
+
+        prompt_tokens, completion_tokens = _count_tokens(prompt), _count_tokens(content)
+        return {
+            "id": f"chatcmpl-fake-{_seed(model, prompt) % 10 ** 12}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        model = body.get("model", "text-embedding-3-small")
+        inputs = body.get("input", "")
+        inputs = [inputs] if isinstance(inputs, str) else list(inputs)
+        stats["llm_calls"] += 1
+        as_base64 = body.get("encoding_format") == "base64"  # Little-endian float32, as the API sends
+
+        tokens = sum(_count_tokens(str(text)) for text in inputs)
+        vectors = [fake_llm.embedding(str(text), model, body.get("dimensions")) for text in inputs]
+        return {
+            "object": "list",
+            "model": model,
+            "data": [
+                {
+                    "object": "embedding",
+                    "index": i,
+                    "embedding": (
+                        base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode("ascii")
+                        if as_base64 else vector
+                    ),
+                }
+                for i, vector in enumerate(vectors)
+            ],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.post("/v1/messages")
+    async def anthropic_messages(request: Request):
+        body = await request.json()
+        model = body.get("model", "claude-3-5-sonnet-20241022")
+        parts = [body.get("system") or ""]
+        for message in body.get("messages", []):
+            content = message.get("content", "")
+            if isinstance(content, list):
+                content = "\n".join(block.get("text", "") for block in content if isinstance(block, dict))
+            parts.append(str(content))
+        prompt = "\n\n".join(p for p in parts if p)
+        content = fake_llm.reply(prompt, model, False, body.get("max_tokens") or 1024)
+        stats["llm_calls"] += 1
+
+        return {
+            "id": f"msg_fake_{_seed(model, prompt) % 10 ** 12}",
+            "type": "message",
+            "role": "assistant",
+            "model": model,
+            "content": [{"type": "text", "text": content}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": _count_tokens(prompt), "output_tokens": _count_tokens(content)},
+        }
+
+    @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
+    async def replay(path: str, request: Request):
+        target = request.headers.get(REPLAY_TARGET_HEADER)
+        if not target:
+            return JSONResponse(
+                {"error": f"Missing {REPLAY_TARGET_HEADER} header; route requests through the replay transport"},
+                status_code=400
+            )
+
+        url = f"{target}{request.url.path}" + (f"?{request.url.query}" if request.url.query else "")
+        body = await request.body()
+        key = fixture_key(request.method, url, body)
+
+        fixture = fixtures.get(key)
+        if fixture is not None:
+            stats["exact"] += 1
+        else:
+            fixture = by_route.get(route_key(request.method, url))
+            if fixture is None:
+                stats["missing"] += 1
+                logger.warning(f"⚠️  No fixture for {request.method} {url}")
+                return JSONResponse({"error": "No recorded fixture", "key": key}, status_code=404)
+            stats["fallback"] += 1
+
+        recorded = fixture["response"]
+        return Response(
+            content=decode_body(recorded),
+            status_code=recorded.get("status", 200),
+            headers=recorded.get("headers", {}),
+        )
+
+    return app
+
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve recorded HTTP fixtures and a fake LLM API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixtures", default=None, help="Fixture directory (default: HTTP_FIXTURES_DIR)")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    uvicorn.run(
+        create_replay_app(
+            fixtures_dir=args.fixtures,
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+            llm_latency_ms=args.llm_latency_ms,
+            error_rate=args.error_rate,
+            error_status=args.error_status,
+            seed=args.seed,
+        ),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+    )
@@ -0,0 +1,310 @@
+"""
+Two-tier response cache for external search services
+L1 is a bounded in-process LRU, L2 is Redis (shared between workers and pods).
+Entries carry a fresh TTL plus a stale-while-revalidate window.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from prometheus_client import Counter, Gauge
+
+from app.config import settings
+from app.core.redis_client import LoopBoundRedis
+from app.services.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics
+CACHE_REQUESTS = Counter(
+    'response_cache_requests_total',
+    'Response cache lookups',
+    ['cache', 'tier', 'result']
+)
+
+CACHE_EVICTIONS = Counter(
+    'response_cache_evictions_total',
+    'Response cache L1 evictions',
+    ['cache', 'reason']
+)
+
+CACHE_L1_ENTRIES = Gauge(
+    'response_cache_l1_entries',
+    'Entries held in the in-process L1 cache',
+    ['cache']
+)
+
+CACHE_L1_BYTES = Gauge(
+    'response_cache_l1_bytes',
+    'Approximate serialized size of the in-process L1 cache',
+    ['cache']
+)
+
+CACHE_REFRESHES = Counter(
+    'response_cache_background_refreshes_total',
+    'Stale-while-revalidate background refreshes',
+    ['cache', 'status']
+)
+
+
+class _Entry:
+    __slots__ = ('value', 'size', 'fresh_until', 'stale_until')
+
+    def __init__(self, value: Any, size: int, fresh_until: float, stale_until: float):
+        self.value = value
+        self.size = size
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class ResponseCache:
+    """
+    Cache for JSON-serializable responses of slow upstream calls
+
+    Features:
+    1. L1 in-process LRU bounded by entry count and serialized bytes
+    2. L2 Redis shared by every worker; fails open when Redis is unavailable
+    3. TTL with a stale-while-revalidate window: stale hits are served
+       immediately while one background task refreshes the entry
+    4. Misses are single-flighted, so concurrent identical requests in any
+       worker share one upstream call
+    5. Hit/miss/eviction metrics per cache (Prometheus)
+
+    Usage:
+        cache = ResponseCache("sam_search", ttl=300, stale_ttl=600)
+        result = await cache.get_or_set(key, lambda: fetch(...))
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: int = 300,
+        stale_ttl: int = 0,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        use_redis: Optional[bool] = None
+    ):
+        """
+        Args:
+            name: Cache name, used as Redis key namespace and metric label
+            ttl: Seconds an entry is fresh
+            stale_ttl: Extra seconds a stale entry may be served while refreshing
+            max_entries: L1 entry limit (defaults to CACHE_L1_MAX_ENTRIES)
+            max_bytes: L1 size limit in serialized bytes (defaults to CACHE_L1_MAX_BYTES)
+            use_redis: Enable the Redis tier (defaults to CACHE_REDIS_ENABLED)
+        """
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries or settings.CACHE_L1_MAX_ENTRIES
+        self.max_bytes = max_bytes or settings.CACHE_L1_MAX_BYTES
+        self.use_redis = settings.CACHE_REDIS_ENABLED if use_redis is None else use_redis
+
+        self._redis = LoopBoundRedis(f"{name} cache", enabled=self.use_redis)
+        self._flight = SingleFlight(name, use_redis=self.use_redis)
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._refreshing: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    async def get(self, key: str) -> Tuple[Optional[Any], bool]:
+        """
+        Look up a key in L1 then L2
+
+        Returns:
+            (value, is_fresh); value is None on a miss or after the stale window
+        """
+        now = time.time()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            if now < entry.stale_until:
+                self._entries.move_to_end(key)
+                fresh = now < entry.fresh_until
+                CACHE_REQUESTS.labels(cache=self.name, tier='l1', result='hit' if fresh else 'stale').inc()
+                return entry.value, fresh
+            self._remove(key, reason='expired')
+
+        payload = await self._redis_get(key)
+        if payload is not None and now < payload['stale_until']:
+            self._store_l1(key, payload['value'], payload['size'], payload['fresh_until'], payload['stale_until'])
+            fresh = now < payload['fresh_until']
+            CACHE_REQUESTS.labels(cache=self.name, tier='l2', result='hit' if fresh else 'stale').inc()
+            return payload['value'], fresh
+
+        CACHE_REQUESTS.labels(cache=self.name, tier='none', result='miss').inc()
+        return None, False
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        """Store a value in both tiers"""
+        ttl = self.ttl if ttl is None else ttl
+        encoded = json.dumps(value, default=str)
+        now = time.time()
+        fresh_until = now + ttl
+        stale_until = fresh_until + self.stale_ttl
+
+        self._store_l1(key, value, len(encoded), fresh_until, stale_until)
+        await self._redis_set(key, encoded, fresh_until, stale_until)
+
+    async def get_or_set(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[int] = None,
+        force_refresh: bool = False
+    ) -> Any:
+        """
+        Return the cached value, calling `loader` on a miss
+
+        A stale hit is returned as-is and refreshed in the background.
+        Concurrent misses for the same key share one `loader` call.
+        Exceptions from `loader` on a miss propagate so callers keep their
+        own fallback handling (and failures are never cached).
+        """
+        if not force_refresh:
+            value, fresh = await self.get(key)
+            if value is not None:
+                if not fresh:
+                    self._schedule_refresh(key, loader, ttl)
+                return value
+
+        return await self._flight.do(key, lambda: self._load(key, loader, ttl, recheck=not force_refresh))
+
+    async def _load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[int],
+        recheck: bool = True
+    ) -> Any:
+        if recheck:
+            # Another worker may have filled L2 while we waited for the lock
+            value, fresh = await self.get(key)
+            if value is not None and fresh:
+                return value
+        value = await loader()
+        await self.set(key, value, ttl)
+        return value
+
+    async def invalidate(self, key: str):
+        """Drop a key from both tiers"""
+        self._remove(key)
+        client = self._redis.get()
+        if client is None:
+            return
+        try:
+            await client.delete(self._redis_key(key))
+        except Exception as e:
+            self._redis.mark_down(e)
+
+    def clear_local(self):
+        """Empty the in-process tier"""
+        self._entries.clear()
+        self._bytes = 0
+        self._update_gauges()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ------------------------------------------------------------------
+    # L1
+    # ------------------------------------------------------------------
+
+    def _store_l1(self, key: str, value: Any, size: int, fresh_until: float, stale_until: float):
+        if size > self.max_bytes:
+            # Larger than the whole L1 budget; keep it in Redis only
+            self._remove(key)
+            return
+
+        self._remove(key)
+        self._entries[key] = _Entry(value, size, fresh_until, stale_until)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest, reason='size')
+
+        self._update_gauges()
+
+    def _remove(self, key: str, reason: Optional[str] = None):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        if reason:
+            CACHE_EVICTIONS.labels(cache=self.name, reason=reason).inc()
+        self._update_gauges()
+
+    def _update_gauges(self):
+        CACHE_L1_ENTRIES.labels(cache=self.name).set(len(self._entries))
+        CACHE_L1_BYTES.labels(cache=self.name).set(self._bytes)
+
+    # ------------------------------------------------------------------
+    # Stale-while-revalidate
+    # ------------------------------------------------------------------
+
+    def _schedule_refresh(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: Optional[int]):
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        async def refresh():
+            try:
+                await self._flight.do(key, lambda: self._load(key, loader, ttl))
+                CACHE_REFRESHES.labels(cache=self.name, status='success').inc()
+            except Exception as e:
+                CACHE_REFRESHES.labels(cache=self.name, status='error').inc()
+                logger.warning(f"⚠️  Background refresh failed for {self.name} cache: {str(e)}")
+            finally:
+                self._refreshing.discard(key)
+
+        task = asyncio.get_running_loop().create_task(refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    # ------------------------------------------------------------------
+    # L2 (Redis)
+    # ------------------------------------------------------------------
+
+    def _redis_key(self, key: str) -> str:
+        return f"response_cache:{self.name}:{hashlib.sha1(key.encode('utf-8')).hexdigest()}"
+
+    async def _redis_get(self, key: str) -> Optional[Dict[str, Any]]:
+        client = self._redis.get()
+        if client is None:
+            return None
+        try:
+            raw = await client.get(self._redis_key(key))
+        except Exception as e:
+            self._redis.mark_down(e)
+            return None
+        if raw is None:
+            return None
+        try:
+            payload = json.loads(raw)
+            payload['size'] = len(raw)
+            return payload
+        except (ValueError, KeyError):
+            return None
+
+    async def _redis_set(self, key: str, encoded: str, fresh_until: float, stale_until: float):
+        client = self._redis.get()
+        if client is None:
+            return
+        envelope = f'{{"fresh_until": {fresh_until}, "stale_until": {stale_until}, "value": {encoded}}}'
+        try:
+            await client.set(
+                self._redis_key(key),
+                envelope,
+                ex=max(1, int(stale_until - time.time()) + 1)
+            )
+        except Exception as e:
+            self._redis.mark_down(e)
@@ -3,19 +3,27 @@ Advanced RFP Section Analyzer
 AI-powered analysis of RFP sections with smart summaries and requirement extraction
 """
 from typing import List, Dict, Optional
-from openai import OpenAI
 import os
 import re
 from pathlib import Path
 
 from app.services.document_service import DocumentProcessingService
+from app.services.llm_clients import openai_client
+from app.services.rfp_section_segmenter import RFPSectionSegmenter
+
+# Section, part and numbered-paragraph headings that begin a line; each ends the previous one
+_section_segmenter = RFPSectionSegmenter(
+    kinds=["section", "part", "numbered"],
+    line_start_only=True,
+    flat=True
+)
 
 
 class RFPAnalyzerService:
     """Analyze RFP documents section by section with AI"""
     
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = openai_client(os.getenv("OPENAI_API_KEY"))
         self.doc_service = DocumentProcessingService()
     
     def analyze_rfp(self, file_path: str) -> Dict:
@@ -67,53 +75,27 @@ class RFPAnalyzerService:
         }
     
     def _identify_sections(self, text: str) -> List[Dict]:
-        """Identify RFP sections using pattern matching"""
+        """Identify RFP sections using the shared section segmenter"""
         
         sections = []
-        
-        # Common RFP section patterns
-        section_patterns = [
-            (r"SECTION\s+([A-Z])[:\s\-]+(.+?)(?=\n)", "section"),
-            (r"PART\s+([IVX]+)[:\s\-]+(.+?)(?=\n)", "part"),
-            (r"(\d+\.\d+)\s+(.+?)(?=\n)", "numbered"),
-        ]
-        
-        lines = text.split('\n')
-        current_section = None
-        current_content = []
-        
-        for i, line in enumerate(lines):
-            # Check if this line is a section header
-            is_header = False
-            for pattern, section_type in section_patterns:
-                match = re.search(pattern, line, re.IGNORECASE)
-                if match:
-                    # Save previous section
-                    if current_section:
-                        current_section["content"] = '\n'.join(current_content)
-                        current_section["end_line"] = i
-                        sections.append(current_section)
-                    
-                    # Start new section
-                    current_section = {
-                        "type": section_type,
-                        "number": match.group(1),
-                        "title": match.group(2).strip(),
-                        "start_line": i,
-                        "content": ""
-                    }
-                    current_content = []
-                    is_header = True
-                    break
+        line = 0
+        position = 0
+        
+        for segment in _section_segmenter.segment(text):
+            line += text.count('\n', position, segment.start)
+            position = segment.start
+            end_line = line + text.count('\n', segment.start, segment.end)
+            if segment.end == len(text):
+                end_line += 1
             
-            if not is_header and current_section:
-                current_content.append(line)
-        
-        # Add last section
-        if current_section:
-            current_section["content"] = '\n'.join(current_content)
-            current_section["end_line"] = len(lines)
-            sections.append(current_section)
+            sections.append({
+                "type": segment.kind,
+                "number": segment.key,
+                "title": segment.title,
+                "start_line": line,
+                "content": segment.body(text).removesuffix('\n'),
+                "end_line": end_line
+            })
         
         # If no sections found, create a single section
         if not sections:
@@ -123,7 +105,7 @@ class RFPAnalyzerService:
                 "title": "Full Document",
                 "content": text,
                 "start_line": 0,
-                "end_line": len(lines)
+                "end_line": text.count('\n') + 1
             })
         
         return sections
@@ -0,0 +1,261 @@
+"""
+RFP Section Segmenter
+Single-pass detection of solicitation section boundaries (UCF sections, parts,
+named headings such as Statement of Work, numbered paragraphs). Returns
+character offsets into the source text instead of copied substrings, and can
+consume a document page by page.
+"""
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional
+import re
+
+# Canonical keys for named headings
+NAMED_HEADINGS = {
+    'INSTRUCTIONS TO OFFERORS': 'L',
+    'EVALUATION FACTORS': 'M',
+    'EVALUATION CRITERIA': 'M',
+    'STATEMENT OF WORK': 'SOW',
+    'SOW': 'SOW',
+    'PERFORMANCE WORK STATEMENT': 'PWS',
+    'PWS': 'PWS',
+}
+
+# Every heading kind, in one alternation so the text is scanned once.
+# Section letters and part numerals are case-sensitive ("Section L", not "section a").
+# Numbered paragraphs, letter items and attachments only count at the start of a line.
+_HEADING_PATTERN = re.compile(
+    r"""
+    (?P<section>\bSECTION[ \t]+(?P<section_key>(?-i:[A-Z]))\b[ \t]*[:.\-]?[ \t]*)
+    |(?P<part>\bPART[ \t]+(?P<part_key>(?-i:[IVX]+))\b[ \t]*[:.\-]?[ \t]*)
+    |(?P<named>\b(?P<named_key>
+        INSTRUCTIONS[ \t]+TO[ \t]+OFFERORS
+        |EVALUATION[ \t]+(?:FACTORS|CRITERIA)
+        |STATEMENT[ \t]+OF[ \t]+WORK
+        |PERFORMANCE[ \t]+WORK[ \t]+STATEMENT
+        |SOW|PWS
+    )\b)
+    |(?P<attachment>^[ \t]*ATTACHMENT\b[ \t]*)
+    |(?P<numbered>^[ \t]*(?P<numbered_key>\d+(?:\.\d+)+)\.?[ \t]+)
+    |(?P<letter>^[ \t]*(?P<letter_key>(?-i:[A-Z]))\.[ \t]+)
+    """,
+    re.IGNORECASE | re.MULTILINE | re.VERBOSE,
+)
+
+KINDS = frozenset(['section', 'part', 'named', 'attachment', 'numbered', 'letter'])
+
+# Which heading kinds end a section of a given kind (SECTION L runs until the
+# next SECTION or PART; a Statement of Work also stops at an ATTACHMENT)
+TERMINATORS: Dict[str, FrozenSet[str]] = {
+    'section': frozenset(['section', 'part']),
+    'part': frozenset(['part']),
+    'named': frozenset(['section', 'part', 'attachment']),
+    'attachment': frozenset(['section', 'part', 'attachment']),
+    'numbered': frozenset(['section', 'part', 'letter', 'numbered']),
+    'letter': frozenset(['section', 'part', 'letter']),
+}
+
+
+@dataclass(frozen=True)
+class Segment:
+    """A section located in the source text; all positions are character offsets"""
+    kind: str          # section | part | named | attachment | numbered | letter
+    key: str           # 'L', 'IV', 'SOW', '3.1', ...
+    title: str         # Rest of the heading line
+    start: int         # Start of the heading
+    title_start: int   # Start of the heading's title (after "SECTION L:" etc.)
+    body_start: int    # Start of the line after the heading
+    end: int           # End of the section (exclusive)
+    line_start: bool   # Heading begins its line
+
+    def text(self, source: str) -> str:
+        """Heading plus body"""
+        return source[self.start:self.end]
+
+    def body(self, source: str) -> str:
+        """Body without the heading line"""
+        return source[self.body_start:self.end]
+
+
+class _Open:
+    __slots__ = ('kind', 'key', 'title', 'start', 'title_start', 'body_start', 'line_start')
+
+    def __init__(self, kind, key, title, start, title_start, body_start, line_start):
+        self.kind = kind
+        self.key = key
+        self.title = title
+        self.start = start
+        self.title_start = title_start
+        self.body_start = body_start
+        self.line_start = line_start
+
+    def close(self, end: int) -> Segment:
+        return Segment(
+            kind=self.kind,
+            key=self.key,
+            title=self.title[:max(0, end - self.title_start)].strip(),
+            start=self.start,
+            title_start=min(self.title_start, end),
+            body_start=min(self.body_start, end),
+            end=end,
+            line_start=self.line_start,
+        )
+
+
+class SegmentStream:
+    """
+    Incremental segmentation over text chunks (e.g. PDF pages)
+
+    Offsets refer to the concatenation of every chunk fed. Only complete lines
+    are scanned, so a heading split across two chunks is still found; segments
+    are returned as soon as a later heading closes them.
+    """
+
+    def __init__(self, segmenter: "RFPSectionSegmenter"):
+        self._segmenter = segmenter
+        self._tail = ''
+        self._offset = 0
+        self._open: Dict[str, List[_Open]] = {}
+
+    def feed(self, chunk: str) -> List[Segment]:
+        """Add a chunk; returns the segments it closed, in document order"""
+        buffer = self._tail + chunk if self._tail else chunk
+        cut = buffer.rfind('\n') + 1
+        closed = self._scan(buffer, cut) if cut else []
+        self._tail = buffer[cut:]
+        self._offset += cut
+        return closed
+
+    def close(self) -> List[Segment]:
+        """Finish the document; returns every remaining segment"""
+        closed = self._scan(self._tail, len(self._tail))
+        end = self._offset + len(self._tail)
+        for pending in self._open.values():
+            closed.extend(o.close(end) for o in pending)
+        self._open = {}
+        self._offset = end
+        self._tail = ''
+        closed.sort(key=lambda s: s.start)
+        return closed
+
+    def _scan(self, buffer: str, endpos: int) -> List[Segment]:
+        segmenter = self._segmenter
+        closed: List[Segment] = []
+
+        for match in _HEADING_PATTERN.finditer(buffer, 0, endpos):
+            kind = match.lastgroup
+            if kind not in segmenter.kinds:
+                continue
+
+            start = match.start()
+            if kind in ('attachment', 'numbered', 'letter'):
+                line_start = True
+            else:
+                line_begin = buffer.rfind('\n', 0, start) + 1
+                line_start = not buffer[line_begin:start].strip()
+            if segmenter.line_start_only and not line_start:
+                continue
+
+            line_end = buffer.find('\n', match.end(), endpos)
+            line_end = endpos if line_end < 0 else line_end
+            title_start = start if kind == 'named' else match.end()
+            key = match.group(f'{kind}_key') if kind != 'attachment' else 'ATTACHMENT'
+            if kind == 'named':
+                key = NAMED_HEADINGS[' '.join(key.upper().split())]
+            else:
+                key = key.upper()
+
+            offset = self._offset
+            for open_kind in segmenter.closed_by[kind]:
+                pending = self._open.pop(open_kind, None)
+                if pending:
+                    closed.extend(o.close(offset + start) for o in pending)
+
+            self._open.setdefault(kind, []).append(_Open(
+                kind,
+                key,
+                buffer[title_start:line_end],
+                offset + start,
+                offset + title_start,
+                offset + min(line_end + 1, endpos),
+                line_start,
+            ))
+
+        closed.sort(key=lambda s: s.start)
+        return closed
+
+
+class RFPSectionSegmenter:
+    """
+    Locate solicitation sections in one pass over the text
+
+    Features:
+    1. One precompiled pattern for every heading kind (no per-call compiles,
+       no per-line or per-section rescans)
+    2. Returns Segment offsets; callers slice only the sections they use
+    3. Streaming mode for page iterators (SegmentStream)
+    4. Nested boundaries by default (SECTION L ends at the next SECTION/PART),
+       or flat boundaries where every heading ends the previous one
+
+    Usage:
+        segments = rfp_segmenter.segment(text)
+        for segment in rfp_segmenter.iter_segments(pages): ...
+    """
+
+    def __init__(
+        self,
+        kinds: Optional[Iterable[str]] = None,
+        line_start_only: bool = False,
+        flat: bool = False
+    ):
+        """
+        Args:
+            kinds: Heading kinds to recognise (default: all of KINDS)
+            line_start_only: Ignore headings that do not begin a line
+            flat: Every recognised heading ends the previous section
+        """
+        self.kinds = frozenset(kinds) if kinds is not None else KINDS
+        unknown = self.kinds - KINDS
+        if unknown:
+            raise ValueError(f"Unknown heading kinds: {sorted(unknown)}")
+        self.line_start_only = line_start_only
+
+        # Inverse of TERMINATORS: heading kind -> open kinds it closes
+        self.closed_by: Dict[str, List[str]] = {
+            kind: [
+                open_kind for open_kind in self.kinds
+                if flat or kind in TERMINATORS[open_kind]
+            ]
+            for kind in self.kinds
+        }
+
+    def stream(self) -> SegmentStream:
+        """Start incremental segmentation"""
+        return SegmentStream(self)
+
+    def segment(self, text: str) -> List[Segment]:
+        """Segments of a complete text, in document order"""
+        stream = self.stream()
+        closed = stream.feed(text or '')
+        closed.extend(stream.close())
+        closed.sort(key=lambda s: s.start)
+        return closed
+
+    def iter_segments(self, chunks: Iterable[str]) -> Iterator[Segment]:
+        """Segments of a chunked text (e.g. PDF pages), yielded as they close"""
+        stream = self.stream()
+        for chunk in chunks:
+            yield from stream.feed(chunk)
+        yield from stream.close()
+
+
+def first_by_key(segments: Iterable[Segment]) -> Dict[tuple, Segment]:
+    """Earliest segment per (kind, key)"""
+    first: Dict[tuple, Segment] = {}
+    for segment in segments:
+        current = first.get((segment.kind, segment.key))
+        if current is None or segment.start < current.start:
+            first[(segment.kind, segment.key)] = segment
+    return first
+
+
+rfp_segmenter = RFPSectionSegmenter()
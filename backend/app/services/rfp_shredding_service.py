@@ -4,15 +4,27 @@ Automatically parse RFPs to extract Section L (Instructions), Section M (Evaluat
 Critical component of Gov Supreme Overlord system
 """
 
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterator, List, Any, Optional
 import re
 from datetime import datetime
 from pypdf import PdfReader
 import docx
 from app.services.llm_service import LLMService
+from app.services.rfp_section_segmenter import RFPSectionSegmenter, Segment, first_by_key
 from sqlalchemy.orm import Session
 
 
+# Headings that mark each major section, in order of preference
+SECTION_HEADINGS = {
+    "L": [("section", "L"), ("named", "L"), ("part", "IV")],
+    "M": [("section", "M"), ("named", "M")],
+    "SOW": [("named", "SOW"), ("section", "C")],  # Section C is often SOW in federal format
+    "PWS": [("named", "PWS")]
+}
+
+_section_segmenter = RFPSectionSegmenter(kinds=["section", "part", "named", "attachment"])
+
+
 class RFPShreddingService:
     """
     RFP "Shredding" - Automated parsing and requirement extraction
@@ -44,11 +56,16 @@ class RFPShreddingService:
         Returns:
             Comprehensive shredded RFP data structure
         """
-        # Step 1: Extract raw text
-        rfp_text = self._extract_text_from_file(rfp_file_path)
-        
-        # Step 2: Identify major sections
-        sections = self._identify_sections(rfp_text)
+        # Steps 1-2: Extract raw text and identify major sections as pages are read
+        chunks = []
+        stream = _section_segmenter.stream()
+        segments = []
+        for chunk in self._iter_text_chunks(rfp_file_path):
+            chunks.append(chunk)
+            segments.extend(stream.feed(chunk))
+        segments.extend(stream.close())
+        rfp_text = "".join(chunks)
+        sections = self._identify_sections(rfp_text, segments)
         
         # Step 3: Extract Section L (Instructions)
         section_l = await self._extract_section_l(sections.get("L", ""))
@@ -87,70 +104,69 @@ class RFPShreddingService:
         """
         Extract text from PDF or DOCX file
         """
+        return "".join(self._iter_text_chunks(file_path))
+    
+    def _iter_text_chunks(self, file_path: str) -> Iterator[str]:
+        """
+        Yield the text of a PDF or DOCX file in order (a page or paragraph at a time)
+        """
         if file_path.lower().endswith('.pdf'):
-            return self._extract_pdf_text(file_path)
+            return self._iter_pdf_pages(file_path)
         elif file_path.lower().endswith(('.docx', '.doc')):
-            return self._extract_docx_text(file_path)
+            return self._iter_docx_paragraphs(file_path)
         else:
             raise ValueError(f"Unsupported file type: {file_path}")
     
     def _extract_pdf_text(self, pdf_path: str) -> str:
         """Extract text from PDF"""
-        text = []
+        return "".join(self._iter_pdf_pages(pdf_path))
+    
+    def _iter_pdf_pages(self, pdf_path: str) -> Iterator[str]:
+        """Yield PDF pages, each prefixed with a [PAGE n] marker"""
         with open(pdf_path, 'rb') as file:
             pdf_reader = PdfReader(file)
             for page_num, page in enumerate(pdf_reader.pages, start=1):
                 page_text = page.extract_text()
-                text.append(f"[PAGE {page_num}]\n{page_text}\n")
-        
-        return "\n".join(text)
+                separator = "\n" if page_num > 1 else ""
+                yield f"{separator}[PAGE {page_num}]\n{page_text}\n"
     
     def _extract_docx_text(self, docx_path: str) -> str:
         """Extract text from DOCX"""
+        return "".join(self._iter_docx_paragraphs(docx_path))
+    
+    def _iter_docx_paragraphs(self, docx_path: str) -> Iterator[str]:
+        """Yield non-empty DOCX paragraphs, newline separated"""
         doc = docx.Document(docx_path)
-        text = []
+        separator = ""
         
-        for i, para in enumerate(doc.paragraphs):
+        for para in doc.paragraphs:
             if para.text.strip():
-                text.append(para.text)
-        
-        return "\n".join(text)
+                yield separator + para.text
+                separator = "\n"
     
-    def _identify_sections(self, rfp_text: str) -> Dict[str, str]:
+    def _identify_sections(
+        self,
+        rfp_text: str,
+        segments: Optional[List[Segment]] = None
+    ) -> Dict[str, str]:
         """
         Identify major RFP sections (L, M, SOW, etc.)
-        Uses pattern matching for common federal RFP structure
-        """
-        sections = {}
+        Uses the shared section segmenter for common federal RFP structure
         
-        # Common patterns for section identification
-        patterns = {
-            "L": [
-                r"SECTION\s+L[:\s]+(.*?)(?=SECTION\s+[A-Z]|$)",
-                r"L\.\s+INSTRUCTIONS\s+TO\s+OFFERORS(.*?)(?=SECTION\s+[A-Z]|$)",
-                r"PART\s+IV[:\s]+PROVISIONS(.*?)(?=PART\s+[A-Z]|$)"
-            ],
-            "M": [
-                r"SECTION\s+M[:\s]+(.*?)(?=SECTION\s+[A-Z]|$)",
-                r"M\.\s+EVALUATION\s+FACTORS(.*?)(?=SECTION\s+[A-Z]|$)",
-                r"EVALUATION\s+CRITERIA(.*?)(?=SECTION\s+[A-Z]|$)"
-            ],
-            "SOW": [
-                r"STATEMENT\s+OF\s+WORK(.*?)(?=SECTION\s+[A-Z]|ATTACHMENT|$)",
-                r"SOW(.*?)(?=SECTION\s+[A-Z]|ATTACHMENT|$)",
-                r"SECTION\s+C[:\s]+(.*?)(?=SECTION\s+[A-Z]|$)"  # Section C is often SOW in federal format
-            ],
-            "PWS": [
-                r"PERFORMANCE\s+WORK\s+STATEMENT(.*?)(?=SECTION\s+[A-Z]|ATTACHMENT|$)",
-                r"PWS(.*?)(?=SECTION\s+[A-Z]|ATTACHMENT|$)"
-            ]
-        }
+        Args:
+            rfp_text: Full RFP text
+            segments: Segments already found while streaming the text (optional)
+        """
+        if segments is None:
+            segments = _section_segmenter.segment(rfp_text)
+        first = first_by_key(segments)
         
-        for section_name, pattern_list in patterns.items():
-            for pattern in pattern_list:
-                match = re.search(pattern, rfp_text, re.IGNORECASE | re.DOTALL)
-                if match:
-                    sections[section_name] = match.group(0)
+        sections = {}
+        for section_name, headings in SECTION_HEADINGS.items():
+            for heading in headings:
+                segment = first.get(heading)
+                if segment:
+                    sections[section_name] = segment.text(rfp_text)
                     break
         
         return sections
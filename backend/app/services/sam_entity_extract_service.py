@@ -0,0 +1,359 @@
+"""
+SAM.gov Entity Extract Ingest
+Streams the SAM.gov entity management public extract (pipe-delimited .dat,
+usually zipped) into the contractors table in bounded memory, and reports
+registrations that dropped out of the extract
+
+Usage:
+    python -m app.services.sam_entity_extract_service /data/SAM_PUBLIC_MONTHLY_V2_20250105.ZIP
+"""
+from typing import Any, Dict, Iterator, List, Optional
+from datetime import datetime, timezone
+from contextlib import contextmanager
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+import io
+import json
+import logging
+import os
+import re
+import time
+import zipfile
+
+import numpy as np
+
+from app.models.sync import SyncCheckpoint
+from app.services.contractor_index import contractor_index
+from app.services.contractor_sync_service import CONTRACTOR_CHECKPOINT, ContractorSyncService
+
+logger = logging.getLogger(__name__)
+
+ENTITY_EXTRACT_CHECKPOINT = "sam_entity_extract"
+
+# Zero-based field positions in the public V2 extract layout
+# (SAM Master Extract Mapping, public entity records)
+EXTRACT_FIELDS = {
+    'uei': 0,
+    'duns': 1,                  # Blank since the UEI transition
+    'cage_code': 3,
+    'extract_code': 5,          # A = active, E = expired (1/2/3 = deleted/new/updated in dailies)
+    'registration_date': 7,
+    'expiration_date': 8,
+    'last_update_date': 9,
+    'legal_name': 11,
+    'dba_name': 12,
+    'address_line1': 15,
+    'address_line2': 16,
+    'city': 17,
+    'state': 18,
+    'zip': 19,
+    'zip4': 20,
+    'country': 21,
+    'congressional_district': 22,
+    'business_types': 31,       # "2X~27~QF~8W"
+    'primary_naics': 32,
+    'naics': 34,                # "541512Y~541330N" (code + small business flag)
+}
+
+# Business type codes behind _extract_set_aside's flags
+SDVOSB_CODES = {'QF'}
+WOSB_CODES = {'8W', '8E'}
+EIGHT_A_CODES = {'A6', 'JT'}
+HUBZONE_CODES = {'XX'}
+
+# Daily extracts mark deleted registrations with extract code 1
+DELETED_EXTRACT_CODES = {'1'}
+
+# Expired registrations stay in the table but are marked inactive
+EXPIRED_EXTRACT_CODES = {'E'}
+
+_NAICS = re.compile(r'^(\d{2,6})([A-Z]?)')
+_DATE = re.compile(r'\b(\d{8})\b')
+
+
+def _codes(value: str) -> List[str]:
+    """Tilde-separated codes; SBA entries carry an expiration ("A6^20270101")"""
+    return [code.split('^')[0].strip().upper() for code in value.split('~') if code.strip()]
+
+
+def extract_record_to_entity(fields: List[str]) -> Dict[str, Any]:
+    """
+    Map an extract record to the Entity API shape, so extract rows go through
+    the same normalization (PartnerMatchingService._parse_sam_entity and
+    _extract_set_aside) as entities synced from the API
+    """
+    def value(name: str) -> Optional[str]:
+        position = EXTRACT_FIELDS[name]
+        v = fields[position].strip() if position < len(fields) else ''
+        return v or None
+
+    naics_codes, small_business = [], False
+    for entry in (value('naics') or '').split('~'):
+        match = _NAICS.match(entry.strip())
+        if match:
+            naics_codes.append(match.group(1))
+            small_business = small_business or match.group(2) == 'Y'
+    primary = value('primary_naics')
+    if primary:
+        # Primary NAICS first, as the Entity API search results list it
+        naics_codes = [primary] + [code for code in naics_codes if code != primary]
+
+    business_types = set(_codes(value('business_types') or ''))
+
+    return {
+        'coreData': {
+            'ueiSAM': value('uei'),
+            'duns Number': value('duns'),
+            'legalBusinessName': value('legal_name'),
+            'dbaName': value('dba_name'),
+            'physicalAddress': {
+                'addressLine1': value('address_line1'),
+                'addressLine2': value('address_line2'),
+                'city': value('city'),
+                'stateOrProvinceCode': value('state'),
+                'zipCode': value('zip'),
+                'zipCodePlus4': value('zip4'),
+                'countryCode': value('country'),
+            },
+        },
+        'entityRegistration': {
+            'cageCode': value('cage_code'),
+            'extractCode': value('extract_code'),
+            'registrationStatus': 'Inactive' if value('extract_code') in EXPIRED_EXTRACT_CODES else 'Active',
+            'naicsCodes': naics_codes,
+            'businessTypes': {
+                'isSmallBusiness': small_business,
+                'is8AProgram': bool(business_types & EIGHT_A_CODES),
+                'isHUBZone': bool(business_types & HUBZONE_CODES),
+                'isSDVOSB': bool(business_types & SDVOSB_CODES),
+                'isWOSB': bool(business_types & WOSB_CODES),
+            },
+        },
+    }
+
+
+class SAMEntityExtractService:
+    """
+    Bulk loader for SAM.gov entity public extract files
+
+    Features:
+    1. Streams the zipped .dat extract line by line (constant memory apart
+       from 12 bytes per UEI for drop detection)
+    2. Maps records through the same parser as the Entity API sync; expired
+       registrations are kept but marked inactive
+    3. Upserts batches with one INSERT ... ON CONFLICT (uei) each, skipping
+       unchanged contractors
+    4. Reports rows/sec and contractors missing from a complete extract, and
+       seeds the incremental API sync watermark
+    """
+
+    BATCH_SIZE = 5000
+    ENCODING = "utf-8"
+    DROPPED_SAMPLE = 100  # UEIs kept in the stats for review
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._sync = ContractorSyncService(db)
+
+    @contextmanager
+    def _open_lines(self, path: str, encoding: str) -> Iterator[Iterator[str]]:
+        """Yield the extract's lines, unpacking the .dat file from a zip"""
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                members = [m for m in archive.namelist() if m.lower().endswith(('.dat', '.txt'))]
+                if not members:
+                    raise ValueError(f"No .dat file found in {path}")
+                with archive.open(members[0]) as raw:
+                    yield io.TextIOWrapper(raw, encoding=encoding, errors='replace', newline='')
+        else:
+            with open(path, encoding=encoding, errors='replace', newline='') as lines:
+                yield lines
+
+    def ingest(self, path: str, encoding: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Stream an entity extract into contractors
+
+        Args:
+            path: SAM_PUBLIC_*_V2_*.ZIP (or the extracted .dat file)
+            encoding: File encoding (default: UTF-8)
+
+        Returns:
+            Ingest statistics including rows_per_second and dropped_contractors
+        """
+        started = time.perf_counter()
+        started_at = datetime.now(timezone.utc)
+        stats = {
+            "path": path,
+            "extract_date": None,
+            "records_read": 0,
+            "records_skipped": 0,
+            "new_contractors": 0,
+            "updated_contractors": 0,
+            "unchanged_contractors": 0,
+            "deleted_records": 0,
+            "expired_records": 0,
+            "batches": 0,
+            "complete": False,
+            "full_extract": 'DAILY' not in os.path.basename(path).upper(),
+        }
+        seen: List[np.ndarray] = []
+
+        checkpoint = self._get_checkpoint(ENTITY_EXTRACT_CHECKPOINT)
+        checkpoint.status = "running"
+        checkpoint.last_started_at = started_at
+        self.db.commit()
+
+        try:
+            batch: List[Dict[str, Any]] = []
+
+            with self._open_lines(path, encoding or self.ENCODING) as lines:
+                for line in lines:
+                    line = line.rstrip('\r\n')
+                    if line.startswith('BOF '):
+                        found = _DATE.search(line)
+                        stats["extract_date"] = found.group(1) if found else None
+                        stats["full_extract"] = stats["full_extract"] and 'DAILY' not in line.upper()
+                        continue
+                    if line.startswith('EOF '):
+                        stats["complete"] = True
+                        break
+                    if not line:
+                        continue
+
+                    stats["records_read"] += 1
+                    if line.endswith('!end'):
+                        line = line[:-len('!end')]
+                    entity = extract_record_to_entity(line.split('|'))
+                    extract_code = entity['entityRegistration']['extractCode']
+                    if extract_code in DELETED_EXTRACT_CODES:
+                        stats["deleted_records"] += 1
+                        continue
+                    if extract_code in EXPIRED_EXTRACT_CODES:
+                        stats["expired_records"] += 1
+                    batch.append(entity)
+
+                    if len(batch) >= self.BATCH_SIZE:
+                        seen.append(self._flush(batch, stats))
+                        batch = []
+                        if stats["batches"] % 20 == 0:
+                            rate = stats["records_read"] / (time.perf_counter() - started)
+                            logger.info(f"🔄 SAM.gov entity extract: {stats['records_read']} records read ({rate:.0f} rows/sec)")
+
+                if batch:
+                    seen.append(self._flush(batch, stats))
+
+            # Only a full (monthly) extract read to its EOF marker says what is missing
+            if stats["complete"] and stats["full_extract"]:
+                self._report_dropped(np.concatenate(seen) if seen else np.zeros(0, dtype='S12'), stats)
+            elif not stats["complete"]:
+                logger.warning(f"⚠️  No EOF marker in {path}; skipping dropped-entity detection")
+
+        except Exception as e:
+            self.db.rollback()
+            checkpoint = self._get_checkpoint(ENTITY_EXTRACT_CHECKPOINT)
+            checkpoint.status = "failed"
+            checkpoint.last_error = str(e)[:1000]
+            checkpoint.stats = stats
+            self.db.commit()
+            logger.error(f"❌ SAM.gov entity extract ingest failed after {stats['records_read']} records: {str(e)}")
+            raise
+
+        duration = time.perf_counter() - started
+        stats["duration_seconds"] = round(duration, 2)
+        stats["rows_per_second"] = round(stats["records_read"] / duration, 1) if duration > 0 else None
+
+        completed_at = datetime.now(timezone.utc)
+        checkpoint.status = "idle"
+        checkpoint.last_error = None
+        checkpoint.last_success_at = completed_at
+        checkpoint.stats = stats
+        self._seed_sync_watermark(stats["extract_date"], completed_at)
+        self.db.commit()
+        # In-process index only; API workers notice the checkpoint in maybe_refresh
+        contractor_index.request_refresh()
+
+        logger.info(
+            f"✅ SAM.gov entity extract ingested {stats['records_read']} records in {stats['duration_seconds']}s "
+            f"({stats['rows_per_second']} rows/sec, {stats['new_contractors']} new, "
+            f"{stats.get('dropped_contractors', 0)} dropped)"
+        )
+        return stats
+
+    def _flush(self, batch: List[Dict[str, Any]], stats: Dict[str, Any]) -> np.ndarray:
+        """Upsert a batch; returns its UEIs for drop detection"""
+        rows, skipped = self._sync._page_rows(batch)
+        counts = self._sync.upsert_contractors(rows)
+        stats["records_skipped"] += skipped
+        stats["new_contractors"] += counts["inserted"]
+        stats["updated_contractors"] += counts["updated"]
+        stats["unchanged_contractors"] += counts["unchanged"]
+        stats["batches"] += 1
+        return np.array([row["uei"][:12] for row in rows], dtype='S12')
+
+    def _report_dropped(self, seen: np.ndarray, stats: Dict[str, Any], partition_size: int = 100000):
+        """Contractors in the table that a complete extract no longer lists"""
+        seen = np.unique(seen)
+        dropped = 0
+        sample: List[str] = []
+        result = self.db.execute(text("SELECT uei FROM contractors").execution_options(stream_results=True))
+        for partition in result.partitions(partition_size):
+            ueis = np.array([row[0] for row in partition], dtype='S12')
+            missing = ueis[~np.isin(ueis, seen)]
+            dropped += len(missing)
+            sample.extend(u.decode() for u in missing[:self.DROPPED_SAMPLE - len(sample)])
+        stats["dropped_contractors"] = dropped
+        stats["dropped_sample"] = sample
+
+    def _get_checkpoint(self, name: str) -> SyncCheckpoint:
+        checkpoint = self.db.query(SyncCheckpoint).filter(SyncCheckpoint.name == name).first()
+        if not checkpoint:
+            checkpoint = SyncCheckpoint(name=name, status="idle")
+            self.db.add(checkpoint)
+            self.db.flush()
+        return checkpoint
+
+    def _seed_sync_watermark(self, extract_date: Optional[str], completed_at: datetime):
+        """
+        The extract covers registrations up to its snapshot date, so the
+        incremental Entity API sync only needs to continue from there
+        """
+        if not extract_date:
+            return
+        try:
+            watermark = datetime.strptime(extract_date, "%Y%m%d").replace(tzinfo=timezone.utc)
+        except ValueError:
+            return
+        sync = self._get_checkpoint(CONTRACTOR_CHECKPOINT)
+        if not sync.watermark or sync.watermark < watermark:
+            sync.watermark = watermark
+            sync.last_success_at = completed_at
+
+
+def latest_extract(path: str) -> str:
+    """`path` itself, or the newest extract zip in it when it is a directory"""
+    if not os.path.isdir(path):
+        return path
+    candidates = [
+        os.path.join(path, name) for name in os.listdir(path)
+        if name.upper().startswith('SAM_PUBLIC') and name.lower().endswith(('.zip', '.dat'))
+    ]
+    if not candidates:
+        raise FileNotFoundError(f"No SAM.gov entity extract in {path}")
+    return max(candidates, key=os.path.getmtime)
+
+
+if __name__ == "__main__":
+    import argparse
+    from app.core.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Ingest a SAM.gov entity public extract")
+    parser.add_argument("path", help="SAM_PUBLIC_*_V2_*.ZIP, its .dat file, or a directory of extracts")
+    parser.add_argument("--encoding", default=None, help="File encoding (default: utf-8)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    session = SessionLocal()
+    try:
+        print(json.dumps(SAMEntityExtractService(session).ingest(latest_extract(args.path), args.encoding), indent=2))
+    finally:
+        session.close()
@@ -0,0 +1,364 @@
+"""
+Shared async HTTP client for SAM.gov
+Connection pooling (keep-alive, HTTP/2), per-endpoint concurrency limits,
+token buckets sized to the API key quota (shared across processes through
+Redis), jittered retries and latency metrics
+"""
+import asyncio
+import importlib.util
+import logging
+import random
+import time
+from typing import Dict, List, Optional, Any
+
+import httpx
+from prometheus_client import Counter, Histogram
+
+from app.config import settings
+from app.core.redis_client import LoopBoundRedis
+from app.services.http_replay import replay_transport
+
+logger = logging.getLogger(__name__)
+
+# Prometheus metrics
+SAM_API_REQUESTS = Counter(
+    'sam_api_requests_total',
+    'Total SAM.gov API requests',
+    ['endpoint', 'status_code']
+)
+
+SAM_API_LATENCY = Histogram(
+    'sam_api_request_duration_seconds',
+    'SAM.gov API request latency in seconds',
+    ['endpoint']
+)
+
+SAM_API_RETRIES = Counter(
+    'sam_api_retries_total',
+    'SAM.gov API retries after 429/5xx or transport errors',
+    ['endpoint']
+)
+
+SAM_API_THROTTLE_WAIT = Histogram(
+    'sam_api_throttle_wait_seconds',
+    'Time spent waiting for SAM.gov quota tokens',
+    ['endpoint']
+)
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+QUOTA_KEY_PREFIX = "samgov_quota"
+
+# Reserve one token from every bucket in KEYS (hashes of tokens/updated_at),
+# refilled at ARGV[2i+1] tokens/sec up to ARGV[2i]. Returns {reserved, wait}:
+# the caller sleeps `wait` seconds before its call; nothing is reserved when
+# the wait would exceed ARGV[1]. Uses the Redis clock so every process agrees.
+_RESERVE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local max_wait = tonumber(ARGV[1])
+local tokens = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'updated_at')
+    local available = tonumber(state[1]) or capacity
+    local updated_at = tonumber(state[2]) or now
+    available = math.min(capacity, available + math.max(0, now - updated_at) * rate)
+    tokens[i] = available
+    if available < 1 then
+        wait = math.max(wait, (1 - available) / rate)
+    end
+end
+if wait > max_wait then
+    return {0, tostring(wait)}
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    redis.call('HSET', key, 'tokens', tostring(tokens[i] - 1), 'updated_at', tostring(now))
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 60)
+end
+return {1, tostring(wait)}
+"""
+
+
+# Whether every bucket in KEYS holds ARGV[1] tokens now (same refill as above);
+# reads only, so checking headroom never spends quota
+_HEADROOM_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local needed = tonumber(ARGV[1])
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'updated_at')
+    local available = tonumber(state[1]) or capacity
+    local updated_at = tonumber(state[2]) or now
+    if math.min(capacity, available + math.max(0, now - updated_at) * rate) < needed then
+        return 0
+    end
+end
+return 1
+"""
+
+
+class SAMQuotaExceededError(Exception):
+    """Raised when the SAM.gov key quota would not allow a call within the wait budget"""
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `rate` tokens per second up to `capacity`.
+    State is plain floats so it survives event loop changes (e.g. Celery's asyncio.run).
+    Process-local; used when the shared Redis buckets are unavailable.
+    """
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        """Seconds until `tokens` are available (0 if available now)"""
+        self._refill()
+        if self.tokens >= tokens:
+            return 0.0
+        return (tokens - self.tokens) / self.rate if self.rate > 0 else float('inf')
+
+    def consume(self, tokens: float = 1.0):
+        """Take `tokens`; the balance may go negative to reserve future tokens"""
+        self._refill()
+        self.tokens -= tokens
+
+
+class SAMGovClient:
+    """
+    Process-wide async client for every SAM.gov-facing service
+
+    Features:
+    1. One pooled httpx.AsyncClient (keep-alive, HTTP/2 when `h2` is installed)
+    2. Per-endpoint concurrency limits (opportunities, entities, documents, ...)
+    3. Hourly + daily token buckets sized to the API key quota, kept in Redis
+       (atomic Lua reservation) so every API and Celery process draws from
+       the same quota; local buckets while Redis is unavailable
+    4. Jittered exponential backoff on 429/5xx, honoring Retry-After
+    5. Per-call latency / status metrics (Prometheus)
+    """
+
+    def __init__(self):
+        self.max_retries = settings.SAM_API_MAX_RETRIES
+        self.max_concurrency = settings.SAM_API_MAX_CONCURRENCY_PER_ENDPOINT
+        self.max_quota_wait = settings.SAM_API_MAX_QUOTA_WAIT_SECONDS
+        self.http2 = importlib.util.find_spec("h2") is not None
+
+        self.hourly_bucket = TokenBucket(
+            capacity=settings.SAM_API_HOURLY_QUOTA,
+            rate=settings.SAM_API_HOURLY_QUOTA / 3600.0
+        )
+        self.daily_bucket = TokenBucket(
+            capacity=settings.SAM_API_DAILY_QUOTA,
+            rate=settings.SAM_API_DAILY_QUOTA / 86400.0
+        )
+        self._redis = LoopBoundRedis("SAM.gov quota", enabled=settings.CACHE_REDIS_ENABLED)
+
+        # Loop-bound resources, recreated if the running event loop changes
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._quota_lock: Optional[asyncio.Lock] = None
+        self._closing = set()  # Close tasks for clients left behind by an old loop
+
+    def _ensure_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._client is not None:
+            return
+
+        if self._client is not None:
+            self._close_stale_client(self._client, self._loop)
+        self._loop = loop
+        limits = httpx.Limits(
+            max_connections=settings.SAM_API_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.SAM_API_MAX_CONNECTIONS,
+            keepalive_expiry=60.0
+        )
+        self._client = httpx.AsyncClient(
+            http2=self.http2,
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            limits=limits,
+            # Record/replay (HTTP_REPLAY_MODE); None keeps the default transport
+            transport=replay_transport(http2=self.http2, limits=limits),
+            headers={'Accept': 'application/json'},
+            follow_redirects=True
+        )
+        self._semaphores = {}
+        self._quota_lock = asyncio.Lock()
+
+    def _close_stale_client(self, client: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]):
+        """Close the pool of a client created on a previous event loop"""
+        if loop is not None and loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+            return
+
+        async def close():
+            try:
+                await client.aclose()
+            except Exception as e:
+                # Connections bound to a closed loop cannot shut down cleanly
+                logger.debug(f"Closed stale SAM.gov client with errors: {str(e)}")
+
+        task = asyncio.get_running_loop().create_task(close())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def _semaphore(self, endpoint: str) -> asyncio.Semaphore:
+        if endpoint not in self._semaphores:
+            self._semaphores[endpoint] = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphores[endpoint]
+
+    async def _acquire_quota(self, endpoint: str):
+        """
+        Reserve one token from both the hourly and daily buckets, then wait
+        until it is due (no lock is held while waiting)
+        """
+        wait = await self._reserve_shared()
+        if wait is None:
+            async with self._quota_lock:
+                wait = max(self.hourly_bucket.wait_time(), self.daily_bucket.wait_time())
+                if wait <= self.max_quota_wait:
+                    self.hourly_bucket.consume()
+                    self.daily_bucket.consume()
+
+        if wait > self.max_quota_wait:
+            raise SAMQuotaExceededError(
+                f"SAM.gov API quota exhausted; next call allowed in {wait:.0f}s"
+            )
+        if wait > 0:
+            SAM_API_THROTTLE_WAIT.labels(endpoint=endpoint).observe(wait)
+            await asyncio.sleep(wait)
+
+    async def _reserve_shared(self) -> Optional[float]:
+        """Reserve from the Redis buckets; returns the wait, or None without Redis"""
+        client = self._redis.get()
+        if client is None:
+            return None
+        try:
+            _, wait = await client.eval(_RESERVE_SCRIPT, 2, *self._bucket_keys(), *self._bucket_args(self.max_quota_wait))
+        except Exception as e:
+            self._redis.mark_down(e)
+            return None
+        return float(wait)
+
+    async def headroom(self, tokens: float = 1.0) -> bool:
+        """
+        Whether `tokens` calls fit in the hourly and daily quota right now,
+        without reserving them (shared Redis buckets, local ones without Redis)
+        """
+        client = self._redis.get()
+        if client is not None:
+            try:
+                return bool(await client.eval(_HEADROOM_SCRIPT, 2, *self._bucket_keys(), *self._bucket_args(tokens)))
+            except Exception as e:
+                self._redis.mark_down(e)
+        return self.hourly_bucket.wait_time(tokens) == 0 and self.daily_bucket.wait_time(tokens) == 0
+
+    @staticmethod
+    def _bucket_keys():
+        return f"{QUOTA_KEY_PREFIX}:hourly", f"{QUOTA_KEY_PREFIX}:daily"
+
+    def _bucket_args(self, first: float) -> List[float]:
+        """Script ARGV: `first`, then capacity and rate of the hourly and daily buckets"""
+        args = [first]
+        for bucket in (self.hourly_bucket, self.daily_bucket):
+            args.extend([bucket.capacity, bucket.rate])
+        return args
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        """Full-jitter exponential backoff, honoring Retry-After when present"""
+        if response is not None and response.headers.get('Retry-After'):
+            try:
+                return min(float(response.headers['Retry-After']), 60.0)
+            except ValueError:
+                pass
+        return random.uniform(0, min(30.0, 0.5 * (2 ** attempt)))
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        endpoint: str = "opportunities",
+        metered: bool = True,
+        **kwargs: Any
+    ) -> httpx.Response:
+        """
+        Send a request through the shared pool
+
+        Args:
+            method: HTTP method
+            url: Absolute URL
+            endpoint: Logical endpoint name for concurrency limits and metrics
+            metered: Whether the call counts against the API key quota
+                     (file downloads from resource links do not)
+            **kwargs: Passed through to httpx (params, json, headers, timeout)
+
+        Returns:
+            The final httpx.Response (callers decide on raise_for_status)
+        """
+        self._ensure_loop()
+
+        response = None
+        for attempt in range(self.max_retries + 1):
+            if metered:
+                await self._acquire_quota(endpoint)
+
+            started = time.perf_counter()
+            try:
+                async with self._semaphore(endpoint):
+                    response = await self._client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                SAM_API_LATENCY.labels(endpoint=endpoint).observe(time.perf_counter() - started)
+                SAM_API_REQUESTS.labels(endpoint=endpoint, status_code='error').inc()
+                if attempt >= self.max_retries:
+                    raise
+                SAM_API_RETRIES.labels(endpoint=endpoint).inc()
+                delay = self._backoff(attempt, None)
+                logger.warning(f"⚠️  SAM.gov {endpoint} transport error ({e}); retry {attempt + 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            SAM_API_LATENCY.labels(endpoint=endpoint).observe(time.perf_counter() - started)
+            SAM_API_REQUESTS.labels(endpoint=endpoint, status_code=str(response.status_code)).inc()
+
+            if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                return response
+
+            SAM_API_RETRIES.labels(endpoint=endpoint).inc()
+            delay = self._backoff(attempt, response)
+            logger.warning(f"⚠️  SAM.gov {endpoint} returned {response.status_code}; retry {attempt + 1} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+        return response
+
+    async def get(self, url: str, endpoint: str = "opportunities", **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", url, endpoint=endpoint, **kwargs)
+
+    async def post(self, url: str, endpoint: str = "opportunities", **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", url, endpoint=endpoint, **kwargs)
+
+    async def aclose(self):
+        """Close the pooled connections (application shutdown)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
+
+
+# Singleton instance
+samgov_client = SAMGovClient()
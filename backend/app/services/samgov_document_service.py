@@ -2,8 +2,9 @@
 Advanced SAM.gov Document Download Service
 Automatically fetches RFP documents, amendments, and attachments
 """
+import asyncio
 from typing import List, Dict, Optional
-import requests
+import httpx
 import os
 from datetime import datetime
 from pathlib import Path
@@ -11,6 +12,7 @@ import hashlib
 from sqlalchemy.orm import Session
 
 from app.models.opportunity import Opportunity
+from app.services.samgov_client import samgov_client
 
 
 class SAMGovDocumentService:
@@ -23,7 +25,7 @@ class SAMGovDocumentService:
         self.download_dir = Path("/home/ubuntu/GovSure/data/rfp_documents")
         self.download_dir.mkdir(parents=True, exist_ok=True)
     
-    def fetch_opportunity_documents(
+    async def fetch_opportunity_documents(
         self,
         solicitation_number: str,
         opportunity_id: Optional[str] = None
@@ -59,7 +61,7 @@ class SAMGovDocumentService:
                 "limit": 1
             }
             
-            response = requests.get(search_url, params=params, timeout=30)
+            response = await samgov_client.get(search_url, params=params)
             response.raise_for_status()
             
             data = response.json()
@@ -75,12 +77,11 @@ class SAMGovDocumentService:
             # Extract document information
             documents = self._extract_documents(opp_data, solicitation_number)
             
-            # Download documents
-            downloaded_docs = []
-            for doc in documents:
-                downloaded = self._download_document(doc, solicitation_number)
-                if downloaded:
-                    downloaded_docs.append(downloaded)
+            # Download documents concurrently (bounded by the client's per-endpoint limit)
+            results = await asyncio.gather(
+                *(self._download_document(doc, solicitation_number) for doc in documents)
+            )
+            downloaded_docs = [doc for doc in results if doc]
             
             return {
                 "documents": downloaded_docs,
@@ -91,7 +92,7 @@ class SAMGovDocumentService:
                 "next_check": self._calculate_next_check().isoformat()
             }
         
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             return {
                 "error": f"SAM.gov API error: {str(e)}",
                 "documents": []
@@ -168,7 +169,7 @@ class SAMGovDocumentService:
         else:
             return "other"
     
-    def _download_document(self, doc: Dict, solicitation_number: str) -> Optional[Dict]:
+    async def _download_document(self, doc: Dict, solicitation_number: str) -> Optional[Dict]:
         """Download a single document"""
         
         if not doc.get("url"):
@@ -183,19 +184,17 @@ class SAMGovDocumentService:
             filename = self._sanitize_filename(doc["name"])
             filepath = sol_dir / filename
             
+            # Resource file downloads do not count against the API key quota
+            response = await samgov_client.get(doc["url"], endpoint="documents", metered=False, timeout=60.0)
+            response.raise_for_status()
+            
             # Check if already downloaded (by hash)
             if filepath.exists():
-                # File exists - check if it's the same
                 existing_hash = self._file_hash(filepath)
-                
-                # Download to temp to compare
-                response = requests.get(doc["url"], timeout=60)
-                response.raise_for_status()
-                
                 new_hash = hashlib.md5(response.content).hexdigest()
                 
                 if existing_hash == new_hash:
-                    # Same file - skip download
+                    # Same file - skip write
                     return {
                         **doc,
                         "local_path": str(filepath),
@@ -204,10 +203,6 @@ class SAMGovDocumentService:
                         "status": "already_downloaded"
                     }
             
-            # Download file
-            response = requests.get(doc["url"], timeout=60)
-            response.raise_for_status()
-            
             # Save file
             with open(filepath, 'wb') as f:
                 f.write(response.content)
@@ -259,7 +254,7 @@ class SAMGovDocumentService:
         from datetime import timedelta
         return datetime.utcnow() + timedelta(hours=6)
     
-    def check_for_updates(self, solicitation_number: str) -> Dict:
+    async def check_for_updates(self, solicitation_number: str) -> Dict:
         """
         Check if there are new documents or amendments
         
@@ -272,7 +267,7 @@ class SAMGovDocumentService:
         """
         
         # Fetch latest from SAM.gov
-        latest = self.fetch_opportunity_documents(solicitation_number)
+        latest = await self.fetch_opportunity_documents(solicitation_number)
         
         if latest.get("error"):
             return {
@@ -4,17 +4,44 @@ Fetches opportunities from SAM.gov API with caching and error handling
 """
 import os
 import json
+import asyncio
+import base64
 from typing import List, Dict, Optional, Any
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.orm import Session
 from app.config import settings
+from app.services.samgov_client import samgov_client
+from app.services.naics_hierarchy import naics_hierarchy
+from app.services.response_cache import ResponseCache
+from app.services.single_flight import SingleFlight
+from app.services.pwin_scoring import score_notices
+from app.services.rfp_section_segmenter import RFPSectionSegmenter
 import logging
 
-import requests
+import httpx
 import json
 
 logger = logging.getLogger(__name__)
 
 
+# Contract sections summarised on the detail page
+CONTRACT_SECTIONS = {
+    'H': 'Special Contract Requirements',
+    'I': 'Contract Clauses',
+    'J': 'List of Attachments',
+    'K': 'Representations and Certifications',
+    'L': 'Instructions, Conditions, and Notices',
+    'M': 'Evaluation Factors'
+}
+
+# "Section H: ..." anywhere in a description, or "H. ..." at the start of a line
+_contract_segmenter = RFPSectionSegmenter(kinds=['section', 'letter'])
+
+
+class InvalidCursorError(Exception):
+    """Raised when a search cursor cannot be decoded"""
+
+
 class SAMGovService:
     """Service for interacting with SAM.gov API"""
     
@@ -24,8 +51,11 @@ class SAMGovService:
         # Use GET with query params; API key provided via 'api_key' parameter
         self.base_url = "https://api.sam.gov/opportunities/v2/search"
         self.base_url_v1 = "https://api.sam.gov/prod/opp/v1/opportunities/search"  # Fallback
-        self.cache = {}
         self.cache_ttl = 300  # 5 minutes cache for search results
+        self.cache = ResponseCache("samgov", ttl=self.cache_ttl, stale_ttl=600)
+        # Coalesces concurrent uncached calls (cache misses are single-flighted by the cache itself)
+        self.flight = SingleFlight("samgov_detail")
+        self._background = set()  # Prefetch tasks (kept referenced until done)
 
         if not self.api_key or self.api_key in ['demo_api_key_12345', 'your_sam_gov_api_key_here', '3wLjNRkUoBtpPEymw0LphKvRmAayb3Lk8byG0b4J']:
             logger.warning("⚠️  SAM_GOV_API_KEY not configured or using demo key. API calls will fail.")
@@ -33,11 +63,12 @@ class SAMGovService:
         else:
             logger.info(f"✅ SAM.gov API key configured: {self.api_key[:8]}...")
     
-    def get_top_opportunities(
+    async def get_top_opportunities(
         self,
         limit: int = 10,
         min_pwin: Optional[int] = 60,
-        use_cache: bool = True
+        use_cache: bool = True,
+        db: Optional[Session] = None
     ) -> Dict[str, Any]:
         """
         Fetch top opportunities from SAM.gov
@@ -46,86 +77,115 @@ class SAMGovService:
             limit: Number of opportunities to return
             min_pwin: Minimum PWin score filter
             use_cache: Whether to use cached results
+            db: Database session; when given and the local mirror is ready,
+                results are served from the mirror instead of the live API
             
         Returns:
             Dict with 'items', 'total', and 'page'
         """
+        mirror = self._get_mirror(db)
+        if mirror:
+            return mirror.get_top(limit=limit, min_pwin=min_pwin)
+
         cache_key = f"top_opportunities_{limit}_{min_pwin}"
         
-        # Check cache
-        if use_cache and cache_key in self.cache:
-            cached_data, cached_time = self.cache[cache_key]
-            if datetime.now() - cached_time < timedelta(seconds=self.cache_ttl):
-                logger.info("📦 Returning cached SAM.gov opportunities")
-                return cached_data
-        
-        # Fetch from API
         try:
-            opportunities = self._fetch_from_api(limit=limit)
-
-            # Transform and score opportunities
-            items = []
-            for opp in opportunities:
-                transformed = self._transform_opportunity(opp)
-                # Simple scoring based on contract value and set-aside type
-                transformed['pwin_score'] = self._calculate_simple_pwin(opp)
-
-                if min_pwin is None or transformed['pwin_score'] >= min_pwin:
-                    items.append(transformed)
-            
-            result = {
-                'items': items[:limit],
-                'total': len(items),
-                'page': 1,
-                'source': 'SAM.gov'
-            }
-            
-            # Cache the result
-            self.cache[cache_key] = (result, datetime.now())
-            logger.info(f"✅ Retrieved {len(items)} opportunities from SAM.gov")
-            
-            return result
-            
+            return await self.cache.get_or_set(
+                cache_key,
+                lambda: self._fetch_top_from_api(limit, min_pwin),
+                force_refresh=not use_cache
+            )
         except Exception as e:
             logger.error(f"❌ SAM.gov API error: {str(e)}")
             # Return mock data as fallback
             return self._get_fallback_opportunities(limit)
     
-    def search_opportunities(
+    async def _fetch_top_from_api(self, limit: int, min_pwin: Optional[int]) -> Dict[str, Any]:
+        """Fetch, score and filter the newest opportunities from the live API"""
+        opportunities = await self._fetch_from_api(limit=limit)
+
+        # Transform and score opportunities (one vectorized scoring pass)
+        items = [
+            item for item in self._transform_opportunities(opportunities)
+            if min_pwin is None or item['pwin_score'] >= min_pwin
+        ]
+        
+        logger.info(f"✅ Retrieved {len(items)} opportunities from SAM.gov")
+        return {
+            'items': items[:limit],
+            'total': len(items),
+            'page': 1,
+            'source': 'SAM.gov'
+        }
+    
+    async def search_opportunities(
         self,
         page: int = 1,
         limit: int = 20,
         naics_code: Optional[str] = None,
         keyword: Optional[str] = None,
         posted_from: Optional[str] = None,
-        posted_to: Optional[str] = None
+        posted_to: Optional[str] = None,
+        cursor: Optional[str] = None,
+        db: Optional[Session] = None
     ) -> Dict[str, Any]:
         """
         Search opportunities with filters and pagination
+        Served from the local mirror when `db` is given and the mirror is ready
+        
+        Args:
+            cursor: Opaque `next_cursor`/`prev_cursor` from a previous response;
+                    replaces the other arguments and keeps pages stable while
+                    new notices are posted
         
         Returns:
-            Dict with paginated results
+            Dict with paginated results, real 'total'/'total_pages' and cursors
         """
-        try:
-            offset = (page - 1) * limit
-            opportunities = self._fetch_from_api(
+        if cursor:
+            state = self._decode_cursor(cursor)
+            query = state['q']
+            page = state['page']
+            snapshot = datetime.fromisoformat(state['snapshot'])
+            snapshot_total = state.get('total')
+        else:
+            snapshot = datetime.now(timezone.utc)
+            snapshot_total = None
+            # Pin the date window so every page of this result set shares a cache key
+            query = {
+                'limit': limit,
+                'naics_code': naics_code,
+                'keyword': keyword,
+                'posted_from': posted_from or (snapshot - timedelta(days=30)).strftime('%m/%d/%Y'),
+                'posted_to': posted_to or snapshot.strftime('%m/%d/%Y'),
+            }
+        limit = query['limit']
+
+        mirror = self._get_mirror(db)
+        if mirror:
+            result = mirror.search(
+                page=page,
                 limit=limit,
-                offset=offset,
-                naics_code=naics_code,
-                keyword=keyword,
-                posted_from=posted_from,
-                posted_to=posted_to
+                naics_code=query['naics_code'],
+                keyword=query['keyword'],
+                posted_from=query['posted_from'],
+                posted_to=query['posted_to'],
+                snapshot=snapshot
             )
+            return self._with_cursors(result, query, snapshot, result['total'])
 
-            items = [self._transform_opportunity(opp) for opp in opportunities]
-            
-            return {
-                'items': items,
-                'total': len(items),  # SAM.gov doesn't always provide total
-                'page': page,
-                'limit': limit,
-                'source': 'SAM.gov'
-            }
+        try:
+            offset = (page - 1) * limit
+            result = await self._get_search_page(query, offset)
+
+            # SAM.gov returns newest notices first, so notices posted since the
+            # cursor's snapshot push older results down by exactly that many rows
+            drift = result['total'] - snapshot_total if snapshot_total is not None else 0
+            if drift > 0:
+                result = dict(await self._get_search_page(query, offset + drift), total=snapshot_total)
+
+            result = dict(result, page=page)
+            self._prefetch_pages(query, page, result['total'], drift)
+            return self._with_cursors(result, query, snapshot, snapshot_total or result['total'])
             
         except Exception as e:
             logger.error(f"❌ SAM.gov search error: {str(e)}")
@@ -138,57 +198,183 @@ class SAMGovService:
                 logger.error(f"❌ SAM.gov API call failed despite having API key: {str(e)}")
                 raise e
     
-    def get_opportunity_by_id(self, notice_id: str) -> Optional[Dict[str, Any]]:
+    async def _get_search_page(self, query: Dict[str, Any], offset: int) -> Dict[str, Any]:
+        """One cached (and single-flighted) page of live search results"""
+        cache_key = f"search_{json.dumps([offset, query], sort_keys=True)}"
+        return await self.cache.get_or_set(cache_key, lambda: self._search_api(query, offset))
+    
+    async def _search_api(self, query: Dict[str, Any], offset: int) -> Dict[str, Any]:
+        """Run one search page against the live API"""
+        limit = query['limit']
+        data = await self._fetch_page(
+            limit=limit,
+            offset=offset,
+            naics_code=query['naics_code'],
+            keyword=query['keyword'],
+            posted_from=query['posted_from'],
+            posted_to=query['posted_to']
+        )
+        total = data.get('totalRecords', 0)
+
+        return {
+            'items': self._transform_opportunities(data.get('opportunitiesData', [])),
+            'total': total,
+            'limit': limit,
+            'total_pages': (total + limit - 1) // limit if limit else 0,
+            'source': 'SAM.gov'
+        }
+    
+    def _prefetch_pages(self, query: Dict[str, Any], page: int, total: int, drift: int = 0):
+        """
+        Warm the cache with the next SAM_SEARCH_PREFETCH_PAGES pages in the background,
+        as long as that leaves quota headroom for interactive calls
+        """
+        limit = query['limit']
+        pages = [
+            p for p in range(page + 1, page + 1 + settings.SAM_SEARCH_PREFETCH_PAGES)
+            if (p - 1) * limit < total
+        ]
+        if not pages:
+            return
+
+        async def prefetch(offset: int):
+            try:
+                await self._get_search_page(query, offset)
+            except Exception as e:
+                logger.warning(f"⚠️  SAM.gov prefetch failed at offset {offset}: {str(e)}")
+
+        async def prefetch_all():
+            # Checked against the shared quota, off the request path
+            if not await samgov_client.headroom(len(pages) + 1):
+                return
+            await asyncio.gather(*(prefetch((p - 1) * limit + drift) for p in pages))
+
+        task = asyncio.get_running_loop().create_task(prefetch_all())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+    
+    def _with_cursors(
+        self,
+        result: Dict[str, Any],
+        query: Dict[str, Any],
+        snapshot: datetime,
+        total: int
+    ) -> Dict[str, Any]:
+        """Attach next/prev cursors pinned to the result set's snapshot"""
+        page = result['page']
+        total_pages = (total + query['limit'] - 1) // query['limit'] if query['limit'] else 0
+        state = {'q': query, 'snapshot': snapshot.isoformat(), 'total': total}
+        return {
+            **result,
+            'total': total,
+            'total_pages': total_pages,
+            'snapshot': snapshot.isoformat(),
+            'next_cursor': self._encode_cursor({**state, 'page': page + 1}) if page < total_pages else None,
+            'prev_cursor': self._encode_cursor({**state, 'page': page - 1}) if page > 1 else None,
+        }
+    
+    @staticmethod
+    def _encode_cursor(state: Dict[str, Any]) -> str:
+        return base64.urlsafe_b64encode(json.dumps(state, separators=(',', ':')).encode('utf-8')).decode('ascii')
+    
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Dict[str, Any]:
+        try:
+            state = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            if not isinstance(state.get('q'), dict) or int(state['page']) < 1:
+                raise ValueError("malformed cursor")
+            state['page'] = int(state['page'])
+            return state
+        except (ValueError, KeyError, TypeError) as e:
+            raise InvalidCursorError(f"Invalid search cursor: {str(e)}")
+    
+    def _get_mirror(self, db: Optional[Session]):
+        """Return the local mirror service if it can serve reads, else None"""
+        if db is None or not settings.SAM_MIRROR_ENABLED:
+            return None
+        try:
+            from app.services.opportunity_mirror_service import OpportunityMirrorService
+            mirror = OpportunityMirrorService(db)
+            if mirror.is_ready():
+                return mirror
+        except Exception as e:
+            logger.warning(f"⚠️  SAM.gov mirror unavailable, using live API: {str(e)}")
+            db.rollback()
+        return None
+    
+    async def get_opportunity_by_id(self, notice_id: str, db: Optional[Session] = None) -> Optional[Dict[str, Any]]:
         """
         Fetch a single opportunity with FULL details by notice ID
         Includes description, attachments, clauses, and all contract sections
+        
+        Args:
+            db: Database session; when given, details come from the persistent
+                detail cache (see OpportunityDetailService)
         """
         if not self.api_key:
             logger.warning("No SAM.gov API key, returning mock data")
             return self._get_mock_opportunity_detail(notice_id)
             
         try:
-            # Use the opportunities search endpoint with noticeId filter
-            url = self.base_url
-            logger.info(f"🔄 Fetching full opportunity details for {notice_id}")
-
-            # Use POST with JSON, and provide API key via header 'apikey'
-            response = requests.post(
-                url,
-                json={
-                    'noticeId': notice_id,
-                    'limit': 1
-                },
-                headers={
-                    'Accept': 'application/json',
-                    'Content-Type': 'application/json',
-                    'apikey': self.api_key
-                },
-                timeout=30
-            )
-            response.raise_for_status()
-            data = response.json()
-
-            if data.get('opportunitiesData') and len(data['opportunitiesData']) > 0:
-                opp_data = data['opportunitiesData'][0]
-
-                # Transform with full details
-                transformed = self._transform_opportunity_detail(opp_data)
-
-                logger.info(f"✅ Retrieved full details for opportunity {notice_id}")
-                return transformed
-
-            logger.warning(f"No opportunity found with ID {notice_id}")
-            return None
-                
+            if db is not None:
+                from app.services.opportunity_detail_service import OpportunityDetailService
+                return await OpportunityDetailService(db).get(notice_id)
+            return await self.flight.do(notice_id, lambda: self._fetch_opportunity_detail(notice_id))
         except Exception as e:
             logger.error(f"❌ Error fetching opportunity {notice_id}: {str(e)}")
+            if db is not None:
+                db.rollback()
             # Return mock data as fallback
             return self._get_mock_opportunity_detail(notice_id)
     
-    def _transform_opportunity_detail(self, opp: Dict[str, Any]) -> Dict[str, Any]:
+    async def _fetch_opportunity_detail(self, notice_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch and transform one notice from the live API"""
+        opp_data = await self._fetch_notice_raw(notice_id)
+        if opp_data is None:
+            return None
+
+        # Transform with full details
+        return self._transform_opportunity_detail(opp_data)
+    
+    async def _fetch_notice_raw(self, notice_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch one raw notice from the live API (None if SAM.gov has no such notice)"""
+        # Use the opportunities search endpoint with noticeId filter
+        url = self.base_url
+        logger.info(f"🔄 Fetching full opportunity details for {notice_id}")
+
+        # Use POST with JSON, and provide API key via header 'apikey'
+        response = await samgov_client.post(
+            url,
+            json={
+                'noticeId': notice_id,
+                'limit': 1
+            },
+            headers={
+                'Accept': 'application/json',
+                'Content-Type': 'application/json',
+                'apikey': self.api_key
+            }
+        )
+        response.raise_for_status()
+        data = response.json()
+
+        if data.get('opportunitiesData') and len(data['opportunitiesData']) > 0:
+            logger.info(f"✅ Retrieved full details for opportunity {notice_id}")
+            return data['opportunitiesData'][0]
+
+        logger.warning(f"No opportunity found with ID {notice_id}")
+        return None
+    
+    def _transform_opportunity_detail(
+        self,
+        opp: Dict[str, Any],
+        sections: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
         """
         Transform SAM.gov opportunity to detailed format with all sections
+        
+        Args:
+            sections: Previously extracted sections to reuse (parsed when omitted)
         """
         base_transform = self._transform_opportunity(opp)
         
@@ -204,7 +390,7 @@ class SAMGovService:
             'pointOfContact': opp.get('pointOfContact', []),
             
             # Contract sections from description
-            'sections': self._extract_contract_sections(opp.get('description', '')),
+            'sections': sections if sections is not None else self._extract_contract_sections(opp.get('description', '')),
             
             # Metadata
             'archiveDate': opp.get('archiveDate', ''),
@@ -220,27 +406,17 @@ class SAMGovService:
         Extract contract sections (H, I, J, K, L) from RFP description
         SAM.gov descriptions often contain structured sections
         """
+        description = description or ''
+        found = {}
+        for segment in _contract_segmenter.segment(description):
+            if segment.key in CONTRACT_SECTIONS and segment.key not in found:
+                found[segment.key] = segment
+
         sections = []
-        
-        # Common section markers in government RFPs
-        section_patterns = {
-            'H': 'Special Contract Requirements',
-            'I': 'Contract Clauses',
-            'J': 'List of Attachments',
-            'K': 'Representations and Certifications',
-            'L': 'Instructions, Conditions, and Notices',
-            'M': 'Evaluation Factors'
-        }
-        
-        # Try to parse sections from description
-        for letter, title in section_patterns.items():
-            # Look for section markers like "Section H:", "H.", etc.
-            import re
-            pattern = rf"(?:Section\s+{letter}|{letter}\.|\b{letter}\b)[\s:]+(.*?)(?=(?:Section\s+[A-Z]|[A-Z]\.|$))"
-            matches = re.findall(pattern, description, re.IGNORECASE | re.DOTALL)
-            
-            if matches:
-                content = matches[0].strip()[:500]  # First 500 chars
+        for letter, title in CONTRACT_SECTIONS.items():
+            segment = found.get(letter)
+            if segment:
+                content = description[segment.title_start:segment.end].strip()[:500]  # First 500 chars
             else:
                 # Generic content if section not found
                 content = f"Full details available in the solicitation document. Please review all {title.lower()} carefully."
@@ -378,7 +554,7 @@ Proposals will be evaluated based on: (1) Technical Approach (40%), (2) Past Per
             'note': 'This is mock data. Configure SAM_GOV_API_KEY for real opportunity details.'
         }
     
-    def _fetch_from_api(
+    async def _fetch_from_api(
         self,
         limit: int = 20,
         offset: int = 0,
@@ -388,8 +564,31 @@ Proposals will be evaluated based on: (1) Technical Approach (40%), (2) Past Per
         posted_to: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """
-        Internal method to fetch from SAM.gov API v2
-        Now uses GET with query parameters instead of POST
+        Fetch raw SAM.gov notices (untransformed) for one page
+        """
+        data = await self._fetch_page(
+            limit=limit,
+            offset=offset,
+            naics_code=naics_code,
+            keyword=keyword,
+            posted_from=posted_from,
+            posted_to=posted_to
+        )
+        return data.get('opportunitiesData', [])
+    
+    async def _fetch_page(
+        self,
+        limit: int = 20,
+        offset: int = 0,
+        naics_code: Optional[str] = None,
+        keyword: Optional[str] = None,
+        posted_from: Optional[str] = None,
+        posted_to: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Internal method to fetch one page from SAM.gov API v2
+        Uses GET with query parameters; returns the raw response body
+        ('opportunitiesData', 'totalRecords', ...)
         """
         if not self.api_key:
             raise ValueError("SAM_GOV_API_KEY is required")
@@ -414,13 +613,9 @@ Proposals will be evaluated based on: (1) Technical Approach (40%), (2) Past Per
 
         try:
             # v2 API uses GET with query parameters (not POST)
-            response = requests.get(
+            response = await samgov_client.get(
                 self.base_url,
-                params=params,
-                headers={
-                    'Accept': 'application/json'
-                },
-                timeout=30
+                params=params
             )
 
             # Log the response status for debugging
@@ -435,19 +630,26 @@ Proposals will be evaluated based on: (1) Technical Approach (40%), (2) Past Per
             data = response.json()
 
             # SAM.gov API v2 returns opportunitiesData array
-            opportunities = data.get('opportunitiesData', [])
-            logger.info(f"✅ SAM.gov v2 returned {len(opportunities)} opportunities")
-
-            # Transform opportunities to our format
-            return [self._transform_opportunity(opp) for opp in opportunities]
+            logger.info(f"✅ SAM.gov v2 returned {len(data.get('opportunitiesData', []))} opportunities")
+            return data
 
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"❌ HTTP request failed: {str(e)}")
             raise e
     
-    def _transform_opportunity(self, opp: Dict[str, Any]) -> Dict[str, Any]:
+    def _transform_opportunities(self, opps: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Transform a list of SAM.gov opportunities, scoring PWin for the whole batch at once
+        """
+        scores = score_notices(opps)
+        return [self._transform_opportunity(opp, int(score)) for opp, score in zip(opps, scores)]
+    
+    def _transform_opportunity(self, opp: Dict[str, Any], pwin_score: Optional[int] = None) -> Dict[str, Any]:
         """
         Transform SAM.gov opportunity to our internal format
+        
+        Args:
+            pwin_score: Precomputed score (from a batch); calculated when omitted
         """
         return {
             'id': opp.get('noticeId', ''),
@@ -469,7 +671,7 @@ Proposals will be evaluated based on: (1) Technical Approach (40%), (2) Past Per
             'active': opp.get('active', True),
             'pointOfContact': opp.get('pointOfContact', []),
             'placeOfPerformance': opp.get('placeOfPerformance', {}),
-            'pwin_score': self._calculate_simple_pwin(opp),  # Add PWin calculation
+            'pwin_score': self._calculate_simple_pwin(opp) if pwin_score is None else pwin_score,  # Add PWin calculation
         }
     
     def _extract_value(self, opp: Dict[str, Any]) -> Optional[float]:
@@ -485,10 +687,10 @@ Proposals will be evaluated based on: (1) Technical Approach (40%), (2) Past Per
                 pass
         
         # Estimate based on NAICS and type
-        naics = opp.get('naicsCode', '')
-        if naics.startswith('54'):  # Professional services
+        sector = naics_hierarchy.sector(opp.get('naicsCode'))
+        if sector == '54':  # Professional services
             return 5000000  # $5M estimate
-        elif naics.startswith('33'):  # Manufacturing
+        elif sector == '31-33':  # Manufacturing
             return 10000000  # $10M estimate
         
         return None
@@ -496,32 +698,9 @@ Proposals will be evaluated based on: (1) Technical Approach (40%), (2) Past Per
     def _calculate_simple_pwin(self, opp: Dict[str, Any]) -> int:
         """
         Calculate a simple PWin score (0-100) based on opportunity characteristics
+        (set-aside type and posting recency); see pwin_scoring for the batch version
         """
-        score = 50  # Base score
-        
-        # Set-aside increases chances (handle None values)
-        set_aside = opp.get('typeOfSetAsideDescription') or ''
-        set_aside_lower = set_aside.lower() if set_aside else ''
-        if 'small business' in set_aside_lower:
-            score += 20
-        elif 'woman' in set_aside_lower or 'veteran' in set_aside_lower:
-            score += 15
-        
-        # Recent postings are better
-        posted_date = opp.get('postedDate', '')
-        if posted_date:
-            try:
-                posted = datetime.strptime(posted_date[:10], '%Y-%m-%d')
-                days_old = (datetime.now() - posted).days
-                if days_old < 7:
-                    score += 10
-                elif days_old < 14:
-                    score += 5
-            except:
-                pass
-        
-        # Cap at 100
-        return min(score, 100)
+        return int(score_notices([opp])[0])
     
     def _get_fallback_opportunities(self, limit: int = 10) -> Dict[str, Any]:
         """
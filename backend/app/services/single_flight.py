@@ -0,0 +1,164 @@
+"""
+Request coalescing (single-flight) for identical in-flight upstream calls
+Concurrent callers with the same key share one execution: within a process
+through a shared future, across processes through a Redis lock plus a
+short-lived result key.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import secrets
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from prometheus_client import Counter
+
+from app.config import settings
+from app.core.redis_client import LoopBoundRedis
+
+logger = logging.getLogger(__name__)
+
+SINGLE_FLIGHT_CALLS = Counter(
+    'single_flight_calls_total',
+    'Single-flight calls by outcome (leader executed, or shared a local/remote result)',
+    ['group', 'outcome']
+)
+
+# Compare-and-delete so a leader never releases a lock that expired and was re-acquired
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution
+
+    Usage:
+        flight = SingleFlight("samgov")
+        result = await flight.do(key, lambda: fetch(...))
+
+    Results shared across processes must be JSON-serializable. If the
+    cross-process leader fails or its lock expires, waiters run the call
+    themselves rather than failing.
+    """
+
+    def __init__(
+        self,
+        group: str,
+        lock_ttl: Optional[float] = None,
+        result_ttl: Optional[float] = None,
+        poll_interval: float = 0.05,
+        use_redis: Optional[bool] = None
+    ):
+        """
+        Args:
+            group: Name used as Redis key namespace and metric label
+            lock_ttl: Seconds the cross-process lock is held at most
+            result_ttl: Seconds the leader's result stays readable by waiters
+            poll_interval: Seconds between waiter polls for the leader's result
+            use_redis: Enable cross-process coalescing (defaults to CACHE_REDIS_ENABLED)
+        """
+        self.group = group
+        self.lock_ttl = lock_ttl or settings.SINGLE_FLIGHT_LOCK_TTL_SECONDS
+        self.result_ttl = result_ttl or settings.SINGLE_FLIGHT_RESULT_TTL_SECONDS
+        self.poll_interval = poll_interval
+        self._redis = LoopBoundRedis(
+            f"single-flight {group}",
+            enabled=settings.CACHE_REDIS_ENABLED if use_redis is None else use_redis
+        )
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run `fn` once for all concurrent callers of `key`
+
+        Exceptions raised by the leader's call propagate to local waiters too.
+        """
+        loop = asyncio.get_running_loop()
+        future = self._inflight.get(key)
+        if future is not None and future.get_loop() is loop:
+            SINGLE_FLIGHT_CALLS.labels(group=self.group, outcome='shared_local').inc()
+            return await asyncio.shield(future)
+
+        future = loop.create_future()
+        # Avoid "exception was never retrieved" when nobody else was waiting
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        try:
+            result = await self._run(key, fn)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        client = self._redis.get()
+        if client is None:
+            SINGLE_FLIGHT_CALLS.labels(group=self.group, outcome='leader').inc()
+            return await fn()
+
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        lock_key = f"single_flight:{self.group}:{digest}:lock"
+        result_key = f"single_flight:{self.group}:{digest}:result"
+        token = secrets.token_hex(8)
+
+        try:
+            acquired = await client.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+        except Exception as e:
+            self._redis.mark_down(e)
+            SINGLE_FLIGHT_CALLS.labels(group=self.group, outcome='leader').inc()
+            return await fn()
+
+        if acquired:
+            SINGLE_FLIGHT_CALLS.labels(group=self.group, outcome='leader').inc()
+            try:
+                result = await fn()
+                try:
+                    encoded = json.dumps(result, default=str)
+                except (TypeError, ValueError):
+                    encoded = None  # Not shareable across processes; local waiters still get it
+                if encoded is not None:
+                    try:
+                        await client.set(result_key, encoded, px=int(self.result_ttl * 1000))
+                    except Exception as e:
+                        self._redis.mark_down(e)
+                return result
+            finally:
+                try:
+                    await client.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+                except Exception as e:
+                    self._redis.mark_down(e)
+
+        # Another process is the leader: wait for its result or for the lock to go away
+        deadline = asyncio.get_running_loop().time() + self.lock_ttl
+        try:
+            while asyncio.get_running_loop().time() < deadline:
+                raw = await client.get(result_key)
+                if raw is not None:
+                    SINGLE_FLIGHT_CALLS.labels(group=self.group, outcome='shared_remote').inc()
+                    return json.loads(raw)
+                if not await client.exists(lock_key):
+                    # Leader finished without a shareable result, or failed
+                    raw = await client.get(result_key)
+                    if raw is not None:
+                        SINGLE_FLIGHT_CALLS.labels(group=self.group, outcome='shared_remote').inc()
+                        return json.loads(raw)
+                    break
+                await asyncio.sleep(self.poll_interval)
+        except Exception as e:
+            self._redis.mark_down(e)
+
+        SINGLE_FLIGHT_CALLS.labels(group=self.group, outcome='leader').inc()
+        return await fn()
@@ -0,0 +1,437 @@
+"""
+Document Embedding Index
+ANN (approximate nearest neighbor) index management for document_embeddings
+(pgvector), and the per-query search parameters RAG similarity queries run with.
+
+A global HNSW (or IVFFlat) index serves every organization; organizations with
+many chunks also get a partial HNSW index over only their rows, so a filtered
+search walks a graph of that organization's chunks instead of discarding other
+tenants' neighbors after the fact. The index is only usable when the query
+orders by distance with a LIMIT; similarity thresholds are applied to the
+ranked rows afterwards.
+
+Usage:
+    python -m app.services.vector_index --status
+    python -m app.services.vector_index --create [--method ivfflat]
+    python -m app.services.vector_index --sync-organizations     # partial indexes for large tenants
+    python -m app.services.vector_index --benchmark --rows 1000000 --dimensions 1536
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import hashlib
+import io
+import logging
+import re
+import struct
+import time
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+TABLE = "document_embeddings"
+GLOBAL_INDEXES = {
+    "hnsw": "idx_document_embeddings_embedding_hnsw",
+    "ivfflat": "idx_document_embeddings_embedding_ivfflat",
+}
+ORGANIZATION_INDEX_PREFIX = "idx_document_embeddings_hnsw_org_"
+ORGANIZATION_KEY = "(metadata ->> 'organization_id')"  # Must match the query's filter expression
+_ORGANIZATION_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")  # Inlined into DDL predicates
+
+_pgvector_version: Optional[Tuple[int, ...]] = None
+
+
+def pgvector_version(db: Session) -> Tuple[int, ...]:
+    """Installed pgvector version ((0,) if unknown), read once per process"""
+    global _pgvector_version
+    if _pgvector_version is None:
+        try:
+            version = db.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")).scalar()
+            _pgvector_version = tuple(int(part) for part in (version or "0").split("."))
+        except Exception:
+            db.rollback()
+            return (0,)
+    return _pgvector_version
+
+
+def apply_search_settings(db: Session, top_k: int):
+    """
+    Transaction-local ANN parameters for the next similarity query:
+    hnsw.ef_search (candidate list size, at least top_k) and ivfflat.probes.
+    On pgvector 0.8+ filtered scans also continue until enough rows pass
+    the filter (iterative scans).
+    """
+    params = {
+        "ef_search": str(max(settings.RAG_HNSW_EF_SEARCH, top_k)),
+        "probes": str(settings.RAG_IVFFLAT_PROBES),
+    }
+    configs = [
+        "set_config('hnsw.ef_search', :ef_search, true)",
+        "set_config('ivfflat.probes', :probes, true)",
+    ]
+    if pgvector_version(db) >= (0, 8):
+        configs += [
+            "set_config('hnsw.iterative_scan', 'relaxed_order', true)",
+            "set_config('ivfflat.iterative_scan', 'relaxed_order', true)",
+        ]
+    db.execute(text(f"SELECT {', '.join(configs)}"), params)
+
+
+def vector_literal(vector: Sequence[float]) -> str:
+    """pgvector text form of a vector ('[0.1,0.2,...]')"""
+    return "[" + ",".join(repr(float(x)) for x in vector) + "]"
+
+
+def organization_index_name(organization_id: str) -> str:
+    """Name of an organization's partial index (ids are hashed: identifiers are limited to 63 bytes)"""
+    return ORGANIZATION_INDEX_PREFIX + hashlib.blake2b(str(organization_id).encode("utf-8"), digest_size=6).hexdigest()
+
+
+class VectorIndexService:
+    """
+    ANN index management for document_embeddings
+
+    Features:
+    1. Global HNSW or IVFFlat index (cosine distance), built CONCURRENTLY so
+       indexing and search continue during a build
+    2. Partial HNSW indexes for organizations above RAG_ORG_INDEX_MIN_ROWS
+       chunks, created and dropped as tenants grow and shrink
+    3. Status: indexes with sizes and the organizations they serve
+    4. Recall@k vs latency benchmark on a synthetic table (benchmark())
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def status(self) -> Dict[str, Any]:
+        """Indexes on document_embeddings, chunk counts and the largest organizations"""
+        indexes = self.db.execute(text("""
+            SELECT c.relname AS name, am.amname AS method, pg_relation_size(c.oid) AS bytes,
+                   obj_description(c.oid, 'pg_class') AS comment, pg_get_indexdef(c.oid) AS definition
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            JOIN pg_am am ON am.oid = c.relam
+            WHERE i.indrelid = CAST(:table AS regclass)
+            ORDER BY c.relname
+        """), {"table": TABLE}).mappings().all()
+        organizations = self.db.execute(text(f"""
+            SELECT {ORGANIZATION_KEY} AS organization_id, COUNT(*) AS chunks
+            FROM {TABLE}
+            GROUP BY 1
+            ORDER BY 2 DESC
+            LIMIT 20
+        """)).mappings().all()
+        return {
+            "chunks": self.db.execute(text(f"SELECT COUNT(*) FROM {TABLE}")).scalar(),
+            "pgvector_version": ".".join(str(part) for part in pgvector_version(self.db)),
+            "indexes": [dict(row) for row in indexes],
+            "largest_organizations": [dict(row) for row in organizations],
+        }
+
+    def create_index(self, method: Optional[str] = None) -> str:
+        """
+        Build the global ANN index (no-op if it exists)
+
+        Args:
+            method: "hnsw" (default RAG_VECTOR_INDEX_METHOD) or "ivfflat";
+                IVFFlat clusters the rows present at build time, so build it
+                after loading and rebuild as the table grows
+
+        Returns:
+            Index name
+        """
+        method = (method or settings.RAG_VECTOR_INDEX_METHOD).lower()
+        if method not in GLOBAL_INDEXES:
+            raise ValueError(f"Unknown vector index method: {method}")
+        name = GLOBAL_INDEXES[method]
+        if method == "hnsw":
+            options = f"m = {int(settings.RAG_HNSW_M)}, ef_construction = {int(settings.RAG_HNSW_EF_CONSTRUCTION)}"
+        else:
+            rows = self.db.execute(text(f"SELECT COUNT(*) FROM {TABLE}")).scalar() or 0
+            options = f"lists = {self.ivfflat_lists(rows)}"
+        self._execute_concurrently(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {TABLE} "
+            f"USING {method} (embedding vector_cosine_ops) WITH ({options})"
+        )
+        logger.info(f"🧭 Vector index {name} ready ({options})")
+        return name
+
+    @staticmethod
+    def ivfflat_lists(rows: int) -> int:
+        """pgvector's guidance: rows / 1000 up to 1M rows, sqrt(rows) beyond"""
+        return max(10, rows // 1000 if rows <= 1_000_000 else int(rows ** 0.5))
+
+    def create_organization_index(self, organization_id: str) -> str:
+        """Build a partial HNSW index over one organization's chunks (no-op if it exists)"""
+        organization_id = str(organization_id)
+        if not _ORGANIZATION_ID.match(organization_id):
+            raise ValueError(f"Organization id not valid in an index predicate: {organization_id!r}")
+        name = organization_index_name(organization_id)
+        self._execute_concurrently(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {TABLE} "
+            f"USING hnsw (embedding vector_cosine_ops) "
+            f"WITH (m = {int(settings.RAG_HNSW_M)}, ef_construction = {int(settings.RAG_HNSW_EF_CONSTRUCTION)}) "
+            f"WHERE {ORGANIZATION_KEY} = '{organization_id}'"
+        )
+        self._execute_concurrently(f"COMMENT ON INDEX {name} IS 'organization_id={organization_id}'")
+        logger.info(f"🧭 Vector index {name} ready for organization {organization_id}")
+        return name
+
+    def drop_organization_index(self, organization_id: str) -> bool:
+        """Drop an organization's partial index; returns whether one existed"""
+        name = organization_index_name(str(organization_id))
+        exists = self.db.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+        self.db.commit()
+        if exists:
+            self._execute_concurrently(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        return bool(exists)
+
+    def sync_organization_indexes(self, min_rows: Optional[int] = None) -> Dict[str, List[str]]:
+        """
+        Give every organization above `min_rows` chunks a partial index and
+        drop those of organizations below half of it (the gap keeps a tenant
+        near the threshold from being rebuilt back and forth)
+
+        Returns:
+            {"created": organization ids, "dropped": organization ids}
+        """
+        min_rows = min_rows or settings.RAG_ORG_INDEX_MIN_ROWS
+        counts = {
+            organization_id: chunks
+            for organization_id, chunks in self.db.execute(text(f"""
+                SELECT {ORGANIZATION_KEY}, COUNT(*) FROM {TABLE}
+                WHERE {ORGANIZATION_KEY} IS NOT NULL
+                GROUP BY 1
+            """)).all()
+        }
+        existing = {
+            comment.split("=", 1)[1]
+            for comment, in self.db.execute(text("""
+                SELECT obj_description(c.oid, 'pg_class')
+                FROM pg_class c
+                WHERE c.relkind = 'i' AND c.relname LIKE :prefix
+            """), {"prefix": ORGANIZATION_INDEX_PREFIX + "%"}).all()
+            if comment and comment.startswith("organization_id=")
+        }
+        self.db.commit()
+
+        created, dropped = [], []
+        for organization_id, chunks in sorted(counts.items(), key=lambda item: -item[1]):
+            if chunks >= min_rows and organization_id not in existing and _ORGANIZATION_ID.match(organization_id):
+                self.create_organization_index(organization_id)
+                created.append(organization_id)
+        for organization_id in sorted(existing):
+            if counts.get(organization_id, 0) < min_rows // 2:
+                self.drop_organization_index(organization_id)
+                dropped.append(organization_id)
+        return {"created": created, "dropped": dropped}
+
+    def _execute_concurrently(self, sql: str):
+        """Run DDL outside a transaction (CREATE/DROP INDEX CONCURRENTLY cannot run inside one)"""
+        with self.db.get_bind().connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text(f"SET maintenance_work_mem = '{settings.RAG_INDEX_MAINTENANCE_WORK_MEM}'"))
+            connection.execute(text(sql))
+
+
+# ----------------------------------------------------------------------
+# Benchmark
+# ----------------------------------------------------------------------
+
+_BENCHMARK_TABLE = "document_embeddings_benchmark"
+_BENCHMARK_BLOCK = 20000  # Rows generated and copied per step
+
+
+def _benchmark_block(seed: int, block: int, size: int, centers: np.ndarray, spread: float) -> np.ndarray:
+    """Deterministic block of clustered unit vectors (regenerated for ground truth instead of kept in memory)"""
+    rng = np.random.default_rng((seed, block + 1))  # block -1: the queries
+    vectors = centers[rng.integers(0, len(centers), size)] + rng.standard_normal((size, centers.shape[1]), dtype=np.float32) * spread
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def benchmark(
+    db: Session,
+    rows: int = 1_000_000,
+    dimensions: int = 1536,
+    queries: int = 100,
+    k: int = 10,
+    clusters: int = 1000,
+    methods: Sequence[str] = ("hnsw",),
+    ef_search: Sequence[int] = (10, 20, 40, 80, 160, 320),
+    probes: Sequence[int] = (1, 2, 5, 10, 20, 50),
+    seed: int = 7,
+    keep: bool = False
+) -> Dict[str, Any]:
+    """
+    Recall@k against latency of ANN search on a synthetic table shaped like
+    document_embeddings (clustered unit vectors, as real chunk embeddings are)
+
+    Exact neighbors come from a streamed NumPy scan. The exact (unindexed)
+    ORDER BY/LIMIT query is timed first; then each method is built, swept
+    over its search parameter, and the previous query shape (similarity
+    threshold in WHERE) is timed against it.
+
+    Returns:
+        {"rows", "dimensions", "k", "exact": {...}, "<method>": {"build_seconds",
+         "index_bytes", "sweep": [{param, recall, p50_ms, p95_ms, index_scan}],
+         "threshold_in_where": {...}}}
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimensions), dtype=np.float32)
+    spread = 0.75  # Noise norm 3/4 of a center's: clusters overlap, as topics in real corpora do
+    probe = _benchmark_block(seed, -1, queries, centers, spread)
+    vector_header = struct.pack(">hh", dimensions, 0)
+    vector_field = struct.pack(">i", len(vector_header) + 4 * dimensions) + vector_header
+    results: Dict[str, Any] = {"rows": rows, "dimensions": dimensions, "k": k, "queries": queries}
+
+    connection = db.connection().connection
+    cursor = connection.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {_BENCHMARK_TABLE}")
+    cursor.execute(f"CREATE UNLOGGED TABLE {_BENCHMARK_TABLE} (id integer PRIMARY KEY, embedding vector({dimensions}) NOT NULL)")
+    connection.commit()
+
+    # Load (binary COPY) while streaming exact top-k per query
+    started = time.perf_counter()
+    best_scores = np.full((queries, k), -np.inf, dtype=np.float32)
+    best_ids = np.zeros((queries, k), dtype=np.int64)
+    for block, start in enumerate(range(0, rows, _BENCHMARK_BLOCK)):
+        size = min(_BENCHMARK_BLOCK, rows - start)
+        vectors = _benchmark_block(seed, block, size, centers, spread)
+        scores = np.concatenate([best_scores, probe @ vectors.T], axis=1)
+        ids = np.concatenate([best_ids, np.broadcast_to(np.arange(start, start + size), (queries, size))], axis=1)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, top, axis=1)
+        best_ids = np.take_along_axis(ids, top, axis=1)
+
+        buffer = io.BytesIO()
+        buffer.write(b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0))
+        for row_id, vector in zip(range(start, start + size), vectors.astype(">f4")):
+            buffer.write(struct.pack(">hii", 2, 4, row_id))
+            buffer.write(vector_field + vector.tobytes())
+        buffer.write(struct.pack(">h", -1))
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {_BENCHMARK_TABLE} (id, embedding) FROM STDIN WITH (FORMAT binary)", buffer)
+        connection.commit()
+    cursor.execute(f"ANALYZE {_BENCHMARK_TABLE}")
+    connection.commit()
+    results["load_seconds"] = round(time.perf_counter() - started, 1)
+    truth = [set(row) for row in best_ids.tolist()]
+    literals = [vector_literal(q) for q in probe]
+    logger.info(f"📦 Benchmark table loaded: {rows} x {dimensions} in {results['load_seconds']}s")
+
+    def run(sql: str, setup: Sequence[str] = (), sample: Optional[int] = None) -> Dict[str, Any]:
+        latencies, hits = [], 0
+        for literal, expected in list(zip(literals, truth))[:sample or queries]:
+            for statement in setup:
+                cursor.execute(statement)
+            began = time.perf_counter()
+            cursor.execute(sql, {"q": literal, "k": k, "threshold": threshold})
+            found = [row[0] for row in cursor.fetchall()]
+            latencies.append((time.perf_counter() - began) * 1000)
+            hits += len(expected.intersection(found))
+            connection.commit()
+        for statement in setup:
+            cursor.execute(statement)
+        cursor.execute(f"EXPLAIN {sql}", {"q": literals[0], "k": k, "threshold": threshold})
+        plan = "\n".join(row[0] for row in cursor.fetchall())
+        connection.commit()
+        return {
+            "recall": round(hits / (k * len(latencies)), 4),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+            "index_scan": "Index Scan" in plan,
+        }
+
+    threshold = 0.5
+    ranked = f"SELECT id FROM {_BENCHMARK_TABLE} ORDER BY embedding <=> %(q)s::vector LIMIT %(k)s"
+    # The previous RAG query shape: similarity threshold in WHERE, ahead of ORDER BY/LIMIT
+    threshold_in_where = (
+        f"SELECT id FROM {_BENCHMARK_TABLE} WHERE 1 - (embedding <=> %(q)s::vector) > %(threshold)s "
+        f"ORDER BY embedding <=> %(q)s::vector LIMIT %(k)s"
+    )
+    exact_sample = min(queries, 20)  # Sequential scans: a sample is enough
+    results["exact"] = run(ranked, sample=exact_sample)
+    logger.info(f"🐢 Exact scan: {results['exact']}")
+
+    for method in methods:
+        cursor.execute(f"SET maintenance_work_mem = '{settings.RAG_INDEX_MAINTENANCE_WORK_MEM}'")
+        if method == "hnsw":
+            options = f"m = {int(settings.RAG_HNSW_M)}, ef_construction = {int(settings.RAG_HNSW_EF_CONSTRUCTION)}"
+        else:
+            options = f"lists = {VectorIndexService.ivfflat_lists(rows)}"
+        began = time.perf_counter()
+        cursor.execute(
+            f"CREATE INDEX {_BENCHMARK_TABLE}_{method} ON {_BENCHMARK_TABLE} "
+            f"USING {method} (embedding vector_cosine_ops) WITH ({options})"
+        )
+        connection.commit()
+        build_seconds = round(time.perf_counter() - began, 1)
+        cursor.execute(f"SELECT pg_relation_size('{_BENCHMARK_TABLE}_{method}')")
+        index_bytes = cursor.fetchone()[0]
+        logger.info(f"🏗️  {method} index ({options}) built in {build_seconds}s")
+
+        sweep = []
+        for value in (ef_search if method == "hnsw" else probes):
+            setting = f"SET LOCAL hnsw.ef_search = {int(max(value, k))}" if method == "hnsw" else f"SET LOCAL ivfflat.probes = {int(value)}"
+            point = {"ef_search" if method == "hnsw" else "probes": value, **run(ranked, setup=(setting,))}
+            sweep.append(point)
+            logger.info(f"   {point}")
+        results[method] = {
+            "options": options,
+            "build_seconds": build_seconds,
+            "index_bytes": index_bytes,
+            "sweep": sweep,
+            "threshold_in_where": run(threshold_in_where, sample=exact_sample),
+        }
+        cursor.execute(f"DROP INDEX {_BENCHMARK_TABLE}_{method}")
+        connection.commit()
+
+    if not keep:
+        cursor.execute(f"DROP TABLE {_BENCHMARK_TABLE}")
+        connection.commit()
+    cursor.close()
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from app.core.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Manage and benchmark the document_embeddings ANN indexes")
+    parser.add_argument("--status", action="store_true", help="Show indexes and the largest organizations")
+    parser.add_argument("--create", action="store_true", help="Build the global ANN index")
+    parser.add_argument("--method", choices=sorted(GLOBAL_INDEXES), default=None, help="Index method (default: RAG_VECTOR_INDEX_METHOD)")
+    parser.add_argument("--organization", help="Build a partial index for this organization")
+    parser.add_argument("--sync-organizations", action="store_true", help="Partial indexes for organizations above RAG_ORG_INDEX_MIN_ROWS")
+    parser.add_argument("--benchmark", action="store_true", help="Recall@k vs latency on a synthetic table")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--clusters", type=int, default=1000, help="Topics the synthetic vectors are drawn around")
+    parser.add_argument("--methods", default="hnsw", help="Comma-separated methods to benchmark (hnsw,ivfflat)")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark table")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        service = VectorIndexService(db)
+        if args.create:
+            service.create_index(args.method)
+        if args.organization:
+            service.create_organization_index(args.organization)
+        if args.sync_organizations:
+            print(json.dumps(service.sync_organization_indexes(), indent=2))
+        if args.benchmark:
+            print(json.dumps(benchmark(
+                db, rows=args.rows, dimensions=args.dimensions, queries=args.queries, k=args.k, clusters=args.clusters,
+                methods=[m.strip() for m in args.methods.split(",") if m.strip()], keep=args.keep
+            ), indent=2))
+        if args.status or not (args.create or args.organization or args.sync_organizations or args.benchmark):
+            print(json.dumps(service.status(), indent=2, default=str))
+    finally:
+        db.close()
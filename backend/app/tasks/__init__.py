@@ -0,0 +1,3 @@
+"""
+Celery background tasks
+"""
@@ -0,0 +1,98 @@
+"""
+Opportunity match score background tasks
+"""
+from app.celery_app import celery_app
+from app.config import settings
+from app.core.database import SessionLocal
+from app.services.match_score_service import MatchScoreService
+
+
+@celery_app.task(name="matching.process_dirty_scores")
+def process_dirty_scores(max_seconds: float = None):
+    """Rescore queued opportunities (across orgs) and organizations (across opportunities)"""
+    db = SessionLocal()
+    try:
+        return MatchScoreService(db).process_dirty(max_seconds=max_seconds or settings.MATCH_SCORES_DRAIN_SECONDS * 2)
+    finally:
+        db.close()
+
+
+@celery_app.task(name="matching.rescore_organization")
+def rescore_organization(organization_id: str):
+    """Rebuild one organization's stored match scores now"""
+    db = SessionLocal()
+    try:
+        return MatchScoreService(db).rescore_organization(organization_id)
+    finally:
+        db.close()
+
+
+@celery_app.task(name="matching.run_match_score_batch")
+def run_match_score_batch(run_id: str = None, shard_size: int = None):
+    """
+    Nightly: rescore every organization against every opportunity as a chord of
+    (organization, opportunity id range) shards. Re-running the same run id
+    re-dispatches only the shards that have not committed.
+    """
+    from celery import chord
+    from app.services.match_score_batch import DEFAULT_SHARD_SIZE, MatchScoreBatchService
+
+    db = SessionLocal()
+    try:
+        service = MatchScoreBatchService(db)
+        plan = service.plan(run_id, shard_size or DEFAULT_SHARD_SIZE)
+        pending = service.pending(plan)
+        if not pending:
+            return service.finish(plan["run_id"])
+    finally:
+        db.close()
+
+    # A shard that exhausts its retries fails the chord and the callback never
+    # runs; the error callback closes the run as failed instead
+    chord(
+        score_match_shard.si(plan["run_id"], org_id, shard) for org_id, shard in pending
+    )(finish_match_score_batch.si(plan["run_id"]).on_error(fail_match_score_batch.s(plan["run_id"])))
+    return {"run_id": plan["run_id"], "dispatched_shards": len(pending)}
+
+
+@celery_app.task(
+    name="matching.score_match_shard",
+    acks_late=True,  # Redelivered if the worker dies mid-shard
+    reject_on_worker_lost=True,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    max_retries=3
+)
+def score_match_shard(run_id: str, organization_id: str, shard: int):
+    """Score one organization against one opportunity id range (idempotent)"""
+    from app.services.match_score_batch import MatchScoreBatchService
+
+    db = SessionLocal()
+    try:
+        return MatchScoreBatchService(db).run_shard(run_id, organization_id, shard)
+    finally:
+        db.close()
+
+
+@celery_app.task(name="matching.finish_match_score_batch")
+def finish_match_score_batch(run_id: str):
+    """Chord callback: summarize shard timings and clean up after a run"""
+    from app.services.match_score_batch import MatchScoreBatchService
+
+    db = SessionLocal()
+    try:
+        return MatchScoreBatchService(db).finish(run_id)
+    finally:
+        db.close()
+
+
+@celery_app.task(name="matching.fail_match_score_batch")
+def fail_match_score_batch(request, exc, traceback, run_id: str):
+    """Chord error callback: close a run whose shards (or callback) failed"""
+    from app.services.match_score_batch import MatchScoreBatchService
+
+    db = SessionLocal()
+    try:
+        return MatchScoreBatchService(db).finish(run_id, error=f"{type(exc).__name__}: {exc}")
+    finally:
+        db.close()
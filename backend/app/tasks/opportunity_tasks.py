@@ -0,0 +1,68 @@
+"""
+SAM.gov opportunity background tasks
+"""
+import asyncio
+import logging
+from datetime import date
+from app.celery_app import celery_app
+from app.core.database import SessionLocal
+from app.services.opportunity_mirror_service import OpportunityMirrorService
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name="opportunities.sync_sam_mirror")
+def sync_sam_mirror(posted_from: str = None, posted_to: str = None, max_pages: int = None):
+    """Incrementally sync the local SAM.gov opportunity mirror"""
+    db = SessionLocal()
+    try:
+        mirror = OpportunityMirrorService(db)
+        return asyncio.run(mirror.sync(
+            posted_from=date.fromisoformat(posted_from) if posted_from else None,
+            posted_to=date.fromisoformat(posted_to) if posted_to else None,
+            max_pages=max_pages
+        ))
+    finally:
+        db.close()
+
+
+@celery_app.task(name="opportunities.refresh_sam_mirror")
+def refresh_sam_mirror():
+    """
+    Scheduled entry point: probe SAM.gov with a one-record freshness check and
+    only page through the API when the mirror is missing notices
+    """
+    async def _refresh(mirror: OpportunityMirrorService):
+        freshness = await mirror.check_freshness()
+        if freshness.get("fresh"):
+            logger.info(f"📦 SAM.gov mirror is fresh: {freshness}")
+            return {"synced": False, "freshness": freshness}
+        return {"synced": True, "freshness": freshness, "stats": await mirror.sync()}
+
+    db = SessionLocal()
+    try:
+        return asyncio.run(_refresh(OpportunityMirrorService(db)))
+    finally:
+        db.close()
+
+
+@celery_app.task(name="opportunities.rescore_sam_mirror")
+def rescore_sam_mirror():
+    """Nightly: refresh stored PWin scores (the recency bonus decays daily)"""
+    db = SessionLocal()
+    try:
+        return OpportunityMirrorService(db).rescore()
+    finally:
+        db.close()
+
+
+@celery_app.task(name="opportunities.ingest_sam_extract")
+def ingest_sam_extract(path: str, encoding: str = None):
+    """Bulk load a SAM.gov contract opportunities extract file (CSV or zip) into the mirror"""
+    from app.services.sam_extract_ingest_service import SAMExtractIngestService
+
+    db = SessionLocal()
+    try:
+        return SAMExtractIngestService(db).ingest(path, encoding=encoding)
+    finally:
+        db.close()
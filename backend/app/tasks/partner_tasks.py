@@ -0,0 +1,55 @@
+"""
+SAM.gov contractor (entity) background tasks
+"""
+import asyncio
+from app.celery_app import celery_app
+from app.config import settings
+from app.core.database import SessionLocal
+from app.services.contractor_sync_service import ContractorSyncService
+
+
+@celery_app.task(name="partners.sync_contractors")
+def sync_contractors(batch_size: int = 1000, incremental: bool = True, concurrency: int = None, max_pages: int = None):
+    """Pipelined contractor sync; re-running after a failure resumes at the first unwritten page"""
+    db = SessionLocal()
+    try:
+        return asyncio.run(ContractorSyncService(db).sync(
+            batch_size=batch_size,
+            incremental=incremental,
+            concurrency=concurrency,
+            max_pages=max_pages
+        ))
+    finally:
+        db.close()
+
+
+@celery_app.task(name="partners.ingest_entity_extract")
+def ingest_entity_extract(path: str = None, encoding: str = None):
+    """Nightly full refresh of contractors from the SAM.gov entity extract (SAM_ENTITY_EXTRACT_PATH by default)"""
+    from app.services.sam_entity_extract_service import SAMEntityExtractService, latest_extract
+
+    db = SessionLocal()
+    try:
+        return SAMEntityExtractService(db).ingest(latest_extract(path or settings.SAM_ENTITY_EXTRACT_PATH), encoding=encoding)
+    finally:
+        db.close()
+
+
+@celery_app.task(
+    name="partners.build_capability_embeddings",
+    # The build pauses itself at its budget; the hard limit only catches a hung API call
+    time_limit=settings.CAPABILITY_EMBEDDINGS_BUILD_SECONDS + 15 * 60
+)
+def build_capability_embeddings(full: bool = False):
+    """
+    Embed new and changed contractor capability profiles; unchanged ones keep
+    their vectors. A build that does not finish in CAPABILITY_EMBEDDINGS_BUILD_SECONDS
+    resumes in the next run.
+    """
+    from app.services.capability_embeddings import capability_embeddings
+
+    db = SessionLocal()
+    try:
+        return capability_embeddings.build(db, full=full, max_seconds=settings.CAPABILITY_EMBEDDINGS_BUILD_SECONDS)
+    finally:
+        db.close()
@@ -67,3 +67,1397 @@ def test_document_service_text_extraction():
         # Expected behavior for non-existent file
         assert True
 
+
+def test_samgov_token_bucket_waits_when_empty():
+    """Test SAM.gov quota token bucket"""
+    from app.services.samgov_client import TokenBucket
+    
+    bucket = TokenBucket(capacity=2, rate=1.0)
+    assert bucket.wait_time() == 0
+    bucket.consume()
+    bucket.consume()
+    assert 0 < bucket.wait_time() <= 1.0
+
+@pytest.mark.asyncio
+async def test_samgov_quota_is_shared_across_clients():
+    """Test SAM.gov quota tokens are reserved from Redis buckets every process shares"""
+    import fakeredis
+    from types import SimpleNamespace
+    from app.services.samgov_client import SAMGovClient, SAMQuotaExceededError, TokenBucket
+    
+    redis = fakeredis.aioredis.FakeRedis()
+    clients = [SAMGovClient(), SAMGovClient()]
+    for client in clients:
+        client._redis = SimpleNamespace(get=lambda: redis, mark_down=lambda error: None)
+        client.hourly_bucket = TokenBucket(capacity=2, rate=0.001)
+    
+    # Headroom checks read the shared buckets without spending them
+    assert await clients[1].headroom(2) and not await clients[1].headroom(3)
+    await clients[0]._acquire_quota("opportunities")
+    await clients[1]._acquire_quota("opportunities")
+    
+    with pytest.raises(SAMQuotaExceededError):
+        await clients[0]._acquire_quota("opportunities")
+    assert float(await redis.hget("samgov_quota:hourly", "tokens")) < 0.01
+    # Spent through Redis: this process's local bucket is still full
+    assert clients[1].hourly_bucket.wait_time(2) == 0 and not await clients[1].headroom(1)
+
+@pytest.mark.asyncio
+async def test_samgov_client_retries_on_429():
+    """Test SAM.gov client retries throttled calls"""
+    import httpx
+    from app.services.samgov_client import SAMGovClient
+    
+    calls = []
+    
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        return httpx.Response(200, json={"opportunitiesData": []})
+    
+    client = SAMGovClient()
+    client._ensure_loop()
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    
+    response = await client.get("https://api.sam.gov/opportunities/v2/search")
+    
+    assert response.status_code == 200
+    assert len(calls) == 2
+
+@pytest.mark.asyncio
+async def test_response_cache_lru_eviction_and_stale_refresh():
+    """Test response cache eviction and stale-while-revalidate"""
+    import asyncio
+    from app.services.response_cache import ResponseCache
+    
+    cache = ResponseCache("test", ttl=0, stale_ttl=60, max_entries=2, use_redis=False)
+    for key in ("a", "b", "c"):
+        await cache.set(key, {"key": key})
+    
+    assert len(cache) == 2
+    assert (await cache.get("a"))[0] is None
+    
+    calls = []
+    
+    async def loader():
+        calls.append(1)
+        return {"key": "fresh"}
+    
+    # Stale hit is served immediately and refreshed in the background
+    assert await cache.get_or_set("b", loader) == {"key": "b"}
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert len(calls) == 1
+    assert (await cache.get("b"))[0] == {"key": "fresh"}
+
+@pytest.mark.asyncio
+async def test_grants_search_does_not_cache_upstream_failures(monkeypatch):
+    """Test a failed SAM.gov grants call falls back to mock data without being cached"""
+    import httpx
+    from app.services import grants_service as grants
+    from app.services.response_cache import ResponseCache
+    
+    service = grants.GrantsService()
+    service.api_key = "live-key"
+    service.cache = ResponseCache("test_grants", ttl=300, stale_ttl=600, use_redis=False)
+    request = httpx.Request("GET", service.sam_base_url)
+    responses = [
+        httpx.Response(503, request=request),
+        httpx.Response(200, request=request, json={"opportunitiesData": [{"noticeId": "G-1", "title": "Grant"}]}),
+    ]
+    
+    async def get(url, params=None, **kwargs):
+        return responses.pop(0)
+    
+    monkeypatch.setattr(grants.samgov_client, "get", get)
+    
+    failed = await service.search_grants(keyword="health")
+    assert failed["source"] == "Mock (API unavailable)"
+    assert (await service.cache.get("grants_search_health_None_20_0"))[0] is None
+    
+    live = await service.search_grants(keyword="health")
+    assert [item["id"] for item in live["items"]] == ["G-1"]
+    assert await service.search_grants(keyword="health") == live  # Now served from the cache
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_concurrent_calls():
+    """Test identical in-flight calls share one execution"""
+    import asyncio
+    from app.services.single_flight import SingleFlight
+    
+    flight = SingleFlight("test", use_redis=False)
+    calls = []
+    
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"items": []}
+    
+    results = await asyncio.gather(*(flight.do("top_10_60", fetch) for _ in range(5)))
+    
+    assert len(calls) == 1
+    assert all(r == {"items": []} for r in results)
+
+@pytest.mark.asyncio
+async def test_opportunity_detail_cache_serves_refreshes_and_reuses_sections(monkeypatch):
+    """Test the detail cache serves hits, refreshes misses and expired entries, and re-parses only new descriptions"""
+    from datetime import datetime, timedelta, timezone
+    from types import SimpleNamespace
+    from sqlalchemy.dialects import postgresql
+    from app.config import settings
+    from app.services.opportunity_detail_service import OpportunityDetailService
+    from app.services.samgov_service import samgov_service
+    
+    class DetailSession:
+        def __init__(self):
+            self.rows = {}
+        
+        def get(self, model, notice_id):
+            return self.rows.get(notice_id)
+        
+        def execute(self, stmt):
+            # The upsert's bound values become the cached row
+            row = SimpleNamespace(**stmt.compile(dialect=postgresql.dialect()).params)
+            self.rows[row.notice_id] = row
+        
+        def commit(self):
+            pass
+    
+    raw = {"noticeId": "N1", "title": "Cloud Migration", "description": "Section C: migrate", "postedDate": "2025-01-01"}
+    fetches, parses, refreshes = [], [], []
+    
+    async def fetch(notice_id):
+        fetches.append(notice_id)
+        return dict(raw)
+    
+    async def do(key, work):
+        return await work()
+    
+    def sections(description):
+        parses.append(description)
+        return [{"title": "Section C", "content": description}]
+    
+    monkeypatch.setattr(settings, "SAM_MIRROR_ENABLED", False)
+    monkeypatch.setattr(samgov_service, "flight", SimpleNamespace(do=do))
+    monkeypatch.setattr(samgov_service, "_fetch_notice_raw", fetch)
+    monkeypatch.setattr(samgov_service, "_extract_contract_sections", sections)
+    monkeypatch.setattr(OpportunityDetailService, "_schedule_refresh", staticmethod(refreshes.append))
+    db = DetailSession()
+    service = OpportunityDetailService(db)
+    
+    # Miss is fetched and stored; the next view is a hit
+    first = await service.get("N1")
+    assert first["title"] == "Cloud Migration"
+    assert await service.get("N1") == first
+    assert fetches == ["N1"] and len(parses) == 1
+    
+    # Past the TTL the stale copy is served and refreshed in the background
+    db.rows["N1"].fetched_at = datetime.now(timezone.utc) - timedelta(minutes=settings.SAM_DETAIL_CACHE_TTL_MINUTES + 1)
+    assert await service.get("N1") == first
+    assert refreshes == ["N1"]
+    
+    # Unchanged payload only records the check
+    assert await service.refresh("N1") == first
+    assert datetime.now(timezone.utc) - db.rows["N1"].fetched_at < timedelta(minutes=1)
+    assert len(parses) == 1
+    
+    # A new title rebuilds the detail but reuses the sections; a new description re-parses them
+    raw["title"] = "Cloud Migration (Amended)"
+    assert (await service.refresh("N1"))["title"] == "Cloud Migration (Amended)"
+    assert len(parses) == 1
+    raw["description"] = "Section C: migrate and operate"
+    assert (await service.refresh("N1"))["sections"][0]["content"] == "Section C: migrate and operate"
+    assert len(parses) == 2
+
+@pytest.mark.asyncio
+async def test_opportunity_mirror_sync_advances_watermark_and_upserts(monkeypatch):
+    """Test mirror sync pages through the posted-date window, upserts each notice once and is ready only after a complete run or a fresh probe"""
+    from datetime import date, timedelta
+    from types import SimpleNamespace
+    from sqlalchemy import create_engine
+    from sqlalchemy.dialects import postgresql
+    from sqlalchemy.orm import Session
+    from app.config import settings
+    from app.models.sync import SyncCheckpoint
+    from app.services import opportunity_mirror_service as mirror
+    
+    engine = create_engine("sqlite://")
+    SyncCheckpoint.__table__.create(engine)
+    notices = [
+        {"noticeId": f"N{i}", "title": f"Notice {i}", "postedDate": date.today().isoformat(), "active": "Yes"}
+        for i in range(5)
+    ]
+    fetches = []
+    
+    async def fetch_page(limit, offset, posted_from, posted_to):
+        fetches.append((offset, posted_from, posted_to))
+        page = notices[offset:offset + limit]
+        if offset == 0:
+            page = page + [dict(page[0], title="Notice 0 (amended)")]  # Repeated on the page: last one wins
+        return {"opportunitiesData": page, "totalRecords": len(notices)}
+    
+    monkeypatch.setattr(mirror.samgov_service, "_fetch_page", fetch_page)
+    monkeypatch.setattr(mirror.OpportunityMirrorService, "PAGE_SIZE", 2)
+    with Session(engine) as db:
+        upserts = []
+        execute = db.execute
+        
+        def capture(stmt, *args, **kwargs):
+            if isinstance(stmt, postgresql.Insert):
+                upserts.append(stmt.compile(dialect=postgresql.dialect()))
+                return None
+            return execute(stmt, *args, **kwargs)
+        
+        monkeypatch.setattr(db, "execute", capture)
+        service = mirror.OpportunityMirrorService(db)
+        today = date.today()
+        
+        # An interrupted first backfill doesn't make the mirror ready
+        assert not (await service.sync(max_pages=1))["complete"]
+        assert service.get_checkpoint().last_success_at is None and not service.is_ready()
+        fetches.clear()
+        upserts.clear()
+        
+        # First run backfills, upserting each page with ON CONFLICT (first_seen_at kept)
+        stats = await service.sync()
+        backfill_from = (today - timedelta(days=settings.SAM_MIRROR_BACKFILL_DAYS)).strftime('%m/%d/%Y')
+        assert [offset for offset, _, _ in fetches] == [0, 2, 4]
+        assert {posted_from for _, posted_from, _ in fetches} == {backfill_from}
+        assert stats["complete"] and stats["pages"] == 3 and stats["upserted"] == 5
+        assert len(upserts) == 3
+        sql = str(upserts[0])
+        assert "ON CONFLICT (notice_id) DO UPDATE" in sql and "first_seen_at" not in sql.split("DO UPDATE")[1]
+        assert upserts[0].params["title_m0"] == "Notice 0 (amended)" and "notice_id_m2" not in upserts[0].params
+        checkpoint = service.get_checkpoint()
+        assert checkpoint.status == "idle" and checkpoint.watermark.date() == today
+        assert checkpoint.last_success_at is not None
+        
+        # Later runs start an overlap window before the watermark; partial runs leave it
+        fetches.clear()
+        checkpoint.watermark -= timedelta(days=10)
+        db.commit()
+        succeeded = service.get_checkpoint().last_success_at
+        stats = await service.sync(max_pages=1)
+        overlap_from = today - timedelta(days=10 + settings.SAM_MIRROR_OVERLAP_DAYS)
+        assert fetches == [(0, overlap_from.strftime('%m/%d/%Y'), today.strftime('%m/%d/%Y'))]
+        assert not stats["complete"]
+        assert service.get_checkpoint().watermark.date() == today - timedelta(days=10)
+        assert service.get_checkpoint().last_success_at == succeeded
+        
+        # A failed run is recorded and keeps the watermark for the retry
+        async def unavailable(**kwargs):
+            raise RuntimeError("SAM.gov unavailable")
+        
+        monkeypatch.setattr(mirror.samgov_service, "_fetch_page", unavailable)
+        assert (await service.sync())["error"] == "SAM.gov unavailable"
+        checkpoint = service.get_checkpoint()
+        assert checkpoint.status == "failed" and checkpoint.watermark.date() == today - timedelta(days=10)
+        
+        # A probe that finds the mirror fresh counts as a successful sync; a stale one doesn't
+        async def probe(**kwargs):
+            return {"opportunitiesData": [], "totalRecords": 5}
+        
+        local = {"count": 4}
+        query = db.query
+        
+        def count_query(*entities):
+            if "sam_opportunities" not in str(entities[0]):
+                return query(*entities)
+            return SimpleNamespace(filter=lambda *conditions: SimpleNamespace(scalar=lambda: local["count"]))
+        
+        monkeypatch.setattr(mirror.samgov_service, "_fetch_page", probe)
+        monkeypatch.setattr(db, "query", count_query)
+        assert not (await service.check_freshness())["fresh"]
+        assert service.get_checkpoint().last_success_at == succeeded
+        local["count"] = 5
+        assert (await service.check_freshness())["fresh"]
+        assert service.get_checkpoint().last_success_at > succeeded
+
+@pytest.mark.asyncio
+async def test_samgov_search_totals_prefetch_and_stable_cursors(monkeypatch):
+    """Test live search reports totalRecords, prefetches the next pages and keeps cursor pages stable as notices are posted"""
+    import asyncio
+    from app.config import settings
+    from app.services.response_cache import ResponseCache
+    from app.services import samgov_service as samgov
+    from app.services.samgov_service import SAMGovService
+    
+    notices = [{"noticeId": f"N{i}", "title": f"Notice {i}"} for i in range(7)]  # Newest first, like SAM.gov
+    fetches, headroom_checks = [], []
+    quota = {"headroom": True}
+    
+    async def headroom(tokens):
+        headroom_checks.append(tokens)
+        return quota["headroom"]
+    
+    async def fetch_page(limit, offset, **filters):
+        fetches.append(offset)
+        return {"opportunitiesData": notices[offset:offset + limit], "totalRecords": len(notices)}
+    
+    monkeypatch.setattr(settings, "SAM_SEARCH_PREFETCH_PAGES", 2)
+    service = SAMGovService()
+    service.api_key = "live-key"
+    service.cache = ResponseCache("test_samgov", ttl=300, stale_ttl=600, use_redis=False)
+    monkeypatch.setattr(service, "_fetch_page", fetch_page)
+    monkeypatch.setattr(samgov.samgov_client, "headroom", headroom)
+    
+    first = await service.search_opportunities(limit=2)
+    assert [item["id"] for item in first["items"]] == ["N0", "N1"]
+    assert (first["total"], first["total_pages"], first["prev_cursor"]) == (7, 4, None)
+    await asyncio.gather(*service._background)
+    assert fetches == [0, 2, 4]  # Pages 2 and 3 prefetched in the background
+    assert headroom_checks == [3]  # Both pages plus the user's next call fit the shared quota
+    
+    second = await service.search_opportunities(cursor=first["next_cursor"])
+    assert [item["id"] for item in second["items"]] == ["N2", "N3"]
+    assert second["page"] == 2 and fetches == [0, 2, 4]  # Served from the cache
+    
+    # A notice posted since the first page shifts live offsets by one; the cursor
+    # compensates and keeps the total the result set started with. No prefetch
+    # without quota headroom.
+    quota["headroom"] = False
+    notices.insert(0, {"noticeId": "N-new", "title": "Newer notice"})
+    service.cache = ResponseCache("test_samgov", ttl=300, stale_ttl=600, use_redis=False)
+    third = await service.search_opportunities(cursor=second["next_cursor"])
+    assert [item["id"] for item in third["items"]] == ["N4", "N5"]
+    assert (third["page"], third["total"], third["total_pages"]) == (3, 7, 4)
+    await asyncio.gather(*service._background)
+    assert fetches[-2:] == [4, 5]  # The drifted page only, not page 4
+    last = await service.search_opportunities(cursor=third["next_cursor"])
+    assert [item["id"] for item in last["items"]] == ["N6"] and last["next_cursor"] is None
+    await asyncio.gather(*service._background)
+
+def test_sam_extract_row_maps_to_api_notice():
+    """Test SAM.gov extract rows use the API notice shape"""
+    from app.services.sam_extract_ingest_service import extract_row_to_notice
+    
+    notice = extract_row_to_notice({
+        "NoticeId": "abc123",
+        "Title": " Cloud Migration ",
+        "Sol#": "W56KGU-25-R-0089",
+        "PostedDate": "2025-01-15 10:00:00.0-05",
+        "SetASide": "Total Small Business Set-Aside (FAR 19.5)",
+        "Award$": "",
+        "PopState": "VA",
+    })
+    
+    assert notice["noticeId"] == "abc123"
+    assert notice["title"] == "Cloud Migration"
+    assert notice["solicitationNumber"] == "W56KGU-25-R-0089"
+    assert notice["placeOfPerformance"]["state"]["code"] == "VA"
+    assert "award" not in notice
+
+def test_batch_pwin_matches_single_scoring():
+    """Test vectorized PWin scoring matches per-notice scoring"""
+    from datetime import date, timedelta
+    from app.services.pwin_scoring import score_notices
+    from app.services.samgov_service import samgov_service
+    
+    today = date.today()
+    notices = [
+        {"typeOfSetAsideDescription": "Total Small Business Set-Aside", "postedDate": today.isoformat()},
+        {"typeOfSetAsideDescription": "Service-Disabled Veteran-Owned", "postedDate": (today - timedelta(days=10)).isoformat()},
+        {"typeOfSetAsideDescription": None, "postedDate": "not-a-date"},
+        {"postedDate": (today - timedelta(days=30)).isoformat() + "T10:00:00-05:00"},
+    ]
+    
+    scores = score_notices(notices)
+    
+    assert scores.tolist() == [80, 70, 50, 50]
+    assert [samgov_service._calculate_simple_pwin(n) for n in notices] == scores.tolist()
+
+def test_section_segmenter_streams_pages_with_offsets():
+    """Test page-by-page segmentation matches whole-text segmentation"""
+    from app.services.rfp_section_segmenter import rfp_segmenter, first_by_key
+    
+    text = (
+        "SECTION C - STATEMENT OF WORK\n"
+        "The contractor shall migrate 150 servers.\n"
+        "ATTACHMENT 1\n"
+        "SECTION L: INSTRUCTIONS TO OFFERORS\n"
+        "Volume I shall not exceed 20 pages.\n"
+        "SECTION M - EVALUATION FACTORS\n"
+        "Best value tradeoff.\n"
+    )
+    pages = [text[i:i + 16] for i in range(0, len(text), 16)]
+    
+    segments = rfp_segmenter.segment(text)
+    streamed = sorted(rfp_segmenter.iter_segments(pages), key=lambda s: s.start)
+    first = first_by_key(segments)
+    
+    assert sorted(segments, key=lambda s: (s.start, s.kind)) == sorted(streamed, key=lambda s: (s.start, s.kind))
+    assert first[("section", "L")].body(text) == "Volume I shall not exceed 20 pages.\n"
+    assert first[("named", "SOW")].text(text).endswith("150 servers.\n")
+    assert first[("section", "M")].title == "EVALUATION FACTORS"
+
+@pytest.mark.asyncio
+async def test_replay_transport_serves_recorded_fixtures():
+    """Test replayed requests reach the stand-in server and get recorded responses"""
+    import httpx
+    from app.services.http_replay import RecordReplayTransport
+    from app.services.replay_server import create_replay_app
+    
+    app = create_replay_app()
+    transport = RecordReplayTransport("replay", inner=httpx.ASGITransport(app=app), replay_url="http://replay")
+    
+    async with httpx.AsyncClient(transport=transport) as client:
+        search = await client.get(
+            "https://api.sam.gov/opportunities/v2/search",
+            params={"api_key": "live-key", "limit": 20, "offset": 0, "q": "not recorded"}
+        )
+        chat = await client.post(
+            "http://replay/v1/chat/completions",
+            json={"model": "gpt-4o", "messages": [{"role": "user", "content": 'Respond in JSON format: {"summary": "..."}'}]}
+        )
+    
+    assert search.status_code == 200
+    assert len(search.json()["opportunitiesData"]) == 20
+    assert chat.json()["choices"][0]["message"]["content"] == '{"summary": "..."}'
+
+def test_contractor_sync_resumes_only_matching_runs():
+    """Test an interrupted contractor sync resumes only with the same filters"""
+    from app.models.sync import SyncCheckpoint
+    from app.services.contractor_sync_service import ContractorSyncService
+    
+    cursor = {"registration_date": "01/15/2025", "size": 1000, "total_pages": 40, "next_page": 12, "done": [14]}
+    failed = SyncCheckpoint(name="sam_contractor_sync", status="failed", cursor=cursor)
+    
+    assert ContractorSyncService._resumable_run(failed, "01/15/2025", 1000)["next_page"] == 12
+    assert ContractorSyncService._resumable_run(failed, "02/01/2025", 1000) is None
+    assert ContractorSyncService._resumable_run(failed, "01/15/2025", 500) is None
+    assert ContractorSyncService._resumable_run(SyncCheckpoint(status="idle", cursor=cursor), "01/15/2025", 1000) is None
+    assert ContractorSyncService._page_count(2350, 1000) == 3
+
+@pytest.mark.asyncio
+async def test_contractor_sync_resumes_an_interrupted_run(monkeypatch):
+    """Test a sync interrupted mid-run checkpoints its written pages and the resumed run writes only the rest"""
+    import asyncio
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from sqlalchemy.pool import StaticPool
+    from app.config import settings
+    from app.models.sync import SyncCheckpoint
+    from app.services.contractor_sync_service import ContractorSyncService
+    
+    monkeypatch.setattr(settings, "SAM_GOV_API_KEY", "test-key")
+    # Pages are written from a worker thread: share the one in-memory database
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SyncCheckpoint.__table__.create(engine)
+    
+    entities = [{"coreData": {"ueiSAM": f"UEI{n:03d}", "legalBusinessName": f"Vendor {n}"}} for n in range(10)]
+    fetched, written = [], []
+    quota = {"exhausted": True}
+    
+    async def fetch_page(params, page):
+        fetched.append(page)
+        if page == 3 and quota["exhausted"]:
+            while len(written) < 6:  # Fail once the pages fetched before it are written
+                await asyncio.sleep(0.01)
+            raise RuntimeError("SAM.gov quota exhausted")
+        return entities[page * 2:page * 2 + 2], len(entities)
+    
+    def upsert_contractors(rows, commit=True):
+        new = [row["uei"] for row in rows if row["uei"] not in written]
+        written.extend(new)
+        return {"inserted": len(new), "updated": len(rows) - len(new), "unchanged": 0}
+    
+    with Session(engine) as db:
+        service = ContractorSyncService(db)
+        monkeypatch.setattr(service, "_fetch_page", fetch_page)
+        monkeypatch.setattr(service, "upsert_contractors", upsert_contractors)
+        
+        stats = await service.sync(batch_size=2, incremental=False, concurrency=1)
+        assert stats["error_message"] == "SAM.gov quota exhausted"
+        assert stats["pages"] == 3 and stats["new_contractors"] == 6
+        db.expire_all()
+        checkpoint = service.get_checkpoint()
+        assert checkpoint.status == "failed"
+        assert checkpoint.cursor["next_page"] == 3
+        assert checkpoint.cursor["done"] == [] and checkpoint.cursor["total_pages"] == 5
+        
+        quota["exhausted"] = False
+        fetched.clear()
+        stats = await service.sync(batch_size=2, incremental=False, concurrency=2)
+        assert stats["complete"] and stats["resumed_from_page"] == 3
+        assert sorted(fetched) == [3, 4]  # Written pages are not fetched again
+        assert stats["pages"] == 2 and stats["new_contractors"] == 4 and stats["updated_contractors"] == 0
+        assert sorted(written) == [entity["coreData"]["ueiSAM"] for entity in entities]
+        db.expire_all()
+        checkpoint = service.get_checkpoint()
+        assert checkpoint.status == "idle" and checkpoint.cursor is None
+        assert checkpoint.watermark is not None
+
+def test_contractor_index_filters_ranks_and_counts_facets():
+    """Test the in-memory contractor index matches filters, prefixes and facet counts"""
+    from app.services.contractor_index import Bitmap, ContractorIndex
+    
+    rows = [
+        (1, "Booz Allen Hamilton", ["541512", "541330"], ["Large Business"], "VA", 40, None),
+        (2, "Cyber Defense Systems LLC", ["541512"], ["Small Business", "WOSB"], "CA", None, None),
+        (3, "Cloud Native Partners", [{"naicsCode": "518210"}, "541512"], ["8(a)", "Small Business"], "TX", 2, None),
+        (4, "Federal Cyber Group", ["541519"], ["Small Business"], "VA", None, None),
+    ]
+    index = ContractorIndex()
+    index.load_rows(rows)
+    
+    naics = index.search({"naics_codes": ["541512"], "capabilities": "cyber"})
+    small_va = index.search({"set_aside": ["Small Business"], "state": "va"})
+    
+    assert naics["total"] == 3
+    assert naics["ids"][0] == 2
+    assert naics["scores"][0] > naics["scores"][1]
+    assert {"value": "Small Business", "count": 2} in naics["facets"]["set_aside"]
+    assert small_va["ids"] == [4]
+    assert index.search({"name": "booz al"})["ids"] == [1]
+    assert index.search({"naics_codes": ["518210"], "min_past_awards": 3})["total"] == 0
+    assert Bitmap.from_rows([70000, 3, 3, 65536]).rows().tolist() == [3, 65536, 70000]
+
+def test_sam_entity_extract_record_maps_to_contractor():
+    """Test SAM.gov entity extract records parse like Entity API entities"""
+    from app.services.partner_matching_service import PartnerMatchingService
+    from app.services.sam_entity_extract_service import EXTRACT_FIELDS, extract_record_to_entity
+    
+    fields = [""] * 40
+    fields[EXTRACT_FIELDS["uei"]] = "JD3K9L2M4N6P"
+    fields[EXTRACT_FIELDS["legal_name"]] = "Tech Solutions Inc."
+    fields[EXTRACT_FIELDS["city"]] = "Arlington"
+    fields[EXTRACT_FIELDS["state"]] = "VA"
+    fields[EXTRACT_FIELDS["business_types"]] = "2X~QF~A6^20270101"
+    fields[EXTRACT_FIELDS["primary_naics"]] = "541512"
+    fields[EXTRACT_FIELDS["naics"]] = "541330Y~541512N"
+    
+    contractor = PartnerMatchingService(None)._parse_sam_entity(extract_record_to_entity(fields))
+    
+    assert contractor["uei"] == "JD3K9L2M4N6P"
+    assert contractor["naics"] == ["541512", "541330"]
+    assert contractor["set_aside"] == ["Small Business", "8(a)", "SDVOSB"]
+    assert contractor["location"]["state"] == "VA"
+
+def test_expired_registrations_leave_the_contractor_index(monkeypatch):
+    """Test expired extract records parse as inactive and are dropped from the contractor index"""
+    from datetime import datetime
+    from types import SimpleNamespace
+    from app.services.contractor_index import ContractorIndex
+    from app.services.partner_matching_service import PartnerMatchingService
+    from app.services.sam_entity_extract_service import EXTRACT_FIELDS, extract_record_to_entity
+    
+    fields = [""] * 40
+    fields[EXTRACT_FIELDS["uei"]] = "JD3K9L2M4N6P"
+    fields[EXTRACT_FIELDS["legal_name"]] = "Tech Solutions Inc."
+    fields[EXTRACT_FIELDS["extract_code"]] = "E"
+    assert PartnerMatchingService(None)._parse_sam_entity(extract_record_to_entity(fields))["active"] is False
+    fields[EXTRACT_FIELDS["extract_code"]] = "A"
+    assert PartnerMatchingService(None)._parse_sam_entity(extract_record_to_entity(fields))["active"] is True
+    
+    index = ContractorIndex()
+    index.load_rows([
+        (1, "Alpha Cyber", ["541512"], [], "VA", None, datetime(2025, 1, 1), True),
+        (2, "Beta Cyber", ["541512"], [], "VA", None, datetime(2025, 1, 1), False),
+    ])
+    assert index.search({"naics_codes": ["541512"]})["ids"] == [1]
+    
+    expired = [(1, "Alpha Cyber", ["541512"], [], "VA", None, datetime(2025, 2, 1), False)]
+    db = SimpleNamespace(execute=lambda *args: SimpleNamespace(fetchall=lambda: expired))
+    monkeypatch.setattr(ContractorIndex, "_checkpoint_updated_at", staticmethod(lambda db: None))
+    index.refresh(db)
+    
+    assert index.search({"naics_codes": ["541512"]})["total"] == 0
+
+def test_capability_embeddings_top_k_blends_bias_and_filters(tmp_path):
+    """Test int8 capability embeddings rank by similarity, bias and allow-masks"""
+    import json
+    import numpy as np
+    from app.services.capability_embeddings import CURRENT_FILE, CapabilityEmbeddings, quantize
+    
+    store = CapabilityEmbeddings(str(tmp_path))
+    vectors = np.random.default_rng(7).standard_normal((300, store.dimensions)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1)[:, None]
+    q, scales = quantize(vectors)
+    generation = tmp_path / "gen-1"
+    generation.mkdir()
+    (generation / "vectors.i8").write_bytes(q.tobytes())
+    np.save(generation / "ids.npy", np.arange(1000, 1300, dtype=np.int64))
+    np.save(generation / "scales.npy", scales)
+    np.save(generation / "hashes.npy", np.zeros(300, dtype=np.uint64))
+    (generation / "meta.json").write_text(json.dumps({"model": store.model, "dimensions": store.dimensions}))
+    (tmp_path / CURRENT_FILE).write_text("gen-1")
+    
+    queries = vectors[[5, 9]]
+    plain, filtered = store.top_k(queries, k=3, allowed=[None, store.ids() != 1009])
+    bias = np.zeros(300, dtype=np.float32)
+    bias[42] = 2.0
+    boosted = store.top_k(queries[:1], k=3, bias=[bias])[0]
+    
+    assert store.ready
+    assert plain["ids"][0] == 1005
+    assert abs(plain["similarity"][0] - 1.0) < 0.02
+    assert 1009 not in filtered["ids"].tolist()
+    assert boosted["ids"][:2].tolist() == [1042, 1005]
+
+def test_batch_match_scores_match_single_scoring(monkeypatch):
+    """Test batch opportunity match scoring equals calculate_ai_match_score"""
+    import random
+    from app.config import settings
+    from datetime import date, timedelta
+    from types import SimpleNamespace
+    from app.services.opportunity_matching_service import OpportunityMatchingService
+    import numpy as np
+    from app.services.opportunity_match_scoring import FACTORS, SCORE_COLUMNS, MatchProfile, score_columns, top_k
+    
+    org = SimpleNamespace(
+        id="org-1", naics_codes=["541512", "541330"], core_capabilities=["Cloud", "cyber", "data"],
+        certifications=["8(a)"], annual_revenue=20000000, headquarters_location="Reston, VA", clearances=["Secret"]
+    )
+    past_performance = [("DHS", date.today() - timedelta(days=100), 3000000.0), ("GSA", None, None)]
+    service = OpportunityMatchingService(None)
+    service._past_performance_cache[org.id] = past_performance
+    monkeypatch.setattr(settings, "OPPORTUNITY_EMBEDDINGS_ENABLED", False)  # Lexical scores only
+    
+    rng = random.Random(3)
+    opps = [
+        SimpleNamespace(
+            naics_code=rng.choice(["541512", "541611", "336411", None]),
+            agency=rng.choice(["DHS", "DOD", None]),
+            estimated_value=rng.choice([None, 0, 500000.0, 3000000.0, 9000000.0]),
+            description=rng.choice([None, "Cloud and CYBER services", "data platform"]),
+            set_aside_type=rng.choice([None, "8(a)", "WOSB"]),
+            place_of_performance=rng.choice([None, "VA", "Washington, DC", "CA"]),
+            remote_work_allowed=rng.random() < 0.2,
+            clearance_required=rng.choice([None, "Secret", "TS/SCI"]),
+        )
+        for _ in range(200)
+    ]
+    for opp in opps:
+        text = (opp.description or "").lower()
+        opp.capability_hits = sum(c.lower() in text for c in org.core_capabilities)
+    
+    batch = score_columns({name: [getattr(o, name) for o in opps] for name in SCORE_COLUMNS},
+                          MatchProfile(org, past_performance))
+    
+    for i, opp in enumerate(opps):
+        single = service.calculate_ai_match_score(opp, org)
+        assert batch["overall"][i] == single["overall_score"]
+        assert all(abs(batch[f][i] - single["scores"][f]) < 1e-9 for f in FACTORS)
+    assert top_k(np.array([1.0, 3.0, 3.0, 2.0]), 2).tolist() == [1, 2]
+
+def test_match_score_tracking_queues_changed_rows(monkeypatch):
+    """Test committed opportunity/org/past performance changes queue only what they affect"""
+    from datetime import datetime, timedelta, timezone
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import Session
+    import app.models  # noqa: F401 (mappers)
+    from app.models.opportunity import Opportunity
+    from app.models.organization import Organization
+    from app.models.knowledge import PastPerformance
+    from app.models.match_score import OpportunityMatchScore
+    from app.config import settings
+    from app.services import match_score_service as scores
+    
+    class Queue:
+        def __init__(self):
+            self.sets = {}
+        def add(self, key, ids):
+            self.sets.setdefault(key, set()).update(str(i) for i in ids)
+    
+    queue = Queue()
+    monkeypatch.setattr(scores, "dirty_queue", queue)
+    engine = create_engine("sqlite://")
+    for model in (Organization, Opportunity, PastPerformance, OpportunityMatchScore):
+        model.__table__.create(engine)
+    
+    scores.track_changes()
+    try:
+        with Session(engine) as db:
+            db.add(Organization(id="org-1", name="Acme", email="a@acme.test"))
+            db.add(Opportunity(id="opp-1", title="Cloud", opportunity_type="RFP", organization_id="org-1"))
+            db.commit()
+            assert queue.sets[scores.DIRTY_OPPORTUNITIES] == {"opp-1"}
+            assert queue.sets[scores.DIRTY_ORGANIZATIONS] == {"org-1"}
+            
+            queue.sets.clear()
+            opp = db.get(Opportunity, "opp-1")
+            opp.solicitation_number = "70RSAT26R00000001"  # Not scored
+            db.commit()
+            assert not queue.sets.get(scores.DIRTY_OPPORTUNITIES)
+            
+            opp.naics_code = "541512"
+            db.add(PastPerformance(id="pp-1", project_name="X", client_name="DHS", organization_id="org-1"))
+            db.commit()
+            assert queue.sets[scores.DIRTY_OPPORTUNITIES] == {"opp-1"}
+            assert queue.sets[scores.DIRTY_ORGANIZATIONS] == {"org-1"}
+            
+            queue.sets.clear()
+            opp.naics_code = "336411"
+            db.rollback()
+            assert not any(queue.sets.values())
+            
+            # Soft-deleting queues the opportunity, and its rescore drops its stored scores
+            opp = db.get(Opportunity, "opp-1")
+            opp.is_deleted = True
+            db.commit()
+            assert queue.sets[scores.DIRTY_OPPORTUNITIES] == {"opp-1"}
+            factors = {column: 50.0 for column in scores._FACTOR_COLUMNS.values()}
+            db.add(OpportunityMatchScore(
+                organization_id="org-1", opportunity_id="opp-1", overall_score=50.0, grade="C",
+                scored_at=datetime.now(timezone.utc) - timedelta(hours=1), **factors
+            ))
+            db.commit()
+            monkeypatch.setattr(settings, "OPPORTUNITY_EMBEDDINGS_ENABLED", False)
+            assert scores.MatchScoreService(db).rescore_opportunities(["opp-1"]) == 0
+            assert db.query(OpportunityMatchScore).count() == 0
+    finally:
+        event.remove(Session, "after_flush", scores._collect_changes)
+        event.remove(Session, "after_commit", scores._queue_changes)
+        event.remove(Session, "after_rollback", scores._discard_changes)
+
+def test_dirty_queue_lock_release_is_compare_and_delete():
+    """Test releasing an expired drain lock never deletes another worker's lock"""
+    import fakeredis
+    from app.services.match_score_service import DRAIN_LOCK, DirtyQueue
+    
+    queue = DirtyQueue()
+    queue._client = fakeredis.FakeRedis(decode_responses=True)
+    token = queue.acquire(DRAIN_LOCK, ttl_seconds=60)
+    assert token and queue.acquire(DRAIN_LOCK, ttl_seconds=60) is None
+    
+    queue._client.set(DRAIN_LOCK, "other-worker")  # Expired and re-acquired
+    queue.release(DRAIN_LOCK, token)
+    assert queue._client.get(DRAIN_LOCK) == "other-worker"
+    queue.release(DRAIN_LOCK, "other-worker")
+    assert queue._client.get(DRAIN_LOCK) is None
+
+def test_capability_matcher_counts_positions_and_variants():
+    """Test the capability automaton against substring, word-boundary and stemmed matching"""
+    from app.services.capability_matcher import capability_matcher
+    
+    text = "Cloud migrations for DHS; cloud-native security and SECURITIES; cybersecurity services"
+    substring = capability_matcher(["cloud", "security", "cloud migration", "devops"])
+    assert substring.counts(text) == [2, 2, 1, 0]
+    assert substring.matched(text) == ["cloud", "security", "cloud migration"]
+    assert substring.positions(text)["cloud migration"] == [(0, 15)]
+    
+    words = capability_matcher(["security", "cyber"], word_boundary=True)
+    assert words.counts(text) == [1, 0]
+    
+    stemmed = capability_matcher(["cloud migration", "security", "service"], stemmed=True)
+    assert stemmed.counts(text) == [1, 2, 1]
+    assert stemmed.positions(text)["cloud migration"] == [(0, 16)]
+    assert capability_matcher(["cloud migration", "security", "service"], stemmed=True) is stemmed
+
+def test_match_score_batch_plan_shards_and_resumes(monkeypatch):
+    """Test the nightly run plan covers the id space, a resumed run skips committed shards and a failed one closes"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    import app.models  # noqa: F401 (mappers)
+    from app.models.match_score import MatchScoreShard
+    from app.models.opportunity import Opportunity
+    from app.models.organization import Organization
+    from app.models.sync import SyncCheckpoint
+    from app.services.match_score_batch import MatchScoreBatchService, shard_range
+    
+    engine = create_engine("sqlite://")
+    for model in (Organization, Opportunity, SyncCheckpoint, MatchScoreShard):
+        model.__table__.create(engine)
+    
+    with Session(engine) as db:
+        db.add_all([Organization(id=org_id, name=org_id, email="ops@acme.test") for org_id in ("org-a", "org-b")])
+        db.add(Organization(id="org-gone", name="Gone", email="ops@acme.test", is_active=False))
+        db.add_all([
+            Opportunity(id=f"opp-{i:02d}", title="Opp", opportunity_type="RFP", organization_id="org-a")
+            for i in range(10)
+        ])
+        # Soft-deleted: outside every shard (else the bounds would start at it)
+        db.add(Opportunity(id="opp-03b", title="Opp", opportunity_type="RFP", organization_id="org-a", is_deleted=True))
+        db.commit()
+        
+        service = MatchScoreBatchService(db)
+        plan = service.plan("run-1", shard_size=4)
+        assert plan["organizations"] == ["org-a", "org-b"]
+        assert plan["bounds"] == [None, "opp-04", "opp-08"]
+        assert [shard_range(plan["bounds"], s) for s in range(3)] == [
+            (None, "opp-04"), ("opp-04", "opp-08"), ("opp-08", None)
+        ]
+        
+        db.add(MatchScoreShard(run_id="run-1", organization_id="org-a", shard=1, rows=4, seconds=0.1))
+        db.commit()
+        assert service.plan("run-1", shard_size=2) == plan  # Same run: same shards
+        assert service.pending(plan) == [("org-a", 0), ("org-a", 2), ("org-b", 0), ("org-b", 1), ("org-b", 2)]
+        assert service.run_shard("run-1", "org-a", 1)["skipped"]
+        assert service.run_shard("run-0", "org-a", 0)["skipped"]
+    
+    # A shard out of retries fails the chord: its error callback closes the run as failed
+    import celery
+    from app.tasks import matching_tasks
+    
+    dispatched = []
+    monkeypatch.setattr(celery, "chord", lambda header: lambda body: dispatched.append((list(header), body)))
+    monkeypatch.setattr(matching_tasks, "SessionLocal", lambda: Session(engine))
+    matching_tasks.run_match_score_batch("run-1")
+    header, body = dispatched[0]
+    assert len(header) == 5
+    errback, = body.options["link_error"]
+    assert errback.task == "matching.fail_match_score_batch" and errback.args == ("run-1",)
+    
+    with Session(engine) as db:
+        db.query(SyncCheckpoint).update({"last_started_at": None})  # SQLite drops the timezone
+        db.commit()
+    stats = matching_tasks.fail_match_score_batch(None, RuntimeError("shard timed out"), None, "run-1")
+    assert stats["pending_shards"] == 5
+    with Session(engine) as db:
+        checkpoint = MatchScoreBatchService(db).get_checkpoint()
+        assert checkpoint.status == "failed"
+        assert checkpoint.last_error == "5 shards did not complete: RuntimeError: shard timed out"
+
+
+def test_semantic_capability_hits_and_lexical_fallback(monkeypatch):
+    """Test semantic capability credit grades similarity and never scores below keyword matches"""
+    import numpy as np
+    from types import SimpleNamespace
+    from app.config import settings
+    from app.services import opportunity_matching_service as matching
+    from app.services.opportunity_embeddings import OpportunityEmbeddings
+    
+    monkeypatch.setattr(settings, "SEMANTIC_MATCH_FLOOR", 0.3)
+    monkeypatch.setattr(settings, "SEMANTIC_MATCH_FULL", 0.5)
+    capabilities = np.eye(3, 4, dtype=np.float32)
+    vectors = np.array([[1, 0, 0, 0], [0.4, 0.6, 0, 0.7], [0, 0, 1, 0], [0, 0, 0, 1]], dtype=np.float32)
+    found = np.array([True, True, False, True])  # Row 3 has no embedding
+    assert np.allclose(OpportunityEmbeddings.semantic_hits(vectors, found, capabilities), [1.0, 1.5, 0.0, 0.0])
+    
+    org = SimpleNamespace(id="org-1", naics_codes=[], core_capabilities=["Zero Trust Architecture", "cloud", "data"])
+    opp = SimpleNamespace(id="opp-1", naics_code=None, title="ZTA rollout", description="Cloud ZTA for DHS")
+    service = matching.OpportunityMatchingService(None)
+    
+    monkeypatch.setattr(matching.opportunity_embeddings, "capability_hits", lambda *args, **kwargs: np.array([2.0]))
+    assert service._score_capability_match(opp, org) == 10.0
+    monkeypatch.setattr(matching.opportunity_embeddings, "capability_hits", lambda *args, **kwargs: np.zeros(1))
+    assert service._score_capability_match(opp, org) == 5.0  # No embedding: "cloud" keyword only
+    
+    # Batch paths pass each opportunity's current text hash, like the single path
+    rows = [("opp-1", "ZTA rollout", "Cloud ZTA for DHS"), ("opp-2", "Data lake", None)]
+    connection = SimpleNamespace(execute=lambda statement: rows)
+    service = matching.OpportunityMatchingService(SimpleNamespace(connection=lambda: connection))
+    monkeypatch.setattr(settings, "OPPORTUNITY_EMBEDDINGS_ENABLED", True)
+    assert service._content_hashes(np.array(["opp-2", "opp-3", "opp-1"], dtype=object)) == [
+        matching.content_hash("Data lake"), None, matching.content_hash("ZTA rollout. Cloud ZTA for DHS")
+    ]
+    
+    calls = []
+    scan = [("opp-1",) + (None,) * len(matching._FETCHED_COLUMNS) + (1,)]
+    connection.execute = lambda statement: SimpleNamespace(partitions=lambda size: iter([scan]))
+    service._past_performance_cache[org.id] = []
+    monkeypatch.setattr(service, "_content_hashes", lambda ids: ["hash-%s" % i for i in ids])
+    monkeypatch.setattr(matching.opportunity_embeddings, "capability_hits",
+                        lambda *args, **kwargs: calls.append(kwargs.get("hashes")) or np.array([2.0]))
+    assert next(service.score_all(org))["id"].tolist() == ["opp-1"]
+    assert calls == [["hash-opp-1"]]
+
+
+def test_recommendation_endpoints_score_off_the_event_loop(monkeypatch):
+    """Test /top25 and /match-score run synchronous scoring (embedding calls on a cache miss) in a worker thread"""
+    import asyncio
+    from types import SimpleNamespace
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.api import recommendations
+    from app.core.database import get_db
+    from app.services.opportunity_matching_service import OpportunityMatchingService
+    
+    on_loop = []
+    
+    def in_event_loop():
+        try:
+            asyncio.get_running_loop()
+            return True
+        except RuntimeError:
+            return False
+    
+    def top(self, organization_id, limit=25, filters=None):
+        on_loop.append(in_event_loop())
+        return []
+    
+    def score(self, opp, org):
+        on_loop.append(in_event_loop())
+        return {"overall_score": 80.0, "grade": "A", "scores": dict.fromkeys(
+            ["capability", "past_performance", "set_aside", "size", "geography", "clearance"], 10.0
+        )}
+    
+    class FakeQuery:
+        def filter(self, *conditions):
+            return self
+        
+        def first(self):
+            return SimpleNamespace(id="x", core_capabilities=[], naics_codes=[], naics_code=None)
+    
+    monkeypatch.setattr(OpportunityMatchingService, "get_top_recommendations", top)
+    monkeypatch.setattr(OpportunityMatchingService, "calculate_ai_match_score", score)
+    monkeypatch.setattr(OpportunityMatchingService, "_generate_recommendation_reason", lambda self, *args: [])
+    app = FastAPI()
+    app.include_router(recommendations.router)
+    app.dependency_overrides[get_db] = lambda: SimpleNamespace(query=lambda model: FakeQuery())
+    client = TestClient(app)
+    
+    assert client.get("/api/v1/recommendations/top25", params={"organization_id": "org-1"}).status_code == 200
+    scored = client.get("/api/v1/recommendations/match-score/opp-1", params={"organization_id": "org-1"})
+    assert scored.status_code == 200 and scored.json()["overall_score"] == 80.0
+    assert on_loop == [False, False]
+
+def test_naics_hierarchy_lookups_distance_and_expansion():
+    """Test NAICS ancestry, sector ranges, similarity, expansion and size standards"""
+    from app.services.naics_hierarchy import naics_hierarchy as naics
+    
+    assert naics.ancestors("541512") == ["54", "541", "5415", "54151"]
+    assert naics.descendants("5415") == ["541511", "541512", "541513", "541519"]
+    assert naics.sector("311111") == naics.sector("336411") == "31-33"  # Not "31" vs "33"
+    assert naics.is_ancestor("5415", "541512") and not naics.is_ancestor("5416", "541512")
+    assert naics.covers("5415", "541519") and not naics.covers("541519", "5415")
+    assert naics.covers("54171", "541712")  # Retired 2017 code under a current industry
+    
+    assert naics.distance("541512", "541511") == 2
+    assert naics.similarity("541512", "541519") == 0.8
+    assert naics.similarity("541512", "541611") == 0.4
+    assert naics.similarity("541512", "336411") == 0.0
+    assert naics.best_match("541512", ["336411", "541330", "541519"]) == ("541519", 0.8)
+    
+    assert naics.expand(["5415", "541512", "999999"]) == ["541511", "541512", "541513", "541519", "999999"]
+    assert naics.mask(["31"]).sum() == len(naics.descendants("31-33"))
+    assert naics.size_standard("541512").describe() == "$34M"
+    assert naics.size_standard("336411").describe() == "1,500 employees"
+    assert naics.size_standard("522110").describe() == "$850M in assets"
+    unsized = [code for code in naics.codes if naics.size_standard(code) is None]
+    assert all(code[:2] == "92" for code in unsized if code not in {"491110", "521110", "551114", "814110"})
+    assert naics.title(541512) == "Computer Systems Design Services"
+
+@pytest.mark.asyncio
+async def test_rag_embeddings_batched_by_tokens_and_concurrent(monkeypatch):
+    """Test RAG chunks are embedded in token-bounded batches, concurrently and in order"""
+    import asyncio
+    import base64
+    from types import SimpleNamespace
+    import numpy as np
+    from app.config import settings
+    from app.services import rag_service
+    
+    monkeypatch.setattr(rag_service, "count_tokens", lambda value: len(value))
+    assert rag_service.token_batches(["aaaa", "bb", "cccccc", "d", "e"], max_tokens=6, max_inputs=2) == [[0, 1], [2], [3, 4]]
+    assert rag_service.token_batches(["a" * 20, "b"], max_tokens=6, max_inputs=8) == [[0], [1]]  # Oversized chunk alone
+    
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(settings, "RAG_EMBEDDING_BATCH_TOKENS", 6)
+    monkeypatch.setattr(settings, "RAG_EMBEDDING_BATCH_INPUTS", 2)
+    monkeypatch.setattr(settings, "RAG_EMBEDDING_CONCURRENCY", 2)
+    monkeypatch.setattr(settings, "EMBEDDING_CACHE_ENABLED", False)
+    service = rag_service.RAGService(db=None)
+    service.embedding_dimensions = 3
+    calls, in_flight, peak = [], [0], [0]
+    
+    async def create(model, input, encoding_format):
+        calls.append(list(input))
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+        data = []
+        for i, value in enumerate(reversed(input)):  # Out of order, like the API may return
+            vector = np.array([len(value), 0, 1], dtype="<f4")
+            data.append(SimpleNamespace(index=len(input) - 1 - i, embedding=base64.b64encode(vector.tobytes()).decode()))
+        return SimpleNamespace(data=data)
+    
+    service.async_openai_client = SimpleNamespace(embeddings=SimpleNamespace(create=create))
+    texts = ["aaaa", "bb", "cccccc", "d", "e"]
+    embeddings = await service.generate_embeddings(texts)
+    
+    assert calls == [["aaaa", "bb"], ["cccccc"], ["d", "e"]]
+    assert peak[0] == 2
+    assert embeddings[:, 0].tolist() == [4, 2, 6, 1, 1]
+    assert await service.generate_embedding("xyz") == [3.0, 0.0, 1.0]
+
+@pytest.mark.asyncio
+async def test_embedding_cache_skips_repeated_chunks(monkeypatch):
+    """Test identical (normalized) chunks and queries are embedded once"""
+    from types import SimpleNamespace
+    import numpy as np
+    from app.config import settings
+    from app.services import embedding_cache as cache_module
+    from app.services import rag_service
+    from app.services.embedding_cache import EmbeddingCache, normalize_text, text_hash
+    
+    assert normalize_text("  Past\u00a0performance:\n\n  CPARS  ") == "Past performance: CPARS"
+    
+    cache = EmbeddingCache(max_entries=2)
+    cache.put_many(None, "m", 2, {"a": np.ones(2), "b": np.ones(2), "c": np.ones(2)})
+    assert set(cache.get_many(None, "m", 2, ["a", "b", "c"])) == {"b", "c"}  # "a" evicted
+    assert cache.get_many(None, "other-model", 2, ["b"]) == {}
+    assert cache.stats()["hit_rate"] == 0.5
+    
+    monkeypatch.setattr(cache_module, "embedding_cache", EmbeddingCache())
+    monkeypatch.setattr(rag_service, "embedding_cache", cache_module.embedding_cache)
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(settings, "EMBEDDING_CACHE_ENABLED", True)
+    service = rag_service.RAGService(db=None)
+    service.embedding_dimensions = 2
+    sent = []
+    
+    async def create(model, input, encoding_format):
+        sent.extend(input)
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[len(value), 1.0]) for i, value in enumerate(input)])
+    
+    service.async_openai_client = SimpleNamespace(embeddings=SimpleNamespace(create=create))
+    overview = "Acme Federal is a  certified 8(a) firm."
+    embeddings = await service.generate_embeddings([overview, "Resume: J. Smith", overview.replace("  ", " ")])
+    
+    assert sent == ["Acme Federal is a certified 8(a) firm.", "Resume: J. Smith"]
+    assert embeddings[0].tolist() == embeddings[2].tolist()
+    
+    await service.generate_embeddings(["Resume:  J. Smith", "New section"])
+    assert sent[2:] == ["New section"]
+    assert service.embedding_stats == {"texts": 5, "embedded": 3}
+    assert cache_module.embedding_cache.get_many(None, service.embedding_model, 2, [text_hash("New section")])
+
+def test_rag_similarity_query_ranks_before_threshold(monkeypatch):
+    """Test the similarity query is ANN-index friendly and filters are bound, not formatted in"""
+    from types import SimpleNamespace
+    from app.config import settings
+    from app.services import vector_index
+    from app.services.rag_service import RAGService
+    from app.services.vector_index import VectorIndexService, organization_index_name
+    
+    executed = []
+    
+    class RecordingSession:
+        def execute(self, statement, params=None):
+            executed.append((str(statement), params or {}))
+            return SimpleNamespace(fetchall=lambda: [], scalar=lambda: "0.8.0")
+    
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(settings, "RAG_HNSW_EF_SEARCH", 40)
+    monkeypatch.setattr(vector_index, "_pgvector_version", None)
+    service = RAGService(RecordingSession())
+    service._nearest_chunks([0.5, -0.25], 50, {"organization_id": 7, "category": "x' OR '1'='1"}, 0.7)
+    
+    settings_sql, settings_params = executed[-2]
+    assert "hnsw.ef_search" in settings_sql and settings_params["ef_search"] == "50"  # Never below top_k
+    assert "hnsw.iterative_scan" in settings_sql  # pgvector 0.8+
+    
+    sql, params = executed[-1]
+    inner, outer = sql.split(") nearest")
+    assert "ORDER BY embedding <=>" in inner and "LIMIT :top_k" in inner
+    assert ":threshold" not in inner and "1 - distance > :threshold" in outer
+    assert "(metadata ->> 'organization_id') = :organization_id" in inner
+    assert "metadata @> CAST(:metadata_filter AS jsonb)" in inner
+    assert "OR '1'='1" not in sql
+    assert params["organization_id"] == "7"
+    assert params["metadata_filter"] == '{"category": "x\' OR \'1\'=\'1"}'
+    assert params["query_embedding"] == "[0.5,-0.25]"
+    
+    assert organization_index_name("org-1") == organization_index_name("org-1") != organization_index_name("org-2")
+    assert len(organization_index_name("x" * 64)) <= 63
+    assert VectorIndexService.ivfflat_lists(200_000) == 200
+    assert VectorIndexService.ivfflat_lists(4_000_000) == 2000
+
+
+@pytest.mark.asyncio
+async def test_rag_hybrid_search_fuses_keyword_and_vector_rankings(monkeypatch):
+    """Test an exact clause-number match reaches the top results through reciprocal rank fusion"""
+    from types import SimpleNamespace
+    from app.config import settings
+    from app.services.rag_service import RAGService, lexical_query_terms, reciprocal_rank_fusion
+    
+    terms, identifiers = lexical_query_terms("What is our DFARS 252.204-7012 or CMMC approach?")
+    assert terms == "What or is or our or DFARS or 252.204-7012 or CMMC or approach"
+    assert identifiers == "DFARS or 252.204-7012 or CMMC"
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]], k=60)[0][0] == "c"
+    
+    def chunk(chunk_id, similarity=None):
+        mapping = {"id": chunk_id, "document_id": chunk_id, "chunk_index": 0,
+                   "content": f"chunk {chunk_id}", "metadata": {"title": "KB"}}
+        if similarity is not None:
+            mapping["similarity"] = similarity
+        return SimpleNamespace(_mapping=mapping, **mapping)
+    
+    executed = []
+    
+    class RecordingSession:
+        def execute(self, statement, params=None):
+            executed.append((str(statement), params or {}))
+            return SimpleNamespace(fetchall=lambda: [])
+    
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(settings, "RAG_HYBRID_CANDIDATES", 20)
+    service = RAGService(RecordingSession())
+    RAGService._lexical_chunks(service.db, "DFARS 252.204-7012 reporting", 20, {"organization_id": 3})
+    sql, params = executed[-1]
+    assert sql.index(":identifiers") < sql.index(":terms)) DESC")  # Exact identifiers rank first
+    assert params["organization_id"] == "3" and params["limit"] == 20
+    
+    async def fake_embedding(text):
+        return [0.1, 0.2]
+    
+    vector_rows = [chunk(i, 0.9 - i / 100) for i in range(1, 21)]
+    monkeypatch.setattr(service, "generate_embedding", fake_embedding)
+    monkeypatch.setattr(service, "_nearest_chunks", lambda embedding, top_k, *args: vector_rows[:top_k])
+    monkeypatch.setattr(service, "_lexical_leg", lambda query, limit, filters: [chunk(99), chunk(3)])
+    
+    results = await service.hybrid_chunks("DFARS 252.204-7012", top_k=5)
+    assert [r["id"] for r in results][:2] == [3, 1]  # Both legs agree on chunk 3
+    assert 99 in [r["id"] for r in results]  # Keyword-only match makes the top 5
+    clause = next(r for r in results if r["id"] == 99)
+    assert clause["similarity"] is None and clause["lexical_rank"] == 1 and clause["vector_rank"] is None
+    assert "Similarity: keyword match" in service._format_results(results)
+
+
+@pytest.mark.asyncio
+async def test_incremental_reindex_embeds_only_changed_chunks(monkeypatch):
+    """Test an edit re-chunks locally and only new chunks are embedded, in one transaction"""
+    import random
+    from types import SimpleNamespace
+    import numpy as np
+    from app.config import settings
+    from app.services.embedding_cache import text_hash
+    from app.services.rag_service import RAGService, plan_reindex
+    
+    plan = plan_reindex([(10, 0, "a"), (11, 1, "b"), (12, 2, "b"), (13, 3, "c")], ["b", "a", "d", "b"])
+    assert plan.kept == 3 and plan.insert == [2] and plan.delete == [13]
+    assert sorted(plan.renumber) == [(10, 1), (11, 0), (12, 3)]
+    
+    rng = random.Random(5)
+    words = ["cloud", "security", "agency", "contract", "zero", "trust", "program", "data", "migration"]
+    document = "\n\n".join(
+        " ".join(" ".join(rng.choice(words) for _ in range(rng.randint(6, 20))).capitalize() + "." for _ in range(5))
+        for _ in range(150)
+    )
+    edited = document[:40000] + " Added FedRAMP High boundary." + document[40000:]
+    
+    executed, embedded, copied = [], [], []
+    
+    class RecordingSession:
+        commits = 0
+        
+        def execute(self, statement, params=None):
+            executed.append(str(statement))
+            return SimpleNamespace(fetchall=lambda: [])
+        
+        def commit(self):
+            RecordingSession.commits += 1
+        
+        def rollback(self):
+            pass
+    
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test-key")
+    service = RAGService(RecordingSession())
+    chunks = service._chunk_text(document, 1000, 200)
+    assert max(len(c) for c in chunks) <= 1000 and chunks == service._chunk_text(document, 1000, 200)
+    stored = [(100 + i, i, text_hash(c)) for i, c in enumerate(chunks)]
+    
+    async def fake_embeddings(texts):
+        embedded.extend(texts)
+        return np.zeros((len(texts), 4), dtype=np.float32)
+    
+    monkeypatch.setattr(service, "_stored_chunks", lambda document_id: stored)
+    monkeypatch.setattr(service, "generate_embeddings", fake_embeddings)
+    monkeypatch.setattr(service, "_copy_chunks", lambda *args: copied.append(args))
+    
+    stats = await service.update_embedding_index(7, edited, {"title": "SSP"})
+    assert 1 <= stats["inserted_chunks"] <= 3 and stats["kept_chunks"] >= len(chunks) - 3
+    assert len(embedded) == stats["inserted_chunks"] and any("FedRAMP" in c for c in embedded)
+    assert len(copied) == 1 and copied[0][0] == 7
+    assert any("pg_advisory_xact_lock" in sql for sql in executed)
+    assert any("DELETE FROM document_embeddings" in sql for sql in executed)
+    assert RecordingSession.commits == 1
+    
+    embedded.clear()
+    unchanged = await service.update_embedding_index(7, document, {"title": "SSP"})
+    assert unchanged["kept_chunks"] == len(chunks) and not embedded
+
+
+@pytest.mark.asyncio
+async def test_reindex_uses_content_saved_while_it_ran(monkeypatch):
+    """Test a re-index redoes its diff when a newer save lands before its write"""
+    from types import SimpleNamespace
+    import numpy as np
+    from app.config import settings
+    from app.services.rag_service import RAGService
+    
+    current = {"content": "Draft statement of work."}
+    copied, rollbacks = [], []
+    
+    class Session:
+        def execute(self, statement, params=None):
+            return SimpleNamespace(fetchall=lambda: [])
+        
+        def commit(self):
+            pass
+        
+        def rollback(self):
+            rollbacks.append(True)
+    
+    async def fake_embeddings(texts):
+        # The user saves again while the first version is being embedded
+        current["content"] = "Final statement of work with FedRAMP High."
+        return np.zeros((len(texts), 4), dtype=np.float32)
+    
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test-key")
+    service = RAGService(Session())
+    monkeypatch.setattr(service, "_stored_chunks", lambda document_id: [])
+    monkeypatch.setattr(service, "generate_embeddings", fake_embeddings)
+    monkeypatch.setattr(service, "_copy_chunks", lambda *args: copied.append(args))
+    
+    await service.update_embedding_index(7, "Draft statement of work.", {}, load_content=lambda: current["content"])
+    
+    assert len(rollbacks) == 1 and len(copied) == 1
+    assert copied[0][2] == ["Final statement of work with FedRAMP High."]
+
+def test_registry_keyed_chunks_satisfy_document_embeddings_constraints(monkeypatch):
+    """Test editor/knowledge chunks (rag_documents ids) pass the migrated document_id checks and cascade on delete"""
+    import importlib.util
+    import os
+    import numpy as np
+    from alembic.migration import MigrationContext
+    from alembic.operations import Operations
+    from psycopg2.errors import ForeignKeyViolation
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.orm import Session
+    from app.config import settings
+    from app.models.knowledge import RAG_DOCUMENT_ID_START
+    from app.services.rag_service import RAGService
+    
+    if not settings.DATABASE_URL.startswith("postgresql"):
+        pytest.skip("needs PostgreSQL (triggers, binary COPY)")
+    engine = create_engine(settings.DATABASE_URL)
+    with engine.connect() as connection:
+        if connection.execute(text("SELECT 1 FROM pg_available_extensions WHERE name = 'vector'")).scalar() is None:
+            pytest.skip("needs the pgvector extension")
+    
+    spec = importlib.util.spec_from_file_location(
+        "add_incremental_rag_index",
+        os.path.join(os.path.dirname(__file__), "..", "alembic", "versions", "add_incremental_rag_index.py")
+    )
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    
+    with engine.connect() as connection:
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        connection.execute(text("DROP SCHEMA IF EXISTS rag_registry_test CASCADE"))
+        connection.execute(text("CREATE SCHEMA rag_registry_test"))
+        connection.execute(text("SET search_path TO rag_registry_test, public"))
+        try:
+            # documents and document_embeddings as the earlier migrations leave them
+            connection.execute(text("CREATE TABLE documents (id serial PRIMARY KEY)"))
+            connection.execute(text("""
+                CREATE TABLE document_embeddings (
+                    id serial PRIMARY KEY,
+                    document_id integer NOT NULL REFERENCES documents (id) ON DELETE CASCADE,
+                    chunk_index integer NOT NULL,
+                    content text NOT NULL,
+                    embedding vector(4) NOT NULL,
+                    metadata jsonb
+                )
+            """))
+            with Operations.context(MigrationContext.configure(connection)):
+                migration.upgrade()
+            connection.commit()
+            
+            with Session(bind=connection) as db:
+                monkeypatch.setattr(settings, "OPENAI_API_KEY", "test-key")
+                service = RAGService(db)
+                editor_id = service.rag_document_id("editor:ssp")
+                assert editor_id >= RAG_DOCUMENT_ID_START and service.rag_document_id("editor:ssp") == editor_id
+                upload_id = db.execute(text("INSERT INTO documents DEFAULT VALUES RETURNING id")).scalar_one()
+                
+                vectors = np.ones((2, 4), dtype=np.float32)
+                service._copy_chunks(editor_id, [0, 1], ["Scope.", "FedRAMP High."], vectors, {"source": "editor:ssp"})
+                service._copy_chunks(upload_id, [0], ["Past performance."], vectors[:1], {})
+                db.commit()
+                
+                def chunks(document_id):
+                    return db.execute(
+                        text("SELECT count(*) FROM document_embeddings WHERE document_id = :id"), {"id": document_id}
+                    ).scalar()
+                
+                assert (chunks(editor_id), chunks(upload_id)) == (2, 1)
+                
+                # Neither table has the id: rejected with the same error as a foreign key
+                with pytest.raises(ForeignKeyViolation):
+                    service._copy_chunks(editor_id + 1, [0], ["Orphan."], vectors[:1], {})
+                db.rollback()
+                
+                # Deleting either parent still removes its chunks
+                db.execute(text("DELETE FROM rag_documents WHERE id = :id"), {"id": editor_id})
+                db.execute(text("DELETE FROM documents WHERE id = :id"), {"id": upload_id})
+                db.commit()
+                assert (chunks(editor_id), chunks(upload_id)) == (0, 0)
+        finally:
+            connection.rollback()
+            connection.execute(text("DROP SCHEMA rag_registry_test CASCADE"))
+            connection.commit()
+
+def test_rich_editor_saves_schedule_reindex_of_latest_content(monkeypatch):
+    """Test editor endpoints accept the authenticated User and re-index with its organization"""
+    from types import SimpleNamespace
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.api import rich_editor
+    from app.api.auth import get_current_user
+    
+    indexed = []
+    
+    async def reindex(source_key, content, metadata, load_content=None):
+        indexed.append((source_key, load_content(), metadata["organization_id"]))
+    
+    monkeypatch.setattr(rich_editor, "reindex_source_document", reindex)
+    app = FastAPI()
+    app.include_router(rich_editor.router)
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(
+        id="user-1", full_name="Ada Lovelace", organization_id="org-1"
+    )
+    client = TestClient(app)
+    
+    created = client.post("/api/v1/editor/documents", json={"document_id": "rag-doc", "title": "SSP", "content": "v1"})
+    saved = client.post("/api/v1/editor/auto-save", json={"document_id": "rag-doc", "content": "v2", "save_as_draft": False})
+    draft = client.post("/api/v1/editor/auto-save", json={"document_id": "rag-doc", "content": "v3"})
+    
+    assert [created.json()["status"], saved.json()["status"], draft.json()["status"]] == ["created", "saved", "auto_saved"]
+    assert indexed == [("editor:rag-doc", "v1", "org-1"), ("editor:rag-doc", "v2", "org-1")]
+
+def test_capability_embedding_build_resumes_after_interruption(tmp_path, monkeypatch):
+    """Test a build stopped mid-way keeps its pages and the next build finishes it without re-embedding them"""
+    from types import SimpleNamespace
+    import numpy as np
+    from app.services.capability_embeddings import BUILDING_FILE, CapabilityEmbeddings
+    
+    contractors = [(i, f"Contractor {i}", None, f"cloud capability {i}", ["541512"], []) for i in range(1, 11)]
+    
+    class PagedSession:
+        def execute(self, statement, params):
+            page = [r for r in contractors if r[0] > params["after"]][:params["limit"]]
+            return SimpleNamespace(fetchall=lambda: page)
+        
+        def rollback(self):
+            pass
+    
+    store = CapabilityEmbeddings(str(tmp_path))
+    embedded = []
+    
+    def fake_embed(texts, batch_size=256):
+        if len(embedded) >= 4:
+            raise RuntimeError("worker killed")
+        embedded.extend(texts)
+        vectors = np.random.default_rng(len(embedded)).standard_normal((len(texts), store.dimensions))
+        return (vectors / np.linalg.norm(vectors, axis=1)[:, None]).astype(np.float32)
+    
+    monkeypatch.setattr(store, "embed", fake_embed)
+    with pytest.raises(RuntimeError):
+        store.build(PagedSession(), page_size=4)
+    assert (tmp_path / BUILDING_FILE).exists() and not store.ready
+    
+    embedded.clear()
+    paused = store.build(PagedSession(), page_size=4, max_seconds=0)
+    assert not paused["complete"] and paused["rows"] == 4
+    
+    monkeypatch.setattr(store, "embed", lambda texts, batch_size=256: np.eye(len(texts), store.dimensions, dtype=np.float32))
+    stats = store.build(PagedSession(), page_size=4)
+    assert stats["complete"] and stats["resumed_at_row"] == 4
+    assert stats["rows"] == 10 and stats["embedded"] == 10  # Rows 1-4 embedded by the first run, kept
+    assert store.ready and store.ids().tolist() == list(range(1, 11))
+    assert not (tmp_path / BUILDING_FILE).exists()